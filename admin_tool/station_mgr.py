@@ -1023,6 +1023,39 @@ again. Un-archiving a station can only be done through editing the database.
     print("** Station Archived **")
 
 
+def rebuild_hourly_summaries(con):
+    print("\n\nRebuild Hourly Summaries\n------------------------")
+    print("""
+The hourly summary table holds rainfall, wind run, reception and temperature,
+humidity and pressure ranges for each quarter hour of a stations data. The web
+interface uses it for its hourly rainfall and reception charts. It is kept up
+to date automatically as samples are added or changed so you should only need
+to rebuild it after upgrading a database that already has data in it or if you
+suspect it is out of date.
+
+Rebuilding may take a few minutes for a station with several years of data.
+
+Which station would you like to rebuild hourly summaries for? Leave blank to
+rebuild them for all stations.""")
+
+    cur = con.cursor()
+    codes = print_station_list(cur)
+    selected_station_code = get_code("Station", codes)
+
+    if selected_station_code is None:
+        station_id = None
+    else:
+        cur.execute("select station_id from station where lower(code) = lower(%s)",
+                    (selected_station_code,))
+        station_id = cur.fetchone()[0]
+
+    print("Rebuilding hourly summaries...")
+    cur.execute("select rebuild_sample_quarter_hours(%s)", (station_id,))
+    quarter_hours = cur.fetchone()[0]
+    con.commit()
+    print("** {0} quarter hours summarised **".format(quarter_hours))
+
+
 def manage_stations(con):
     """
     Runs a menu allowing the user to select various station management options.
@@ -1072,6 +1105,12 @@ def manage_stations(con):
             "type": "func",
             "func": lambda: archive_station(con)
         },
+        {
+            "key": "8",
+            "name": "Rebuild hourly summaries",
+            "type": "func",
+            "func": lambda: rebuild_hourly_summaries(con)
+        },
         {
             "key": "0",
             "name": "Return",
@@ -741,6 +741,116 @@ comment on column sample_gap.end_time is 'The timestamp of the sample directly a
 comment on column sample_gap.missing_sample_count is 'The number of samples that are missing';
 comment on column sample_gap.label is 'Optional label/description for the gap - why it exists, etc.';
 
+-- Quarter hour summaries of the sample table. These are kept up to date by
+-- triggers on sample and davis_sample so the hourly rainfall and reception
+-- data sets can add up four rows per hour rather than aggregating every sample
+-- on every request. Quarter hours rather than hours so they still line up with
+-- local hours and days in time zones that are offset from UTC by 30 or 45
+-- minutes. Averages are stored as totals and counts so new samples can be
+-- added in without going back to the sample table. Use
+-- rebuild_sample_quarter_hours() to populate it for existing samples.
+create table sample_quarter_hour (
+    station_id integer not null references station(station_id),
+    time_stamp timestamptz not null,
+    sample_count integer not null,
+    rainfall real,
+    wind_run real,
+    min_temperature real,
+    max_temperature real,
+    total_temperature double precision,
+    temperature_samples integer not null,
+    min_relative_humidity integer,
+    max_relative_humidity integer,
+    total_relative_humidity integer,
+    relative_humidity_samples integer not null,
+    min_pressure real,
+    max_pressure real,
+    total_pressure double precision,
+    pressure_samples integer not null,
+    total_wind_speed double precision,
+    wind_speed_samples integer not null,
+    max_gust_wind_speed real,
+    wind_sample_count integer,
+    wind_sample_count_samples integer not null,
+    in_climatology boolean not null default false,
+    primary key (station_id, time_stamp)
+);
+
+comment on table sample_quarter_hour is 'Summary of the samples in each quarter hour. Maintained by triggers on the sample and davis_sample tables.';
+comment on column sample_quarter_hour.station_id is 'Station the summary is for';
+comment on column sample_quarter_hour.time_stamp is 'Start of the quarter hour. Quarter hours start on the hour in UTC so they line up with the start of local hours in every time zone.';
+comment on column sample_quarter_hour.sample_count is 'Number of samples in the quarter hour';
+comment on column sample_quarter_hour.rainfall is 'Total rainfall in mm';
+comment on column sample_quarter_hour.wind_run is 'Wind run in km (average wind speed multiplied by the sample interval summed over all samples)';
+comment on column sample_quarter_hour.min_temperature is 'Lowest outdoor temperature';
+comment on column sample_quarter_hour.max_temperature is 'Highest outdoor temperature';
+comment on column sample_quarter_hour.total_temperature is 'Sum of the outdoor temperature. Divide by temperature_samples for the average.';
+comment on column sample_quarter_hour.temperature_samples is 'Number of samples with an outdoor temperature';
+comment on column sample_quarter_hour.min_relative_humidity is 'Lowest outdoor relative humidity';
+comment on column sample_quarter_hour.max_relative_humidity is 'Highest outdoor relative humidity';
+comment on column sample_quarter_hour.total_relative_humidity is 'Sum of the outdoor relative humidity. Divide by relative_humidity_samples for the average.';
+comment on column sample_quarter_hour.relative_humidity_samples is 'Number of samples with an outdoor relative humidity';
+comment on column sample_quarter_hour.min_pressure is 'Lowest pressure (mean sea level if available, otherwise absolute)';
+comment on column sample_quarter_hour.max_pressure is 'Highest pressure (mean sea level if available, otherwise absolute)';
+comment on column sample_quarter_hour.total_pressure is 'Sum of the pressure (mean sea level if available, otherwise absolute). Divide by pressure_samples for the average.';
+comment on column sample_quarter_hour.pressure_samples is 'Number of samples with a pressure';
+comment on column sample_quarter_hour.total_wind_speed is 'Sum of the average wind speed in m/s. Divide by wind_speed_samples for the average.';
+comment on column sample_quarter_hour.wind_speed_samples is 'Number of samples with an average wind speed';
+comment on column sample_quarter_hour.max_gust_wind_speed is 'Highest gust wind speed in m/s';
+comment on column sample_quarter_hour.wind_sample_count is 'Total of davis_sample.wind_sample_count. Divide by wind_sample_count_samples and the maximum number of packets per sample to get reception.';
+comment on column sample_quarter_hour.wind_sample_count_samples is 'Number of samples with a wind sample count (Davis hardware only)';
+comment on column sample_quarter_hour.in_climatology is 'If a daily_climatology record may include this quarter hour. Changes to the quarter hour throw the records for its day away.';
+
+-- Daily summaries used by the NOAA monthly and yearly climatological reports.
+-- Rows are only stored for days old enough that they're not expected to change
+-- and are filled in by the web interface as reports ask for them. Degree days
+-- depend on the heat and cool base the report is configured with so rows
+-- calculated with a different base are replaced. Rows for a day are deleted by
+-- the sample_quarter_hour trigger if any of its samples change.
+create table daily_climatology (
+    station_id integer not null references station(station_id),
+    date_stamp date not null,
+    heat_base double precision not null,
+    cool_base double precision not null,
+    sample_count integer not null,
+    max_temperature real,
+    max_temperature_time timestamptz,
+    min_temperature real,
+    min_temperature_time timestamptz,
+    avg_temperature double precision,
+    rainfall real,
+    avg_wind_speed double precision,
+    max_gust_wind_speed real,
+    max_gust_wind_speed_time timestamptz,
+    heat_degree_days double precision,
+    cool_degree_days double precision,
+    wind_directions integer[],
+    wind_direction_counts integer[],
+    calculated timestamptz not null default now(),
+    primary key (station_id, date_stamp)
+);
+
+comment on table daily_climatology is 'Daily summaries for the NOAA climatological reports. Only holds days that are not expected to change anymore.';
+comment on column daily_climatology.station_id is 'Station the summary is for';
+comment on column daily_climatology.date_stamp is 'Day the summary is for (in the time zone of the session that calculated it)';
+comment on column daily_climatology.heat_base is 'Base temperature heat degree days were calculated with';
+comment on column daily_climatology.cool_base is 'Base temperature cool degree days were calculated with';
+comment on column daily_climatology.sample_count is 'Number of samples in the day. Days without samples are stored so they are not looked for again.';
+comment on column daily_climatology.max_temperature is 'Highest outdoor temperature';
+comment on column daily_climatology.max_temperature_time is 'Last time the highest outdoor temperature was recorded';
+comment on column daily_climatology.min_temperature is 'Lowest outdoor temperature';
+comment on column daily_climatology.min_temperature_time is 'Last time the lowest outdoor temperature was recorded';
+comment on column daily_climatology.avg_temperature is 'Average outdoor temperature';
+comment on column daily_climatology.rainfall is 'Total rainfall in mm';
+comment on column daily_climatology.avg_wind_speed is 'Average of the average wind speed in m/s';
+comment on column daily_climatology.max_gust_wind_speed is 'Highest gust wind speed in m/s';
+comment on column daily_climatology.max_gust_wind_speed_time is 'Last time the highest gust wind speed was recorded';
+comment on column daily_climatology.heat_degree_days is 'Heat degree days calculated by integration over all samples';
+comment on column daily_climatology.cool_degree_days is 'Cool degree days calculated by integration over all samples';
+comment on column daily_climatology.wind_directions is 'Each wind direction recorded during the day';
+comment on column daily_climatology.wind_direction_counts is 'Number of samples recording each direction in wind_directions';
+comment on column daily_climatology.calculated is 'When the summary was calculated. Lets reports built from these records tell when they have been recalculated.';
+
 
 -- A table to store some basic information about the database (such as schema
 -- version).
@@ -1930,11 +2040,12 @@ end;
 $$;
 comment on function get_live_text_record is 'Gets sample data as a text string such as CSV.';
 
-create or replace function month_samples_tsv(for_station_id integer,
-                                             month timestamptz,
-                                             broadcast_id integer,
-                                             version integer,
-                                             include_extra_sensors bool)
+create or replace function month_samples_tsv_rows(for_station_id integer,
+                                                  month timestamptz,
+                                                  after timestamptz,
+                                                  broadcast_id integer,
+                                                  version integer,
+                                                  include_extra_sensors bool)
     returns table
             (
                 sample_ts   timestamptz,
@@ -1945,31 +2056,6 @@ as
 $$
 begin
     return query
-        -- Column headings
-        select date_trunc('month', month) as time_stamp,
-                ('# timestamp	temperature	dew point	apparent temperature	'  ||
-                'wind chill	relative humidity	'  ||
-                case when version = 1 then 'pressure'
-                     else 'absolute pressure	mean sea level pressure'
-                end || chr(9) ||
-                'indoor temperature	indoor relative humidity	rainfall	'  ||
-                'average wind speed	gust wind speed	wind direction	' ||
-                'uv index	solar radiation	reception	high temp	low temp	' ||
-                'high rain rate	gust direction	evapotranspiration	' ||
-                'high solar radiation	high uv index	forecast rule id' ||
-                case when include_extra_sensors then
-                     '	soil moisture 1	soil moisture 2	soil moisture 3	' ||
-                     'soil moisture 4	soil temperature 1	' ||
-                     'soil temperature 2	soil temperature 3	' ||
-                     'soil temperature 4	leaf wetness 1	leaf wetness 2	' ||
-                     'leaf temperature 1	leaf temperature 2	' ||
-                     'extra humidity 1	extra humidity 2	' ||
-                     'extra temperature 1	extra temperature 2	' ||
-                     'extra temperature 3'
-                     else ''
-                end)::varchar
-        union all
-        -- Row data
         select cur.time_stamp as time_stamp,
                (
                    to_char(cur.time_stamp, 'YYYY-MM-DD HH24:MI:SSOF') || chr(9) ||
@@ -2030,14 +2116,343 @@ begin
         from sample cur
                  inner join station s on s.station_id = cur.station_id
                  left outer join davis_sample ds on ds.sample_id = cur.sample_id
-        where date(date_trunc('month', cur.time_stamp)) = date(date_trunc('month', month))
-          and cur.station_id = for_station_id
-        order by time_stamp;
+        where cur.station_id = for_station_id
+          and cur.time_stamp >= date_trunc('month', month)
+          and cur.time_stamp < date_trunc('month', month) + '1 month'::interval
+          and cur.time_stamp > coalesce(after, '-infinity'::timestamptz)
+        order by cur.time_stamp;
+
+end;
+$$;
+comment on function month_samples_tsv_rows is 'Gets tab-delimited sample data (without column headings) for a month, optionally only including samples after the specified time. Used by some of the web UIs data endpoints.';
+
+create or replace function month_samples_tsv(for_station_id integer,
+                                             month timestamptz,
+                                             broadcast_id integer,
+                                             version integer,
+                                             include_extra_sensors bool)
+    returns table
+            (
+                sample_ts   timestamptz,
+                sample_data varchar
+            )
+    language plpgsql
+as
+$$
+begin
+    return query
+        -- Column headings
+        select date_trunc('month', month) as time_stamp,
+                ('# timestamp	temperature	dew point	apparent temperature	'  ||
+                'wind chill	relative humidity	'  ||
+                case when version = 1 then 'pressure'
+                     else 'absolute pressure	mean sea level pressure'
+                end || chr(9) ||
+                'indoor temperature	indoor relative humidity	rainfall	'  ||
+                'average wind speed	gust wind speed	wind direction	' ||
+                'uv index	solar radiation	reception	high temp	low temp	' ||
+                'high rain rate	gust direction	evapotranspiration	' ||
+                'high solar radiation	high uv index	forecast rule id' ||
+                case when include_extra_sensors then
+                     '	soil moisture 1	soil moisture 2	soil moisture 3	' ||
+                     'soil moisture 4	soil temperature 1	' ||
+                     'soil temperature 2	soil temperature 3	' ||
+                     'soil temperature 4	leaf wetness 1	leaf wetness 2	' ||
+                     'leaf temperature 1	leaf temperature 2	' ||
+                     'extra humidity 1	extra humidity 2	' ||
+                     'extra temperature 1	extra temperature 2	' ||
+                     'extra temperature 3'
+                     else ''
+                end)::varchar
+        union all
+        -- Row data
+        select r.sample_ts, r.sample_data
+        from month_samples_tsv_rows(for_station_id, month, null,
+                                    broadcast_id, version,
+                                    include_extra_sensors) as r
+        order by 1;
 
 end;
 $$;
 comment on function month_samples_tsv is 'Gets tab-delimited sample data for an entire month. Used by some of the web UIs data endpoints.';
 
+-- Start of the quarter hour a timestamp falls in for the sample_quarter_hour
+-- table.
+create or replace function quarter_hour_start(ts timestamptz)
+    returns timestamptz
+    language sql
+    immutable
+as
+$$
+select to_timestamp(floor(extract(epoch from $1) / 900) * 900);
+$$;
+comment on function quarter_hour_start is 'Start of the quarter hour a timestamp falls in for the sample_quarter_hour table.';
+
+create or replace function summarise_sample_quarter_hours(for_station_id integer,
+                                                          start_time timestamptz,
+                                                          end_time timestamptz)
+    returns setof sample_quarter_hour
+    language plpgsql
+    stable
+as
+$$
+begin
+    return query
+    select s.station_id,
+           quarter_hour_start(s.time_stamp)                 as time_stamp,
+           count(*)::integer                                as sample_count,
+           sum(s.rainfall)                                  as rainfall,
+           (sum(s.average_wind_speed * st.sample_interval) / 1000.0)::real
+                                                            as wind_run,
+           min(s.temperature)                               as min_temperature,
+           max(s.temperature)                               as max_temperature,
+           sum(s.temperature::double precision)             as total_temperature,
+           count(s.temperature)::integer                    as temperature_samples,
+           min(s.relative_humidity)                         as min_relative_humidity,
+           max(s.relative_humidity)                         as max_relative_humidity,
+           sum(s.relative_humidity)::integer                as total_relative_humidity,
+           count(s.relative_humidity)::integer              as relative_humidity_samples,
+           min(coalesce(s.mean_sea_level_pressure, s.absolute_pressure))
+                                                            as min_pressure,
+           max(coalesce(s.mean_sea_level_pressure, s.absolute_pressure))
+                                                            as max_pressure,
+           sum(coalesce(s.mean_sea_level_pressure, s.absolute_pressure)::double precision)
+                                                            as total_pressure,
+           count(coalesce(s.mean_sea_level_pressure, s.absolute_pressure))::integer
+                                                            as pressure_samples,
+           sum(s.average_wind_speed::double precision)      as total_wind_speed,
+           count(s.average_wind_speed)::integer             as wind_speed_samples,
+           max(s.gust_wind_speed)                           as max_gust_wind_speed,
+           sum(ds.wind_sample_count)::integer               as wind_sample_count,
+           count(ds.wind_sample_count)::integer             as wind_sample_count_samples,
+           false                                            as in_climatology
+    from sample s
+    inner join station st on st.station_id = s.station_id
+    left outer join davis_sample ds on ds.sample_id = s.sample_id
+    where s.station_id = for_station_id
+      and s.time_stamp >= start_time
+      and s.time_stamp < end_time
+    group by s.station_id, quarter_hour_start(s.time_stamp);
+end;
+$$;
+comment on function summarise_sample_quarter_hours is 'Summarises the samples for a station into quarter hours in the same format as the sample_quarter_hour table. The start and end times should be on a quarter hour.';
+
+create or replace function update_sample_quarter_hours(for_station_id integer,
+                                                       start_time timestamptz,
+                                                       end_time timestamptz)
+    returns integer
+    language plpgsql
+    volatile
+as
+$$
+declare
+    quarter_hour_count integer;
+begin
+    -- Recalculated quarter hours lose track of whether they're part of a
+    -- daily_climatology record so any records they might be part of go
+    if exists(select 1 from sample_quarter_hour
+              where station_id = for_station_id
+                and time_stamp >= start_time
+                and time_stamp < end_time
+                and in_climatology) then
+        delete from daily_climatology
+        where station_id = for_station_id
+          and date_stamp between (start_time - '1 day'::interval)::date
+                             and (end_time + '1 day'::interval)::date;
+    end if;
+
+    -- Quarter hours that no longer have samples go along with the rest
+    delete from sample_quarter_hour
+    where station_id = for_station_id
+      and time_stamp >= start_time
+      and time_stamp < end_time;
+
+    insert into sample_quarter_hour
+    select * from summarise_sample_quarter_hours(for_station_id, start_time,
+                                                 end_time);
+
+    get diagnostics quarter_hour_count = row_count;
+    return quarter_hour_count;
+end;
+$$;
+comment on function update_sample_quarter_hours is 'Recalculates the sample_quarter_hour records for a station over a time range. The start and end times should be on a quarter hour. Returns the number of quarter hours with samples.';
+
+create or replace function rebuild_sample_quarter_hours(for_station_id integer)
+    returns integer
+    language plpgsql
+    volatile
+as
+$$
+declare
+    stn integer;
+    quarter_hour_count integer := 0;
+begin
+    for stn in select station_id from station
+               where for_station_id is null or station_id = for_station_id
+    loop
+        quarter_hour_count := quarter_hour_count +
+            update_sample_quarter_hours(stn, '-infinity', 'infinity');
+    end loop;
+
+    return quarter_hour_count;
+end;
+$$;
+comment on function rebuild_sample_quarter_hours is 'Rebuilds the sample_quarter_hour table from scratch for one station or all stations (if null). Returns the number of quarter hours summarised.';
+
+create or replace function summarise_climatology_days(for_station_id integer,
+                                                      start_date date,
+                                                      end_date date,
+                                                      for_heat_base double precision,
+                                                      for_cool_base double precision)
+    returns setof daily_climatology
+    language plpgsql
+    stable
+as
+$$
+begin
+    return query
+    with samples as (
+        select s.time_stamp,
+               s.time_stamp::date as date_stamp,
+               s.temperature,
+               s.rainfall,
+               s.average_wind_speed,
+               s.gust_wind_speed,
+               s.wind_direction,
+               st.sample_interval::numeric / 86400.0 as day_fraction
+        from sample s
+        inner join station st on st.station_id = s.station_id
+        where s.station_id = for_station_id
+          and s.time_stamp >= start_date
+          and s.time_stamp < end_date + 1
+    ), days as (
+        select date_stamp,
+               count(*)::integer                as sample_count,
+               max(temperature)                 as max_temperature,
+               min(temperature)                 as min_temperature,
+               avg(temperature)                 as avg_temperature,
+               sum(rainfall)                    as rainfall,
+               avg(average_wind_speed)          as avg_wind_speed,
+               max(gust_wind_speed)             as max_gust_wind_speed,
+               sum(case when temperature < for_heat_base
+                        then for_heat_base - temperature
+                        else 0 end * day_fraction) as heat_degree_days,
+               sum(case when temperature > for_cool_base
+                        then temperature - for_cool_base
+                        else 0 end * day_fraction) as cool_degree_days
+        from samples
+        group by date_stamp
+    ), times as (
+        select s.date_stamp,
+               max(case when s.temperature = d.max_temperature
+                        then s.time_stamp end)  as max_temperature_time,
+               max(case when s.temperature = d.min_temperature
+                        then s.time_stamp end)  as min_temperature_time,
+               max(case when s.gust_wind_speed = d.max_gust_wind_speed
+                        then s.time_stamp end)  as max_gust_wind_speed_time
+        from samples s
+        inner join days d on d.date_stamp = s.date_stamp
+        group by s.date_stamp
+    ), directions as (
+        select date_stamp,
+               array_agg(wind_direction order by wind_direction) as wind_directions,
+               array_agg(sample_count order by wind_direction)   as wind_direction_counts
+        from (select date_stamp, wind_direction, count(*)::integer as sample_count
+              from samples
+              where wind_direction is not null
+              group by date_stamp, wind_direction) as x
+        group by date_stamp
+    )
+    select for_station_id,
+           dates.date_stamp::date,
+           for_heat_base,
+           for_cool_base,
+           coalesce(d.sample_count, 0),
+           d.max_temperature,
+           t.max_temperature_time,
+           d.min_temperature,
+           t.min_temperature_time,
+           d.avg_temperature,
+           d.rainfall,
+           d.avg_wind_speed,
+           d.max_gust_wind_speed,
+           t.max_gust_wind_speed_time,
+           d.heat_degree_days,
+           d.cool_degree_days,
+           dir.wind_directions,
+           dir.wind_direction_counts,
+           now()
+    from generate_series(start_date, end_date, '1 day'::interval) as dates(date_stamp)
+    left outer join days d on d.date_stamp = dates.date_stamp::date
+    left outer join times t on t.date_stamp = dates.date_stamp::date
+    left outer join directions dir on dir.date_stamp = dates.date_stamp::date
+    order by dates.date_stamp;
+end;
+$$;
+comment on function summarise_climatology_days is 'Summarises the samples for a station into days in the same format as the daily_climatology table. Returns a row for every day in the range (inclusive) including those without samples.';
+
+create or replace function update_climatology_days(for_station_id integer,
+                                                   start_date date,
+                                                   end_date date,
+                                                   for_heat_base double precision,
+                                                   for_cool_base double precision)
+    returns integer
+    language plpgsql
+    volatile
+as
+$$
+declare
+    day_count integer;
+begin
+    delete from daily_climatology
+    where station_id = for_station_id
+      and date_stamp between start_date and end_date;
+
+    insert into daily_climatology
+    select * from summarise_climatology_days(for_station_id, start_date, end_date,
+                                             for_heat_base, for_cool_base);
+
+    get diagnostics day_count = row_count;
+
+    -- So changes to the samples in these days throw them away again
+    update sample_quarter_hour
+    set in_climatology = true
+    where station_id = for_station_id
+      and time_stamp >= start_date::timestamptz
+      and time_stamp < (end_date + 1)::timestamptz
+      and not in_climatology;
+
+    return day_count;
+end;
+$$;
+comment on function update_climatology_days is 'Calculates and stores the daily_climatology records for a station over a range of days (inclusive). Returns the number of days stored.';
+
+-- Days in daily_climatology are in the time zone of whoever filled in the
+-- record which may not be ours so the days either side are thrown away too.
+create or replace function discard_climatology_days(for_station_id integer,
+                                                    ts timestamptz)
+    returns void
+    language plpgsql
+    volatile
+as
+$$
+begin
+    delete from daily_climatology
+    where station_id = for_station_id
+      and date_stamp between (ts - '1 day'::interval)::date
+                         and (ts + '1 day'::interval)::date;
+
+    -- Nothing in our day is part of a record anymore
+    update sample_quarter_hour
+    set in_climatology = false
+    where station_id = for_station_id
+      and time_stamp >= ts::date::timestamptz
+      and time_stamp < (ts::date + 1)::timestamptz
+      and in_climatology;
+end;
+$$;
+comment on function discard_climatology_days is 'Throws away the daily_climatology records that may include a time so they are recalculated the next time a report needs them.';
+
 ----------------------------------------------------------------------
 -- TRIGGER FUNCTIONS -------------------------------------------------
 ----------------------------------------------------------------------
@@ -2237,6 +2652,161 @@ END;$BODY$
 LANGUAGE plpgsql VOLATILE;
 COMMENT ON FUNCTION live_data_update() IS 'Calculates values for all calculated fields.';
 
+-- Keeps the sample_quarter_hour table up to date as samples are inserted,
+-- updated (such as when rainfall is calculated for WH1080 samples) or deleted.
+-- New samples are added in to the quarter hour they're in without looking at
+-- any other samples so inserts (including bulk uploads with COPY) cost the same
+-- no matter how many samples are already there. Anything else recalculates the
+-- quarter hours involved. Changes to quarter hours that are part of a
+-- daily_climatology record throw the record away so the reports pick up late
+-- or corrected samples. New samples only need to do this when they start a
+-- quarter hour or land in one that is part of a record rather than every time.
+CREATE OR REPLACE FUNCTION sample_quarter_hour_update()
+  RETURNS trigger AS
+  $BODY$
+DECLARE
+    new_start timestamptz;
+    old_start timestamptz;
+    new_wind_run real;
+    new_pressure real;
+    was_in_climatology boolean;
+BEGIN
+    IF(TG_OP = 'INSERT') THEN
+        new_start := quarter_hour_start(NEW.time_stamp);
+        new_pressure := coalesce(NEW.mean_sea_level_pressure, NEW.absolute_pressure);
+
+        select NEW.average_wind_speed * st.sample_interval / 1000.0
+        into new_wind_run
+        from station st where st.station_id = NEW.station_id;
+
+        LOOP
+            update sample_quarter_hour q
+            set sample_count = q.sample_count + 1,
+                rainfall = coalesce(q.rainfall + NEW.rainfall, q.rainfall, NEW.rainfall),
+                wind_run = coalesce(q.wind_run + new_wind_run, q.wind_run, new_wind_run),
+                min_temperature = least(q.min_temperature, NEW.temperature),
+                max_temperature = greatest(q.max_temperature, NEW.temperature),
+                total_temperature = coalesce(q.total_temperature + NEW.temperature,
+                                             q.total_temperature, NEW.temperature),
+                temperature_samples = q.temperature_samples
+                                      + (NEW.temperature is not null)::integer,
+                min_relative_humidity = least(q.min_relative_humidity, NEW.relative_humidity),
+                max_relative_humidity = greatest(q.max_relative_humidity, NEW.relative_humidity),
+                total_relative_humidity = coalesce(q.total_relative_humidity + NEW.relative_humidity,
+                                                   q.total_relative_humidity, NEW.relative_humidity),
+                relative_humidity_samples = q.relative_humidity_samples
+                                            + (NEW.relative_humidity is not null)::integer,
+                min_pressure = least(q.min_pressure, new_pressure),
+                max_pressure = greatest(q.max_pressure, new_pressure),
+                total_pressure = coalesce(q.total_pressure + new_pressure,
+                                          q.total_pressure, new_pressure),
+                pressure_samples = q.pressure_samples
+                                   + (new_pressure is not null)::integer,
+                total_wind_speed = coalesce(q.total_wind_speed + NEW.average_wind_speed,
+                                            q.total_wind_speed, NEW.average_wind_speed),
+                wind_speed_samples = q.wind_speed_samples
+                                     + (NEW.average_wind_speed is not null)::integer,
+                max_gust_wind_speed = greatest(q.max_gust_wind_speed, NEW.gust_wind_speed)
+            where q.station_id = NEW.station_id
+              and q.time_stamp = new_start
+            returning q.in_climatology into was_in_climatology;
+
+            IF(found) THEN
+                IF(was_in_climatology) THEN
+                    perform discard_climatology_days(NEW.station_id, NEW.time_stamp);
+                END IF;
+                EXIT;
+            END IF;
+
+            BEGIN
+                insert into sample_quarter_hour
+                values (NEW.station_id, new_start, 1, NEW.rainfall, new_wind_run,
+                        NEW.temperature, NEW.temperature, NEW.temperature,
+                        (NEW.temperature is not null)::integer,
+                        NEW.relative_humidity, NEW.relative_humidity,
+                        NEW.relative_humidity,
+                        (NEW.relative_humidity is not null)::integer,
+                        new_pressure, new_pressure, new_pressure,
+                        (new_pressure is not null)::integer,
+                        NEW.average_wind_speed,
+                        (NEW.average_wind_speed is not null)::integer,
+                        NEW.gust_wind_speed, null, 0, false);
+
+                -- A quarter hour with no samples might still be part of a
+                -- record for a day that has others
+                perform discard_climatology_days(NEW.station_id, NEW.time_stamp);
+                EXIT;
+            EXCEPTION WHEN unique_violation THEN
+                -- Another session started the quarter hour first. Go around
+                -- again and add to theirs.
+            END;
+        END LOOP;
+
+        RETURN NULL;
+    END IF;
+
+    old_start := quarter_hour_start(OLD.time_stamp);
+    perform update_sample_quarter_hours(OLD.station_id, old_start,
+                                        old_start + '15 minutes'::interval);
+
+    IF(TG_OP = 'UPDATE') THEN
+        new_start := quarter_hour_start(NEW.time_stamp);
+        IF(NEW.station_id <> OLD.station_id OR new_start <> old_start) THEN
+            IF(NOT exists(select 1 from sample_quarter_hour
+                          where station_id = NEW.station_id
+                            and time_stamp = new_start)) THEN
+                perform discard_climatology_days(NEW.station_id, NEW.time_stamp);
+            END IF;
+            perform update_sample_quarter_hours(NEW.station_id, new_start,
+                                                new_start + '15 minutes'::interval);
+        END IF;
+    END IF;
+
+    RETURN NULL;
+END;
+$BODY$
+LANGUAGE plpgsql VOLATILE;
+COMMENT ON FUNCTION sample_quarter_hour_update() IS 'Adds new samples to their sample_quarter_hour record and recalculates the record for samples that are updated or deleted. Throws away any daily_climatology records the quarter hour is part of.';
+
+-- Davis samples are inserted after the sample record so the wind sample count
+-- isn't there when the sample is added to its quarter hour. New Davis samples
+-- are added to the quarter hour they're in; anything else recalculates it.
+CREATE OR REPLACE FUNCTION davis_sample_quarter_hour_update()
+  RETURNS trigger AS
+  $BODY$
+DECLARE
+    stn integer;
+    ts timestamptz;
+BEGIN
+    IF(TG_OP = 'INSERT') THEN
+        update sample_quarter_hour q
+        set wind_sample_count = coalesce(q.wind_sample_count + NEW.wind_sample_count,
+                                         q.wind_sample_count, NEW.wind_sample_count),
+            wind_sample_count_samples = q.wind_sample_count_samples
+                                        + (NEW.wind_sample_count is not null)::integer
+        from sample s
+        where s.sample_id = NEW.sample_id
+          and q.station_id = s.station_id
+          and q.time_stamp = quarter_hour_start(s.time_stamp);
+
+        RETURN NULL;
+    END IF;
+
+    -- Samples removed along with their davis_sample records are handled by the
+    -- sample table trigger
+    select station_id, quarter_hour_start(time_stamp) into stn, ts
+    from sample where sample_id = OLD.sample_id;
+
+    IF(found) THEN
+        perform update_sample_quarter_hours(stn, ts, ts + '15 minutes'::interval);
+    END IF;
+
+    RETURN NULL;
+END;
+$BODY$
+LANGUAGE plpgsql VOLATILE;
+COMMENT ON FUNCTION davis_sample_quarter_hour_update() IS 'Updates the sample_quarter_hour record for the quarter hour a davis sample is in.';
+
 
 ----------------------------------------------------------------------
 -- TRIGGERS ----------------------------------------------------------
@@ -2257,5 +2827,15 @@ ON live_data FOR EACH ROW
 EXECUTE PROCEDURE public.live_data_update();
 COMMENT ON TRIGGER live_data_update ON live_data IS 'Calculates calculated fields for updates, ignores everything else.';
 
+CREATE TRIGGER sample_quarter_hour_update AFTER INSERT OR UPDATE OR DELETE
+ON sample FOR EACH ROW
+EXECUTE PROCEDURE public.sample_quarter_hour_update();
+COMMENT ON TRIGGER sample_quarter_hour_update ON sample IS 'Keeps the sample_quarter_hour table up to date.';
+
+CREATE TRIGGER davis_sample_quarter_hour_update AFTER INSERT OR UPDATE OR DELETE
+ON davis_sample FOR EACH ROW
+EXECUTE PROCEDURE public.davis_sample_quarter_hour_update();
+COMMENT ON TRIGGER davis_sample_quarter_hour_update ON davis_sample IS 'Keeps the sample_quarter_hour table up to date.';
+
 
 COMMIT;
\ No newline at end of file
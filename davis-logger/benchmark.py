@@ -0,0 +1,294 @@
+# coding=utf-8
+"""
+Benchmarks the data logger against the virtual console in
+davis_logger.simulator. Everything runs in memory on a virtual clock so the
+results measure the loggers own overhead rather than the speed of the serial
+port. The time the same exchange would have taken over a real 19200 baud
+serial link is reported alongside for comparison.
+
+    python benchmark.py --records 2560
+    python benchmark.py --records 2560 --crc-error-rate 0.05 --drip-size 64
+    python benchmark.py --dsn "host=localhost dbname=weather" --station-id 1
+
+When a database is supplied the downloaded records are also inserted into it
+(inside a transaction which is rolled back afterwards) to measure database
+write throughput.
+"""
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+
+from twisted.internet.task import Clock
+
+from davis_logger.record_types import crc
+from davis_logger.record_types.dmp import deserialise_dmp, \
+    deserialise_dmp_records, serialise_dmp
+from davis_logger.record_types.loop import deserialise_loop
+from davis_logger.simulator import VirtualConsole, LoopbackConnection, \
+    STATION_TYPE_VANTAGE_VUE
+from davis_logger.station_procedures import DmpProcedure, LpsProcedure
+
+__author__ = 'david'
+
+# 19200 baud with 8 data bits, 1 start bit and 1 stop bit
+_SERIAL_BYTES_PER_SECOND = 19200 / 10.0
+
+try:
+    _cpu_time = time.process_time
+except AttributeError:
+    # Python 2.7
+    _cpu_time = time.clock
+
+
+class _Timer(object):
+    """
+    Measures wall and CPU time for a block
+    """
+    def __enter__(self):
+        self.wall = time.time()
+        self.cpu = _cpu_time()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.wall = time.time() - self.wall
+        self.cpu = _cpu_time() - self.cpu
+
+
+class _Counter(object):
+    """
+    Sits between a LoopbackConnection and a procedure counting the bytes
+    delivered.
+    """
+    def __init__(self, receiver):
+        self.receiver = receiver
+        self.bytes = 0
+
+    def __call__(self, data):
+        self.bytes += len(data)
+        self.receiver(data)
+
+
+def _console(args, clock):
+    return VirtualConsole(station_type=STATION_TYPE_VANTAGE_VUE,
+                          archive_records=args.records,
+                          archive_interval=args.archive_interval,
+                          crc_error_rate=args.crc_error_rate,
+                          drip_size=args.drip_size,
+                          drip_interval=args.drip_interval,
+                          loop_interval=0,
+                          seed=args.seed,
+                          clock=clock)
+
+
+def _run(connection, procedure):
+    """
+    Runs a procedure to completion against the virtual console.
+
+    :returns: Number of bytes received from the console and the number of
+        virtual seconds spent waiting on it.
+    :rtype: (int, float)
+    """
+    finished = []
+    procedure.finished += lambda: finished.append(True)
+    counter = _Counter(procedure.data_received)
+    connection.receiver = counter
+    procedure.start()
+    waited = connection.pump(lambda: len(finished) > 0)
+    if not finished:
+        raise Exception("Procedure {0} did not finish".format(procedure.Name))
+    return counter.bytes, waited
+
+
+def _report(name, timer, count, unit, serial_bytes=None, waited=0.0):
+    print("{0}:".format(name))
+    print("    {0} {1} in {2:.3f}s wall, {3:.3f}s CPU ({4:.0f} {1}/s CPU)"
+          .format(count, unit, timer.wall, timer.cpu,
+                  count / timer.cpu if timer.cpu > 0 else float('inf')))
+    if serial_bytes is not None:
+        print("    {0} bytes received - {1:.1f}s over a 19200 baud serial "
+              "link".format(serial_bytes,
+                            serial_bytes / _SERIAL_BYTES_PER_SECOND + waited))
+
+
+def benchmark_dmp(args):
+    """
+    Downloads the entire archive with DMPAFT.
+
+    :returns: Downloaded records
+    :rtype: list of davis_logger.record_types.dmp.Dmp
+    """
+    clock = Clock()
+    connection = LoopbackConnection(_console(args, clock), clock)
+    procedure = DmpProcedure(connection.write, None,
+                             datetime.datetime(2000, 1, 1), 0.2)
+
+    with _Timer() as timer:
+        received, waited = _run(connection, procedure)
+
+    _report("DMPAFT download", timer, len(procedure.ArchiveRecords),
+            "records", received, waited)
+    return procedure.ArchiveRecords
+
+
+def benchmark_decode(args, records):
+    """
+    Compares decoding DMP records one at a time with decoding them in bulk
+    and measures LOOP packet decoding.
+
+    :param records: Records to encode and then decode again
+    :type records: list of davis_logger.record_types.dmp.Dmp
+    """
+    encoded = [serialise_dmp(r) for r in records]
+    joined = b''.join(encoded)
+    count = len(encoded) * args.repeat
+
+    with _Timer() as timer:
+        for _ in range(args.repeat):
+            for record in encoded:
+                deserialise_dmp(record)
+    _report("deserialise_dmp", timer, count, "records")
+
+    with _Timer() as timer:
+        for _ in range(args.repeat):
+            deserialise_dmp_records(joined)
+    _report("deserialise_dmp_records", timer, count, "records")
+
+    clock = Clock()
+    connection = LoopbackConnection(_console(args, clock), clock)
+    received = []
+    connection.receiver = received.append
+    connection.write(b'LOOP 1\n')
+    connection.pump()
+    loop = b''.join(received)[1:-2]  # Strip the ACK and CRC
+
+    with _Timer() as timer:
+        for _ in range(count):
+            deserialise_loop(loop)
+    _report("deserialise_loop", timer, count, "packets")
+
+
+def benchmark_crc(args):
+    """
+    Compares the CRC implementation against the table based one from the
+    Davis documentation for LOOP packet and DMP page sized data.
+    """
+    rng = random.Random(args.seed)
+    for name, size in (("LOOP packet", 97), ("DMP page", 265)):
+        packets = [bytearray(rng.randint(0, 255) for _ in range(size))
+                   for _ in range(1000)]
+        count = len(packets) * args.repeat
+
+        for packet in packets:
+            if crc.calculate_crc(packet) != crc.table_crc(packet):
+                raise Exception("CRC mismatch for {0}".format(packet))
+
+        with _Timer() as timer:
+            for _ in range(args.repeat):
+                for packet in packets:
+                    crc.table_crc(packet)
+        _report("Table CRC ({0})".format(name), timer, count, "packets")
+
+        with _Timer() as timer:
+            for _ in range(args.repeat):
+                for packet in packets:
+                    crc.calculate_crc(memoryview(packet))
+        _report("CRC ({0})".format(name), timer, count, "packets")
+
+
+def benchmark_lps(args):
+    """
+    Receives LOOP and LOOP2 packets with the LPS command.
+    """
+    clock = Clock()
+    connection = LoopbackConnection(_console(args, clock), clock)
+
+    received = []
+    total_bytes = 0
+    total_waited = 0.0
+    with _Timer() as timer:
+        for _ in range(args.loop_requests):
+            procedure = LpsProcedure(connection.write, None, True, 0.2, 200,
+                                     clock.callLater)
+            procedure.loopDataReceived += received.append
+            procedure.loop2DataReceived += received.append
+            byte_count, waited = _run(connection, procedure)
+            total_bytes += byte_count
+            total_waited += waited
+
+    _report("LPS", timer, len(received), "packets", total_bytes,
+            total_waited)
+
+
+def benchmark_database(args, records):
+    """
+    Inserts records into the database using the loggers own insert code. The
+    transaction is rolled back afterwards.
+
+    :param records: Records to insert
+    :type records: list of davis_logger.record_types.dmp.Dmp
+    """
+    import psycopg2
+    from davis_logger.logger import DavisLoggerProtocol
+
+    fd, error_file = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+
+    logger = DavisLoggerProtocol(None, args.station_id, None, None,
+                                 error_file, False, None, None, None, None,
+                                 args.archive_interval, None)
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        cur = conn.cursor()
+        with _Timer() as timer:
+            logger._store_samples_int(cur, records)
+        conn.rollback()
+    finally:
+        conn.close()
+        os.remove(error_file)
+
+    _report("Database insert", timer, len(records), "records")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the data logger against a virtual console")
+    parser.add_argument("--records", type=int, default=2560,
+                        help="Records in the consoles archive")
+    parser.add_argument("--archive-interval", type=int, default=5,
+                        help="Archive interval in minutes")
+    parser.add_argument("--crc-error-rate", type=float, default=0.0,
+                        help="Fraction of responses to corrupt")
+    parser.add_argument("--drip-size", type=int, default=None,
+                        help="Send data in chunks of this many bytes")
+    parser.add_argument("--drip-interval", type=float, default=0.01,
+                        help="Seconds between chunks when drip feeding")
+    parser.add_argument("--loop-requests", type=int, default=10,
+                        help="Number of 200 packet LPS requests to make")
+    parser.add_argument("--repeat", type=int, default=10,
+                        help="How many times to repeat the decode benchmarks")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Random seed for fault injection")
+    parser.add_argument("--dsn", default=None,
+                        help="Database to benchmark inserts against")
+    parser.add_argument("--station-id", type=int, default=None,
+                        help="Station to insert records for (with --dsn)")
+    args = parser.parse_args()
+
+    if args.dsn is not None and args.station_id is None:
+        parser.error("--station-id is required with --dsn")
+
+    records = benchmark_dmp(args)
+    benchmark_decode(args, records)
+    benchmark_crc(args)
+    benchmark_lps(args)
+
+    if args.dsn is not None:
+        benchmark_database(args, records)
+
+
+if __name__ == "__main__":
+    main()
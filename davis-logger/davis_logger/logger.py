@@ -8,6 +8,7 @@ import json
 import os
 
 import psycopg2
+import psycopg2.tz
 from twisted.application import service
 from twisted.enterprise import adbapi
 from twisted.internet import reactor, protocol, defer
@@ -20,6 +21,7 @@ from twisted.python import log
 from davis_logger.davis import DavisWeatherStation
 from davis_logger.dst_switcher import DstInfo, DstSwitcher, NullDstSwitcher
 from davis_logger.record_types.dmp import decode_date, decode_time
+from davis_logger.sample_writer import SampleWriter
 
 __author__ = 'david'
 
@@ -28,6 +30,35 @@ __author__ = 'david'
 # noinspection PyClassicStyleClass
 from davis_logger.record_types.loop import Loop, Loop2, LiveData
 
+_sample_writer = SampleWriter(
+    [
+        ("download_timestamp", "%s::timestamptz"),
+        ("time_stamp", "%s::timestamptz"),
+        ("indoor_relative_humidity", "%s::integer"),
+        ("indoor_temperature", "%s::real"),
+        ("relative_humidity", "%s::integer"),
+        ("temperature", "%s::real"),
+        ("absolute_pressure", "%s::real"),
+        ("mean_sea_level_pressure", "%s::real"),
+        ("average_wind_speed", "%s::real"),
+        ("gust_wind_speed", "%s::real"),
+        ("wind_direction", "%s::integer"),
+        ("rainfall", "%s::real"),
+        ("station_id", "%s::integer"),
+    ],
+    [
+        "record_time", "record_date", "high_temperature", "low_temperature",
+        "high_rain_rate", "solar_radiation", "wind_sample_count",
+        "gust_wind_direction", "average_uv_index", "evapotranspiration",
+        "high_solar_radiation", "high_uv_index", "forecast_rule_id",
+        "leaf_wetness_1", "leaf_wetness_2", "leaf_temperature_1",
+        "leaf_temperature_2", "soil_moisture_1", "soil_moisture_2",
+        "soil_moisture_3", "soil_moisture_4", "soil_temperature_1",
+        "soil_temperature_2", "soil_temperature_3", "soil_temperature_4",
+        "extra_humidity_1", "extra_humidity_2", "extra_temperature_1",
+        "extra_temperature_2", "extra_temperature_3"
+    ])
+
 
 class DavisLoggerProtocol(Protocol):
     """
@@ -36,14 +67,14 @@ class DavisLoggerProtocol(Protocol):
 
     def __init__(self, database_pool, station_id, latest_date, latest_time,
                  sample_error_file, auto_dst, time_zone, latest_ts,
-                 database_live_data_enabled, mq_publisher, archive_interval,
+                 live_writer, mq_publisher, archive_interval,
                  station_config_json):
         self.station = DavisWeatherStation()
 
         self._auto_dst = auto_dst
         self._time_zone = time_zone
         self._latest_ts = latest_ts
-        self._database_live_data_enabled = database_live_data_enabled
+        self._live_writer = live_writer
         self._mq_publisher = mq_publisher
         self._db_archive_interval = archive_interval
         self._station_config_json = station_config_json
@@ -398,114 +429,91 @@ class DavisLoggerProtocol(Protocol):
         :type samples: list of davis_logger.record_types.dmp.Dmp
         """
 
-        base_query = """
-            insert into sample(download_timestamp, time_stamp,
-                indoor_relative_humidity, indoor_temperature, relative_humidity,
-                temperature, absolute_pressure, mean_sea_level_pressure,
-                average_wind_speed, gust_wind_speed, wind_direction, rainfall, 
-                station_id)
-            values(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            returning sample_id
-                """
+        download_timestamp = datetime.now()
+        rows = []
+        for sample in samples:
 
-        davis_query = """
-                insert into davis_sample(
-                    sample_id, record_time, record_date, high_temperature,
-                    low_temperature, high_rain_rate, solar_radiation,
-                    wind_sample_count, gust_wind_direction, average_uv_index,
-                    evapotranspiration, high_solar_radiation, high_uv_index,
-                    forecast_rule_id, leaf_wetness_1, leaf_wetness_2, 
-                    leaf_temperature_1, leaf_temperature_2, soil_moisture_1, 
-                    soil_moisture_2, soil_moisture_3, soil_moisture_4, 
-                    soil_temperature_1, soil_temperature_2, soil_temperature_3, 
-                    soil_temperature_4, extra_humidity_1, extra_humidity_2, 
-                    extra_temperature_1, extra_temperature_2, 
-                    extra_temperature_3)
-                values(%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,
-                       %s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                """
+            t = sample.timeStamp
 
-        try:
-            for sample in samples:
+            if sample.timeZone is not None:
+                # timeZone is only present on samples adjusted by the
+                # DST Switcher.
+                t = time(t.hour, t.minute, t.second, t.microsecond,
+                         psycopg2.tz.FixedOffsetTimezone(
+                             offset=sample.timeZone))
+
+            ts = datetime.combine(sample.dateStamp, t)
+
+            rows.append((
+                (
+                    download_timestamp,
+                    ts,
+                    sample.insideHumidity,
+                    sample.insideTemperature,
+                    sample.outsideHumidity,
+                    sample.outsideTemperature,
+                    # TODO: Remove the absolute pressure column from
+                    #       the query once everything has been
+                    #       updated.
+                    sample.barometer,
+                    sample.barometer,
+                    sample.averageWindSpeed,
+                    sample.highWindSpeed,
+                    sample.prevailingWindDirection,
+                    sample.rainfall,
+                    self._station_id
+                ),
+                (
+                    sample.timeInteger,
+                    sample.dateInteger,
+                    sample.highOutsideTemperature,
+                    sample.lowOutsideTemperature,
+                    sample.highRainRate,
+                    sample.solarRadiation,
+                    sample.numberOfWindSamples,
+                    sample.highWindSpeedDirection,
+                    sample.averageUVIndex,
+                    sample.ET,
+                    sample.highSolarRadiation,
+                    sample.highUVIndex,
+                    sample.forecastRule,
+                    sample.leafWetness[0],
+                    sample.leafWetness[1],
+                    sample.leafTemperature[0],
+                    sample.leafTemperature[1],
+                    sample.soilMoistures[0],
+                    sample.soilMoistures[1],
+                    sample.soilMoistures[2],
+                    sample.soilMoistures[3],
+                    sample.soilTemperatures[0],
+                    sample.soilTemperatures[1],
+                    sample.soilTemperatures[2],
+                    sample.soilTemperatures[3],
+                    sample.extraHumidities[0],
+                    sample.extraHumidities[1],
+                    sample.extraTemperatures[0],
+                    sample.extraTemperatures[1],
+                    sample.extraTemperatures[2],
+                )
+            ))
+
+        failed = _sample_writer.insert_samples(txn, rows)
+
+        if len(failed) == 0:
+            return
 
-                t = sample.timeStamp
-
-                if sample.timeZone is not None:
-                    # timeZone is only present on samples adjusted by the
-                    # DST Switcher.
-                    t = time(t.hour, t.minute, t.second, t.microsecond,
-                             psycopg2.tz.FixedOffsetTimezone(
-                                 offset=sample.timeZone))
-
-                ts = datetime.combine(sample.dateStamp, t)
-
-                txn.execute(base_query,
-                            (
-                                datetime.now(),  # Download timestamp
-                                ts,
-                                sample.insideHumidity,
-                                sample.insideTemperature,
-                                sample.outsideHumidity,
-                                sample.outsideTemperature,
-                                # TODO: Remove the absolute pressure column from
-                                #       the query once everything has been
-                                #       updated.
-                                sample.barometer,
-                                sample.barometer,
-                                sample.averageWindSpeed,
-                                sample.highWindSpeed,
-                                sample.prevailingWindDirection,
-                                sample.rainfall,
-                                self._station_id
-                            ))
-
-                sample_id = txn.fetchone()[0]
-
-                txn.execute(davis_query,
-                            (
-                                sample_id,
-                                sample.timeInteger,
-                                sample.dateInteger,
-                                sample.highOutsideTemperature,
-                                sample.lowOutsideTemperature,
-                                sample.highRainRate,
-                                sample.solarRadiation,
-                                sample.numberOfWindSamples,
-                                sample.highWindSpeedDirection,
-                                sample.averageUVIndex,
-                                sample.ET,
-                                sample.highSolarRadiation,
-                                sample.highUVIndex,
-                                sample.forecastRule,
-                                sample.leafWetness[0],
-                                sample.leafWetness[1],
-                                sample.leafTemperature[0],
-                                sample.leafTemperature[1],
-                                sample.soilMoistures[0],
-                                sample.soilMoistures[1],
-                                sample.soilMoistures[2],
-                                sample.soilMoistures[3],
-                                sample.soilTemperatures[0],
-                                sample.soilTemperatures[1],
-                                sample.soilTemperatures[2],
-                                sample.soilTemperatures[3],
-                                sample.extraHumidities[0],
-                                sample.extraHumidities[1],
-                                sample.extraTemperatures[0],
-                                sample.extraTemperatures[1],
-                                sample.extraTemperatures[2],
-                            ))
-        except psycopg2.Error as e:
-            log.msg("""Database exception trying to insert samples:-
-{0}
+        for i, e in failed:
+            log.msg("""Database exception trying to insert sample {0} {1}:-
+{2}
 If error is violation of station_timestamp_unique constraint this may be caused
-by a change in time zone due to daylight savings.""".format(e.pgerror))
-            self._error_state = True
+by a change in time zone due to daylight savings.""".format(
+                samples[i].dateStamp, samples[i].timeStamp, e.pgerror))
+        self._error_state = True
 
-            log.msg("Logger is now in error state. All data will be redirected "
-                    "to error_samples.csv")
+        log.msg("Logger is now in error state. All data will be redirected "
+                "to error_samples.csv")
 
-            self._write_samples_to_error_log(samples)
+        self._write_samples_to_error_log([samples[i] for i, _ in failed])
 
     def _publish_live(self, loop):
 
@@ -520,134 +528,8 @@ by a change in time zone due to daylight savings.""".format(e.pgerror))
         if self._mq_publisher is not None:
             self._mq_publisher.publish_live(self._live_data)
 
-        if self._database_live_data_enabled:
-            self._store_live()
-
-    def _store_live(self):
-        """
-        Updates the database live data tables with the latest weather data.
-        """
-
-        query = """update live_data
-                set download_timestamp = %s,
-                    indoor_relative_humidity = %s,
-                    indoor_temperature = %s,
-                    relative_humidity = %s,
-                    temperature = %s,
-                    mean_sea_level_pressure = %s,
-                    absolute_pressure = %s,
-                    average_wind_speed = %s,
-                    gust_wind_speed = %s,
-                    wind_direction = %s
-                where station_id = %s
-                """
-
-        self._database_pool.runOperation(
-            query,
-            (
-                datetime.now(),  # Download TS
-                self._live_data.insideHumidity,
-                self._live_data.insideTemperature,
-                self._live_data.outsideHumidity,
-                self._live_data.outsideTemperature,
-                self._live_data.barometer,
-                self._live_data.absoluteBarometricPressure,  # Loop2 only
-                self._live_data.windSpeed,
-                None,  # Gust wind speed isn't supported for live data
-                self._live_data.windDirection,
-                self._station_id
-            )
-        )
-
-        query = """
-                update davis_live_data
-                set bar_trend = %s,
-                    rain_rate = %s,
-                    storm_rain = %s,
-                    current_storm_start_date = %s,
-                    transmitter_battery = %s,
-                    console_battery_voltage = %s,
-                    forecast_icon = %s,
-                    forecast_rule_id = %s,
-                    uv_index = %s,
-                    solar_radiation = %s,
-                    average_wind_speed_10m = %s,
-                    
-                    -- Loop1 only values
-                    leaf_wetness_1 = %s, 
-                    leaf_wetness_2 = %s, 
-                    leaf_temperature_1 = %s, 
-                    leaf_temperature_2 = %s, 
-                    soil_moisture_1 = %s, 
-                    soil_moisture_2 = %s, 
-                    soil_moisture_3 = %s, 
-                    soil_moisture_4 = %s, 
-                    soil_temperature_1 = %s, 
-                    soil_temperature_2 = %s, 
-                    soil_temperature_3 = %s, 
-                    soil_temperature_4 = %s, 
-                    extra_humidity_1 = %s, 
-                    extra_humidity_2 = %s, 
-                    extra_temperature_1 = %s, 
-                    extra_temperature_2 = %s, 
-                    extra_temperature_3 = %s,
-                    
-                    -- Loop2 only values
-                    average_wind_speed_2m = %s,
-                    gust_wind_speed_10m = %s,
-                    gust_wind_direction_10m = %s,
-                    heat_index = %s,
-                    thsw_index = %s,
-                    altimeter_setting = %s
-                where station_id = %s
-                """
-
-        self._database_pool.runOperation(
-            query,
-            (
-                self._live_data.barTrend,
-                self._live_data.rainRate,
-                self._live_data.stormRain,
-                self._live_data.startDateOfCurrentStorm,
-                self._live_data.transmitterBatteryStatus,    # Loop1 only
-                self._live_data.consoleBatteryVoltage,    # Loop1 only
-                self._live_data.forecastIcons,    # Loop1 only
-                self._live_data.forecastRuleNumber,  # Loop1 only
-                self._live_data.UV,
-                self._live_data.solarRadiation,
-                self._live_data.averageWindSpeed10min,
-
-                # Loop1
-                self._live_data.leafWetness[0],
-                self._live_data.leafWetness[1],
-                self._live_data.leafTemperatures[0],
-                self._live_data.leafTemperatures[1],
-                self._live_data.soilMoistures[0],
-                self._live_data.soilMoistures[1],
-                self._live_data.soilMoistures[2],
-                self._live_data.soilMoistures[3],
-                self._live_data.soilTemperatures[0],
-                self._live_data.soilTemperatures[1],
-                self._live_data.soilTemperatures[2],
-                self._live_data.soilTemperatures[3],
-                self._live_data.extraHumidities[0],
-                self._live_data.extraHumidities[1],
-                self._live_data.extraTemperatures[0],
-                self._live_data.extraTemperatures[1],
-                self._live_data.extraTemperatures[2],
-
-                # Loop2
-                self._live_data.averageWindSpeed2min,
-                self._live_data.windGust10m,
-                self._live_data.windGust10mDirection,
-                self._live_data.heatIndex,
-                self._live_data.thswIndex,
-                self._live_data.altimeterSetting,
-
-                # Station ID
-                self._station_id
-            )
-        )
+        if self._live_writer is not None:
+            self._live_writer.write(self._live_data)
 
     def _reschedule_watchdog(self, interval=60):
         reactor.callLater(interval, self._watchdog)
@@ -674,6 +556,257 @@ by a change in time zone due to daylight savings.""".format(e.pgerror))
         self._reschedule_watchdog()
 
 
+class DatabaseLiveWriter(object):
+    """
+    Handles writing live data to the database live data tables.
+
+    Both live data tables are updated in a single transaction so the
+    live_data_updated notification only goes out once both are current. Writes
+    are skipped when nothing that is stored in the database has changed since
+    the last write (apart from a periodic refresh of the download timestamp so
+    clients don't consider the data stale) and are limited to at most one every
+    min_interval seconds. This is independent of how often live data is
+    published to the message broker.
+    """
+
+    # Write unchanged live data at least this often (in seconds) so the
+    # download timestamp stays current.
+    MAX_AGE = 30
+
+    # LiveData fields written to the database
+    _FIELDS = (
+        'insideHumidity', 'insideTemperature', 'outsideHumidity',
+        'outsideTemperature', 'barometer', 'absoluteBarometricPressure',
+        'windSpeed', 'windDirection', 'barTrend', 'rainRate', 'stormRain',
+        'startDateOfCurrentStorm', 'transmitterBatteryStatus',
+        'consoleBatteryVoltage', 'forecastIcons', 'forecastRuleNumber', 'UV',
+        'solarRadiation', 'averageWindSpeed10min', 'leafWetness',
+        'leafTemperatures', 'soilMoistures', 'soilTemperatures',
+        'extraHumidities', 'extraTemperatures', 'averageWindSpeed2min',
+        'windGust10m', 'windGust10mDirection', 'heatIndex', 'thswIndex',
+        'altimeterSetting',
+    )
+
+    _live_query = """
+            update live_data
+            set download_timestamp = %s,
+                indoor_relative_humidity = %s,
+                indoor_temperature = %s,
+                relative_humidity = %s,
+                temperature = %s,
+                mean_sea_level_pressure = %s,
+                absolute_pressure = %s,
+                average_wind_speed = %s,
+                gust_wind_speed = %s,
+                wind_direction = %s
+            where station_id = %s
+            """
+
+    _davis_live_query = """
+            update davis_live_data
+            set bar_trend = %s,
+                rain_rate = %s,
+                storm_rain = %s,
+                current_storm_start_date = %s,
+                transmitter_battery = %s,
+                console_battery_voltage = %s,
+                forecast_icon = %s,
+                forecast_rule_id = %s,
+                uv_index = %s,
+                solar_radiation = %s,
+                average_wind_speed_10m = %s,
+
+                -- Loop1 only values
+                leaf_wetness_1 = %s,
+                leaf_wetness_2 = %s,
+                leaf_temperature_1 = %s,
+                leaf_temperature_2 = %s,
+                soil_moisture_1 = %s,
+                soil_moisture_2 = %s,
+                soil_moisture_3 = %s,
+                soil_moisture_4 = %s,
+                soil_temperature_1 = %s,
+                soil_temperature_2 = %s,
+                soil_temperature_3 = %s,
+                soil_temperature_4 = %s,
+                extra_humidity_1 = %s,
+                extra_humidity_2 = %s,
+                extra_temperature_1 = %s,
+                extra_temperature_2 = %s,
+                extra_temperature_3 = %s,
+
+                -- Loop2 only values
+                average_wind_speed_2m = %s,
+                gust_wind_speed_10m = %s,
+                gust_wind_direction_10m = %s,
+                heat_index = %s,
+                thsw_index = %s,
+                altimeter_setting = %s
+            where station_id = %s
+            """
+
+    def __init__(self, database_pool, station_id, min_interval=0,
+                 clock=reactor):
+        """
+        :param database_pool: Database connection pool
+        :type database_pool: adbapi.ConnectionPool
+        :param station_id: ID of the station to write live data for
+        :type station_id: int
+        :param min_interval: Minimum number of seconds between database writes
+        :type min_interval: float
+        :param clock: Provider of IReactorTime (for testing)
+        """
+        self._database_pool = database_pool
+        self._station_id = station_id
+        self._min_interval = min_interval
+        self._clock = clock
+
+        self._live_data = None
+        self._last_version = None
+        self._last_write = None
+        self._write_in_progress = False
+        self._pending_call = None
+
+    @staticmethod
+    def _get_values(live_data):
+        """
+        Gets the values written to the database for the supplied live data
+        (excluding the download timestamp and station ID).
+
+        :param live_data: Live data to get values for
+        :type live_data: LiveData
+        :returns: Tuple of values for live_data and tuple of values for
+                  davis_live_data
+        :rtype: (tuple, tuple)
+        """
+        live = (
+            live_data.insideHumidity,
+            live_data.insideTemperature,
+            live_data.outsideHumidity,
+            live_data.outsideTemperature,
+            live_data.barometer,
+            live_data.absoluteBarometricPressure,  # Loop2 only
+            live_data.windSpeed,
+            None,  # Gust wind speed isn't supported for live data
+            live_data.windDirection,
+        )
+
+        davis = (
+            live_data.barTrend,
+            live_data.rainRate,
+            live_data.stormRain,
+            live_data.startDateOfCurrentStorm,
+            live_data.transmitterBatteryStatus,  # Loop1 only
+            live_data.consoleBatteryVoltage,  # Loop1 only
+            live_data.forecastIcons,  # Loop1 only
+            live_data.forecastRuleNumber,  # Loop1 only
+            live_data.UV,
+            live_data.solarRadiation,
+            live_data.averageWindSpeed10min,
+
+            # Loop1
+            live_data.leafWetness[0],
+            live_data.leafWetness[1],
+            live_data.leafTemperatures[0],
+            live_data.leafTemperatures[1],
+            live_data.soilMoistures[0],
+            live_data.soilMoistures[1],
+            live_data.soilMoistures[2],
+            live_data.soilMoistures[3],
+            live_data.soilTemperatures[0],
+            live_data.soilTemperatures[1],
+            live_data.soilTemperatures[2],
+            live_data.soilTemperatures[3],
+            live_data.extraHumidities[0],
+            live_data.extraHumidities[1],
+            live_data.extraTemperatures[0],
+            live_data.extraTemperatures[1],
+            live_data.extraTemperatures[2],
+
+            # Loop2
+            live_data.averageWindSpeed2min,
+            live_data.windGust10m,
+            live_data.windGust10mDirection,
+            live_data.heatIndex,
+            live_data.thswIndex,
+            live_data.altimeterSetting,
+        )
+
+        return live, davis
+
+    def write(self, live_data):
+        """
+        Writes the supplied live data to the database if it has changed and
+        the minimum interval since the last write has passed. If it hasn't
+        passed yet the write is deferred until it has.
+
+        :param live_data: Object providing a combined view of the latest Loop
+                          and Loop2 packets
+        :type live_data: LiveData
+        """
+        self._live_data = live_data
+
+        if self._write_in_progress or self._pending_call is not None:
+            # Whatever is latest will be written once the current write has
+            # finished or the pending one fires.
+            return
+
+        self._schedule()
+
+    def _schedule(self):
+        now = self._clock.seconds()
+
+        if self._last_write is not None:
+            age = now - self._last_write
+
+            if age < self.MAX_AGE and not self._live_data.changed_since(
+                    self._last_version, self._FIELDS):
+                return  # Nothing has changed.
+
+            if age < self._min_interval:
+                self._pending_call = self._clock.callLater(
+                    self._min_interval - age, self._pending_write)
+                return
+
+        self._write()
+
+    def _pending_write(self):
+        self._pending_call = None
+        self._schedule()
+
+    def _write(self):
+        live, davis = self._get_values(self._live_data)
+
+        self._last_version = self._live_data.version
+        self._last_write = self._clock.seconds()
+        self._write_in_progress = True
+
+        d = self._database_pool.runInteraction(
+            self._write_int,
+            (datetime.now(),) + live + (self._station_id,),
+            davis + (self._station_id,))
+        d.addErrback(self._write_failed)
+        d.addBoth(self._write_finished)
+
+    def _write_int(self, txn, live_parameters, davis_parameters):
+        txn.execute(self._live_query, live_parameters)
+        txn.execute(self._davis_live_query, davis_parameters)
+
+    def _write_failed(self, failure):
+        log.msg("Failed to write live data to the database: {0}".format(
+            failure.getErrorMessage()))
+
+        # Make sure the next update is written.
+        self._last_version = None
+
+    def _write_finished(self, _):
+        self._write_in_progress = False
+
+        # Catch up on anything that arrived while the write was running
+        if self._live_data is not None and self._pending_call is None:
+            self._schedule()
+
+
 class MQPublisher(object):
     """
     Handles publishing data to a message broker.
@@ -714,7 +847,7 @@ class DavisService(service.Service):
     """
     def __init__(self, database, station, port, baud, sample_error_file,
                  auto_dst, time_zone, mq_host, mq_port, mq_exchange,
-                 mq_username, mq_password, mq_vhost):
+                 mq_username, mq_password, mq_vhost, live_data_interval=0):
         self.dbc = database
         self.station_code = station
         self.serial_port = port
@@ -735,6 +868,8 @@ class DavisService(service.Service):
         self._mq_vhost = mq_vhost
         self._mq_publisher = None
 
+        self._live_data_interval = live_data_interval
+
         if not os.path.exists(self.sample_error_file):
             # File doesn't exist. Try to create it.
             log.msg("Sample error file does not exist. Attempting to create...")
@@ -825,10 +960,17 @@ class DavisService(service.Service):
 
     def _start_logging(self):
         log.msg("Starting data logger...")
+
+        live_writer = None
+        if self._live_available:
+            live_writer = DatabaseLiveWriter(self.database_pool,
+                                             self._station_id,
+                                             self._live_data_interval)
+
         logger = DavisLoggerProtocol(
             self.database_pool, self._station_id, self._latest_date,
             self._latest_time, self.sample_error_file, self.auto_dst,
-            self.time_zone, self._latest_ts, self._live_available,
+            self.time_zone, self._latest_ts, live_writer,
             self._mq_publisher, self._sample_interval,
             self._station_config_json)
 
@@ -0,0 +1,168 @@
+# coding=utf-8
+"""
+CRC-CCITT (XMODEM) as used by the Davis Vantage consoles for all binary data.
+
+The actual work is done by binascii.crc_hqx which implements the same
+polynomial in C. All functions accept anything supporting the buffer protocol
+(bytes, bytearray, memoryview) so CRCs can be checked on slices of a receive
+buffer without copying them first.
+
+A useful property of this CRC is that running it over a packet *including*
+its trailing big-endian CRC gives zero when the packet is intact. is_valid
+uses this to check packets in one call.
+"""
+from binascii import crc_hqx
+import struct
+
+__author__ = 'david'
+
+FORMAT = '>H'
+
+# From section XII, Davis part 07395.801 rev 2.5 (30-JUL-2012)
+# "Vantage Pro, Vantage Pro2 and Vantage Vue Serial Communication Reference
+#  Manual". Only used by table_crc.
+crc_table = [
+    0x0000, 0x1021, 0x2042, 0x3063, 0x4084, 0x50a5, 0x60c6, 0x70e7,
+    0x8108, 0x9129, 0xa14a, 0xb16b, 0xc18c, 0xd1ad, 0xe1ce, 0xf1ef,
+    0x1231, 0x0210, 0x3273, 0x2252, 0x52b5, 0x4294, 0x72f7, 0x62d6,
+    0x9339, 0x8318, 0xb37b, 0xa35a, 0xd3bd, 0xc39c, 0xf3ff, 0xe3de,
+    0x2462, 0x3443, 0x0420, 0x1401, 0x64e6, 0x74c7, 0x44a4, 0x5485,
+    0xa56a, 0xb54b, 0x8528, 0x9509, 0xe5ee, 0xf5cf, 0xc5ac, 0xd58d,
+    0x3653, 0x2672, 0x1611, 0x0630, 0x76d7, 0x66f6, 0x5695, 0x46b4,
+    0xb75b, 0xa77a, 0x9719, 0x8738, 0xf7df, 0xe7fe, 0xd79d, 0xc7bc,
+    0x48c4, 0x58e5, 0x6886, 0x78a7, 0x0840, 0x1861, 0x2802, 0x3823,
+    0xc9cc, 0xd9ed, 0xe98e, 0xf9af, 0x8948, 0x9969, 0xa90a, 0xb92b,
+    0x5af5, 0x4ad4, 0x7ab7, 0x6a96, 0x1a71, 0x0a50, 0x3a33, 0x2a12,
+    0xdbfd, 0xcbdc, 0xfbbf, 0xeb9e, 0x9b79, 0x8b58, 0xbb3b, 0xab1a,
+    0x6ca6, 0x7c87, 0x4ce4, 0x5cc5, 0x2c22, 0x3c03, 0x0c60, 0x1c41,
+    0xedae, 0xfd8f, 0xcdec, 0xddcd, 0xad2a, 0xbd0b, 0x8d68, 0x9d49,
+    0x7e97, 0x6eb6, 0x5ed5, 0x4ef4, 0x3e13, 0x2e32, 0x1e51, 0x0e70,
+    0xff9f, 0xefbe, 0xdfdd, 0xcffc, 0xbf1b, 0xaf3a, 0x9f59, 0x8f78,
+    0x9188, 0x81a9, 0xb1ca, 0xa1eb, 0xd10c, 0xc12d, 0xf14e, 0xe16f,
+    0x1080, 0x00a1, 0x30c2, 0x20e3, 0x5004, 0x4025, 0x7046, 0x6067,
+    0x83b9, 0x9398, 0xa3fb, 0xb3da, 0xc33d, 0xd31c, 0xe37f, 0xf35e,
+    0x02b1, 0x1290, 0x22f3, 0x32d2, 0x4235, 0x5214, 0x6277, 0x7256,
+    0xb5ea, 0xa5cb, 0x95a8, 0x8589, 0xf56e, 0xe54f, 0xd52c, 0xc50d,
+    0x34e2, 0x24c3, 0x14a0, 0x0481, 0x7466, 0x6447, 0x5424, 0x4405,
+    0xa7db, 0xb7fa, 0x8799, 0x97b8, 0xe75f, 0xf77e, 0xc71d, 0xd73c,
+    0x26d3, 0x36f2, 0x0691, 0x16b0, 0x6657, 0x7676, 0x4615, 0x5634,
+    0xd94c, 0xc96d, 0xf90e, 0xe92f, 0x99c8, 0x89e9, 0xb98a, 0xa9ab,
+    0x5844, 0x4865, 0x7806, 0x6827, 0x18c0, 0x08e1, 0x3882, 0x28a3,
+    0xcb7d, 0xdb5c, 0xeb3f, 0xfb1e, 0x8bf9, 0x9bd8, 0xabbb, 0xbb9a,
+    0x4a75, 0x5a54, 0x6a37, 0x7a16, 0x0af1, 0x1ad0, 0x2ab3, 0x3a92,
+    0xfd2e, 0xed0f, 0xdd6c, 0xcd4d, 0xbdaa, 0xad8b, 0x9de8, 0x8dc9,
+    0x7c26, 0x6c07, 0x5c64, 0x4c45, 0x3ca2, 0x2c83, 0x1ce0, 0x0cc1,
+    0xef1f, 0xff3e, 0xcf5d, 0xdf7c, 0xaf9b, 0xbfba, 0x8fd9, 0x9ff8,
+    0x6e17, 0x7e36, 0x4e55, 0x5e74, 0x2e93, 0x3eb2, 0x0ed1, 0x1ef0
+]
+
+
+def table_crc(byte_string):
+    """
+    Calculates the CRC one byte at a time using the table from the Davis
+    documentation. This is much slower than calculate_crc and is only kept
+    around to check calculate_crc against.
+
+    :param byte_string: The string of bytes to calculate the CRC for
+    :type byte_string: bytes or bytearray
+    :return: The CRC value
+    :rtype: int
+    """
+    crc = 0
+
+    for data in bytearray(byte_string):
+        table_idx = ((crc >> 8) ^ data) & 0xffff
+        crc = (crc_table[table_idx] ^ (crc << 8)) & 0xffff
+
+    return crc
+
+
+def calculate_crc(byte_string, crc=0):
+    """
+    Calculates the CRC value for the supplied data. To calculate a CRC over
+    data that arrives in pieces pass the result for the previous piece as crc.
+
+    :param byte_string: The data to calculate the CRC for
+    :type byte_string: bytes or bytearray or memoryview
+    :param crc: CRC of any preceding data
+    :type crc: int
+    :return: The CRC value
+    :rtype: int
+    """
+    return crc_hqx(byte_string, crc)
+
+
+def is_valid(packet):
+    """
+    Checks a packet which ends with its two byte CRC.
+
+    :param packet: Packet data followed by its CRC
+    :type packet: bytes or bytearray or memoryview
+    :return: True if the CRC matches the data
+    :rtype: bool
+    """
+    return crc_hqx(packet, 0) == 0
+
+
+def append_crc(data):
+    """
+    Appends the CRC for the data to it.
+
+    :param data: Data to add a CRC to. Modified in place.
+    :type data: bytearray
+    :return: data
+    :rtype: bytearray
+    """
+    data.extend(struct.pack(FORMAT, crc_hqx(data, 0)))
+    return data
+
+
+class CrcAccumulator(object):
+    """
+    Calculates a CRC over data that arrives in pieces, such as a DMP page
+    being received a few bytes at a time.
+    """
+
+    __slots__ = ('crc', 'length')
+
+    def __init__(self):
+        self.crc = 0
+        self.length = 0
+
+    def update(self, data):
+        """
+        Adds more data to the CRC.
+
+        :param data: Data to add
+        :type data: bytes or bytearray or memoryview
+        """
+        self.crc = crc_hqx(data, self.crc)
+        self.length += len(data)
+
+    def reset(self):
+        """
+        Starts again from nothing.
+        """
+        self.crc = 0
+        self.length = 0
+
+    @property
+    def valid(self):
+        """
+        If all the data passed to update so far (which should end with a CRC)
+        is intact.
+        :rtype: bool
+        """
+        return self.length >= 2 and self.crc == 0
+
+
+class CRC(object):
+    """
+    For calculating the 16bit CRC on data coming back from the weather station.
+    """
+
+    FORMAT = FORMAT
+    crc_table = crc_table
+
+    calculate_crc = staticmethod(calculate_crc)
+    is_valid = staticmethod(is_valid)
@@ -16,6 +16,18 @@ class Dmp(object):
     """
     An archive record from a Vantage Pro2 or Vue weather station
     """
+    __slots__ = (
+        'dateStamp', 'timeStamp', 'timeZone', 'dateInteger', 'timeInteger',
+        'outsideTemperature', 'highOutsideTemperature',
+        'lowOutsideTemperature', 'rainfall', 'highRainRate', 'barometer',
+        'solarRadiation', 'numberOfWindSamples', 'insideTemperature',
+        'insideHumidity', 'outsideHumidity', 'averageWindSpeed',
+        'highWindSpeed', 'highWindSpeedDirection', 'prevailingWindDirection',
+        'averageUVIndex', 'ET', 'highSolarRadiation', 'highUVIndex',
+        'forecastRule', 'leafTemperature', 'leafWetness', 'soilTemperatures',
+        'extraHumidities', 'extraTemperatures', 'soilMoistures'
+    )
+
     def __init__(self, date_stamp, time_stamp, time_zone, date_integer, time_integer,
                  outside_temperature, high_outside_temperature, low_outside_temperature,
                  rainfall, high_rain_rate, barometer, solar_radiation, number_of_wind_samples,
@@ -343,61 +355,97 @@ def _serialise_wind_direction_code(value):
     return _compass_points.index(value)
 
 
-def deserialise_dmp(dmp_record, rain_collector_size=0.2, rev_b_firmware=True):
+# Size in bytes of a single archive record
+DMP_RECORD_SIZE = 52
+
+_dmp_struct_a = struct.Struct('<HHhhhHHHHHhBBBBBBBBB4B4B4B2B2BHHB')
+_dmp_struct_b = struct.Struct('<HHhhhHHHHHhBBBBBBBBHBB2B2B4BB2B3B4B')
+
+# Decoded values for every possible 8-bit temperature and 8-bit dashable value
+# so records can be decoded with table lookups rather than function calls.
+_8bit_temps = tuple(deserialise_8bit_temp(v) for v in range(256))
+_8bit_values = tuple(undash_8bit(v) for v in range(256))
+
+# Position of the download record type field in a Rev. B record as unpacked by
+# _dmp_struct_b. This is 0x00 for Rev. B records and 0xFF for Rev. A records.
+_REV_B_RECORD_TYPE = 30
+
+
+def _rev_b_fields(values):
     """
-    Deserialised a dmp string into a Dmp tuple.
-    :param dmp_record: DMP record in string format as sent by the console
-    :type dmp_record: bytes
+    Converts values unpacked from a Rev. B record into the field order expected
+    by _build_dmp (which is the Rev. B order without the record type)
+    """
+    return values[:_REV_B_RECORD_TYPE] + values[_REV_B_RECORD_TYPE + 1:]
+
+
+def _rev_a_fields(values):
+    """
+    Converts values unpacked from a Rev. A record into the field order expected
+    by _build_dmp.
+    """
+    # This has never been tested. It may not work.
+    date_stamp, time_stamp, outside_temperature, high_outside_temperature, \
+        low_outside_temperature, rainfall, high_rain_rate, barometer, \
+        solar_radiation, number_of_wind_samples, inside_temperature, \
+        inside_humidity, outside_humidity, average_wind_speed, high_wind_speed, \
+        high_wind_speed_direction, prevailing_wind_direction, average_uv_index, et, \
+        reserved_a, soil_moisture_1, soil_moisture_2, soil_moisture_3, soil_moisture_4, \
+        soil_temperature_1, soil_temperature_2, soil_temperature_3, soil_temperature_4, \
+        leaf_wetness_1, leaf_wetness_2, leaf_wetness_3, leaf_wetness_4, \
+        extra_temperature_1, extra_temperature_2, extra_humidity_1, extra_humidity_2, \
+        reed_closed_count, reed_opened_count, reserved_b = values
+
+    # These fields are unsupported in Rev. A dump records so we'll just
+    # pretend they're null.
+    high_solar_radiation = 32767
+    high_uv_index = 255
+    forecast_rule = None
+    leaf_temperature_1 = 255
+    leaf_temperature_2 = 255
+    extra_temperature_3 = 255
+
+    return (date_stamp, time_stamp, outside_temperature,
+            high_outside_temperature, low_outside_temperature, rainfall,
+            high_rain_rate, barometer, solar_radiation, number_of_wind_samples,
+            inside_temperature, inside_humidity, outside_humidity,
+            average_wind_speed, high_wind_speed, high_wind_speed_direction,
+            prevailing_wind_direction, average_uv_index, et,
+            high_solar_radiation, high_uv_index, forecast_rule,
+            leaf_temperature_1, leaf_temperature_2, leaf_wetness_1,
+            leaf_wetness_2, soil_temperature_1, soil_temperature_2,
+            soil_temperature_3, soil_temperature_4, extra_humidity_1,
+            extra_humidity_2, extra_temperature_1, extra_temperature_2,
+            extra_temperature_3, soil_moisture_1, soil_moisture_2,
+            soil_moisture_3, soil_moisture_4)
+
+
+def _build_dmp(fields, record_date, record_time, rain_collector_size):
+    """
+    Builds a Dmp from the raw field values of an archive record.
+    :param fields: Raw field values as returned by _rev_a_fields or
+                   _rev_b_fields
+    :type fields: tuple
+    :param record_date: The decoded record date
+    :type record_date: datetime.date
+    :param record_time: The decoded record time
+    :type record_time: datetime.time
     :param rain_collector_size: Size of the rain collector in millimeters
     :type rain_collector_size: float
-    :param rev_b_firmware: If this station is using Rev. B firmware.
-    :type rev_b_firmware: bool
-    :return: The DMP record as a named tuple.
     :rtype: Dmp
     """
-
-    dmp_format_a = '<HHhhhHHHHHhBBBBBBBBB4B4B4B2B2BHHB'
-    dmp_format_b = '<HHhhhHHHHHhBBBBBBBBHBB2B2B4BB2B3B4B'
-
-    # byte 42 is guaranteed to be 0 for revision B and 0xFF for revision A.
-    is_rev_a = dmp_record[42] == b'\xFF'
-
-    if not is_rev_a:
-        date_stamp, time_stamp, outside_temperature, high_outside_temperature, \
-            low_outside_temperature, rainfall, high_rain_rate, barometer, \
-            solar_radiation, number_of_wind_samples, inside_temperature, \
-            inside_humidity, outside_humidity, average_wind_speed, high_wind_speed, \
-            high_wind_speed_direction, prevailing_wind_direction, average_uv_index, et, \
-            high_solar_radiation, high_uv_index, forecast_rule, leaf_temperature_1, \
-            leaf_temperature_2, leaf_wetness_1, leaf_wetness_2, soil_temperature_1, \
-            soil_temperature_2, soil_temperature_3, soil_temperature_4, \
-            download_record_type, extra_humidity_1, extra_humidity_2, \
-            extra_temperature_1, extra_temperature_2, extra_temperature_3,\
-            soil_moisture_1, soil_moisture_2, soil_moisture_3, soil_moisture_4 = \
-            struct.unpack(dmp_format_b, dmp_record)
-    else:
-        # This has never been tested. It may not work.
-        assert not rev_b_firmware
-        date_stamp, time_stamp, outside_temperature, high_outside_temperature, \
-            low_outside_temperature, rainfall, high_rain_rate, barometer, \
-            solar_radiation, number_of_wind_samples, inside_temperature, \
-            inside_humidity, outside_humidity, average_wind_speed, high_wind_speed, \
-            high_wind_speed_direction, prevailing_wind_direction, average_uv_index, et, \
-            reserved_a, soil_moisture_1, soil_moisture_2, soil_moisture_3, soil_moisture_4, \
-            soil_temperature_1, soil_temperature_2, soil_temperature_3, soil_temperature_4, \
-            leaf_wetness_1, leaf_wetness_2, leaf_wetness_3, leaf_wetness_4, \
-            extra_temperature_1, extra_temperature_2, extra_humidity_1, extra_humidity_2, \
-            reed_closed_count, reed_opened_count, reserved_b \
-            = struct.unpack(dmp_format_a, dmp_record)
-
-        # These fields are unsupported in Rev. A dump records so we'll just
-        # pretend they're null.
-        high_solar_radiation = 32767
-        high_uv_index = 255
-        forecast_rule = None
-        leaf_temperature_1 = 255
-        leaf_temperature_2 = 255
-        extra_temperature_3 = 255
+    date_stamp, time_stamp, outside_temperature, high_outside_temperature, \
+        low_outside_temperature, rainfall, high_rain_rate, barometer, \
+        solar_radiation, number_of_wind_samples, inside_temperature, \
+        inside_humidity, outside_humidity, average_wind_speed, high_wind_speed, \
+        high_wind_speed_direction, prevailing_wind_direction, average_uv_index, et, \
+        high_solar_radiation, high_uv_index, forecast_rule, leaf_temperature_1, \
+        leaf_temperature_2, leaf_wetness_1, leaf_wetness_2, soil_temperature_1, \
+        soil_temperature_2, soil_temperature_3, soil_temperature_4, \
+        extra_humidity_1, extra_humidity_2, \
+        extra_temperature_1, extra_temperature_2, extra_temperature_3,\
+        soil_moisture_1, soil_moisture_2, soil_moisture_3, soil_moisture_4 = \
+        fields
 
     if solar_radiation == 32767:
         solar_radiation = None
@@ -419,67 +467,158 @@ def deserialise_dmp(dmp_record, rain_collector_size=0.2, rev_b_firmware=True):
 
     et = inch_to_mm(et / 1000.0)
 
-    unpacked = Dmp(
-        date_stamp=decode_date(date_stamp),
-        time_stamp=decode_time(time_stamp),
-        time_zone=None,
-        date_integer=date_stamp,
-        time_integer=time_stamp,
-        outside_temperature=deserialise_16bit_temp(outside_temperature),
-        high_outside_temperature=deserialise_16bit_temp(
-            high_outside_temperature, True),
-        low_outside_temperature=deserialise_16bit_temp(low_outside_temperature),
-        rainfall=rainfall * rain_collector_size,
-        high_rain_rate=high_rain_rate * rain_collector_size,
-        barometer=inhg_to_mb(barometer / 1000.0),
-        solar_radiation=solar_radiation,
-        number_of_wind_samples=number_of_wind_samples,
-        inside_temperature=deserialise_16bit_temp(inside_temperature),
-        inside_humidity=undash_8bit(inside_humidity),
-        outside_humidity=undash_8bit(outside_humidity),
-        average_wind_speed=average_wind_speed,
-        high_wind_speed=mph_to_ms(high_wind_speed),
-        high_wind_speed_direction=_deserialise_wind_direction_code(
-            high_wind_speed_direction),
-        prevailing_wind_direction=_deserialise_wind_direction_code(
-            prevailing_wind_direction),
-        average_uv_index=average_uv_index,
-        evapotranspiration=et,
-        high_solar_radiation=high_solar_radiation,
-        high_uv_index=undash_8bit(high_uv_index),
-        forecast_rule=forecast_rule,
-        leaf_temperatures=[
-            deserialise_8bit_temp(leaf_temperature_1),
-            deserialise_8bit_temp(leaf_temperature_2)
+    return Dmp(
+        record_date,
+        record_time,
+        None,  # Time zone
+        date_stamp,
+        time_stamp,
+        deserialise_16bit_temp(outside_temperature),
+        deserialise_16bit_temp(high_outside_temperature, True),
+        deserialise_16bit_temp(low_outside_temperature),
+        rainfall * rain_collector_size,
+        high_rain_rate * rain_collector_size,
+        inhg_to_mb(barometer / 1000.0),
+        solar_radiation,
+        number_of_wind_samples,
+        deserialise_16bit_temp(inside_temperature),
+        _8bit_values[inside_humidity],
+        _8bit_values[outside_humidity],
+        average_wind_speed,
+        mph_to_ms(high_wind_speed),
+        _deserialise_wind_direction_code(high_wind_speed_direction),
+        _deserialise_wind_direction_code(prevailing_wind_direction),
+        average_uv_index,
+        et,
+        high_solar_radiation,
+        undash_8bit(high_uv_index),
+        forecast_rule,
+        [
+            _8bit_temps[leaf_temperature_1],
+            _8bit_temps[leaf_temperature_2]
         ],
-        leaf_wetness=[
-            undash_8bit(leaf_wetness_1),
-            undash_8bit(leaf_wetness_2)
+        [
+            _8bit_values[leaf_wetness_1],
+            _8bit_values[leaf_wetness_2]
         ],
-        soil_temperatures=[
-            deserialise_8bit_temp(soil_temperature_1),
-            deserialise_8bit_temp(soil_temperature_2),
-            deserialise_8bit_temp(soil_temperature_3),
-            deserialise_8bit_temp(soil_temperature_4)
+        [
+            _8bit_temps[soil_temperature_1],
+            _8bit_temps[soil_temperature_2],
+            _8bit_temps[soil_temperature_3],
+            _8bit_temps[soil_temperature_4]
         ],
-        extra_humidities=[
-            undash_8bit(extra_humidity_1),
-            undash_8bit(extra_humidity_2)
+        [
+            _8bit_values[extra_humidity_1],
+            _8bit_values[extra_humidity_2]
         ],
-        extra_temperatures=[
-            deserialise_8bit_temp(extra_temperature_1),
-            deserialise_8bit_temp(extra_temperature_2),
-            deserialise_8bit_temp(extra_temperature_3)
+        [
+            _8bit_temps[extra_temperature_1],
+            _8bit_temps[extra_temperature_2],
+            _8bit_temps[extra_temperature_3]
         ],
-        soil_moistures=[
-            undash_8bit(soil_moisture_1),
-            undash_8bit(soil_moisture_2),
-            undash_8bit(soil_moisture_3),
-            undash_8bit(soil_moisture_4)
+        [
+            _8bit_values[soil_moisture_1],
+            _8bit_values[soil_moisture_2],
+            _8bit_values[soil_moisture_3],
+            _8bit_values[soil_moisture_4]
         ]
     )
 
-    return unpacked
+
+def _is_rev_a(values):
+    """
+    Checks if values unpacked as a Rev. B record actually came from a Rev. A
+    record. Empty records (no date) are all 0xFF so they're never treated as
+    Rev. A.
+    """
+    return values[_REV_B_RECORD_TYPE] == 0xFF and values[0] != 0xFFFF
+
+
+def deserialise_dmp(dmp_record, rain_collector_size=0.2, rev_b_firmware=True):
+    """
+    Deserialised a dmp string into a Dmp tuple.
+    :param dmp_record: DMP record in string format as sent by the console
+    :type dmp_record: bytes
+    :param rain_collector_size: Size of the rain collector in millimeters
+    :type rain_collector_size: float
+    :param rev_b_firmware: If this station is using Rev. B firmware.
+    :type rev_b_firmware: bool
+    :return: The DMP record as a named tuple.
+    :rtype: Dmp
+    """
+
+    values = _dmp_struct_b.unpack(dmp_record)
+
+    if _is_rev_a(values):
+        assert not rev_b_firmware
+        fields = _rev_a_fields(_dmp_struct_a.unpack(dmp_record))
+    else:
+        fields = _rev_b_fields(values)
+
+    return _build_dmp(fields, decode_date(fields[0]), decode_time(fields[1]),
+                      rain_collector_size)
+
+
+def _iter_unpack_b(data):
+    """
+    Unpacks every record in data as a Rev. B record.
+    """
+    if hasattr(_dmp_struct_b, 'iter_unpack'):
+        return _dmp_struct_b.iter_unpack(data)
+
+    # Python 2.7
+    return (_dmp_struct_b.unpack_from(data, offset)
+            for offset in range(0, len(data), DMP_RECORD_SIZE))
+
+
+def deserialise_dmp_records(data, rain_collector_size=0.2,
+                            rev_b_firmware=True):
+    """
+    Deserialises a sequence of dmp records (such as all the records from a
+    DMPAFT download joined together) in one go. This is much faster than
+    calling deserialise_dmp for each record individually.
+
+    :param data: DMP records in the format sent by the console
+    :type data: bytes
+    :param rain_collector_size: Size of the rain collector in millimeters
+    :type rain_collector_size: float
+    :param rev_b_firmware: If this station is using Rev. B firmware.
+    :type rev_b_firmware: bool
+    :return: The decoded records
+    :rtype: list[Dmp]
+    """
+    if len(data) % DMP_RECORD_SIZE != 0:
+        raise ValueError("DMP record data must be a multiple of {0} "
+                         "bytes".format(DMP_RECORD_SIZE))
+
+    # Every record in a download is from one of only a handful of days and
+    # there are only 1440 possible times so decoded dates and times are reused.
+    dates = {}
+    times = {}
+
+    records = []
+    for index, values in enumerate(_iter_unpack_b(data)):
+        if _is_rev_a(values):
+            assert not rev_b_firmware
+            fields = _rev_a_fields(_dmp_struct_a.unpack_from(
+                data, index * DMP_RECORD_SIZE))
+        else:
+            fields = _rev_b_fields(values)
+
+        date_stamp = fields[0]
+        record_date = dates.get(date_stamp)
+        if record_date is None:
+            record_date = dates[date_stamp] = decode_date(date_stamp)
+
+        time_stamp = fields[1]
+        record_time = times.get(time_stamp)
+        if record_time is None:
+            record_time = times[time_stamp] = decode_time(time_stamp)
+
+        records.append(_build_dmp(fields, record_date, record_time,
+                                  rain_collector_size))
+
+    return records
 
 
 def serialise_dmp(dmp, rain_collector_size=0.2):
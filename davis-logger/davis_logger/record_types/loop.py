@@ -868,6 +868,89 @@ def serialise_loop2(loop2, rain_collector_size=0.2, include_crc=True):
     return result
 
 
+def _value(value):
+    return value
+
+
+def _item(index):
+    def _get_item(value):
+        return value[index]
+    return _get_item
+
+
+def _isoformat(value):
+    if value is None:
+        return None
+    return value.isoformat()
+
+
+# Live data fields found in both Loop and Loop2 packets
+_LIVE_SHARED_FIELDS = (
+    'barTrend', 'barometer', 'insideTemperature', 'insideHumidity',
+    'outsideTemperature', 'windSpeed', 'windDirection', 'outsideHumidity',
+    'rainRate', 'UV', 'solarRadiation', 'stormRain', 'startDateOfCurrentStorm',
+    'dayRain', 'dayET',
+)
+
+_LIVE_LOOP1_FIELDS = (
+    'nextRecord', 'extraTemperatures', 'soilTemperatures', 'leafTemperatures',
+    'extraHumidities', 'monthRain', 'yearRain', 'monthET', 'yearET',
+    'soilMoistures', 'leafWetness', 'insideAlarms', 'rainAlarms',
+    'outsideAlarms', 'extraTempHumAlarms', 'soilAndLeafAlarms',
+    'transmitterBatteryStatus', 'consoleBatteryVoltage', 'forecastIcons',
+    'forecastRuleNumber', 'timeOfSunrise', 'timeOfSunset',
+)
+
+_LIVE_LOOP2_FIELDS = (
+    'averageWindSpeed2min', 'windGust10m', 'windGust10mDirection', 'dewPoint',
+    'heatIndex', 'windChill', 'thswIndex', 'last15minRain', 'lastHourRain',
+    'last24hourRain', 'barometricReductionMethod', 'userBarometricOffset',
+    'barometricCalibrationNumber', 'barometricSensorRaw',
+    'absoluteBarometricPressure', 'altimeterSetting',
+)
+
+# Available in both packets but at a higher resolution in Loop2 so its only
+# taken from Loop packets when Loop2 isn't available.
+_AVERAGE_WIND_SPEED = 'averageWindSpeed10min'
+
+_LIVE_FIELDS = _LIVE_SHARED_FIELDS + (_AVERAGE_WIND_SPEED,) + \
+    _LIVE_LOOP1_FIELDS + _LIVE_LOOP2_FIELDS
+
+_LIVE_FIELD_INDEX = dict((name, i) for i, name in enumerate(_LIVE_FIELDS))
+
+
+def _live_field_map(packet_type, names):
+    """
+    Builds a list of (field name, index in packet tuple, index in
+    _LIVE_FIELDS) for copying the named fields from a Loop or Loop2 packet.
+    """
+    return tuple((name, packet_type._fields.index(name),
+                  _LIVE_FIELD_INDEX[name])
+                 for name in names)
+
+
+def _live_dict_template():
+    """
+    Builds the keys and value conversions used for each field in the dict
+    produced by LiveData.to_dict().
+    """
+    template = dict((name, ((name, _value),)) for name in _LIVE_FIELDS)
+
+    for name in ('startDateOfCurrentStorm', 'timeOfSunrise', 'timeOfSunset'):
+        template[name] = ((name, _isoformat),)
+
+    for name, key, count in (('extraTemperatures', 'extraTemperature', 3),
+                             ('soilTemperatures', 'soilTemperature', 4),
+                             ('leafTemperatures', 'leafTemperature', 4),
+                             ('extraHumidities', 'extraHumidity', 2),
+                             ('soilMoistures', 'soilMoisture', 4),
+                             ('leafWetness', 'leafWetness', 2)):
+        template[name] = tuple((key + str(i + 1), _item(i))
+                               for i in range(count))
+
+    return tuple(template[name] for name in _LIVE_FIELDS)
+
+
 class LiveData(object):
     """
     A container for live data. Stores a combined view of the latest Loop and
@@ -878,192 +961,145 @@ class LiveData(object):
 
     If loop1_only is set to True on construction then ready will be set to True
     when the first loop1 packet has been received.
+
+    Live data is updated in place every couple of seconds so the instance keeps
+    track of which fields have actually changed. Every update that changes
+    something increments version and changed_since can be used to find out if
+    any fields of interest have changed since some earlier version. Assigning
+    to a field directly is tracked too, but changing the contents of one of the
+    list fields is not.
     """
+
+    FIELDS = _LIVE_FIELDS
+    _FIELD_INDEX = _LIVE_FIELD_INDEX
+    _DICT_TEMPLATE = _live_dict_template()
+
+    _LOOP1_MAP = _live_field_map(Loop, _LIVE_SHARED_FIELDS + _LIVE_LOOP1_FIELDS)
+    _LOOP1_ONLY_MAP = _live_field_map(
+        Loop, _LIVE_SHARED_FIELDS + (_AVERAGE_WIND_SPEED,) + _LIVE_LOOP1_FIELDS)
+    _LOOP2_MAP = _live_field_map(
+        Loop2, _LIVE_SHARED_FIELDS + (_AVERAGE_WIND_SPEED,) + _LIVE_LOOP2_FIELDS)
+
+    __slots__ = FIELDS + (
+        'lastUpdateType', 'lastUpdateTime', 'ready', 'version',
+        '_loop1_received', '_loop2_received', '_loop1_map', '_versions',
+        '_dict', '_dict_version',
+    )
+
     def __init__(self, loop1_only):
         """
         :param loop1_only: If only loop1 packets are being received (False if
                            both loop1 and loop2 packets are being received)
         :type loop1_only: bool
         """
-        self.lastUpdateType = None
-        self.lastUpdateTime = None
-        self.ready = False
-        self._loop1_received = False
-        self._loop2_received = loop1_only
-        self._loop1_only = loop1_only
-
-        # Shared
-        self.barTrend = None
-        self.barometer = None
-        self.insideTemperature = None
-        self.insideHumidity = None
-        self.outsideTemperature = None
-        self.windSpeed = None
-        self.averageWindSpeed10min = None
-        self.windDirection = None
-        self.outsideHumidity = None
-        self.rainRate = None
-        self.UV = None
-        self.solarRadiation = None
-        self.stormRain = None
-        self.startDateOfCurrentStorm = None
-        self.dayRain = None
-        self.dayET = None
-
-        # Loop1 Only
-        self.nextRecord = None
-        self.extraTemperatures = [None, None, None]
-        self.soilTemperatures = [None, None, None, None]
-        self.leafTemperatures = [None, None]
-        self.extraHumidities = [None, None]
-        self.monthRain = None
-        self.yearRain = None
-        self.monthET = None
-        self.yearET = None
-        self.soilMoistures = [None, None, None, None]
-        self.leafWetness = [None, None]
-        self.insideAlarms = None
-        self.rainAlarms = None
-        self.outsideAlarms = None
-        self.extraTempHumAlarms = None
-        self.soilAndLeafAlarms = None
-        self.transmitterBatteryStatus = None
-        self.consoleBatteryVoltage = None
-        self.forecastIcons = None
-        self.forecastRuleNumber = None
-        self.timeOfSunrise = None
-        self.timeOfSunset = None
-
-        # Loop2 Only
-        self.averageWindSpeed2min = None
-        self.windGust10m = None
-        self.windGust10mDirection = None
-        self.dewPoint = None
-        self.heatIndex = None
-        self.windChill = None
-        self.thswIndex = None
-        self.last15minRain = None
-        self.lastHourRain = None
-        self.last24hourRain = None
-        self.barometricReductionMethod = None
-        self.userBarometricOffset = None
-        self.barometricCalibrationNumber = None
-        self.barometricSensorRaw = None
-        self.absoluteBarometricPressure = None
-        self.altimeterSetting = None
+        _set = object.__setattr__
+
+        _set(self, 'lastUpdateType', None)
+        _set(self, 'lastUpdateTime', None)
+        _set(self, 'ready', False)
+        _set(self, 'version', 0)
+        _set(self, '_loop1_received', False)
+        _set(self, '_loop2_received', loop1_only)
+        _set(self, '_loop1_map',
+             self._LOOP1_ONLY_MAP if loop1_only else self._LOOP1_MAP)
+        _set(self, '_versions', [0] * len(self.FIELDS))
+        _set(self, '_dict', {})
+        _set(self, '_dict_version', -1)
+
+        for name in self.FIELDS:
+            _set(self, name, None)
+
+        _set(self, 'extraTemperatures', [None, None, None])
+        _set(self, 'soilTemperatures', [None, None, None, None])
+        _set(self, 'leafTemperatures', [None, None, None, None])
+        _set(self, 'extraHumidities', [None, None])
+        _set(self, 'soilMoistures', [None, None, None, None])
+        _set(self, 'leafWetness', [None, None])
+
+    def __setattr__(self, name, value):
+        index = self._FIELD_INDEX.get(name)
+        if index is not None and getattr(self, name) != value:
+            version = self.version + 1
+            object.__setattr__(self, 'version', version)
+            self._versions[index] = version
+        object.__setattr__(self, name, value)
+
+    def changed_since(self, version, fields=None):
+        """
+        Checks if any of the specified fields have changed since the specified
+        version.
+
+        :param version: Version to compare against. None to always return
+                        True.
+        :type version: int or None
+        :param fields: Names of the fields to check. All fields are checked if
+                       not specified.
+        :type fields: Iterable[str]
+        :return: True if any of the fields have changed
+        :rtype: bool
+        """
+        if version is None:
+            return True
+
+        versions = self._versions
+
+        if fields is None:
+            return max(versions) > version
+
+        index = self._FIELD_INDEX
+        for name in fields:
+            if versions[index[name]] > version:
+                return True
+        return False
 
     def to_dict(self):
         """
-        Creates a dict containing the latest data
+        Creates a dict containing the latest data. Only fields which have
+        changed since the last call are converted again.
         :return: A dict
         :rtype: dict
         """
-        start_date_of_current_storm = None
-        if self.startDateOfCurrentStorm is not None:
-            start_date_of_current_storm = self.startDateOfCurrentStorm.isoformat()
-
-        result = {
-            "timestamp": self.lastUpdateTime.isoformat(),
-            "barTrend": self.barTrend,
-            "barometer": self.barometer,
-            "insideTemperature": self.insideTemperature,
-            "insideHumidity": self.insideHumidity,
-            "outsideTemperature": self.outsideTemperature,
-            "windSpeed": self.windSpeed,
-            "averageWindSpeed10min": self.averageWindSpeed10min,
-            "windDirection": self.windDirection,
-            "outsideHumidity": self.outsideHumidity,
-            "rainRate": self.rainRate,
-            "UV": self.UV,
-            "solarRadiation": self.solarRadiation,
-            "stormRain": self.stormRain,
-            "startDateOfCurrentStorm": start_date_of_current_storm,
-            "dayRain": self.dayRain,
-            "dayET": self.dayET,
-
-            "nextRecord": self.nextRecord,
-            "extraTemperature1": self.extraTemperatures[0],
-            "extraTemperature2": self.extraTemperatures[1],
-            "extraTemperature3": self.extraTemperatures[2],
-            "soilTemperature1": self.soilTemperatures[0],
-            "soilTemperature2": self.soilTemperatures[1],
-            "soilTemperature3": self.soilTemperatures[2],
-            "soilTemperature4": self.soilTemperatures[3],
-            "leafTemperature1": self.leafTemperatures[0],
-            "leafTemperature2": self.leafTemperatures[1],
-            "leafTemperature3": self.leafTemperatures[2],
-            "leafTemperature4": self.leafTemperatures[3],
-            "extraHumidity1": self.extraHumidities[0],
-            "extraHumidity2": self.extraHumidities[1],
-
-            "monthRain": self.monthRain,
-            "yearRain": self.yearRain,
-            "monthET": self.monthET,
-            "yearET": self.yearET,
-            "soilMoisture1": self.soilMoistures[0],
-            "soilMoisture2": self.soilMoistures[1],
-            "soilMoisture3": self.soilMoistures[2],
-            "soilMoisture4": self.soilMoistures[3],
-            "leafWetness1": self.leafWetness[0],
-            "leafWetness2": self.leafWetness[1],
-            "insideAlarms": self.insideAlarms,
-            "rainAlarms": self.rainAlarms,
-            "outsideAlarms": self.outsideAlarms,
-            "extraTempHumAlarms": self.extraTempHumAlarms,
-            "soilAndLeafAlarms": self.soilAndLeafAlarms,
-            "transmitterBatteryStatus": self.transmitterBatteryStatus,
-            "consoleBatteryVoltage": self.consoleBatteryVoltage,
-            "forecastIcons": self.forecastIcons,
-            "forecastRuleNumber": self.forecastRuleNumber,
-            "timeOfSunrise": self.timeOfSunrise.isoformat(),
-            "timeOfSunset": self.timeOfSunset.isoformat(),
-
-            "averageWindSpeed2min": self.averageWindSpeed2min,
-            "windGust10m": self.windGust10m,
-            "windGust10mDirection": self.windGust10mDirection,
-            "dewPoint": self.dewPoint,
-            "heatIndex": self.heatIndex,
-            "windChill": self.windChill,
-            "thswIndex": self.thswIndex,
-            "last15minRain": self.last15minRain,
-            "lastHourRain": self.lastHourRain,
-            "last24hourRain": self.last24hourRain,
-            "barometricReductionMethod": self.barometricReductionMethod,
-            "userBarometricOffset": self.userBarometricOffset,
-            "barometricCalibrationNumber": self.barometricCalibrationNumber,
-            "barometricSensorRaw": self.barometricSensorRaw,
-            "absoluteBarometricPressure": self.absoluteBarometricPressure,
-            "altimeterSetting": self.altimeterSetting
-        }
+        result = self._dict
+        versions = self._versions
+        dict_version = self._dict_version
+
+        for i, template in enumerate(self._DICT_TEMPLATE):
+            if versions[i] > dict_version:
+                value = getattr(self, self.FIELDS[i])
+                for key, convert in template:
+                    result[key] = convert(value)
+
+        object.__setattr__(self, '_dict_version', self.version)
+
+        result = result.copy()
+        result["timestamp"] = self.lastUpdateTime.isoformat()
         return result
 
-    def _update_shared(self, loop):
+    def _update(self, packet, field_map):
         """
-        Updates parameters common to both Loop and Loop2 packets
-        :param loop: A Loop or Loop2 packet
-        :type loop: Union[Loop, Loop2]
-        :return:
+        Copies any changed fields from the packet.
+        :param packet: A Loop or Loop2 packet
+        :type packet: Union[Loop, Loop2]
+        :param field_map: Fields to copy
         """
-        # Shared
-        self.lastUpdateTime = datetime.datetime.now()
-        self.barTrend = loop.barTrend
-        self.barometer = loop.barometer
-        self.insideTemperature = loop.insideTemperature
-        self.insideHumidity = loop.insideHumidity
-        self.outsideTemperature = loop.outsideTemperature
-        self.windSpeed = loop.windSpeed
-        self.windDirection = loop.windDirection
-        self.outsideHumidity = loop.outsideHumidity
-        self.rainRate = loop.rainRate
-        self.UV = loop.UV
-        self.solarRadiation = loop.solarRadiation
-        self.stormRain = loop.stormRain
-        self.startDateOfCurrentStorm = loop.startDateOfCurrentStorm
-        self.dayRain = loop.dayRain
-        self.dayET = loop.dayET
-
+        _set = object.__setattr__
+        versions = self._versions
+        version = self.version + 1
+        changed = False
+
+        for name, packet_index, field_index in field_map:
+            value = packet[packet_index]
+            if getattr(self, name) != value:
+                _set(self, name, value)
+                versions[field_index] = version
+                changed = True
+
+        if changed:
+            _set(self, 'version', version)
+
+        _set(self, 'lastUpdateTime', datetime.datetime.now())
         if self._loop1_received and self._loop2_received:
-            self.ready = True
+            _set(self, 'ready', True)
 
     def update_loop(self, loop):
         """
@@ -1071,40 +1107,9 @@ class LiveData(object):
         :param loop: A loop packet
         :type loop: Loop
         """
-        self._loop1_received = True
-        self.lastUpdateType = 1
-        self._update_shared(loop)
-
-        if self._loop1_only:
-            # This field is available at a higher resolution in the LOOP2
-            # packet. So the field isn't alternating between high and low
-            # resolution every 2 seconds we'll just ignore the LOOP1 value
-            # unless LOOP2 is unavailable.
-            self.averageWindSpeed10min = loop.averageWindSpeed10min
-
-        # Loop1 Only
-        self.nextRecord = loop.nextRecord
-        self.extraTemperatures = loop.extraTemperatures
-        self.soilTemperatures = loop.soilTemperatures
-        self.leafTemperatures = loop.leafTemperatures
-        self.extraHumidities = loop.extraHumidities
-        self.monthRain = loop.monthRain
-        self.yearRain = loop.yearRain
-        self.monthET = loop.monthET
-        self.yearET = loop.yearET
-        self.soilMoistures = loop.soilMoistures
-        self.leafWetness = loop.leafWetness
-        self.insideAlarms = loop.insideAlarms
-        self.rainAlarms = loop.rainAlarms
-        self.outsideAlarms = loop.outsideAlarms
-        self.extraTempHumAlarms = loop.extraTempHumAlarms
-        self.soilAndLeafAlarms = loop.soilAndLeafAlarms
-        self.transmitterBatteryStatus = loop.transmitterBatteryStatus
-        self.consoleBatteryVoltage = loop.consoleBatteryVoltage
-        self.forecastIcons = loop.forecastIcons
-        self.forecastRuleNumber = loop.forecastRuleNumber
-        self.timeOfSunrise = loop.timeOfSunrise
-        self.timeOfSunset = loop.timeOfSunset
+        object.__setattr__(self, '_loop1_received', True)
+        object.__setattr__(self, 'lastUpdateType', 1)
+        self._update(loop, self._loop1_map)
 
     def update_loop2(self, loop2):
         """
@@ -1112,29 +1117,6 @@ class LiveData(object):
         :param loop2: A loop2 packet
         :type loop2: Loop2
         """
-        self._loop2_received = True
-        self.lastUpdateType = 2
-        self._update_shared(loop2)
-
-        # While this field is available in the LOOP1 packet its at lower
-        # resolution (1mph vs 0.1mph). So when both LOOP1 and LOOP2 are
-        # available the value in the LOOP1 packet will be ignored.
-        self.averageWindSpeed10min = loop2.averageWindSpeed10min
-
-        # Loop2 Only
-        self.averageWindSpeed2min = loop2.averageWindSpeed2min
-        self.windGust10m = loop2.windGust10m
-        self.windGust10mDirection = loop2.windGust10mDirection
-        self.dewPoint = loop2.dewPoint
-        self.heatIndex = loop2.heatIndex
-        self.windChill = loop2.windChill
-        self.thswIndex = loop2.thswIndex
-        self.last15minRain = loop2.last15minRain
-        self.lastHourRain = loop2.lastHourRain
-        self.last24hourRain = loop2.last24hourRain
-        self.barometricReductionMethod = loop2.barometricReductionMethod
-        self.userBarometricOffset = loop2.userBarometricOffset
-        self.barometricCalibrationNumber = loop2.barometricCalibrationNumber
-        self.barometricSensorRaw = loop2.barometricSensorRaw
-        self.absoluteBarometricPressure = loop2.absoluteBarometricPressure
-        self.altimeterSetting = loop2.altimeterSetting
+        object.__setattr__(self, '_loop2_received', True)
+        object.__setattr__(self, 'lastUpdateType', 2)
+        self._update(loop2, self._LOOP2_MAP)
@@ -0,0 +1,137 @@
+# coding=utf-8
+"""
+Writes batches of Davis archive records to the sample and davis_sample tables.
+
+All of the sample rows in a batch are inserted with a single statement which
+returns the new sample IDs. The davis_sample rows are then inserted with a
+second statement. If anything goes wrong with the batch it is rolled back and
+the samples are inserted one at a time instead so a single bad record doesn't
+take the rest of the batch down with it.
+
+The server and davis-logger are installed and deployed separately and don't
+share a common library so each has its own copy of this module. The copies
+must stay identical - the server tests check this.
+"""
+import psycopg2
+from psycopg2.extras import execute_values
+from twisted.python import log
+
+__author__ = 'david'
+
+
+class SampleWriter(object):
+    """
+    Inserts batches of samples for a Davis station.
+    """
+
+    def __init__(self, sample_columns, davis_sample_columns):
+        """
+        :param sample_columns: List of (column name, value expression) pairs
+            for the sample table. The value expression must include a %s
+            placeholder and cast the value to the columns type (eg,
+            "%s::real").
+        :type sample_columns: list[(str, str)]
+        :param davis_sample_columns: List of column names for the davis_sample
+            table (excluding sample_id)
+        :type davis_sample_columns: list[str]
+        """
+        sample_column_names = ", ".join(c[0] for c in sample_columns)
+
+        # Values are numbered so the new sample IDs can be matched back up
+        # with the davis_sample data. The sample table has a unique constraint
+        # on station and timestamp so the join back to the values is on that.
+        self._batch_sample_query = """
+            with new_values(row_num, {columns}) as (values %s),
+            new_sample as (
+                insert into sample({columns})
+                select {columns} from new_values
+                order by row_num
+                returning sample_id, station_id, time_stamp
+            )
+            select nv.row_num, ns.sample_id
+            from new_sample ns
+            inner join new_values nv on nv.station_id = ns.station_id
+                                    and nv.time_stamp = ns.time_stamp
+            """.format(columns=sample_column_names)
+        self._batch_sample_template = "(%s, {0})".format(
+            ", ".join(c[1] for c in sample_columns))
+
+        self._sample_query = """
+            insert into sample({columns}) values({values})
+            returning sample_id
+            """.format(columns=sample_column_names,
+                       values=", ".join(c[1] for c in sample_columns))
+
+        self._davis_sample_query = """
+            insert into davis_sample(sample_id, {columns}) values %s
+            """.format(columns=", ".join(davis_sample_columns))
+
+    def insert_samples(self, txn, samples):
+        """
+        Inserts a list of samples. This must be run as part of a database
+        interaction.
+
+        :param txn: Database transaction cursor thing
+        :param samples: List of samples to insert. Each sample is a tuple of
+            values for the sample table and a tuple of values for the
+            davis_sample table (excluding sample_id) in the order given when
+            the writer was created.
+        :type samples: list[(tuple, tuple)]
+        :returns: List of (index, error) for any samples that could not be
+            inserted.
+        :rtype: list[(int, psycopg2.Error)]
+        """
+        if len(samples) == 0:
+            return []
+
+        if len(samples) > 1:
+            txn.execute("savepoint sample_batch")
+            try:
+                self._insert_batch(txn, samples)
+            except (psycopg2.Error, ValueError) as e:
+                txn.execute("rollback to savepoint sample_batch")
+                log.msg("Failed to insert batch of {0} samples ({1}). "
+                        "Inserting individually.".format(
+                            len(samples), str(e).strip()))
+            else:
+                txn.execute("release savepoint sample_batch")
+                return []
+
+        return self._insert_individually(txn, samples)
+
+    def _insert_batch(self, txn, samples):
+        result = execute_values(
+            txn, self._batch_sample_query,
+            [(i,) + tuple(sample[0]) for i, sample in enumerate(samples)],
+            template=self._batch_sample_template,
+            page_size=len(samples),
+            fetch=True)
+
+        sample_ids = dict(result)
+        if len(sample_ids) != len(samples):
+            raise ValueError("Only matched {0} of {1} new sample IDs".format(
+                len(sample_ids), len(samples)))
+
+        execute_values(
+            txn, self._davis_sample_query,
+            [(sample_ids[i],) + tuple(sample[1])
+             for i, sample in enumerate(samples)],
+            page_size=len(samples))
+
+    def _insert_individually(self, txn, samples):
+        failed = []
+
+        for i, sample in enumerate(samples):
+            txn.execute("savepoint sample_row")
+            try:
+                txn.execute(self._sample_query, sample[0])
+                sample_id = txn.fetchone()[0]
+                execute_values(txn, self._davis_sample_query,
+                               [(sample_id,) + tuple(sample[1])])
+            except psycopg2.Error as e:
+                txn.execute("rollback to savepoint sample_row")
+                failed.append((i, e))
+            else:
+                txn.execute("release savepoint sample_row")
+
+        return failed
@@ -0,0 +1,900 @@
+# coding=utf-8
+"""
+A virtual Davis Vantage Pro2/Vue console. It speaks enough of the serial
+protocol for the data logger to initialise, download archive records and
+receive live data which makes it possible to run the logger end-to-end (and
+benchmark it) without any station hardware.
+
+Supported commands are WRD, VER, NVER, GETTIME, SETTIME, EEBRD, EEBWR, LOOP,
+LPS and DMPAFT along with waking the console (and canceling LOOP/LPS) with a
+bare line feed.
+
+The console can be served over TCP or a pseudo-terminal:
+
+    python -m davis_logger.simulator --tcp 4000
+    python -m davis_logger.simulator --pty
+
+When served over a pty the name of the slave device is printed - point the
+data loggers serial port setting at that. For tests and benchmarks the console
+can also be connected to a procedure in memory with LoopbackConnection.
+"""
+import argparse
+import bisect
+from collections import deque
+import datetime
+import math
+import os
+import random
+import struct
+import sys
+import time
+
+from twisted.internet import reactor, protocol
+from twisted.python import log
+
+from davis_logger.record_types.dmp import build_page, encode_date, \
+    encode_time, decode_date, decode_time
+from davis_logger.record_types.util import CRC, c_to_f
+
+__author__ = 'david'
+
+_ACK = b'\x06'
+_NAK = b'\x21'
+_CANCEL = b'\x18'
+_ESC = b'\x1B'
+
+# Vantage consoles have space for 512 pages of 5 archive records.
+ARCHIVE_CAPACITY = 2560
+
+STATION_TYPE_VANTAGE_PRO = 16
+STATION_TYPE_VANTAGE_VUE = 17
+
+_MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep',
+           'Oct', 'Nov', 'Dec']
+
+_EMPTY_RECORD = b'\xff' * 52
+
+# Values for the rain collector size bits of the setup byte (EEPROM 0x2B)
+_RAIN_COLLECTOR_SIZES = {
+    0.254: 0,
+    0.2: 1,
+    0.1: 2
+}
+
+# Packets captured from a real console. Outside temperature and (for LOOP)
+# the next archive record pointer are replaced in each packet sent.
+_LOOP_TEMPLATE = bytes(bytearray([
+    0x4c, 0x4f, 0x4f, 0xec, 0x00, 0x27, 0x00, 0x87, 0x75, 0x0a, 0x03, 0x32,
+    0xca, 0x02, 0x00, 0x01, 0xcd, 0x00, 0xff, 0xff, 0xff, 0xff, 0xff, 0xff,
+    0xff, 0xff, 0xff, 0xff, 0xff, 0xff, 0xff, 0xff, 0xff, 0x34, 0xff, 0xff,
+    0xff, 0xff, 0xff, 0xff, 0xff, 0x00, 0x00, 0xff, 0xff, 0x7f, 0x00, 0x00,
+    0xff, 0xff, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+    0x00, 0x00, 0xff, 0xff, 0xff, 0xff, 0xff, 0xff, 0xff, 0x00, 0x00, 0x00,
+    0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+    0x00, 0x00, 0x00, 0x40, 0x03, 0x00, 0xc1, 0x83, 0x02, 0xe8, 0x07, 0x0a,
+    0x0d,
+]))
+
+_LOOP2_TEMPLATE = bytes(bytearray([
+    0x4c, 0x4f, 0x4f, 0xec, 0x01, 0xff, 0x7f, 0x86, 0x76, 0xcf, 0x02, 0x30,
+    0x40, 0x02, 0x01, 0xff, 0x4c, 0x01, 0x11, 0x00, 0x14, 0x00, 0x07, 0x00,
+    0x38, 0x01, 0xff, 0x7f, 0xff, 0x7f, 0x2e, 0x00, 0xff, 0x42, 0xff, 0x39,
+    0x00, 0x3a, 0x00, 0x37, 0x00, 0x00, 0x00, 0x00, 0x1a, 0x00, 0x00, 0x00,
+    0xff, 0xff, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x33, 0x00, 0x00, 0x00,
+    0x02, 0x00, 0x00, 0xed, 0xff, 0xf5, 0x75, 0xf5, 0x75, 0x84, 0x76, 0xff,
+    0x06, 0x17, 0x01, 0x14, 0x12, 0x0a, 0x03, 0x2e, 0x03, 0x02, 0x02, 0xff,
+    0x7f, 0xff, 0x7f, 0xff, 0x7f, 0xff, 0x7f, 0xff, 0x7f, 0xff, 0x7f, 0x0a,
+    0x0d,
+]))
+
+_DMP_TEMPLATE = bytes(bytearray([
+    0x49, 0x1a, 0xeb, 0x05, 0x0a, 0x03, 0x0a, 0x03, 0x04, 0x03, 0x00, 0x00,
+    0x00, 0x00, 0xa3, 0x75, 0xff, 0x7f, 0x5f, 0x00, 0x3a, 0x03, 0x2c, 0x2c,
+    0x01, 0x07, 0x0e, 0x0b, 0xff, 0x00, 0xff, 0x7f, 0xff, 0xc1, 0x00, 0x08,
+    0x00, 0x08, 0x00, 0x08, 0x00, 0x08, 0x00, 0xff, 0xff, 0xff, 0xff, 0xff,
+    0x00, 0x00, 0x01, 0x20,
+]))
+
+_STATE_COMMAND = 0
+_STATE_SETTIME = 1
+_STATE_EEBWR = 2
+_STATE_DMPAFT_TIMESTAMP = 3
+_STATE_DMPAFT_CONFIRM = 4
+_STATE_DMP_SENDING = 5
+_STATE_LOOP = 6
+
+
+class VirtualConsole(protocol.Protocol):
+    """
+    Pretends to be a Vantage Pro2 or Vantage Vue console. The console has
+    an archive full of generated records and produces LOOP/LOOP2 packets on
+    request.
+
+    Archive records are generated every archive interval (based on the
+    consoles clock) whenever a DMPAFT command is received. Outside temperature
+    follows a daily cycle so data looks vaguely plausible in charts.
+
+    If the timestamp given with DMPAFT does not match a record all records
+    after it are sent, and if it is older than everything in the archive the
+    entire archive is sent.
+    """
+
+    def __init__(self, station_type=STATION_TYPE_VANTAGE_VUE,
+                 archive_records=0, archive_interval=5,
+                 rain_collector_size=0.2, crc_error_rate=0.0, drip_size=None,
+                 drip_interval=0.01, clock_drift=0.0, loop_interval=2.0,
+                 firmware_date=datetime.date(2012, 9, 4),
+                 firmware_version="3.12", seed=None, clock=reactor,
+                 time_function=time.time):
+        """
+        :param station_type: Station type code reported by WRD. 16 for a
+            Vantage Pro or Pro2, 17 for a Vantage Vue
+        :type station_type: int
+        :param archive_records: Number of archive records to generate up front
+        :type archive_records: int
+        :param archive_interval: Archive interval in minutes
+        :type archive_interval: int
+        :param rain_collector_size: Rain collector size in millimeters (0.2,
+            0.1 or 0.254)
+        :type rain_collector_size: float
+        :param crc_error_rate: Probability (0-1) of any LOOP packet, DMP page
+            or DMPAFT page count being sent with a bad CRC
+        :type crc_error_rate: float
+        :param drip_size: If set, data is sent this many bytes at a time with
+            drip_interval seconds between each chunk.
+        :type drip_size: int
+        :param drip_interval: Seconds between chunks when drip_size is set
+        :type drip_interval: float
+        :param clock_drift: Seconds the console clock gains (or loses, if
+            negative) each day
+        :type clock_drift: float
+        :param loop_interval: Seconds between LOOP packets. If 0 all requested
+            packets are sent at once.
+        :type loop_interval: float
+        :param firmware_date: Firmware date reported by VER. LPS is only
+            supported by Pro2 firmware from 31-DEC-2009 onwards.
+        :type firmware_date: datetime.date
+        :param firmware_version: Firmware version reported by NVER
+        :type firmware_version: str
+        :param seed: Seed for the random number generator used for CRC error
+            injection
+        :param clock: Something providing callLater. Normally the reactor.
+        :param time_function: Function returning the current (real) time as
+            seconds since the epoch
+        :type time_function: callable
+        """
+        self._station_type = station_type
+        self._archive_interval = archive_interval
+        self._crc_error_rate = crc_error_rate
+        self._drip_size = drip_size
+        self._drip_interval = drip_interval
+        self._drift_factor = 1.0 + clock_drift / 86400.0
+        self._loop_interval = loop_interval
+        self._firmware_date = firmware_date
+        self._firmware_version = firmware_version
+        self._random = random.Random(seed)
+        self._clock = clock
+        self._time = time_function
+
+        self._epoch = self._time()
+        self._console_epoch = datetime.datetime.fromtimestamp(
+            self._epoch).replace(microsecond=0)
+
+        self._eeprom = bytearray(b'\x00' * 4096)
+        self._eeprom[0x2B] = \
+            _RAIN_COLLECTOR_SIZES.get(rain_collector_size, 1) << 4
+        self._eeprom[0x2D] = archive_interval
+        # Transmitter 1 is an ISS, the rest are disabled.
+        self._eeprom[0x19:0x29] = b'\x00\xff' + b'\x0a\xff' * 7
+        self._eeprom[0x12] = 0  # Automatic daylight savings
+        self._eeprom[0x13] = 0  # Daylight savings off
+
+        # Archive records are kept oldest first. _archive_position is where
+        # the first record lives in the consoles (circular) archive memory.
+        self._archive_timestamps = []
+        self._archive = []
+        self._archive_position = 0
+        self._generate_records(archive_records)
+
+        self._output = bytearray()
+        self._drip_call = None
+        self._loop_call = None
+
+        self._reset()
+
+        self.commands_received = 0
+        self.crc_errors_sent = 0
+
+    def _reset(self):
+        self._state = _STATE_COMMAND
+        self._buffer = bytearray()
+        self._pending = None
+
+        self._dmp_pages = None
+        self._dmp_page = 0
+
+        if self._loop_call is not None and self._loop_call.active():
+            self._loop_call.cancel()
+        self._loop_call = None
+        self._loop_remaining = 0
+
+    def connectionLost(self, reason=protocol.connectionDone):
+        """
+        Called when the logger disconnects. Anything in progress is abandoned.
+        """
+        self._reset()
+        self._discard_output()
+
+    @property
+    def console_time(self):
+        """
+        The current time according to the consoles clock.
+        :rtype: datetime.datetime
+        """
+        elapsed = (self._time() - self._epoch) * self._drift_factor
+        return self._console_epoch + datetime.timedelta(seconds=elapsed)
+
+    @property
+    def archive_size(self):
+        """
+        Number of records currently in the archive.
+        :rtype: int
+        """
+        return len(self._archive)
+
+    def _set_console_time(self, new_time):
+        self._epoch = self._time()
+        self._console_epoch = new_time
+
+    #
+    # Archive records
+    #
+
+    def _outside_temperature(self, timestamp):
+        # Coldest at 3am, warmest at 3pm
+        hours = timestamp.hour + timestamp.minute / 60.0
+        return 15.0 + 5.0 * math.sin((hours - 9.0) / 24.0 * 2.0 * math.pi)
+
+    @staticmethod
+    def _temperature_value(celsius):
+        return int(round(c_to_f(celsius) * 10))
+
+    def _make_record(self, timestamp):
+        record = bytearray(_DMP_TEMPLATE)
+        temperature = self._outside_temperature(timestamp)
+        struct.pack_into('<HHhhh', record, 0,
+                         encode_date(timestamp.date()),
+                         encode_time(timestamp.time()),
+                         self._temperature_value(temperature),
+                         self._temperature_value(temperature + 0.2),
+                         self._temperature_value(temperature - 0.2))
+        return bytes(record)
+
+    def _add_record(self, timestamp):
+        self._archive_timestamps.append(timestamp)
+        self._archive.append(self._make_record(timestamp))
+
+        if len(self._archive) > ARCHIVE_CAPACITY:
+            # Archive memory is full - the oldest record gets overwritten.
+            del self._archive_timestamps[0]
+            del self._archive[0]
+            self._archive_position = \
+                (self._archive_position + 1) % ARCHIVE_CAPACITY
+
+    def _latest_record_time(self):
+        now = self.console_time
+        minutes = now.hour * 60 + now.minute
+        minutes -= minutes % self._archive_interval
+        return now.replace(hour=minutes // 60, minute=minutes % 60, second=0,
+                           microsecond=0)
+
+    def _generate_records(self, count):
+        """
+        Fills the archive with the specified number of records ending at the
+        current console time.
+        """
+        interval = datetime.timedelta(minutes=self._archive_interval)
+        latest = self._latest_record_time()
+        for i in range(count - 1, -1, -1):
+            self._add_record(latest - interval * i)
+
+    def _catch_up(self):
+        """
+        Generates any archive records that would have been logged since the
+        last record.
+        """
+        if len(self._archive) == 0:
+            return
+
+        interval = datetime.timedelta(minutes=self._archive_interval)
+        latest = self._latest_record_time()
+        next_record = self._archive_timestamps[-1] + interval
+        while next_record <= latest:
+            self._add_record(next_record)
+            next_record += interval
+
+    #
+    # Sending data
+    #
+
+    def _maybe_corrupt(self, data):
+        """
+        Randomly corrupts the CRC at the end of a packet according to the
+        configured error rate.
+        """
+        if self._crc_error_rate <= 0 or \
+                self._random.random() >= self._crc_error_rate:
+            return data
+
+        self.crc_errors_sent += 1
+        data = bytearray(data)
+        data[-1] ^= 0xFF
+        return data
+
+    @staticmethod
+    def _with_crc(data):
+        data = bytearray(data)
+        data.extend(struct.pack(CRC.FORMAT, CRC.calculate_crc(data)))
+        return data
+
+    def _send(self, data):
+        if self._drip_size is None:
+            self.transport.write(bytes(data))
+            return
+
+        self._output.extend(data)
+        if self._drip_call is None:
+            self._drip()
+
+    def _discard_output(self):
+        # Drops anything still waiting to be drip-fed to the logger
+        self._output = bytearray()
+        if self._drip_call is not None and self._drip_call.active():
+            self._drip_call.cancel()
+        self._drip_call = None
+
+    def _drip(self):
+        chunk = self._output[:self._drip_size]
+        self._output = self._output[self._drip_size:]
+        self.transport.write(bytes(chunk))
+
+        if len(self._output) > 0:
+            self._drip_call = self._clock.callLater(self._drip_interval,
+                                                    self._drip)
+        else:
+            self._drip_call = None
+
+    #
+    # Receiving data
+    #
+
+    def dataReceived(self, data):
+        """
+        Handles data from the logger.
+        :param data: Received data
+        :type data: bytes
+        """
+        self._buffer.extend(data)
+
+        handlers = {
+            _STATE_COMMAND: self._command_data,
+            _STATE_SETTIME: self._settime_data,
+            _STATE_EEBWR: self._eebwr_data,
+            _STATE_DMPAFT_TIMESTAMP: self._dmpaft_timestamp_data,
+            _STATE_DMPAFT_CONFIRM: self._dmpaft_confirm_data,
+            _STATE_DMP_SENDING: self._dmp_sending_data,
+            _STATE_LOOP: self._loop_data,
+        }
+
+        # Each handler returns True if it consumed something and there may
+        # be more to process.
+        while len(self._buffer) > 0 and handlers[self._state]():
+            pass
+
+    def _command_data(self):
+        end = self._buffer.find(b'\n')
+        if end < 0:
+            return False
+
+        line = bytes(self._buffer[:end]).strip(b'\r')
+        self._buffer = self._buffer[end + 1:]
+
+        # A real console stops sending whatever it was in the middle of (such
+        # as a burst of LOOP packets) when it gets a new command.
+        self._discard_output()
+
+        if len(line) == 0:
+            # Wakeup
+            self._send(b'\n\r')
+            return True
+
+        self.commands_received += 1
+        bits = line.split()
+        command = bits[0].upper()
+        args = bits[1:]
+
+        commands = {
+            b'WRD\x12\x4d': self._wrd,
+            b'VER': self._ver,
+            b'NVER': self._nver,
+            b'GETTIME': self._gettime,
+            b'SETTIME': self._settime,
+            b'EEBRD': self._eebrd,
+            b'EEBWR': self._eebwr,
+            b'LOOP': self._loop,
+            b'LPS': self._lps,
+            b'DMPAFT': self._dmpaft,
+        }
+
+        if command not in commands:
+            log.msg("Simulator: unsupported command {0!r}".format(line))
+            self._send(b'\n\rINVALID COMMAND\n\r')
+            return True
+
+        try:
+            commands[command](args)
+        except (ValueError, IndexError):
+            log.msg("Simulator: invalid arguments for {0!r}".format(line))
+            self._send(_NAK)
+        return True
+
+    def _wrd(self, args):
+        self._send(_ACK + struct.pack('B', self._station_type))
+
+    def _ver(self, args):
+        self._send("\n\rOK\n\r{0} {1} {2}\n\r".format(
+            _MONTHS[self._firmware_date.month - 1], self._firmware_date.day,
+            self._firmware_date.year).encode('ascii'))
+
+    def _nver(self, args):
+        self._send("\n\rOK\n\r{0}\n\r".format(
+            self._firmware_version).encode('ascii'))
+
+    def _gettime(self, args):
+        now = self.console_time
+        self._send(_ACK + self._with_crc(bytearray([
+            now.second, now.minute, now.hour, now.day, now.month,
+            now.year - 1900])))
+
+    def _settime(self, args):
+        self._state = _STATE_SETTIME
+        self._send(_ACK)
+
+    def _settime_data(self):
+        if len(self._buffer) < 8:
+            return False
+
+        data = self._buffer[:8]
+        self._buffer = self._buffer[8:]
+        self._state = _STATE_COMMAND
+
+        if not CRC.is_valid(data):
+            self._send(_CANCEL)
+            return True
+
+        self._set_console_time(datetime.datetime(
+            year=data[5] + 1900, month=data[4], day=data[3], hour=data[2],
+            minute=data[1], second=data[0]))
+        self._send(_ACK)
+        return True
+
+    def _eebrd(self, args):
+        address = int(args[0], 16)
+        length = int(args[1], 16)
+        if address + length > len(self._eeprom):
+            raise ValueError("Read past end of EEPROM")
+
+        self._send(_ACK + self._with_crc(
+            self._eeprom[address:address + length]))
+
+    def _eebwr(self, args):
+        address = int(args[0], 16)
+        length = int(args[1], 16)
+        if address + length > len(self._eeprom):
+            raise ValueError("Write past end of EEPROM")
+
+        self._pending = (address, length)
+        self._state = _STATE_EEBWR
+        self._send(_ACK)
+
+    def _eebwr_data(self):
+        address, length = self._pending
+        if len(self._buffer) < length + 2:
+            return False
+
+        data = self._buffer[:length + 2]
+        self._buffer = self._buffer[length + 2:]
+        self._state = _STATE_COMMAND
+        self._pending = None
+
+        if not CRC.is_valid(data):
+            self._send(_CANCEL)
+            return True
+
+        self._eeprom[address:address + length] = data[:length]
+        self._send(_ACK)
+        return True
+
+    #
+    # Archive download (DMPAFT)
+    #
+
+    def _dmpaft(self, args):
+        self._state = _STATE_DMPAFT_TIMESTAMP
+        self._send(_ACK)
+
+    def _dmpaft_timestamp_data(self):
+        if len(self._buffer) < 6:
+            return False
+
+        data = self._buffer[:6]
+        self._buffer = self._buffer[6:]
+
+        if not CRC.is_valid(data):
+            self._state = _STATE_COMMAND
+            self._send(_CANCEL)
+            return True
+
+        self._catch_up()
+
+        date_stamp, time_stamp = struct.unpack('<HH', bytes(data[:4]))
+        try:
+            after = datetime.datetime.combine(decode_date(date_stamp),
+                                              decode_time(time_stamp))
+        except (TypeError, ValueError):
+            after = None
+
+        if after is None:
+            first = 0
+        else:
+            first = bisect.bisect_right(self._archive_timestamps, after)
+
+        if first >= len(self._archive):
+            page_count = 0
+            first_record = 0
+            self._state = _STATE_COMMAND
+        else:
+            position = self._archive_position + first
+            last_position = self._archive_position + len(self._archive) - 1
+            first_record = position % 5
+            first_page = position // 5
+            page_count = last_position // 5 - first_page + 1
+            self._dmp_pages = (first_page, page_count)
+            self._dmp_page = 0
+            self._state = _STATE_DMPAFT_CONFIRM
+
+        self._send(_ACK + self._maybe_corrupt(self._with_crc(
+            struct.pack('<HH', page_count, first_record))))
+        return True
+
+    def _dmpaft_confirm_data(self):
+        command = self._buffer[0:1]
+
+        if command == _ACK:
+            self._buffer = self._buffer[1:]
+            self._state = _STATE_DMP_SENDING
+            self._send_dmp_page()
+        else:
+            self._cancel_dmp()
+        return True
+
+    def _cancel_dmp(self):
+        """
+        Cancels the download on ESC. Anything else is probably the logger
+        giving up and starting again so its left for the command parser.
+        """
+        if self._buffer[0:1] == _ESC:
+            self._buffer = self._buffer[1:]
+        self._state = _STATE_COMMAND
+        self._dmp_pages = None
+
+    def _send_dmp_page(self):
+        first_page, page_count = self._dmp_pages
+        page = first_page + self._dmp_page
+
+        records = []
+        for position in range(page * 5, page * 5 + 5):
+            index = position - self._archive_position
+            if 0 <= index < len(self._archive):
+                records.append(self._archive[index])
+            else:
+                records.append(_EMPTY_RECORD)
+
+        self._send(self._maybe_corrupt(
+            build_page(self._dmp_page % 256, records)))
+
+    def _dmp_sending_data(self):
+        command = self._buffer[0:1]
+        first_page, page_count = self._dmp_pages
+
+        if command not in (_ACK, _NAK):
+            self._cancel_dmp()
+            return True
+
+        self._buffer = self._buffer[1:]
+        if command == _ACK:
+            self._dmp_page += 1
+            if self._dmp_page >= page_count:
+                # That was the last page.
+                self._state = _STATE_COMMAND
+                self._dmp_pages = None
+                return True
+            self._send_dmp_page()
+        else:
+            # CRC error - send it again.
+            self._send_dmp_page()
+        return True
+
+    #
+    # Live data (LOOP/LPS)
+    #
+
+    def _loop(self, args):
+        self._start_loop(int(args[0]), [1])
+
+    def _lps(self, args):
+        loop_types = int(args[0])
+        packet_types = []
+        if loop_types & 1:
+            packet_types.append(1)
+        if loop_types & 2:
+            packet_types.append(2)
+
+        if len(packet_types) == 0 or (
+                self._station_type == STATION_TYPE_VANTAGE_PRO and
+                self._firmware_date < datetime.date(2009, 12, 31)):
+            # LPS isn't supported by older firmware.
+            self._send(_NAK)
+            return
+
+        self._start_loop(int(args[1]), packet_types)
+
+    def _start_loop(self, count, packet_types):
+        self._loop_remaining = count
+        self._loop_types = packet_types
+        self._loop_sent = 0
+        self._state = _STATE_LOOP
+        self._send(_ACK)
+        self._loop_call = self._clock.callLater(0, self._send_loop)
+
+    def _loop_packet(self):
+        packet_type = self._loop_types[self._loop_sent % len(self._loop_types)]
+        temperature = self._temperature_value(
+            self._outside_temperature(self.console_time))
+
+        if packet_type == 1:
+            packet = bytearray(_LOOP_TEMPLATE)
+            next_record = (self._archive_position + len(self._archive)) \
+                % ARCHIVE_CAPACITY
+            struct.pack_into('<H', packet, 5, next_record)
+        else:
+            packet = bytearray(_LOOP2_TEMPLATE)
+
+        struct.pack_into('<h', packet, 12, temperature)
+        return self._maybe_corrupt(self._with_crc(packet))
+
+    def _send_loop(self):
+        self._loop_call = None
+
+        while self._loop_remaining > 0:
+            self._send(self._loop_packet())
+            self._loop_sent += 1
+            self._loop_remaining -= 1
+
+            if self._loop_interval > 0:
+                break
+
+        if self._loop_remaining > 0:
+            self._loop_call = self._clock.callLater(self._loop_interval,
+                                                    self._send_loop)
+        else:
+            self._state = _STATE_COMMAND
+
+    def _loop_data(self):
+        end = self._buffer.find(b'\n')
+        if end < 0:
+            # Anything other than a line feed is ignored while looping.
+            self._buffer = bytearray()
+            return False
+
+        # Line feed cancels the loop
+        self._buffer = self._buffer[end + 1:]
+        if self._loop_call is not None and self._loop_call.active():
+            self._loop_call.cancel()
+        self._loop_call = None
+        self._loop_remaining = 0
+        self._state = _STATE_COMMAND
+        self._send(b'\n\r')
+        return True
+
+
+class _LoopbackTransport(object):
+    """
+    Just enough of a transport for VirtualConsole to write to.
+    """
+
+    def __init__(self, queue):
+        self._queue = queue
+
+    def write(self, data):
+        """Queues data for delivery to the receiver"""
+        self._queue.append(data)
+
+    def writeSequence(self, data):
+        """Queues data for delivery to the receiver"""
+        self._queue.append(b''.join(data))
+
+    def loseConnection(self):
+        """Does nothing."""
+        pass
+
+
+class LoopbackConnection(object):
+    """
+    Connects a VirtualConsole to something like a Procedure in memory. Pass
+    write as the procedures write callback and set receiver to its
+    data_received function.
+
+    Data is queued in both directions and only delivered when pump is called
+    so long exchanges don't end up recursing. If a task.Clock is supplied
+    (and was also given to the console) pump will advance it as required to
+    deliver drip-fed data and LOOP packets without waiting in real time.
+    """
+
+    def __init__(self, console, clock=None):
+        """
+        :param console: Console to connect to
+        :type console: VirtualConsole
+        :param clock: Clock used by the console
+        :type clock: twisted.internet.task.Clock
+        """
+        self.receiver = None
+        self._console = console
+        self._clock = clock
+        self._to_console = deque()
+        self._to_receiver = deque()
+        console.makeConnection(_LoopbackTransport(self._to_receiver))
+
+    def write(self, data):
+        """
+        Sends data to the console
+        :param data: Data to send
+        :type data: bytes
+        """
+        self._to_console.append(bytes(data))
+
+    def pump(self, until=None):
+        """
+        Delivers data in both directions until there is nothing left to do.
+
+        :param until: Optional function returning True when pumping should
+            stop (eg, when a procedure has finished)
+        :type until: callable
+        :returns: Number of seconds the clock was advanced by
+        :rtype: float
+        """
+        advanced = 0.0
+        while until is None or not until():
+            if len(self._to_console) > 0:
+                self._console.dataReceived(self._to_console.popleft())
+            elif len(self._to_receiver) > 0:
+                self.receiver(self._to_receiver.popleft())
+            elif self._clock is not None and \
+                    len(self._clock.getDelayedCalls()) > 0:
+                next_call = min(c.getTime()
+                                for c in self._clock.getDelayedCalls())
+                step = max(next_call - self._clock.seconds(), 0)
+                self._clock.advance(step)
+                advanced += step
+            else:
+                break
+        return advanced
+
+
+class VirtualConsoleFactory(protocol.Factory):
+    """
+    Serves a single virtual console to whoever connects.
+    """
+
+    def __init__(self, console):
+        """
+        :param console: The console
+        :type console: VirtualConsole
+        """
+        self.console = console
+
+    def buildProtocol(self, addr):
+        """
+        Returns the console.
+        """
+        log.msg("Simulator: connection from {0}".format(addr))
+        return self.console
+
+
+def serve_pty(console):
+    """
+    Serves the console over a new pseudo-terminal.
+
+    :param console: The console to serve
+    :type console: VirtualConsole
+    :returns: Name of the slave device for the logger to open
+    :rtype: str
+    """
+    import tty
+    from twisted.internet import stdio
+
+    master, slave = os.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+
+    # The slave end is left open (but unused) so reads on the master don't
+    # fail when the logger isn't connected. Reading and writing need separate
+    # descriptors as the reactor tracks them by number and the writer stops
+    # reading whenever it writes.
+    stdio.StandardIO(console, stdin=master, stdout=os.dup(master))
+    return os.ttyname(slave)
+
+
+def main():
+    """
+    Runs the simulator until interrupted.
+    """
+    parser = argparse.ArgumentParser(
+        description="Virtual Davis Vantage Pro2/Vue console")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--tcp", type=int, metavar="PORT",
+                       help="Listen for TCP connections on this port")
+    group.add_argument("--pty", action="store_true",
+                       help="Serve the console on a new pseudo-terminal")
+    parser.add_argument("--station-type", choices=["vue", "pro2"],
+                        default="vue", help="Station hardware type")
+    parser.add_argument("--archive-records", type=int, default=100,
+                        help="Number of archive records to start with "
+                             "(max {0})".format(ARCHIVE_CAPACITY))
+    parser.add_argument("--archive-interval", type=int, default=5,
+                        help="Archive interval in minutes")
+    parser.add_argument("--crc-error-rate", type=float, default=0.0,
+                        help="Probability of a packet being sent with a bad "
+                             "CRC (0-1)")
+    parser.add_argument("--drip-size", type=int, default=None,
+                        help="Send data this many bytes at a time")
+    parser.add_argument("--drip-interval", type=float, default=0.01,
+                        help="Seconds between chunks when --drip-size is set")
+    parser.add_argument("--clock-drift", type=float, default=0.0,
+                        help="Seconds the console clock gains each day")
+    parser.add_argument("--loop-interval", type=float, default=2.0,
+                        help="Seconds between LOOP packets")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Random seed for CRC error injection")
+    args = parser.parse_args()
+
+    log.startLogging(sys.stdout)
+
+    if args.station_type == "vue":
+        station_type = STATION_TYPE_VANTAGE_VUE
+    else:
+        station_type = STATION_TYPE_VANTAGE_PRO
+
+    console = VirtualConsole(
+        station_type=station_type,
+        archive_records=min(args.archive_records, ARCHIVE_CAPACITY),
+        archive_interval=args.archive_interval,
+        crc_error_rate=args.crc_error_rate,
+        drip_size=args.drip_size,
+        drip_interval=args.drip_interval,
+        clock_drift=args.clock_drift,
+        loop_interval=args.loop_interval,
+        seed=args.seed)
+
+    if args.pty:
+        log.msg("Simulator: console available on {0}".format(
+            serve_pty(console)))
+    else:
+        reactor.listenTCP(args.tcp, VirtualConsoleFactory(console))
+        log.msg("Simulator: listening on port {0}".format(args.tcp))
+
+    reactor.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,11 +7,11 @@ from collections import namedtuple
 
 import datetime
 
-from davis_logger.record_types.dmp import encode_date, encode_time, split_page, deserialise_dmp
+from davis_logger.record_types.dmp import encode_date, encode_time, split_page, deserialise_dmp_records
 from davis_logger.record_types.loop import deserialise_loop, PACKET_TYPE_LOOP, get_packet_type, PACKET_TYPE_LOOP2, \
     deserialise_loop2
 from davis_logger.record_types.util import CRC
-from davis_logger.util import Event, to_hex_string
+from davis_logger.util import Event, to_hex_string, ReceiveBuffer
 
 __author__ = 'david'
 
@@ -37,7 +37,7 @@ class Procedure(object):
         :type log_callback: Callable
         """
         self.finished = Event()
-        self._buffer = bytearray()
+        self._buffer = ReceiveBuffer()
         self._handlers = []
         self._state = self._STATE_READY
         self._write = write_callback
@@ -89,7 +89,7 @@ class SequentialProcedure(Procedure):
         """
         # Completely linear!
         self._state += 1
-        self._buffer = bytearray()
+        self._buffer.clear()
 
         if data is not None:
             self._write(data)
@@ -399,7 +399,7 @@ class GetConsoleInformationProcedure(SequentialProcedure):
             assert self._buffer[0:1] == self._ACK
 
             self.station_type = self._buffer[1]
-            self._buffer = bytearray()
+            self._buffer.clear()
 
             self.hw_type = "Unknown"
             if self.station_type == 0:
@@ -427,9 +427,9 @@ class GetConsoleInformationProcedure(SequentialProcedure):
 
     def _receive_version_date(self):
         if self._buffer.count(b'\n') == 3:
-            str_buffer = self._buffer.decode('ascii')
+            str_buffer = self._buffer.getvalue().decode('ascii')
             self.version_date = str_buffer.split('\n')[2].strip()
-            self._buffer = bytearray()
+            self._buffer.clear()
 
             bits = self.version_date.split(" ")
             month_name = bits[0]
@@ -458,7 +458,7 @@ class GetConsoleInformationProcedure(SequentialProcedure):
 
     def _receive_version_number(self):
         if self._buffer.count(b'\n') == 3:
-            self.version = self._buffer.decode('ascii').split('\n')[2].strip()
+            self.version = self._buffer.getvalue().decode('ascii').split('\n')[2].strip()
             self._state = self._STATE_READY
             self._complete()
 
@@ -572,7 +572,7 @@ class GetConsoleConfigurationProcedure(SequentialProcedure):
             assert self._buffer[0:1] == self._ACK
             self.CurrentStationTime = self._decodeTimeInBuffer()
 
-            self._buffer = bytearray()
+            self._buffer.clear()
             self._transition(b'EEBRD 2B 01\n')
 
     def _receive_rain_size(self):
@@ -593,7 +593,7 @@ class GetConsoleConfigurationProcedure(SequentialProcedure):
                 self.RainSizeString = "0.1mm"
                 self.RainSizeMM = 0.1
 
-            self._buffer = bytearray()
+            self._buffer.clear()
             self._transition(b"EEBRD 2D 01\n")
 
     def _receive_archive_interval(self):
@@ -603,7 +603,7 @@ class GetConsoleConfigurationProcedure(SequentialProcedure):
             self.ArchiveIntervalMinutes = self._buffer[1]
 
             # Read the station list
-            self._buffer = bytearray()
+            self._buffer.clear()
             self._transition(b"EEBRD 19 10\n")
 
     def _receive_station_list(self):
@@ -658,7 +658,7 @@ class GetConsoleConfigurationProcedure(SequentialProcedure):
                 )
 
             # Read the Auto/Manual DST setting
-            self._buffer = bytearray()
+            self._buffer.clear()
             self._transition(b"EEBRD 12 1\n")
 
     def _receive_auto_dst_enabled(self):
@@ -680,7 +680,7 @@ class GetConsoleConfigurationProcedure(SequentialProcedure):
 
             # Auto DST is off, DST is being done manually. Check to see if
             # DST is turned on or off.
-            self._buffer = bytearray()
+            self._buffer.clear()
             self._transition(b"EEBRD 13 1\n")
 
     def _daylight_savings_status_received(self):
@@ -761,7 +761,7 @@ class DmpProcedure(SequentialProcedure):
 
     def _send_start_time(self):
         if self._buffer != self._ACK:
-            self._log('Warning: Expected ACK. Buffer: {0}'.format(to_hex_string(self._buffer)))
+            self._log('Warning: Expected ACK. Buffer: {0}'.format(to_hex_string(self._buffer.getvalue())))
             # TODO: What should we do here? Retry? Signal failure?
             return
 
@@ -772,7 +772,7 @@ class DmpProcedure(SequentialProcedure):
         time_stamp = encode_time(self._from_time.time())
         packed = struct.pack('<HH', date_stamp, time_stamp)
 
-        self._buffer = bytearray()
+        self._buffer.clear()
         crc = CRC.calculate_crc(packed)
         packed += struct.pack(CRC.FORMAT, crc)
         self._transition(packed)
@@ -795,7 +795,7 @@ class DmpProcedure(SequentialProcedure):
 
         # Consume the ACK
         assert self._buffer[0:1] == self._ACK
-        self._buffer = self._buffer[1:]
+        self._buffer.skip(1)
 
         payload = self._buffer[0:4]
 
@@ -817,7 +817,7 @@ class DmpProcedure(SequentialProcedure):
         self._dmp_page_count = page_count
         self._dmp_remaining_pages = page_count
         self._dmp_first_record = first_record_location
-        self._buffer = bytearray()
+        self._buffer.clear()
         self._dmp_records = []
 
         if page_count > 0:
@@ -837,11 +837,10 @@ class DmpProcedure(SequentialProcedure):
     def _receive_archive_records(self):
 
         if len(self._buffer) >= 267:
-            page = self._buffer[0:267]
-            self._buffer = self._buffer[267:]
-            page_number, records, crc = split_page(page)
-            if crc == CRC.calculate_crc(page[0:265]):
+            page = self._buffer.read(267)
+            if CRC.is_valid(page):
                 # CRC checks out.
+                page_number, records, _ = split_page(page.tobytes())
 
                 if self._dmp_remaining_pages == self._dmp_page_count:
                     # Skip any 'old' records if the first record of the dump
@@ -868,9 +867,13 @@ class DmpProcedure(SequentialProcedure):
         decoded_records = []
         last_ts = None
 
-        for index, record in enumerate(self._dmp_records):
-            decoded = deserialise_dmp(record, self._rain_collector_size,
-                                      self._rev_b_firmware)
+        # Decode everything in one go - its much quicker than decoding each
+        # record individually.
+        all_decoded = deserialise_dmp_records(
+            bytearray().join(self._dmp_records), self._rain_collector_size,
+            self._rev_b_firmware)
+
+        for index, decoded in enumerate(all_decoded):
 
             if decoded.dateStamp is None or decoded.timeStamp is None:
                 # An empty record indicates we've gone past the last record
@@ -999,7 +1002,7 @@ class LpsProcedure(SequentialProcedure):
             return
 
         self._state = self._STATE_READY
-        self._buffer = bytearray()
+        self._buffer.clear()
         self._lps_acknowledged = False
 
         if self._lps_packets_remaining <= 0:
@@ -1048,7 +1051,7 @@ class LpsProcedure(SequentialProcedure):
             #       out of the buffer too. If the procedure has been provided
             #       with a call_later function the cancellation will be retried
             #       and that should sort everything out.
-            self._buffer = bytearray()
+            self._buffer.clear()
             return
 
         if self._lps_packets_remaining <= 0:
@@ -1073,7 +1076,7 @@ class LpsProcedure(SequentialProcedure):
 
         if not self._lps_acknowledged and self._buffer[0:1] == self._ACK:
             self._lps_acknowledged = True
-            self._buffer = self._buffer[1:]
+            self._buffer.skip(1)
 
         # The LPS command hasn't been acknowledged yet so we're not *really*
         # in LPS mode just yet. Who knows what data we received to end up
@@ -1085,7 +1088,7 @@ class LpsProcedure(SequentialProcedure):
             # say the attempt to enter LPS mode failed and we'll make another
             # attempt.
             self._log('LPS mode not acknowledged. Retrying...\n'
-                      'Buffer contents is: {0}'.format(to_hex_string(self._buffer)))
+                      'Buffer contents is: {0}'.format(to_hex_string(self._buffer.getvalue())))
             if not self._check_if_canceled():
                 # Don't retry if we've been canceled
                 self.start()
@@ -1102,16 +1105,16 @@ class LpsProcedure(SequentialProcedure):
                 # ))
 
                 # We have at least one full LOOP packet
-                packet = self._buffer[0:99]  # Type: bytes
-                self._buffer = self._buffer[99:]
+                packet = self._buffer.read(99)  # Type: memoryview
 
                 self._lps_packets_remaining -= 1
 
                 packet_data = packet[0:97]
-                packet_crc = struct.unpack(CRC.FORMAT, packet[97:])[0]  # Type: int
 
-                crc = CRC.calculate_crc(packet_data)
-                if crc != packet_crc:
+                if not CRC.is_valid(packet):
+                    packet_crc = struct.unpack(CRC.FORMAT, packet[97:])[0]  # Type: int
+                    crc = CRC.calculate_crc(packet_data)
+
                     self._crc_errors += 1
                     if self._last_crc_error is None:
                         last_crc = 'Never'
@@ -1122,7 +1125,7 @@ class LpsProcedure(SequentialProcedure):
                               'This is CRC Error #{4}, last was {5}\n'
                               'Packet data: {2}\nBuffer data: {3}'.format(
                         packet_crc, crc, to_hex_string(packet_data),
-                        to_hex_string(self._buffer), self._crc_errors,
+                        to_hex_string(self._buffer.getvalue()), self._crc_errors,
                         last_crc))
                     self._last_crc_error = datetime.datetime.now()
 
@@ -1132,8 +1135,8 @@ class LpsProcedure(SequentialProcedure):
                     # the next loop packet ends up being stolen by the corrupt one
                     # resulting in all subsequent loop packets being broken too.
                     # So to take care of this situation we will search back through
-                    # the bad loop packet looking for the string "LOO" and insert
-                    # everything from that point back into the start of the buffer.
+                    # the bad loop packet looking for the string "LOO" and move
+                    # the read cursor back to that point.
 
                     # Every LOOP packet should end with \n\r followed by its
                     # two-byte CRC. If this packet doesn't do that then some of it
@@ -1143,16 +1146,21 @@ class LpsProcedure(SequentialProcedure):
                         # the packet is short. Go looking a second packet header.
 
                         self._log('WARNING! End of current packet is corrupt.')
-                        end_of_packet = packet.find(b'\n\r')
-                        next_packet = packet.find(b'LOO', end_of_packet)
+                        self._buffer.rewind(99)
+                        end_of_packet = self._buffer.find(b'\n\r', 0, 99)
+                        next_packet = -1
+                        if end_of_packet >= 0:
+                            next_packet = self._buffer.find(b'LOO', end_of_packet,
+                                                            99)
 
                         if next_packet >= 0:
                             self._log("WARNING! Found next packet data within current "
                                       "packet at position {0}. Current packet is {1} "
                                       "bytes short. Attempting to patch up buffer."
                                       .format(next_packet, (99 - next_packet)))
-                            next_packet_data = packet[next_packet:]
-                            self._buffer = next_packet_data + self._buffer
+                            self._buffer.skip(next_packet)
+                        else:
+                            self._buffer.skip(99)
 
                         # If we didn't find a second packet header then something
                         # is properly wrong. Just restart the LOOP command and
@@ -1195,11 +1203,11 @@ class LpsProcedure(SequentialProcedure):
             self._log("WARNING: Buffer contents is invalid. Discarding and "
                       "resetting LOOP process...")
             self._log("Buffer contents: {0}".format(
-                to_hex_string(self._buffer)))
+                to_hex_string(self._buffer.getvalue())))
             self._lpsFaultReset()
             return
         elif self._buffer.find(b"\n\r") >= 0 or \
-                self._buffer[3:].find(b"LOO") >= 0:
+                self._buffer.find(b"LOO", 3) >= 0:
             # 1. The current packet terminated early (length is <98 and we found
             #    the end-of-packet marker)
             # OR
@@ -1225,7 +1233,7 @@ class LpsProcedure(SequentialProcedure):
                 self._log("Found second packet in buffer at position {0}. "
                           "Current packet is {1} bytes short.".format(
                                 next_packet, (99 - next_packet)))
-                self._buffer = self._buffer[next_packet:]
+                self._buffer.skip(next_packet)
                 self._lps_packets_remaining -= 1
             else:
                 self._log("End of packet sequence was detected but no "
@@ -72,3 +72,170 @@ def to_hex_string(string):
 
         result += r'\x{0}'.format(hex_encoded)
     return result
+
+
+class ReceiveBuffer(object):
+    """
+    Buffer for data received from the weather station.
+
+    Data is consumed by moving a read cursor forward rather than slicing the
+    front off the buffer so consuming a packet doesn't copy everything that
+    arrived after it. Space taken up by consumed data is reclaimed once it
+    makes up most of the buffer.
+
+    read() and peek() return memoryviews of the buffer so packets can be CRC
+    checked and decoded without being copied first. These remain valid (and
+    unchanged) until the buffer is cleared, even if more data arrives.
+
+    Indexes and offsets passed to and returned by all methods are relative to
+    the read cursor.
+    """
+
+    # Don't bother reclaiming space until at least this many bytes have been
+    # consumed.
+    _COMPACT_THRESHOLD = 4096
+
+    def __init__(self):
+        self._data = bytearray()
+        self._pos = 0
+
+    def __len__(self):
+        return len(self._data) - self._pos
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            return self._data[self._pos + start:self._pos + stop:step]
+
+        if item < 0:
+            item += len(self)
+        if item < 0 or item >= len(self):
+            raise IndexError("ReceiveBuffer index out of range")
+        return self._data[self._pos + item]
+
+    def __eq__(self, other):
+        return self.getvalue() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def extend(self, data):
+        """
+        Adds newly received data to the end of the buffer
+        :param data: Received data
+        :type data: bytes
+        """
+        if self._pos >= self._COMPACT_THRESHOLD and \
+                self._pos * 2 >= len(self._data):
+            self._compact()
+
+        try:
+            self._data.extend(data)
+        except BufferError:
+            # Something is still holding on to a memoryview from read() or
+            # peek() so the buffer can't be resized. Move the unread data
+            # somewhere new instead - the old buffer will go away with the
+            # last memoryview.
+            self._compact()
+            self._data.extend(data)
+
+    def _compact(self):
+        # This creates a new bytearray rather than deleting from the existing
+        # one so any memoryviews still around don't stop it from working.
+        self._data = self._data[self._pos:]
+        self._pos = 0
+
+    def clear(self):
+        """
+        Discards everything in the buffer
+        """
+        self._data = bytearray()
+        self._pos = 0
+
+    def skip(self, count):
+        """
+        Consumes and discards data from the start of the buffer
+        :param count: Number of bytes to discard
+        :type count: int
+        """
+        self._pos = min(self._pos + count, len(self._data))
+
+    def rewind(self, count):
+        """
+        Moves the read cursor back so data that was just consumed can be
+        read again. Only data consumed since more data was last added to the
+        buffer can be rewound over.
+        :param count: Number of bytes to move back
+        :type count: int
+        """
+        self._pos = max(self._pos - count, 0)
+
+    def peek(self, start=0, end=None):
+        """
+        Returns data from the buffer without consuming it.
+        :param start: Offset of the first byte to return
+        :type start: int
+        :param end: Offset to stop at. Defaults to the end of the buffer.
+        :type end: int
+        :rtype: memoryview
+        """
+        if end is None:
+            end = len(self)
+        return memoryview(self._data)[self._pos + start:self._pos + end]
+
+    def read(self, count):
+        """
+        Consumes data from the start of the buffer and returns it.
+        :param count: Number of bytes to read
+        :type count: int
+        :rtype: memoryview
+        """
+        result = self.peek(0, count)
+        self.skip(count)
+        return result
+
+    def find(self, sub, start=0, end=None):
+        """
+        Finds the first occurrence of sub within the unread data. Returns -1
+        if it can't be found.
+        :param sub: Data to search for
+        :type sub: bytes
+        :param start: Offset to start searching from
+        :type start: int
+        :param end: Offset to stop searching at
+        :type end: int
+        :rtype: int
+        """
+        if end is None:
+            end = len(self)
+        result = self._data.find(sub, self._pos + start, self._pos + end)
+        if result < 0:
+            return result
+        return result - self._pos
+
+    def startswith(self, prefix):
+        """
+        Checks if the unread data starts with the supplied prefix.
+        :param prefix: Prefix to check for
+        :type prefix: bytes
+        :rtype: bool
+        """
+        return self._data.startswith(prefix, self._pos)
+
+    def count(self, sub):
+        """
+        Counts occurrences of sub within the unread data.
+        :param sub: Data to count
+        :type sub: bytes
+        :rtype: int
+        """
+        return self._data.count(sub, self._pos)
+
+    def getvalue(self):
+        """
+        Returns a copy of all unread data.
+        :rtype: bytearray
+        """
+        return self._data[self._pos:]
@@ -0,0 +1,94 @@
+"""
+Tests the CRC implementation against the table from the Davis documentation
+"""
+import random
+import struct
+import unittest
+
+from davis_logger.record_types import crc
+from davis_logger.record_types.util import CRC
+
+# A LOOP packet minus its CRC
+_LOOP_PACKET = bytearray(
+    b'LOO\x14\x00\x62\x01\xab\x74\x24\x03\x31\x9c\x02\x05\x05\x3c\x00\xff\xff'
+    b'\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff'
+    b'\xff\xff\xff\xff\xff\xff\x47\xff\xff\xff\xff\xff\xff\xff\x00\x00\xff'
+    b'\xff\x7f\x00\x00\xff\xff\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+    b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+    b'\x00\x00\x00\x00\x00\x00\x06\x04\x1c\x02\x50\x03\x0a\x0d')
+
+
+class CrcTests(unittest.TestCase):
+
+    def setUp(self):
+        self.random = random.Random(42)
+
+    def _random_data(self, length):
+        return bytearray(self.random.randint(0, 255) for _ in range(length))
+
+    def test_empty_data(self):
+        self.assertEqual(crc.calculate_crc(b''), 0)
+        self.assertEqual(crc.table_crc(b''), 0)
+
+    def test_matches_table(self):
+        for length in (1, 6, 97, 265, 1000):
+            data = self._random_data(length)
+            self.assertEqual(crc.calculate_crc(data), crc.table_crc(data))
+
+    def test_known_value(self):
+        # The standard check value for CRC-CCITT (XMODEM)
+        self.assertEqual(crc.calculate_crc(b'123456789'), 0x31C3)
+
+    def test_accepts_bytes_bytearray_and_memoryview(self):
+        data = self._random_data(99)
+        expected = crc.table_crc(data)
+
+        self.assertEqual(crc.calculate_crc(bytes(data)), expected)
+        self.assertEqual(crc.calculate_crc(data), expected)
+        self.assertEqual(crc.calculate_crc(memoryview(data)), expected)
+
+    def test_memoryview_slice(self):
+        data = self._random_data(300)
+        view = memoryview(data)
+
+        self.assertEqual(crc.calculate_crc(view[10:107]),
+                         crc.table_crc(data[10:107]))
+
+    def test_incremental(self):
+        data = self._random_data(267)
+        value = crc.calculate_crc(data[:100])
+        value = crc.calculate_crc(data[100:], value)
+
+        self.assertEqual(value, crc.calculate_crc(data))
+
+    def test_accumulator(self):
+        data = crc.append_crc(self._random_data(265))
+        accumulator = crc.CrcAccumulator()
+        for i in range(0, len(data), 64):
+            accumulator.update(memoryview(data)[i:i + 64])
+
+        self.assertTrue(accumulator.valid)
+        self.assertEqual(accumulator.length, 267)
+
+        accumulator.reset()
+        self.assertFalse(accumulator.valid)
+
+    def test_is_valid(self):
+        packet = crc.append_crc(bytearray(_LOOP_PACKET))
+
+        self.assertTrue(crc.is_valid(packet))
+        packet[50] ^= 0x01
+        self.assertFalse(crc.is_valid(packet))
+
+    def test_append_crc(self):
+        packet = crc.append_crc(bytearray(_LOOP_PACKET))
+        value = struct.unpack(crc.FORMAT, bytes(packet[-2:]))[0]
+
+        self.assertEqual(value, crc.table_crc(_LOOP_PACKET))
+
+    def test_util_crc_compatibility(self):
+        data = self._random_data(97)
+
+        self.assertEqual(CRC.calculate_crc(data), crc.table_crc(data))
+        self.assertEqual(CRC.FORMAT, '>H')
+        self.assertEqual(len(CRC.crc_table), 256)
@@ -4,7 +4,8 @@ Tests for the DMP encoding/decoding code.
 """
 import struct
 import unittest
-from davis_logger.record_types.dmp import deserialise_dmp, serialise_dmp, split_page, build_page
+from davis_logger.record_types.dmp import deserialise_dmp, serialise_dmp, split_page, build_page, \
+    deserialise_dmp_records
 from davis_logger.record_types.util import CRC
 
 __author__ = 'david'
@@ -120,3 +121,24 @@ class dmp_tests(unittest.TestCase):
             self.assertEqual(decoded.soilMoistures, decoded2.soilMoistures)
 
             self.assertEqual(record, encoded)
+
+    def test_deserialise_records_matches_deserialise_dmp(self):
+        decoded = deserialise_dmp_records(b''.join(self.dmp_records), 0.3)
+
+        self.assertEqual(len(self.dmp_records), len(decoded))
+        for record, bulk_decoded in zip(self.dmp_records, decoded):
+            self.assertEqual(repr(deserialise_dmp(record, 0.3)),
+                             repr(bulk_decoded))
+
+    def test_deserialise_records_empty_record(self):
+        data = self.dmp_records[0] + b'\xff' * 52
+
+        decoded = deserialise_dmp_records(data)
+
+        self.assertEqual(2, len(decoded))
+        self.assertIsNone(decoded[1].dateStamp)
+        self.assertIsNone(decoded[1].timeStamp)
+
+    def test_deserialise_records_partial_record(self):
+        self.assertRaises(ValueError, deserialise_dmp_records,
+                          self.dmp_records[0][:51])
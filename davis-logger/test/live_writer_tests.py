@@ -0,0 +1,136 @@
+"""
+Tests the database live data writer
+"""
+import unittest
+
+from twisted.internet import defer
+from twisted.internet.task import Clock
+
+from davis_logger.logger import DatabaseLiveWriter
+from davis_logger.record_types.loop import LiveData
+
+
+class FakePool(object):
+    """
+    Records interactions instead of running them against a database.
+    """
+    def __init__(self):
+        self.interactions = []
+
+    def runInteraction(self, interaction, *args):
+        d = defer.Deferred()
+        self.interactions.append((interaction, args, d))
+        return d
+
+    def complete_all(self):
+        for interaction in self.interactions:
+            if not interaction[2].called:
+                interaction[2].callback(None)
+
+    def outside_temperatures(self):
+        # Live data parameters: download timestamp, indoor humidity,
+        # indoor temperature, humidity, temperature, ...
+        return [args[0][4] for _, args, _ in self.interactions]
+
+
+class DatabaseLiveWriterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = FakePool()
+        self.clock = Clock()
+        self.live = LiveData(True)
+
+    def _writer(self, min_interval=0):
+        return DatabaseLiveWriter(self.pool, 1, min_interval, self.clock)
+
+    def test_both_tables_updated_in_one_interaction(self):
+        writer = self._writer()
+        self.live.outsideTemperature = 12.5
+
+        writer.write(self.live)
+
+        self.assertEqual(1, len(self.pool.interactions))
+
+        queries = []
+
+        class Txn(object):
+            def execute(self, query, params):
+                queries.append(query)
+
+        interaction, args, _ = self.pool.interactions[0]
+        interaction(Txn(), *args)
+
+        self.assertEqual(2, len(queries))
+        self.assertIn("update live_data", queries[0])
+        self.assertIn("update davis_live_data", queries[1])
+
+    def test_unchanged_data_not_written(self):
+        writer = self._writer()
+        self.live.outsideTemperature = 12.5
+
+        writer.write(self.live)
+        self.pool.complete_all()
+        writer.write(self.live)
+        writer.write(self.live)
+
+        self.assertEqual(1, len(self.pool.interactions))
+
+    def test_unchanged_data_refreshed_after_max_age(self):
+        writer = self._writer()
+        self.live.outsideTemperature = 12.5
+
+        writer.write(self.live)
+        self.pool.complete_all()
+        self.clock.advance(DatabaseLiveWriter.MAX_AGE)
+        writer.write(self.live)
+
+        self.assertEqual(2, len(self.pool.interactions))
+
+    def test_changes_rate_limited(self):
+        writer = self._writer(min_interval=10)
+
+        self.live.outsideTemperature = 12.5
+        writer.write(self.live)
+        self.pool.complete_all()
+
+        self.clock.advance(2)
+        self.live.outsideTemperature = 12.6
+        writer.write(self.live)
+        self.clock.advance(2)
+        self.live.outsideTemperature = 12.7
+        writer.write(self.live)
+
+        self.assertEqual([12.5], self.pool.outside_temperatures())
+
+        # Latest value is written once the interval has passed.
+        self.clock.advance(6)
+        self.assertEqual([12.5, 12.7], self.pool.outside_temperatures())
+
+    def test_updates_during_write_are_written_afterwards(self):
+        writer = self._writer()
+
+        self.live.outsideTemperature = 12.5
+        writer.write(self.live)
+        self.live.outsideTemperature = 12.6
+        writer.write(self.live)
+        self.live.outsideTemperature = 12.7
+        writer.write(self.live)
+
+        self.assertEqual([12.5], self.pool.outside_temperatures())
+
+        self.pool.complete_all()
+        self.assertEqual([12.5, 12.7], self.pool.outside_temperatures())
+
+    def test_failed_write_retried_on_next_update(self):
+        writer = self._writer()
+        self.live.outsideTemperature = 12.5
+
+        writer.write(self.live)
+        self.pool.interactions[0][2].errback(Exception("connection lost"))
+        writer.write(self.live)
+
+        self.assertEqual(2, len(self.pool.interactions))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,7 @@ Tests the functions that deal with the loop packet type.
 """
 import unittest
 from davis_logger.record_types.loop import serialise_loop, deserialise_loop, deserialise_loop2, serialise_loop2, \
-    PACKET_TYPE_LOOP, get_packet_type, PACKET_TYPE_LOOP2
+    PACKET_TYPE_LOOP, get_packet_type, PACKET_TYPE_LOOP2, LiveData
 
 __author__ = 'david'
 
@@ -221,4 +221,124 @@ class loop_tests(unittest.TestCase):
         self.assertEqual(PACKET_TYPE_LOOP, get_packet_type(self.loop_packets[0]))
 
     def test_detect_loop2(self):
-        self.assertEqual(PACKET_TYPE_LOOP2, get_packet_type(self.loop2_packets[0]))
\ No newline at end of file
+        self.assertEqual(PACKET_TYPE_LOOP2, get_packet_type(self.loop2_packets[0]))
+
+
+class LiveDataTests(unittest.TestCase):
+
+    # Keys in the dict published to the message broker
+    _DICT_KEYS = [
+        "timestamp", "barTrend", "barometer", "insideTemperature",
+        "insideHumidity", "outsideTemperature", "windSpeed",
+        "averageWindSpeed10min", "windDirection", "outsideHumidity",
+        "rainRate", "UV", "solarRadiation", "stormRain",
+        "startDateOfCurrentStorm", "dayRain", "dayET", "nextRecord",
+        "extraTemperature1", "extraTemperature2", "extraTemperature3",
+        "soilTemperature1", "soilTemperature2", "soilTemperature3",
+        "soilTemperature4", "leafTemperature1", "leafTemperature2",
+        "leafTemperature3", "leafTemperature4", "extraHumidity1",
+        "extraHumidity2", "monthRain", "yearRain", "monthET", "yearET",
+        "soilMoisture1", "soilMoisture2", "soilMoisture3", "soilMoisture4",
+        "leafWetness1", "leafWetness2", "insideAlarms", "rainAlarms",
+        "outsideAlarms", "extraTempHumAlarms", "soilAndLeafAlarms",
+        "transmitterBatteryStatus", "consoleBatteryVoltage", "forecastIcons",
+        "forecastRuleNumber", "timeOfSunrise", "timeOfSunset",
+        "averageWindSpeed2min", "windGust10m", "windGust10mDirection",
+        "dewPoint", "heatIndex", "windChill", "thswIndex", "last15minRain",
+        "lastHourRain", "last24hourRain", "barometricReductionMethod",
+        "userBarometricOffset", "barometricCalibrationNumber",
+        "barometricSensorRaw", "absoluteBarometricPressure",
+        "altimeterSetting"
+    ]
+
+    def setUp(self):
+        self.loop = deserialise_loop(loop_tests.loop_packets[0][0:97])
+        self.loop2 = deserialise_loop2(loop_tests.loop2_packets[0][0:97])
+
+    def test_ready_once_both_packets_received(self):
+        live = LiveData(False)
+
+        live.update_loop(self.loop)
+        self.assertFalse(live.ready)
+
+        live.update_loop2(self.loop2)
+        self.assertTrue(live.ready)
+
+    def test_loop1_only_ready_after_loop(self):
+        live = LiveData(True)
+        live.update_loop(self.loop)
+
+        self.assertTrue(live.ready)
+        self.assertEqual(live.averageWindSpeed10min,
+                         self.loop.averageWindSpeed10min)
+
+    def test_loop2_average_wind_speed_preferred(self):
+        live = LiveData(False)
+        live.update_loop2(self.loop2)
+        live.update_loop(self.loop)
+
+        self.assertEqual(live.averageWindSpeed10min,
+                         self.loop2.averageWindSpeed10min)
+
+    def test_to_dict(self):
+        live = LiveData(False)
+        live.update_loop(self.loop)
+        live.update_loop2(self.loop2)
+
+        result = live.to_dict()
+
+        self.assertEqual(sorted(result.keys()), sorted(self._DICT_KEYS))
+        self.assertEqual(result["timestamp"], live.lastUpdateTime.isoformat())
+        self.assertEqual(result["outsideTemperature"],
+                         self.loop2.outsideTemperature)
+        self.assertEqual(result["nextRecord"], self.loop.nextRecord)
+        self.assertEqual(result["extraTemperature2"],
+                         self.loop.extraTemperatures[1])
+        self.assertEqual(result["soilMoisture4"], self.loop.soilMoistures[3])
+        self.assertEqual(result["timeOfSunrise"],
+                         self.loop.timeOfSunrise.isoformat())
+        self.assertEqual(result["dewPoint"], self.loop2.dewPoint)
+
+    def test_to_dict_reflects_changes(self):
+        live = LiveData(True)
+        live.update_loop(self.loop)
+        live.to_dict()
+
+        live.update_loop(self.loop._replace(outsideTemperature=-5.5,
+                                            soilMoistures=[1, 2, 3, 4]))
+        result = live.to_dict()
+
+        self.assertEqual(result["outsideTemperature"], -5.5)
+        self.assertEqual(result["soilMoisture3"], 3)
+        self.assertEqual(result["insideTemperature"],
+                         self.loop.insideTemperature)
+
+    def test_unchanged_packet_does_not_change_version(self):
+        live = LiveData(True)
+        live.update_loop(self.loop)
+        version = live.version
+
+        live.update_loop(self.loop)
+
+        self.assertEqual(live.version, version)
+        self.assertFalse(live.changed_since(version))
+
+    def test_changed_since(self):
+        live = LiveData(True)
+        live.update_loop(self.loop)
+        version = live.version
+
+        live.update_loop(self.loop._replace(outsideTemperature=-5.5))
+
+        self.assertTrue(live.changed_since(version))
+        self.assertTrue(live.changed_since(version, ['outsideTemperature']))
+        self.assertFalse(live.changed_since(version, ['insideTemperature']))
+        self.assertTrue(live.changed_since(None, ['insideTemperature']))
+
+    def test_assignment_is_tracked(self):
+        live = LiveData(True)
+        version = live.version
+
+        live.outsideTemperature = 12.5
+
+        self.assertTrue(live.changed_since(version, ['outsideTemperature']))
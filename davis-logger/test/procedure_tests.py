@@ -2510,6 +2510,25 @@ class TestLpsProcedure(unittest.TestCase):
         # Make sure nothing was misdetected as a loop2 packet
         self.assertEqual(0, len(looper2.LoopRecords))
 
+    def test_decodes_loop_packets_received_in_one_burst(self):
+        recv = WriteReceiver()
+        log = LogReceiver()
+        looper1 = LoopReceiver()
+
+        proc = LpsProcedure(recv.write, log.log, True, 0.2, 200)
+        proc.loopDataReceived += looper1.receiveLoop
+
+        records = TestLpsProcedure._make_loop_records(200, 0.2)
+
+        proc.start()
+        proc.data_received(self._ACK + b''.join(
+            serialise_loop(record, 0.2) for record in records))
+
+        self.assertEqual(len(records), len(looper1.LoopRecords))
+
+        for i, record in enumerate(records):
+            self._assertLoopEqual(record, looper1.LoopRecords[i], i)
+
     def test_decodes_multiple_loop2_packets(self):
         recv = WriteReceiver()
         log = LogReceiver()
@@ -0,0 +1,225 @@
+"""
+Runs the station procedures against the virtual console
+"""
+import datetime
+import unittest
+
+from twisted.internet.task import Clock
+
+from davis_logger.simulator import VirtualConsole, LoopbackConnection, \
+    STATION_TYPE_VANTAGE_PRO, STATION_TYPE_VANTAGE_VUE
+from davis_logger.station_procedures import GetConsoleInformationProcedure, \
+    GetConsoleConfigurationProcedure, DmpProcedure, LpsProcedure, \
+    DstSwitchProcedure
+
+
+class FakeTime(object):
+    """
+    A wall clock for the console that only moves when told to.
+    """
+    def __init__(self):
+        self.now = 1600000000.0
+
+    def __call__(self):
+        return self.now
+
+
+class SimulatorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.time = FakeTime()
+
+    def _connect(self, **kwargs):
+        kwargs.setdefault('clock', self.clock)
+        kwargs.setdefault('time_function', self.time)
+        self.console = VirtualConsole(**kwargs)
+        self.connection = LoopbackConnection(self.console, self.clock)
+
+    def _run(self, procedure):
+        finished = []
+        procedure.finished += lambda: finished.append(True)
+        self.connection.receiver = procedure.data_received
+        procedure.start()
+        self.connection.pump(lambda: len(finished) > 0)
+        self.assertTrue(finished, "Procedure did not finish")
+
+    def _download(self, from_time):
+        procedure = DmpProcedure(self.connection.write, None, from_time, 0.2)
+        self._run(procedure)
+        return procedure.ArchiveRecords
+
+    @staticmethod
+    def _timestamps(records):
+        return [datetime.datetime.combine(r.dateStamp, r.timeStamp)
+                for r in records]
+
+    def test_console_information(self):
+        self._connect(station_type=STATION_TYPE_VANTAGE_VUE)
+        procedure = GetConsoleInformationProcedure(self.connection.write)
+        self._run(procedure)
+
+        self.assertEqual(procedure.hw_type, "Vantage Vue")
+        self.assertEqual(procedure.version_date_d, datetime.date(2012, 9, 4))
+        self.assertEqual(procedure.version, "3.12")
+        self.assertTrue(procedure.lps_supported)
+
+    def test_old_pro2_firmware_does_not_support_lps(self):
+        self._connect(station_type=STATION_TYPE_VANTAGE_PRO,
+                      firmware_date=datetime.date(2008, 1, 1))
+        procedure = GetConsoleInformationProcedure(self.connection.write)
+        self._run(procedure)
+
+        self.assertEqual(procedure.hw_type, "Vantage Pro, Vantage Pro2")
+        self.assertFalse(procedure.lps_supported)
+        self.assertIsNone(procedure.version)
+
+    def test_console_configuration(self):
+        self._connect(archive_interval=10, rain_collector_size=0.1)
+        procedure = GetConsoleConfigurationProcedure(self.connection.write,
+                                                     True, True)
+        self._run(procedure)
+
+        self.assertEqual(procedure.ArchiveIntervalMinutes, 10)
+        self.assertEqual(procedure.RainSizeMM, 0.1)
+        self.assertTrue(procedure.AutoDSTEnabled)
+        self.assertEqual(procedure.CurrentStationTime,
+                         datetime.datetime.fromtimestamp(self.time.now))
+        self.assertEqual(len(procedure.ConfiguredStations), 1)
+        self.assertEqual(procedure.ConfiguredStations[0].tx_id, 0)
+
+    def test_download_entire_archive(self):
+        self._connect(archive_records=123)
+        records = self._download(datetime.datetime(2000, 1, 1))
+
+        self.assertEqual(len(records), 123)
+        timestamps = self._timestamps(records)
+        for a, b in zip(timestamps, timestamps[1:]):
+            self.assertEqual(b - a, datetime.timedelta(minutes=5))
+
+    def test_download_after_timestamp(self):
+        self._connect(archive_records=50)
+        records = self._download(datetime.datetime(2000, 1, 1))
+        after = self._timestamps(records)[-8]
+
+        newer = self._download(after)
+
+        self.assertEqual(self._timestamps(newer),
+                         self._timestamps(records)[-7:])
+
+    def test_download_nothing_new(self):
+        self._connect(archive_records=10)
+        records = self._download(datetime.datetime(2000, 1, 1))
+        latest = self._timestamps(records)[-1]
+
+        self.assertEqual(self._download(latest), [])
+
+    def test_new_records_are_logged_as_time_passes(self):
+        self._connect(archive_records=10)
+        records = self._download(datetime.datetime(2000, 1, 1))
+        latest = self._timestamps(records)[-1]
+
+        self.time.now += 15 * 60
+        newer = self._download(latest)
+
+        self.assertEqual(len(newer), 3)
+
+    def test_full_archive_wraps(self):
+        self._connect(archive_records=2560)
+        self.time.now += 12 * 60 * 60
+        records = self._download(datetime.datetime(2000, 1, 1))
+
+        self.assertEqual(len(records), 2560)
+        timestamps = self._timestamps(records)
+        self.assertEqual(timestamps, sorted(timestamps))
+
+    def test_download_with_crc_errors(self):
+        self._connect(archive_records=200, crc_error_rate=0.2, seed=42)
+        records = self._download(datetime.datetime(2000, 1, 1))
+
+        self.assertEqual(len(records), 200)
+        self.assertGreater(self.console.crc_errors_sent, 0)
+
+    def test_download_drip_fed(self):
+        self._connect(archive_records=20, drip_size=7, drip_interval=0.01)
+        records = self._download(datetime.datetime(2000, 1, 1))
+
+        self.assertEqual(len(records), 20)
+
+    def test_lps(self):
+        self._connect(archive_records=10, loop_interval=2)
+        procedure = LpsProcedure(self.connection.write, None, True, 0.2, 10,
+                                 self.clock.callLater)
+        loops = []
+        loop2s = []
+        procedure.loopDataReceived += loops.append
+        procedure.loop2DataReceived += loop2s.append
+
+        self._run(procedure)
+
+        self.assertEqual(len(loops), 5)
+        self.assertEqual(len(loop2s), 5)
+        self.assertEqual(loops[0].nextRecord, 10)
+        self.assertEqual(self.clock.seconds(), 18)
+
+    def test_lps_cancel(self):
+        self._connect(loop_interval=2)
+        procedure = LpsProcedure(self.connection.write, None, True, 0.2, 100,
+                                 self.clock.callLater)
+        canceled = []
+        loops = []
+        procedure.canceled += lambda: canceled.append(True)
+        procedure.loopDataReceived += loops.append
+        procedure.loop2DataReceived += loops.append
+        self.connection.receiver = procedure.data_received
+
+        procedure.start()
+        self.connection.pump(lambda: self.clock.seconds() >= 5)
+        procedure.cancel()
+        self.connection.pump(lambda: len(canceled) > 0)
+        received = len(loops)
+        self.connection.pump()
+
+        self.assertTrue(canceled)
+        self.assertGreater(received, 0)
+        self.assertEqual(len(loops), received)
+
+    def test_lps_with_crc_errors(self):
+        self._connect(loop_interval=0, crc_error_rate=0.3, seed=1)
+        procedure = LpsProcedure(self.connection.write, None, True, 0.2, 50)
+        loops = []
+        procedure.loopDataReceived += loops.append
+        procedure.loop2DataReceived += loops.append
+
+        self._run(procedure)
+
+        self.assertEqual(len(loops), 50 - self.console.crc_errors_sent)
+
+    def test_lps_restart_discards_pending_output(self):
+        # When the procedure restarts LPS after a CRC error the console must
+        # stop sending the rest of the previous burst.
+        self._connect(loop_interval=0, crc_error_rate=0.05, seed=3,
+                      drip_size=64)
+        procedure = LpsProcedure(self.connection.write, None, True, 0.2, 200,
+                                 self.clock.callLater)
+
+        self._run(procedure)
+
+        self.assertGreater(self.console.crc_errors_sent, 0)
+
+    def test_dst_switch_sets_clock(self):
+        self._connect()
+        before = self.console.console_time
+        procedure = DstSwitchProcedure(self.connection.write, True)
+        self._run(procedure)
+
+        self.assertEqual(self.console.console_time - before,
+                         datetime.timedelta(hours=1))
+
+    def test_clock_drift(self):
+        self._connect(clock_drift=10)
+        before = self.console.console_time
+        self.time.now += 86400 * 3
+
+        self.assertEqual(self.console.console_time - before,
+                         datetime.timedelta(days=3, seconds=30))
@@ -1,5 +1,5 @@
 import unittest
-from davis_logger.util import Event
+from davis_logger.util import Event, ReceiveBuffer
 from test.util import CallTracker
 
 __author__ = 'david'
@@ -113,3 +113,76 @@ class EventTests(unittest.TestCase):
 
         event.remove_handlers(instance)
         self.assertListEqual(event._handlers, [_foo_handler])
+
+
+class ReceiveBufferTests(unittest.TestCase):
+    """
+    Tests the buffer procedures receive data from the station into.
+    """
+
+    def setUp(self):
+        self.buffer = ReceiveBuffer()
+        self.buffer.extend(b'\x06LOOP\n\r')
+
+    def test_len_and_equality(self):
+        self.assertEqual(len(self.buffer), 7)
+        self.assertEqual(self.buffer, b'\x06LOOP\n\r')
+        self.assertNotEqual(self.buffer, b'\x06')
+
+    def test_indexing_is_relative_to_read_cursor(self):
+        self.buffer.skip(1)
+
+        self.assertEqual(self.buffer[0], ord('L'))
+        self.assertEqual(self.buffer[-1], ord('\r'))
+        self.assertEqual(self.buffer[0:3], b'LOO')
+        self.assertEqual(self.buffer[4:], b'\n\r')
+        self.assertRaises(IndexError, lambda: self.buffer[6])
+
+    def test_read_consumes_data(self):
+        self.buffer.skip(1)
+        packet = self.buffer.read(4)
+
+        self.assertIsInstance(packet, memoryview)
+        self.assertEqual(packet.tobytes(), b'LOOP')
+        self.assertEqual(self.buffer, b'\n\r')
+
+    def test_rewind(self):
+        self.buffer.read(5)
+        self.buffer.rewind(4)
+
+        self.assertEqual(self.buffer, b'LOOP\n\r')
+
+    def test_peek_does_not_consume(self):
+        self.assertEqual(self.buffer.peek(1, 3).tobytes(), b'LO')
+        self.assertEqual(len(self.buffer), 7)
+
+    def test_find_startswith_and_count(self):
+        self.buffer.skip(1)
+
+        self.assertEqual(self.buffer.find(b'OO'), 1)
+        self.assertEqual(self.buffer.find(b'L', 1), -1)
+        self.assertEqual(self.buffer.find(b'\n', 0, 4), -1)
+        self.assertTrue(self.buffer.startswith(b'LOO'))
+        self.assertEqual(self.buffer.count(b'O'), 2)
+
+    def test_clear(self):
+        self.buffer.clear()
+
+        self.assertEqual(len(self.buffer), 0)
+        self.assertEqual(self.buffer, b'')
+
+    def test_views_survive_more_data(self):
+        packet = self.buffer.read(5)
+        self.buffer.extend(b'more data')
+
+        self.assertEqual(packet.tobytes(), b'\x06LOOP')
+        self.assertEqual(self.buffer, b'\n\rmore data')
+
+    def test_consumed_space_is_reclaimed(self):
+        chunk = b'x' * 99
+        for _ in range(1000):
+            self.buffer.extend(chunk)
+            self.buffer.skip(99)
+
+        self.assertLess(len(self.buffer._data), 10000)
+        self.assertEqual(len(self.buffer), 7)
@@ -68,6 +68,11 @@ class DavisLoggerServiceMaker(object):
         baud_rate = config.getint(S_LOGGER, "baud_rate")
         sample_error_file = config.get(S_LOGGER, "sample_error_file")
 
+        live_data_interval = 0
+        if config.has_option(S_LOGGER, "live_data_interval"):
+            live_data_interval = config.getfloat(S_LOGGER,
+                                                 "live_data_interval")
+
         auto_dst = False
         time_zone = ""
         if config.has_section(S_DST) and config.has_option(S_DST, "auto_dst"):
@@ -78,7 +83,7 @@ class DavisLoggerServiceMaker(object):
 
         return dsn, station_code, serial_port, baud_rate, sample_error_file, \
                auto_dst, time_zone, mq_host, mq_port, mq_exchange, mq_user, \
-               mq_password, mq_vhost
+               mq_password, mq_vhost, live_data_interval
 
     def makeService(self, options):
         """
@@ -93,12 +98,13 @@ class DavisLoggerServiceMaker(object):
 
         dsn, station_code, serial_port, baud_rate, sample_error_file, auto_dst, \
             time_zone, mq_host, mq_port, mq_exchange, mq_user, mq_password, \
-            mq_vhost = self._readConfigFile(options['config-file'])
+            mq_vhost, live_data_interval = self._readConfigFile(
+                options['config-file'])
 
         return DavisService(dsn, station_code, serial_port, baud_rate,
                             sample_error_file, auto_dst, time_zone, mq_host,
                        mq_port, mq_exchange, mq_user, mq_password,
-                       mq_vhost)
+                       mq_vhost, live_data_interval)
 
 
 serviceMaker = DavisLoggerServiceMaker()
@@ -0,0 +1,233 @@
+# coding=utf-8
+"""
+Captures images from one or more IP cameras over HTTP(S). Connections to the
+cameras are kept open between captures where the camera allows it.
+"""
+from datetime import datetime
+from timeit import default_timer as timer
+
+from twisted.internet import reactor
+from twisted.internet.defer import inlineCallbacks, returnValue
+from twisted.internet.ssl import ClientContextFactory
+from twisted.python import log
+from twisted.web.client import Agent, WebClientContextFactory, \
+    HTTPConnectionPool
+from twisted.web.http_headers import Headers
+
+from .readbody import readBody
+
+__author__ = 'david'
+
+# Seconds to wait for a camera to produce an image before giving up
+DEFAULT_TIMEOUT = 30
+
+
+# noinspection PyClassicStyleClass
+class NoVerifyWebClientContextFactory(ClientContextFactory):
+    def __init__(self):
+        pass
+
+    def getContext(self, hostname=None, port=None):
+        return ClientContextFactory.getContext(self)
+
+
+class CaptureStatistics(object):
+    """
+    Capture latency and failure counts for an image source
+    """
+
+    def __init__(self):
+        self.captures = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.bytes = 0
+        self.total_latency = 0.0
+        self.min_latency = None
+        self.max_latency = None
+        self.last_latency = None
+
+    @property
+    def mean_latency(self):
+        if self.captures == 0:
+            return None
+        return self.total_latency / self.captures
+
+    def record_success(self, latency, size):
+        """
+        Records a successful capture
+
+        :param latency: Seconds taken to receive the image
+        :type latency: float
+        :param size: Size of the image in bytes
+        :type size: int
+        """
+        self.captures += 1
+        self.bytes += size
+        self.total_latency += latency
+        self.last_latency = latency
+        if self.min_latency is None or latency < self.min_latency:
+            self.min_latency = latency
+        if self.max_latency is None or latency > self.max_latency:
+            self.max_latency = latency
+
+    def record_failure(self, timed_out):
+        """
+        Records a failed capture
+
+        :param timed_out: If the capture failed because it took too long
+        :type timed_out: bool
+        """
+        self.failures += 1
+        if timed_out:
+            self.timeouts += 1
+
+    def __str__(self):
+        if self.captures == 0:
+            latency = "no successful captures"
+        else:
+            latency = "latency min {0:.3f}s, mean {1:.3f}s, max {2:.3f}s, " \
+                      "last {3:.3f}s".format(self.min_latency,
+                                             self.mean_latency,
+                                             self.max_latency,
+                                             self.last_latency)
+
+        return "{0} captured ({1} bytes), {2} failed ({3} timed out), " \
+               "{4}".format(self.captures, self.bytes, self.failures,
+                            self.timeouts, latency)
+
+
+class CameraSource(object):
+    """
+    An IP camera and the image source its images are stored against.
+    """
+
+    def __init__(self, code, url, interval, disable_cert_verification=False,
+                 timeout=DEFAULT_TIMEOUT):
+        """
+        :param code: Image source code
+        :type code: str
+        :param url: URL where images can be obtained from the IP Camera
+        :type url: str
+        :param interval: How often to capture images (in minutes)
+        :type interval: int
+        :param disable_cert_verification: Disable SSL certificate verification
+        :type disable_cert_verification: bool
+        :param timeout: Seconds to wait for the camera to produce an image
+        :type timeout: float
+        """
+        self.code = code
+        self.url = url
+        self.interval = interval
+        self.disable_cert_verification = disable_cert_verification
+        self.timeout = timeout
+        self.statistics = CaptureStatistics()
+
+
+class CaptureEngine(object):
+    """
+    Fetches images from camera sources sharing a pool of persistent HTTP
+    connections.
+    """
+
+    def __init__(self, max_connections_per_host=2):
+        """
+        :param max_connections_per_host: Maximum number of idle connections to
+            keep open to each camera
+        :type max_connections_per_host: int
+        """
+        self._pool = HTTPConnectionPool(reactor, persistent=True)
+        self._pool.maxPersistentPerHost = max_connections_per_host
+
+        # Agents by (disable_cert_verification, timeout)
+        self._agents = {}
+
+    def _agent(self, source):
+        key = (source.disable_cert_verification, source.timeout)
+
+        if key not in self._agents:
+            if source.disable_cert_verification:
+                context_factory = NoVerifyWebClientContextFactory()
+            else:
+                context_factory = WebClientContextFactory()
+            self._agents[key] = Agent(reactor, context_factory,
+                                      connectTimeout=source.timeout,
+                                      pool=self._pool)
+        return self._agents[key]
+
+    @inlineCallbacks
+    def _request(self, source):
+        response = yield self._agent(source).request(
+            b'GET',
+            source.url.encode('latin1'),
+            Headers({'User-Agent': ['zxweather image-logger']}),
+            None
+        )
+
+        # Always read the body so the connection can go back in the pool
+        response_data = yield readBody(response)
+
+        if response.code != 200:
+            raise Exception("Camera responded with HTTP {0} {1}".format(
+                response.code, response.phrase.decode('latin1')))
+
+        content_type = response.headers.getRawHeaders(
+            "Content-Type", ["application/octet-stream"])[0]
+
+        if response_data is None or not len(response_data):
+            raise Exception("Empty repsonse from camera")
+
+        returnValue((response_data, content_type))
+
+    @inlineCallbacks
+    def capture(self, source):
+        """
+        Captures an image from the specified source. The capture fails if the
+        image isn't received within the sources timeout.
+
+        :param source: Camera to capture an image from
+        :type source: CameraSource
+        :returns: Deferred firing with the time the capture started, the
+            image data and its content type
+        :rtype: Deferred
+        """
+        ts = datetime.now()
+        start = timer()
+
+        d = self._request(source)
+
+        # Cancelling the request drops the connection to the camera. Agent
+        # wraps the resulting CancelledError so remember why it happened.
+        timed_out = []
+
+        def _timeout():
+            timed_out.append(True)
+            d.cancel()
+
+        timeout_call = reactor.callLater(source.timeout, _timeout)
+
+        try:
+            response_data, content_type = yield d
+        except Exception:
+            source.statistics.record_failure(len(timed_out) > 0)
+            if timed_out:
+                raise Exception("Timed out after {0} seconds".format(
+                    source.timeout))
+            raise
+        finally:
+            if timeout_call.active():
+                timeout_call.cancel()
+
+        latency = timer() - start
+        source.statistics.record_success(latency, len(response_data))
+        log.msg("Image from {0} received in {1:.3f} seconds ({2} bytes)"
+                .format(source.code, latency, len(response_data)))
+
+        returnValue((ts, response_data, content_type))
+
+    def close(self):
+        """
+        Closes any idle connections to the cameras.
+
+        :rtype: Deferred
+        """
+        return self._pool.closeCachedConnections()
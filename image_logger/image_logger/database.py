@@ -12,7 +12,6 @@ from .util import Event
 import psycopg2
 from psycopg2.extras import DictConnection as Psycopg2DictConn
 from txpostgres import txpostgres
-from tempfile import TemporaryFile
 import imghdr
 import mimetypes
 
@@ -147,13 +146,35 @@ class DatabaseReceiver(object):
         self.connect()
 
 
+class ImageRejectedError(Exception):
+    """
+    Raised when the database won't accept an image. Retrying won't help.
+    """
+    pass
+
+
+def guess_mime_type(image_data):
+    """
+    Guesses the MIME type of an image from its contents
+
+    :param image_data: The image
+    :type image_data: bytes
+    :returns: MIME type or None if the image type isn't recognised
+    :rtype: str or None
+    """
+    image_type = imghdr.what(None, image_data)
+    if image_type is None:
+        return None
+    return mimetypes.guess_type("foo.{0}".format(image_type))[0]
+
+
 class Database(object):
     def __init__(self, dsn, image_source_code):
         self._dsn = dsn
         self._database_pool = None
         self._image_source_code = image_source_code
         self._camera_image_type_id = None
-        self._image_source_id = None
+        self._image_source_ids = {}
 
     def connect(self):
         self._database_pool = adbapi.ConnectionPool("psycopg2",
@@ -229,51 +250,116 @@ class Database(object):
             returnValue(self._camera_image_type_id)
 
     @inlineCallbacks
-    def _get_image_source_id(self):
-        if self._image_source_id is not None:
-            returnValue(self._image_source_id)
+    def _get_image_source_id(self, image_source_code):
+        if image_source_code in self._image_source_ids:
+            returnValue(self._image_source_ids[image_source_code])
         else:
             result = yield self._database_pool.runQuery(
                     "select image_source_id from image_source "
                     "where upper(code) = upper(%s)",
-                    (self._image_source_code,))
+                    (image_source_code,))
             if len(result):
-                self._image_source_id = result[0][0]
+                self._image_source_ids[image_source_code] = result[0][0]
             else:
-                raise Exception("Invalid image source {0}".format(
-                        self._image_source_code))
+                raise ImageRejectedError("Invalid image source {0}".format(
+                        image_source_code))
 
-            returnValue(self._image_source_id)
+            returnValue(self._image_source_ids[image_source_code])
 
-    @inlineCallbacks
-    def store_image(self, time_stamp, image_data, mime_type=None):
-
-        # Try to guess a MIME type for the image data.
-        if mime_type is None:
-            with TemporaryFile('rw+b') as f:
-                f.write(image_data)
-                image_type = imghdr.what(f.name())
-                mime_type = \
-                    mimetypes.guess_type("foo.{0}".format(image_type))[0]
-
-        query = """
+    _INSERT_IMAGE = """
         insert into image(image_type_id, image_source_id, time_stamp,
                           image_data, mime_type)
         values(%(type_id)s, %(source_id)s, %(time_stamp)s, %(data)s, %(mime)s)
-        returning image_id
-                """
+        """
+
+    # Storing a batch again after a crash (before it was removed from the
+    # spool) must not fail on the images that were already stored.
+    _INSERT_IMAGES = """
+        insert into image(image_type_id, image_source_id, time_stamp,
+                          image_data, mime_type)
+        select %(type_id)s, %(source_id)s, %(time_stamp)s, %(data)s, %(mime)s
+        where not exists(select 1 from image
+                         where image_source_id = %(source_id)s
+                           and image_type_id = %(type_id)s
+                           and time_stamp = %(time_stamp)s)
+        """
+
+    @inlineCallbacks
+    def _image_parameters(self, time_stamp, image_data, mime_type,
+                          image_source_code):
+        # Try to guess a MIME type for the image data.
+        if mime_type is None or mime_type == "application/octet-stream":
+            mime_type = guess_mime_type(image_data) or mime_type
 
         type_id = yield self._get_camera_image_type_id()
-        source_id = yield self._get_image_source_id()
+        source_id = yield self._get_image_source_id(image_source_code)
 
-        data = {
+        returnValue({
             "type_id": type_id,
             "source_id": source_id,
             "time_stamp": time_stamp,
             "data": psycopg2.Binary(image_data),
             "mime": mime_type
-        }
+        })
+
+    @inlineCallbacks
+    def store_image(self, time_stamp, image_data, mime_type=None,
+                    image_source_code=None):
+        """
+        Stores an image in the database
+
+        :param time_stamp: Time the image was captured
+        :type time_stamp: datetime
+        :param image_data: The image
+        :type image_data: bytes
+        :param mime_type: Image MIME type. Guessed from the image data if not
+            supplied
+        :type mime_type: str or None
+        :param image_source_code: Image source to store the image against.
+            Defaults to the image source the database was created with.
+        :type image_source_code: str or None
+        :returns: ID of the new image
+        :rtype: int
+        """
+        if image_source_code is None:
+            image_source_code = self._image_source_code
+
+        data = yield self._image_parameters(time_stamp, image_data, mime_type,
+                                            image_source_code)
 
-        result = yield self._database_pool.runQuery(query, data)
+        result = yield self._database_pool.runQuery(
+            self._INSERT_IMAGE + " returning image_id", data)
 
         returnValue(result[0][0])
+
+    @staticmethod
+    def _insert_images(txn, rows):
+        txn.executemany(Database._INSERT_IMAGES, rows)
+
+    @inlineCallbacks
+    def store_images(self, images):
+        """
+        Stores a batch of images in a single transaction. Either all of the
+        images are stored or none are. Images that are already in the database
+        are skipped.
+
+        :param images: Images to store
+        :type images: list[image_logger.spool.SpooledImage]
+        :raise ImageRejectedError: If the database won't accept one of the
+            images
+        """
+        rows = []
+        for image in images:
+            source_code = image.source_code
+            if source_code is None:
+                source_code = self._image_source_code
+
+            row = yield self._image_parameters(image.time_stamp,
+                                               image.image_data,
+                                               image.mime_type, source_code)
+            rows.append(row)
+
+        try:
+            yield self._database_pool.runInteraction(self._insert_images, rows)
+        except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+            raise ImageRejectedError(str(e))
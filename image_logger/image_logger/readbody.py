@@ -46,6 +46,10 @@ class _ReadBodyProtocol(protocol.Protocol):
         Deliver the accumulated response bytes to the waiting L{Deferred}, if
         the response body has been completely received without error.
         """
+        if self.deferred.called:
+            # Cancelled
+            return
+
         if reason.check(ResponseDone):
             self.deferred.callback(b''.join(self.dataBuffer))
         elif reason.check(PotentialDataLoss):
@@ -67,6 +71,17 @@ def readBody(response):
 
     @return: A L{Deferred} which will fire with the body of the response.
     """
-    d = defer.Deferred()
-    response.deliverBody(_ReadBodyProtocol(response.code, response.phrase, d))
+    def cancel(deferred):
+        """
+        Drops the connection if the body is no longer wanted (eg, the request
+        timed out)
+        """
+        transport = getattr(body_protocol, 'transport', None)
+        abort = getattr(transport, 'abortConnection', None)
+        if abort is not None:
+            abort()
+
+    d = defer.Deferred(cancel)
+    body_protocol = _ReadBodyProtocol(response.code, response.phrase, d)
+    response.deliverBody(body_protocol)
     return d
@@ -6,34 +6,28 @@ from astral import Location
 from twisted.application import service
 from twisted.internet import task, reactor
 from twisted.internet.defer import inlineCallbacks
-from twisted.internet.ssl import ClientContextFactory
 from twisted.python import log
-from twisted.web.client import Agent, WebClientContextFactory
-from twisted.web.http_headers import Headers
 
+from .capture import CaptureEngine
 from .database import DatabaseReceiver, Database
 from .mq_receiver import RabbitMqReceiver
-from .readbody import readBody
+from .spool import ImageSpool, SpoolDrainer
 
 # License: GPLv3 (Astral incompatible with GPLv2)
 
-# noinspection PyClassicStyleClass
-class NoVerifyWebClientContextFactory(ClientContextFactory):
-    def __init__(self):
-        pass
-
-    def getContext(self, hostname=None, port=None):
-        return ClientContextFactory.getContext(self)
+# How often capture statistics are logged (in seconds)
+STATISTICS_INTERVAL = 3600
 
 
 class ImageLoggerService(service.Service):
     def __init__(self, dsn, station_code, mq_hostname, mq_port, mq_exchange,
-                 mq_username, mq_password, mq_vhost, capture_interval,
+                 mq_username, mq_password, mq_vhost,
                  capture_during_daylight_only,  sunrise_time, sunset_time,
-                 use_solar_sensors, camera_url, image_source_code,
-                 disable_cert_verification, calculate_schedule, latitude,
+                 use_solar_sensors, camera_sources, calculate_schedule, latitude,
                  longitude, timezone, elevation, sunrise_offset, sunset_offset,
-                 take_detected_sunrise_picture):
+                 take_detected_sunrise_picture, spool_directory,
+                 spool_batch_size=10, max_retry_interval=300,
+                 default_image_source=None):
         """
 
         :param dsn: Database connection string
@@ -53,8 +47,6 @@ class ImageLoggerService(service.Service):
         :type mq_password: str or None
         :param mq_vhost: RabbitMQ vhost.
         :type mq_vhost: str or None
-        :param capture_interval: How often to capture images (in seconds)
-        :type capture_interval: int
         :param sunrise_time: Time the sun rises
         :type sunrise_time: time
         :param sunset_time: Time the sun sets
@@ -63,12 +55,9 @@ class ImageLoggerService(service.Service):
                                   be used to automatically detect sunrise/sunset
                                   instead of using sunrise_time/sunset_time
         :type use_solar_sensors: bool
-        :param camera_url: URL where images can be obtained from the IP Camera
-        :type camera_url: str
-        :param image_source_code: Code of the camera
-        :type image_source_code: str
-        :param disable_cert_verification: Disable SSL certificate verification
-        :type disable_cert_verification: bool
+        :param camera_sources: Cameras to capture images from. Each camera
+            is captured on its own interval.
+        :type camera_sources: list[CameraSource]
         :param calculate_schedule: If sunrise and sunset times should be
             calculated based on location instead of using the solar sensors or
             a fixed schedule
@@ -89,13 +78,34 @@ class ImageLoggerService(service.Service):
         taken when the configured stations solar sensors first detect sunlight
         in the morning when running on a fixed or calculated schedule
         :type take_detected_sunrise_picture: bool
+        :param spool_directory: Directory to hold captured images in until
+            they've been stored in the database
+        :type spool_directory: str
+        :param spool_batch_size: Maximum number of images to store in the
+            database in one transaction
+        :type spool_batch_size: int
+        :param max_retry_interval: Maximum number of seconds to wait between
+            attempts to store images while the database is unavailable
+        :type max_retry_interval: int
+        :param default_image_source: Image source to store images captured
+            without one against. Only optional when there is a single camera.
+        :type default_image_source: str or None
         """
 
-        # Database connection for storing pictures
-        self._database = Database(dsn, image_source_code)
-
-        # How often pictures should be taken
-        self._interval = capture_interval
+        if default_image_source is None:
+            if len(camera_sources) != 1:
+                raise ValueError("A default image source is required when "
+                                 "capturing from more than one camera")
+            default_image_source = camera_sources[0].code
+
+        # Database connection for storing pictures. Images are spooled to
+        # disk as they're captured and stored in the database from there.
+        self._database = Database(dsn, default_image_source)
+        self._spool = ImageSpool(spool_directory)
+        self._drainer = SpoolDrainer(self._spool, self._database,
+                                     spool_batch_size,
+                                     max_retry_interval=max_retry_interval)
+        self._drainer.storeFailed += self._reconnect_database
 
         # No schedule - capture all the time
         self._daylight_only = capture_during_daylight_only
@@ -137,13 +147,16 @@ class ImageLoggerService(service.Service):
                                                      station_code)
                 self._mq_receiver.LiveUpdate += self._live_data_received
 
-        # Camera settings
-        self._camera_url = camera_url
-        self._disable_cert_verification = disable_cert_verification
+        # Camera settings. All cameras share a pool of persistent
+        # connections.
+        self._sources = camera_sources
+        self._capture_engine = CaptureEngine()
 
         # Initialise other members
         self._logging = False
-        self._looper = task.LoopingCall(self._get_image)
+        self._loopers = [(source, task.LoopingCall(self._get_image, source))
+                         for source in self._sources]
+        self._statistics_looper = task.LoopingCall(self._log_statistics)
         self._sunrise_image_taken = False
         self._logging_start_time = None
 
@@ -205,6 +218,11 @@ class ImageLoggerService(service.Service):
 
         self._database.connect()
 
+        # Store anything left in the spool from last time
+        self._drainer.kick()
+
+        self._statistics_looper.start(STATISTICS_INTERVAL, False)
+
         if self._daylight_only:
             # We're set to log only during daylight hours.
 
@@ -240,51 +258,53 @@ class ImageLoggerService(service.Service):
         service.Service.stopService(self)
         self._stop_logging("service stop")
 
+        if self._statistics_looper.running:
+            self._statistics_looper.stop()
+        self._log_statistics()
+        self._drainer.stop()
+
+        return self._capture_engine.close()
+
+    def _log_statistics(self):
+        for source in self._sources:
+            log.msg("Capture statistics for {0}: {1}".format(
+                source.code, source.statistics))
+
+    def _get_images(self):
+        """
+        Captures an image from every camera
+        """
+        for source in self._sources:
+            self._get_image(source)
+
     @inlineCallbacks
-    def _get_image(self):
-        ts = datetime.now()
-        log.msg("Obtaining image...")
+    def _get_image(self, source):
+        log.msg("Obtaining image from {0}...".format(source.code))
 
         try:
-            if self._disable_cert_verification:
-                context_factory = NoVerifyWebClientContextFactory()
-            else:
-                context_factory = WebClientContextFactory()
-            agent = Agent(reactor, context_factory)
-
-            response = yield agent.request(
-                b'GET',
-                self._camera_url.encode('latin1'),
-                Headers({'User-Agent': ['zxweather image-logger']}),
-                None
-            )
-
-            response_data = yield readBody(response)
-            content_type = response.headers.getRawHeaders(
-                    "Content-Type", ["application/octet-stream"])[0]
-
-            if response_data is None or not len(response_data):
-                raise Exception("Empty repsonse from camera")
-
-            # noinspection PyBroadException
-            try:
-                yield self._database.store_image(ts, response_data, content_type)
-                log.msg("Image stored.")
-            except:
-                # Lost database connection perhaps? Try reconnecting.
-                log.msg("Possible database connection problem. "
-                        "Attempting reconnect...")
-                self._database.reconnect()
-
-                if self._db_receiver is not None:
-                    self._db_receiver.reconnect()
-
-                yield self._database.store_image(ts, response_data,
-                                                 content_type)
-                log.msg("Database reconnected and image stored")
+            ts, response_data, content_type = \
+                yield self._capture_engine.capture(source)
+
+            self._spool.add(source.code, ts, response_data, content_type)
+            self._drainer.kick()
+        except Exception as e:
+            # Not re-raised: that would stop the sources LoopingCall and no
+            # further images would be captured from it.
+            log.msg("Failed to capture or store image from {0}: {1}".format(
+                source.code, e))
+
+    def _reconnect_database(self):
+        # Lost database connection perhaps? Try reconnecting. Images stay in
+        # the spool until they can be stored.
+        log.msg("Possible database connection problem. "
+                "Attempting reconnect...")
+        try:
+            self._database.reconnect()
+
+            if self._db_receiver is not None:
+                self._db_receiver.reconnect()
         except Exception as e:
-            log.msg("Failed to capture or store image: {0}".format(e))
-            raise e
+            log.msg("Reconnect failed: {0}".format(e))
 
     def _schedule_logging_start(self):
         """
@@ -343,7 +363,8 @@ class ImageLoggerService(service.Service):
         self._logging_start_time = self.current_time
 
         # Interval in minutes (unlike time-lapse logger which is in seconds)
-        self._looper.start(self._interval * 60, True)
+        for source, looper in self._loopers:
+            looper.start(source.interval * 60, True)
 
         if self._daylight_only and not self._daylight_trigger:
             self._schedule_logging_stop()
@@ -365,14 +386,15 @@ class ImageLoggerService(service.Service):
                 return
 
         # Fetch one last image before we stop for the night
-        self._get_image()
+        self._get_images()
 
         log.msg("Stopping logger: {0}".format(trigger))
         self._logging = False
         self._sunrise_image_taken = False
 
-        if self._looper.running:
-            self._looper.stop()
+        for _, looper in self._loopers:
+            if looper.running:
+                looper.stop()
 
         if self._daylight_only and (self._calculated_schedule or
                                     not self._daylight_trigger):
@@ -415,7 +437,7 @@ class ImageLoggerService(service.Service):
                 if not self._sunrise_image_taken:
                     log.msg("Fetching picture of detected sunrise...")
                     self._sunrise_image_taken = True
-                    self._get_image()
+                    self._get_images()
         elif self._daylight_only and self._daylight_trigger:
             # Daylight trigger - stop logging at sunset.
             self._stop_logging("sunset detected")
@@ -0,0 +1,285 @@
+# coding=utf-8
+"""
+On-disk journal of captured images waiting to be stored in the database.
+Images are written to the spool as soon as they're captured and drained to
+the database in batches so a database outage doesn't lose any images.
+"""
+import json
+import os
+from collections import namedtuple
+from datetime import datetime
+
+from twisted.internet import reactor
+from twisted.internet.defer import inlineCallbacks
+from twisted.python import log
+
+from .database import ImageRejectedError
+from .util import Event
+
+__author__ = 'david'
+
+_TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# Spooled image metadata is written to <name>.json once <name>.img is
+# complete
+_DATA_EXT = ".img"
+_META_EXT = ".json"
+_TEMP_EXT = ".tmp"
+_BAD_EXT = ".bad"
+
+SpooledImage = namedtuple('SpooledImage', ('source_code', 'time_stamp',
+                                           'image_data', 'mime_type'))
+
+
+def _write_file(filename, data, mode):
+    # Write to a temporary file first so a crash never leaves a partially
+    # written file under the real name
+    with open(filename + _TEMP_EXT, mode) as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(filename + _TEMP_EXT, filename)
+
+
+class ImageSpool(object):
+    """
+    A directory of images waiting to be stored in the database.
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: Directory to spool images in. Created if it doesn't
+            exist.
+        :type directory: str
+        """
+        self._directory = directory
+        self._sequence = 0
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._clean_up()
+
+    def _clean_up(self):
+        # Remove anything left behind by a crash part way through writing an
+        # image to the spool.
+        files = set(os.listdir(self._directory))
+        for filename in files:
+            name, ext = os.path.splitext(filename)
+            if ext == _TEMP_EXT or \
+                    (ext == _DATA_EXT and name + _META_EXT not in files):
+                log.msg("Removing incomplete spool file {0}".format(filename))
+                os.unlink(os.path.join(self._directory, filename))
+
+    def _path(self, name, ext):
+        return os.path.join(self._directory, name + ext)
+
+    def add(self, source_code, time_stamp, image_data, mime_type):
+        """
+        Writes an image to the spool.
+
+        :param source_code: Image source the image was captured from
+        :type source_code: str
+        :param time_stamp: Time the image was captured
+        :type time_stamp: datetime
+        :param image_data: The image
+        :type image_data: bytes
+        :param mime_type: Image MIME type or None if unknown
+        :type mime_type: str or None
+        """
+        # Names sort in the order images were captured
+        self._sequence = (self._sequence + 1) % 1000000
+        name = "{0}_{1:06}".format(time_stamp.strftime("%Y%m%d%H%M%S%f"),
+                                   self._sequence)
+
+        _write_file(self._path(name, _DATA_EXT), image_data, 'wb')
+        _write_file(self._path(name, _META_EXT), json.dumps({
+            "source": source_code,
+            "time": time_stamp.strftime(_TIME_FORMAT),
+            "mime": mime_type
+        }), 'w')
+
+    def pending(self, limit=None):
+        """
+        Returns the names of spooled images, oldest first.
+
+        :param limit: Maximum number of images to return
+        :type limit: int or None
+        :rtype: list[str]
+        """
+        names = sorted(os.path.splitext(f)[0]
+                       for f in os.listdir(self._directory)
+                       if f.endswith(_META_EXT))
+        if limit is not None:
+            names = names[:limit]
+        return names
+
+    def load(self, name):
+        """
+        Reads a spooled image.
+
+        :param name: Spooled image name as returned by pending()
+        :type name: str
+        :rtype: SpooledImage
+        """
+        with open(self._path(name, _META_EXT), 'r') as f:
+            metadata = json.loads(f.read())
+        with open(self._path(name, _DATA_EXT), 'rb') as f:
+            image_data = f.read()
+
+        return SpooledImage(
+            metadata["source"],
+            datetime.strptime(metadata["time"], _TIME_FORMAT),
+            image_data,
+            metadata["mime"])
+
+    def remove(self, name):
+        """
+        Removes an image from the spool once its been stored.
+
+        :param name: Spooled image name
+        :type name: str
+        """
+        os.unlink(self._path(name, _META_EXT))
+        os.unlink(self._path(name, _DATA_EXT))
+
+    def set_aside(self, name):
+        """
+        Moves an image that can't be read out of the way so it doesn't block
+        the rest of the spool.
+
+        :param name: Spooled image name
+        :type name: str
+        """
+        for ext in (_META_EXT, _DATA_EXT):
+            path = self._path(name, ext)
+            if os.path.exists(path):
+                os.rename(path, path + _BAD_EXT)
+
+
+class SpoolDrainer(object):
+    """
+    Stores spooled images in the database in batches. If storing a batch
+    fails it is retried with an exponential backoff. If the database rejects a
+    batch its images are stored one at a time and any the database rejects are
+    set aside.
+    """
+
+    def __init__(self, spool, database, batch_size=10, min_retry_interval=5,
+                 max_retry_interval=300, clock=reactor):
+        """
+        :param spool: Spool to drain
+        :type spool: ImageSpool
+        :param database: Database to store images in
+        :type database: image_logger.database.Database
+        :param batch_size: Maximum number of images to insert in one
+            transaction
+        :type batch_size: int
+        :param min_retry_interval: Seconds to wait before retrying after the
+            first failure
+        :type min_retry_interval: float
+        :param max_retry_interval: Maximum number of seconds to wait between
+            retries
+        :type max_retry_interval: float
+        :param clock: Provider of IReactorTime (for testing)
+        """
+        # Fired when storing a batch fails
+        self.storeFailed = Event()
+
+        self._spool = spool
+        self._database = database
+        self._batch_size = batch_size
+        self._min_retry_interval = min_retry_interval
+        self._max_retry_interval = max_retry_interval
+        self._retry_interval = min_retry_interval
+        self._retry_call = None
+        self._draining = False
+        self._clock = clock
+
+    def kick(self):
+        """
+        Starts draining the spool unless its already being drained or waiting
+        to retry after a failure.
+        """
+        if self._draining or self._retry_call is not None:
+            return
+        self._drain()
+
+    def stop(self):
+        """
+        Cancels any pending retry
+        """
+        if self._retry_call is not None and self._retry_call.active():
+            self._retry_call.cancel()
+        self._retry_call = None
+
+    def _load_batch(self):
+        names = []
+        images = []
+        for name in self._spool.pending(self._batch_size):
+            try:
+                images.append(self._spool.load(name))
+                names.append(name)
+            except Exception as e:
+                log.msg("Failed to read spooled image {0}: {1}. Setting "
+                        "aside.".format(name, e))
+                self._spool.set_aside(name)
+        return names, images
+
+    @inlineCallbacks
+    def _drain(self):
+        self._draining = True
+        try:
+            while True:
+                names, images = self._load_batch()
+                if not names:
+                    break
+
+                try:
+                    yield self._database.store_images(images)
+                except ImageRejectedError as e:
+                    if len(names) == 1:
+                        self._reject(names[0], e)
+                    else:
+                        log.msg("Database rejected batch of {0} images: {1}. "
+                                "Storing them individually.".format(
+                                    len(names), e))
+                        yield self._store_individually(names, images)
+                    continue
+
+                for name in names:
+                    self._spool.remove(name)
+                log.msg("Stored {0} images.".format(len(names)))
+
+            self._retry_interval = self._min_retry_interval
+        except Exception as e:
+            log.msg("Failed to store spooled images: {0}. Retrying in {1} "
+                    "seconds.".format(e, self._retry_interval))
+            self._retry_call = self._clock.callLater(self._retry_interval,
+                                                     self._retry)
+            self._retry_interval = min(self._retry_interval * 2,
+                                       self._max_retry_interval)
+            self.storeFailed.fire()
+        finally:
+            self._draining = False
+
+    def _reject(self, name, error):
+        log.msg("Database rejected spooled image {0}: {1}. Setting "
+                "aside.".format(name, error))
+        self._spool.set_aside(name)
+
+    @inlineCallbacks
+    def _store_individually(self, names, images):
+        # Finds the images in a rejected batch that the database won't accept
+        # so they don't block the rest of the spool.
+        for name, image in zip(names, images):
+            try:
+                yield self._database.store_images([image])
+            except ImageRejectedError as e:
+                self._reject(name, e)
+            else:
+                self._spool.remove(name)
+
+    def _retry(self):
+        self._retry_call = None
+        self.kick()
@@ -0,0 +1,230 @@
+"""
+Tests capturing images from cameras with the HTTP requests faked out
+"""
+import unittest
+
+from twisted.internet import defer
+from twisted.internet.task import Clock
+from twisted.web.http_headers import Headers
+
+from image_logger import capture
+from image_logger.capture import CaptureEngine, CaptureStatistics, \
+    CameraSource
+
+IMAGE = b"\xff\xd8\xff\xe0" + b"x" * 100
+
+
+class FakeResponse(object):
+    def __init__(self, code=200, phrase=b"OK", body=IMAGE,
+                 content_type="image/jpeg"):
+        self.code = code
+        self.phrase = phrase
+        self.body = body
+        self.headers = Headers()
+        if content_type is not None:
+            self.headers.setRawHeaders("Content-Type", [content_type])
+
+
+class FakeAgent(object):
+    """
+    Agent which answers every request with the same response
+    """
+    def __init__(self, response):
+        self.response = response
+        self.requests = []
+
+    def request(self, method, uri, headers=None, body_producer=None):
+        self.requests.append((method, uri))
+        return defer.succeed(self.response)
+
+
+class FakeCaptureEngine(CaptureEngine):
+    """
+    Capture engine where the test completes each request
+    """
+    def __init__(self):
+        super(FakeCaptureEngine, self).__init__()
+        self.requests = []
+
+    def _request(self, source):
+        d = defer.Deferred()
+        self.requests.append(d)
+        return d
+
+
+def _source(timeout=5, disable_cert_verification=False):
+    return CameraSource("cam01", "http://camera/image.jpg", 60,
+                        disable_cert_verification, timeout)
+
+
+class CaptureEngineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._reactor = capture.reactor
+        self._readBody = capture.readBody
+        self.clock = Clock()
+        capture.reactor = self.clock
+        capture.readBody = lambda response: defer.succeed(response.body)
+
+    def tearDown(self):
+        capture.reactor = self._reactor
+        capture.readBody = self._readBody
+
+    def _result(self, d):
+        results = []
+        d.addBoth(results.append)
+        self.assertEqual(len(results), 1)
+        return results[0]
+
+
+class CaptureTests(CaptureEngineTestCase):
+
+    def setUp(self):
+        super(CaptureTests, self).setUp()
+        self.engine = FakeCaptureEngine()
+        self.source = _source()
+
+    def test_capture(self):
+        d = self.engine.capture(self.source)
+        self.engine.requests[0].callback((IMAGE, "image/jpeg"))
+
+        ts, data, content_type = self._result(d)
+
+        self.assertEqual((data, content_type), (IMAGE, "image/jpeg"))
+        self.assertEqual(self.source.statistics.captures, 1)
+        self.assertEqual(self.source.statistics.bytes, len(IMAGE))
+        self.assertEqual(self.source.statistics.failures, 0)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_timeout(self):
+        d = self.engine.capture(self.source)
+
+        self.clock.advance(4.9)
+        self.assertFalse(d.called)
+
+        self.clock.advance(0.1)
+
+        failure = self._result(d)
+        self.assertEqual(str(failure.value), "Timed out after 5 seconds")
+        self.assertEqual(self.source.statistics.failures, 1)
+        self.assertEqual(self.source.statistics.timeouts, 1)
+        self.assertEqual(self.source.statistics.captures, 0)
+
+    def test_failure(self):
+        d = self.engine.capture(self.source)
+        self.engine.requests[0].errback(Exception("Connection refused"))
+
+        failure = self._result(d)
+        self.assertEqual(str(failure.value), "Connection refused")
+        self.assertEqual(self.source.statistics.failures, 1)
+        self.assertEqual(self.source.statistics.timeouts, 0)
+
+        # The timeout doesn't go off later
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_sources_timed_out_separately(self):
+        slow = _source(timeout=30)
+        d_fast = self.engine.capture(self.source)
+        d_slow = self.engine.capture(slow)
+
+        self.clock.advance(5)
+        self.assertTrue(d_fast.called)
+        self.assertFalse(d_slow.called)
+        self._result(d_fast)
+
+        self.engine.requests[1].callback((IMAGE, "image/jpeg"))
+        self._result(d_slow)
+        self.assertEqual(slow.statistics.captures, 1)
+        self.assertEqual(self.source.statistics.timeouts, 1)
+
+
+class RequestTests(CaptureEngineTestCase):
+
+    def setUp(self):
+        super(RequestTests, self).setUp()
+        self.engine = CaptureEngine()
+        self.source = _source()
+
+    def _request(self, response):
+        agent = FakeAgent(response)
+        self.engine._agent = lambda source: agent
+        result = self._result(self.engine._request(self.source))
+        self.assertEqual(agent.requests,
+                         [(b"GET", b"http://camera/image.jpg")])
+        return result
+
+    def test_image(self):
+        self.assertEqual(self._request(FakeResponse()), (IMAGE, "image/jpeg"))
+
+    def test_default_content_type(self):
+        self.assertEqual(self._request(FakeResponse(content_type=None)),
+                         (IMAGE, "application/octet-stream"))
+
+    def test_error_status(self):
+        failure = self._request(FakeResponse(404, b"Not Found", b"missing"))
+
+        self.assertEqual(str(failure.value),
+                         "Camera responded with HTTP 404 Not Found")
+
+    def test_empty_response(self):
+        failure = self._request(FakeResponse(body=b""))
+
+        self.assertEqual(str(failure.value), "Empty repsonse from camera")
+
+    def test_agents_shared(self):
+        agent = self.engine._agent(self.source)
+
+        self.assertIs(self.engine._agent(_source()), agent)
+        self.assertIsNot(self.engine._agent(_source(timeout=10)), agent)
+
+        no_verify = self.engine._agent(_source(disable_cert_verification=True))
+        self.assertIsNot(no_verify, agent)
+
+        # All agents use the same connection pool
+        self.assertIs(agent._pool, self.engine._pool)
+        self.assertIs(no_verify._pool, self.engine._pool)
+
+
+class CaptureStatisticsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.statistics = CaptureStatistics()
+
+    def test_empty(self):
+        self.assertIsNone(self.statistics.mean_latency)
+        self.assertEqual(str(self.statistics),
+                         "0 captured (0 bytes), 0 failed (0 timed out), "
+                         "no successful captures")
+
+    def test_latency(self):
+        for latency in (0.5, 0.25, 1.5, 0.75):
+            self.statistics.record_success(latency, 1000)
+
+        self.assertEqual(self.statistics.captures, 4)
+        self.assertEqual(self.statistics.bytes, 4000)
+        self.assertEqual(self.statistics.min_latency, 0.25)
+        self.assertEqual(self.statistics.max_latency, 1.5)
+        self.assertEqual(self.statistics.last_latency, 0.75)
+        self.assertEqual(self.statistics.mean_latency, 0.75)
+
+    def test_failures(self):
+        self.statistics.record_failure(False)
+        self.statistics.record_failure(True)
+
+        self.assertEqual(self.statistics.failures, 2)
+        self.assertEqual(self.statistics.timeouts, 1)
+        self.assertIsNone(self.statistics.mean_latency)
+
+    def test_str(self):
+        self.statistics.record_success(0.5, 100)
+        self.statistics.record_success(1.0, 200)
+        self.statistics.record_failure(True)
+
+        self.assertEqual(str(self.statistics),
+                         "2 captured (300 bytes), 1 failed (1 timed out), "
+                         "latency min 0.500s, mean 0.750s, max 1.000s, "
+                         "last 1.000s")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,225 @@
+"""
+Tests the image spool and the drainer that stores spooled images
+"""
+from datetime import datetime, timedelta
+import os
+import shutil
+import tempfile
+import unittest
+
+from twisted.internet import defer
+from twisted.internet.task import Clock
+
+from image_logger.database import ImageRejectedError
+from image_logger.spool import ImageSpool, SpoolDrainer
+
+
+class FakeDatabase(object):
+    """
+    Records stored images. Can be made to fail, or to reject images.
+    """
+    def __init__(self):
+        self.batches = []
+        self.error = None
+        self.rejected_sources = set()
+
+    def store_images(self, images):
+        if self.error is not None:
+            return defer.fail(self.error)
+        for image in images:
+            if image.source_code in self.rejected_sources:
+                return defer.fail(ImageRejectedError(
+                    "Invalid image source {0}".format(image.source_code)))
+        self.batches.append([image.image_data for image in images])
+        return defer.succeed(None)
+
+    def stored(self):
+        return [data for batch in self.batches for data in batch]
+
+
+class SpoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.time = datetime(2020, 1, 2, 3, 4, 5)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _add(self, spool, count, source="cam"):
+        for i in range(count):
+            self.time += timedelta(seconds=30)
+            spool.add(source, self.time, "image {0}".format(
+                self.time.strftime("%H:%M:%S")).encode('ascii'), "image/jpeg")
+
+    def _files(self):
+        return sorted(os.listdir(self.directory))
+
+
+class ImageSpoolTests(SpoolTestCase):
+
+    def test_round_trip(self):
+        spool = ImageSpool(self.directory)
+        spool.add("cam", self.time, b"\xff\xd8image", None)
+
+        names = spool.pending()
+        self.assertEqual(len(names), 1)
+
+        image = spool.load(names[0])
+        self.assertEqual(image.source_code, "cam")
+        self.assertEqual(image.time_stamp, self.time)
+        self.assertEqual(image.image_data, b"\xff\xd8image")
+        self.assertIsNone(image.mime_type)
+
+        spool.remove(names[0])
+        self.assertEqual(spool.pending(), [])
+        self.assertEqual(self._files(), [])
+
+    def test_capture_order(self):
+        spool = ImageSpool(self.directory)
+        spool.add("cam2", self.time + timedelta(seconds=1), b"2", None)
+        spool.add("cam1", self.time, b"1", None)
+        spool.add("cam3", self.time + timedelta(seconds=1), b"3", None)
+
+        self.assertEqual([spool.load(n).image_data for n in spool.pending()],
+                         [b"1", b"2", b"3"])
+        self.assertEqual(len(spool.pending(2)), 2)
+
+    def test_crash_clean_up(self):
+        spool = ImageSpool(self.directory)
+        self._add(spool, 2)
+        name = spool.pending()[0]
+
+        # Crashed while writing an images data, while writing its metadata
+        # and while removing it
+        for filename in ("a.img.tmp", "b.img", "b.json.tmp", "c.img"):
+            with open(os.path.join(self.directory, filename), 'w') as f:
+                f.write("x")
+        os.unlink(os.path.join(self.directory, name + ".json"))
+
+        spool = ImageSpool(self.directory)
+        self.assertEqual(len(spool.pending()), 1)
+        self.assertEqual(len(self._files()), 2)
+
+    def test_set_aside(self):
+        spool = ImageSpool(self.directory)
+        self._add(spool, 1)
+        name = spool.pending()[0]
+
+        spool.set_aside(name)
+
+        self.assertEqual(spool.pending(), [])
+        self.assertEqual(self._files(), [name + ".img.bad",
+                                         name + ".json.bad"])
+
+        # Set aside images survive a restart
+        ImageSpool(self.directory)
+        self.assertEqual(len(self._files()), 2)
+
+
+class SpoolDrainerTests(SpoolTestCase):
+
+    def setUp(self):
+        super(SpoolDrainerTests, self).setUp()
+        self.spool = ImageSpool(self.directory)
+        self.database = FakeDatabase()
+        self.clock = Clock()
+        self.drainer = SpoolDrainer(self.spool, self.database, batch_size=3,
+                                    min_retry_interval=5,
+                                    max_retry_interval=20, clock=self.clock)
+        self.failures = 0
+
+        def _failed():
+            self.failures += 1
+        self.drainer.storeFailed += _failed
+
+    def test_drains_in_batches(self):
+        self._add(self.spool, 7)
+        expected = [self.spool.load(n).image_data
+                    for n in self.spool.pending()]
+
+        self.drainer.kick()
+
+        self.assertEqual([len(b) for b in self.database.batches], [3, 3, 1])
+        self.assertEqual(self.database.stored(), expected)
+        self.assertEqual(self._files(), [])
+
+    def test_unreadable_image_set_aside(self):
+        self._add(self.spool, 3)
+        name = self.spool.pending()[1]
+        with open(os.path.join(self.directory, name + ".json"), 'w') as f:
+            f.write("{not json")
+
+        self.drainer.kick()
+
+        self.assertEqual(len(self.database.stored()), 2)
+        self.assertEqual(self._files(), [name + ".img.bad",
+                                         name + ".json.bad"])
+
+    def test_rejected_image_set_aside(self):
+        self._add(self.spool, 2)
+        self._add(self.spool, 1, "unknown")
+        self._add(self.spool, 3)
+        bad = self.spool.pending()[2]
+
+        self.database.rejected_sources.add("unknown")
+        self.drainer.kick()
+
+        # The first batch is stored one image at a time to find the bad one.
+        # Later batches are unaffected.
+        self.assertEqual([len(b) for b in self.database.batches],
+                         [1, 1, 3])
+        self.assertEqual(self._files(), [bad + ".img.bad", bad + ".json.bad"])
+        self.assertEqual(self.failures, 0)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_retry_backoff(self):
+        self._add(self.spool, 2)
+        self.database.error = Exception("connection lost")
+
+        self.drainer.kick()
+        self.assertEqual(self.failures, 1)
+
+        # Nothing happens until the retry is due
+        self.drainer.kick()
+        self.clock.advance(4)
+        self.assertEqual(self.failures, 1)
+
+        delays = []
+        for i in range(4):
+            delays.append(self.clock.getDelayedCalls()[0].getTime()
+                          - self.clock.seconds())
+            self.clock.advance(delays[-1])
+
+        self.assertEqual(delays, [1, 10, 20, 20])
+        self.assertEqual(self.failures, 5)
+
+        # Nothing is lost or set aside while the database is unavailable
+        self.assertEqual(len(self.spool.pending()), 2)
+        self.assertEqual(self.database.stored(), [])
+
+        self.database.error = None
+        self.clock.advance(20)
+
+        self.assertEqual(len(self.database.stored()), 2)
+        self.assertEqual(self._files(), [])
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+        # Backoff starts over after the database recovers
+        self._add(self.spool, 1)
+        self.database.error = Exception("connection lost")
+        self.drainer.kick()
+        self.assertEqual(self.clock.getDelayedCalls()[0].getTime()
+                         - self.clock.seconds(), 5)
+
+    def test_stop_cancels_retry(self):
+        self._add(self.spool, 1)
+        self.database.error = Exception("connection lost")
+        self.drainer.kick()
+
+        self.drainer.stop()
+
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
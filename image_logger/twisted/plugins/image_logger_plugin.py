@@ -5,11 +5,14 @@ except ImportError:
     from configparser import ConfigParser
 from zope.interface import implementer
 from datetime import datetime
+import os
+import tempfile
 
 from twisted.python import usage
 from twisted.plugin import IPlugin
 from twisted.application.service import IServiceMaker
 
+from image_logger.capture import CameraSource, DEFAULT_TIMEOUT
 from image_logger.service import ImageLoggerService
 
 __author__ = 'david'
@@ -38,6 +41,7 @@ class ZXWPushClientServiceMaker(object):
         S_RABBITMQ = 'rabbitmq'
         S_SCHEDULE = 'schedule'
         S_CAMERA = 'camera'
+        S_SPOOL = 'spool'
 
         config = ConfigParser()
         config.read([filename])
@@ -84,17 +88,51 @@ class ZXWPushClientServiceMaker(object):
         sunrise_time_t = datetime.strptime(sunrise_time, "%H:%M").time()
         sunset_time_t = datetime.strptime(sunset_time, "%H:%M").time()
 
-        camera_url = config.get(S_CAMERA, "camera_url")
-        image_source_code = config.get(S_CAMERA, "image_source")
-        disable_cert_verification = config.getboolean(
-                S_CAMERA, "disable_ssl_certificate_verification")
+        # The camera section plus any additional camera_ sections. Images
+        # captured without a source (from older versions) are stored against
+        # the camera section's image source.
+        cameras = [S_CAMERA] + [
+            x for x in config.sections()
+            if x.startswith(S_CAMERA + "_")]
+        default_image_source = config.get(S_CAMERA, "image_source")
+
+        camera_sources = []
+        for camera in cameras:
+            interval = capture_interval
+            if config.has_option(camera, "capture_interval"):
+                interval = config.getint(camera, "capture_interval")
+
+            timeout = DEFAULT_TIMEOUT
+            if config.has_option(camera, "timeout"):
+                timeout = config.getfloat(camera, "timeout")
+
+            camera_sources.append(CameraSource(
+                config.get(camera, "image_source"),
+                config.get(camera, "camera_url"),
+                interval,
+                config.getboolean(camera,
+                                  "disable_ssl_certificate_verification"),
+                timeout))
+
+        spool_directory = os.path.join(tempfile.gettempdir(),
+                                       "zxweather_image_logger_spool")
+        spool_batch_size = 10
+        max_retry_interval = 300
+        if config.has_section(S_SPOOL):
+            if config.has_option(S_SPOOL, "directory"):
+                spool_directory = config.get(S_SPOOL, "directory")
+            if config.has_option(S_SPOOL, "batch_size"):
+                spool_batch_size = config.getint(S_SPOOL, "batch_size")
+            if config.has_option(S_SPOOL, "max_retry_interval"):
+                max_retry_interval = config.getint(S_SPOOL,
+                                                   "max_retry_interval")
 
         return dsn, mq_host, mq_port, mq_exchange, mq_user, mq_password, \
-            mq_vhost, capture_interval, daylight_only, sunrise_time_t, \
-            sunset_time_t, use_solar_sensors, station_code, camera_url, \
-            image_source_code, disable_cert_verification, calculate_schedule, \
-            latitude, longitude, timezone,  elevation, sunrise_offset, \
-            sunset_offset, take_detected_sunrise_picture
+            mq_vhost, daylight_only, sunrise_time_t, \
+            sunset_time_t, use_solar_sensors, station_code, camera_sources, \
+            calculate_schedule, latitude, longitude, timezone,  elevation, sunrise_offset, \
+            sunset_offset, take_detected_sunrise_picture, spool_directory, \
+            spool_batch_size, max_retry_interval, default_image_source
 
     def makeService(self, options):
         """
@@ -104,21 +142,22 @@ class ZXWPushClientServiceMaker(object):
         """
 
         dsn, mq_host, mq_port, mq_exchange, mq_user, mq_password, \
-            mq_vhost, capture_interval, daylight_only, sunrise_time, \
-            sunset_time, use_solar_sensors, station_code, camera_url, \
-            image_source_code, disable_cert_verification, calculate_schedule, \
-            latitude, longitude, timezone,  elevation, sunrise_offset, \
-            sunset_offset, take_detected_sunrise_picture\
+            mq_vhost, daylight_only, sunrise_time, \
+            sunset_time, use_solar_sensors, station_code, camera_sources, \
+            calculate_schedule, latitude, longitude, timezone,  elevation, sunrise_offset, \
+            sunset_offset, take_detected_sunrise_picture, spool_directory, \
+            spool_batch_size, max_retry_interval, default_image_source \
             = self._readConfigFile(options['config-file'])
 
         svc = ImageLoggerService(dsn, station_code, mq_host, mq_port,
                                  mq_exchange, mq_user, mq_password, mq_vhost,
-                                 capture_interval, daylight_only, sunrise_time,
-                                 sunset_time, use_solar_sensors, camera_url,
-                                 image_source_code, disable_cert_verification,
+                                 daylight_only, sunrise_time,
+                                 sunset_time, use_solar_sensors, camera_sources,
                                  calculate_schedule, latitude,  longitude,
                                  timezone, elevation, sunrise_offset,
-                                 sunset_offset, take_detected_sunrise_picture)
+                                 sunset_offset, take_detected_sunrise_picture,
+                                 spool_directory, spool_batch_size,
+                                 max_retry_interval, default_image_source)
 
         # All OK. Go get the service.
         return svc
@@ -0,0 +1,174 @@
+# coding=utf-8
+"""
+Loads sample data for plotting a month at a time. A single query fetches the
+month along with the week before it and the month, day, hourly rainfall and
+7-day data sets are all sliced out of that.
+"""
+from bisect import bisect_left
+from datetime import date, timedelta
+
+from day_charts import COL_TIMESTAMP, COL_SOLAR_RADIATION
+
+__author__ = 'David Goodwin'
+
+# Raw (unrounded) rainfall used for the hourly rainfall totals. This follows
+# the chart columns in each row.
+COL_RAW_RAINFALL = COL_SOLAR_RADIATION + 1
+
+_MONTH_QUERY = """
+select s.time_stamp,
+       round(s.temperature::numeric,2),
+       round(s.dew_point::numeric, 1),
+       round(s.apparent_temperature::numeric, 1),
+       round(s.wind_chill::numeric,1),
+       s.relative_humidity,
+       round(coalesce(s.mean_sea_level_pressure, s.absolute_pressure)::numeric,2),
+       round(s.indoor_temperature::numeric,2),
+       s.indoor_relative_humidity,
+       round(s.rainfall::numeric, 1),
+       round(s.average_wind_speed::numeric,2),
+       round(s.gust_wind_speed::numeric,2),
+       s.wind_direction,
+       s.time_stamp::time - (st.sample_interval * '1 minute'::interval) as prev_sample_time,
+       coalesce((s.time_stamp - lag(s.time_stamp) over (order by s.time_stamp))
+                > ((st.sample_interval * 2) * '1 minute'::interval),
+                true) as gap,
+       ds.average_uv_index as uv_index,
+       ds.solar_radiation,
+       s.rainfall
+from sample s
+inner join station st on st.station_id = s.station_id
+left outer join davis_sample ds on ds.sample_id = s.sample_id
+where lower(st.code) = lower(%(station)s)
+  and s.time_stamp >= %(start)s
+  and s.time_stamp < %(end)s
+order by s.time_stamp"""
+
+# 604800 seconds as used by the 7-day charts
+_WEEK = timedelta(days=7)
+
+
+class MonthData(object):
+    """
+    Samples for a month (plus the week before it) in the layout expected by
+    the chart modules
+    """
+
+    def __init__(self, year, month, rows):
+        """
+        :param year: Year
+        :type year: int
+        :param month: Month
+        :type month: int
+        :param rows: Query results ordered by timestamp
+        :type rows: list
+        """
+        self._month_start = date(year, month, 1)
+        self._rows = rows
+        self._timestamps = [row[COL_TIMESTAMP] for row in rows]
+
+    def _date_index(self, day):
+        # Index of the first row on or after the specified date. Dates are
+        # taken from each timestamp in the sessions time zone.
+        lo = 0
+        hi = len(self._rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._timestamps[mid].date() < day:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _day_range(self, day):
+        return self._date_index(day), \
+            self._date_index(day + timedelta(days=1))
+
+    def days(self):
+        """
+        Returns the dates in the month that have samples
+        :rtype: list[date]
+        """
+        days = []
+        i = self._date_index(self._month_start)
+        while i < len(self._rows):
+            day = self._timestamps[i].date()
+            days.append(day)
+            i = self._date_index(day + timedelta(days=1))
+        return days
+
+    def month_rows(self):
+        """
+        Rows for the month data file
+        """
+        return [row[:COL_RAW_RAINFALL]
+                for row in self._rows[self._date_index(self._month_start):]]
+
+    def day_rows(self, day):
+        """
+        Rows for the 1-day data file. Timestamps are converted to times.
+        """
+        start, end = self._day_range(day)
+        return [(row[COL_TIMESTAMP].time(),) +
+                tuple(row[COL_TIMESTAMP + 1:COL_RAW_RAINFALL])
+                for row in self._rows[start:end]]
+
+    def day_rainfall(self, day):
+        """
+        Total rainfall for each hour of the day that has samples
+        :return: (hour, rainfall) tuples
+        :rtype: list
+        """
+        start, end = self._day_range(day)
+
+        hours = {}
+        for row in self._rows[start:end]:
+            hour = row[COL_TIMESTAMP].hour
+            rain = row[COL_RAW_RAINFALL]
+            hours[hour] = hours.get(hour, 0) + (rain if rain is not None
+                                                else 0)
+        return sorted(hours.items())
+
+    def seven_day_rows(self, day):
+        """
+        Rows for the 7-day data file for a day: the week ending with the last
+        sample of the day.
+        """
+        start, end = self._day_range(day)
+        if start == end:
+            return []
+
+        max_ts = self._timestamps[end - 1]
+        start = bisect_left(self._timestamps, max_ts - _WEEK)
+        return [row[:COL_RAW_RAINFALL] for row in self._rows[start:end]]
+
+
+def load_month(cur, station_code, year, month):
+    """
+    Loads all samples needed to plot the month and day charts for a month
+    with a single query.
+
+    :param cur: Database cursor
+    :param station_code: Station to load samples for
+    :type station_code: str
+    :param year: Year
+    :type year: int
+    :param month: Month
+    :type month: int
+    :rtype: MonthData
+    """
+    month_start = date(year, month, 1)
+    if month == 12:
+        month_end = date(year + 1, 1, 1)
+    else:
+        month_end = date(year, month + 1, 1)
+
+    # An extra day is loaded ahead of the 7-day window so the first sample in
+    # it has a previous sample to detect gaps against.
+    cur.execute(_MONTH_QUERY, {
+        "station": station_code,
+        "start": month_start - _WEEK - timedelta(days=1),
+        "end": month_end
+    })
+
+    return MonthData(year, month, cur.fetchall())
@@ -3,42 +3,96 @@ from gnuplot import plot_graph, plot_rainfall
 
 __author__ = 'David Goodwin'
 
+# Columns in sample data rows. The day, 7-day and month data sets all use this
+# layout.
+COL_TIMESTAMP = 0
+COL_TEMPERATURE = 1
+COL_DEW_POINT = 2
+COL_APPARENT_TEMP = 3
+COL_WIND_CHILL = 4
+COL_REL_HUMIDITY = 5
+COL_ABS_PRESSURE = 6
+COL_INDOOR_TEMP = 7
+COL_INDOOR_REL_HUMIDITY = 8
+COL_RAINFALL = 9
+COL_AVG_WIND_SPEED = 10
+COL_GUST_WIND_SPEED = 11
+COL_WIND_DIRECTION = 12
+COL_PREV_TIMESTAMP = 13
+COL_PREV_SAMPLE_MISSING = 14
+COL_UV_INDEX = 15
+COL_SOLAR_RADIATION = 16
+
+
+def write_1_day_data(dest_dir, weather_data):
+    """
+    Writes the data file for the 1-day charts
+    :param dest_dir: Directory to write the data file to
+    :type dest_dir: str
+    :param weather_data: Samples for the day. Timestamps are times only.
+    :type weather_data: list
+    :return: X range for the charts
+    :rtype: tuple
+    """
+    data_filename = dest_dir + 'gnuplot_data.dat'
 
-def charts_1_day(cur, dest_dir, plot_date, station_code, output_format,
-                 hw_config, write_data):
+    # Write the data file for gnuplot
+    file_data = [
+        '# timestamp\ttemperature\tdew point\tapparent temperature\twind chill'
+        '\trelative humidity\tpressure\tindoor temperature\t'
+        'indoor relative humidity\trainfall\taverage wind speed\t'
+        'gust wind speed\twind direction\tuv index\tsolar radiation\n']
+
+    FORMAT_STRING = '{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6}\t{7}\t{8}\t{9}\t' \
+                    '{10}\t{11}\t{12}\t{13}\t{14}\n'
+    for record in weather_data:
+        # Handle missing data.
+        if record[COL_PREV_SAMPLE_MISSING]:
+            file_data.append(
+                FORMAT_STRING.format(str(record[COL_PREV_TIMESTAMP]),
+                                     '?', '?', '?', '?', '?', '?', '?', '?',
+                                     '?', '?', '?', '?', '?', '?'))
+
+        file_data.append(FORMAT_STRING.format(str(record[COL_TIMESTAMP]),
+                                              str(record[COL_TEMPERATURE]),
+                                              str(record[COL_DEW_POINT]),
+                                              str(record[COL_APPARENT_TEMP]),
+                                              str(record[COL_WIND_CHILL]),
+                                              str(record[COL_REL_HUMIDITY]),
+                                              str(record[COL_ABS_PRESSURE]),
+                                              str(record[COL_INDOOR_TEMP]),
+                                              str(record[
+                                                  COL_INDOOR_REL_HUMIDITY]),
+                                              str(record[COL_RAINFALL]),
+                                              str(record[COL_AVG_WIND_SPEED]),
+                                              str(record[COL_GUST_WIND_SPEED]),
+                                              str(record[COL_WIND_DIRECTION]),
+                                              str(record[COL_UV_INDEX]),
+                                              str(record[COL_SOLAR_RADIATION])
+        ))
+    x_range = (str(weather_data[0][COL_TIMESTAMP]),
+               str(weather_data[len(weather_data) - 1][COL_TIMESTAMP]))
+
+    file = open(data_filename, 'w+')
+    file.writelines(file_data)
+    file.close()
+
+    return x_range
+
+
+def charts_1_day(dest_dir, x_range, output_format, hw_config):
     """
-    Charts detailing weather for a single day (24 hours max)
-    :param cur: Database cursor
+    Charts detailing weather for a single day (24 hours max). The data file
+    must have already been written by write_1_day_data.
     :param dest_dir: Directory to write images to
-    :param plot_date: Date to chart for
-    :type plot_date: date
-    :param station_code: The code for the station to plot data for
-    :type station_code: str
+    :param x_range: X range for the charts as returned by write_1_day_data
+    :type x_range: tuple
     :param output_format: Output format (eg, "pngcairo")
     :type output_format: str
     :param hw_config: station hardware configuration details
     :type hw_config: weatherplot.StationConfig
     """
 
-    # Columns in the query
-    COL_TIMESTAMP = 0
-    COL_TEMPERATURE = 1
-    COL_DEW_POINT = 2
-    COL_APPARENT_TEMP = 3
-    COL_WIND_CHILL = 4
-    COL_REL_HUMIDITY = 5
-    COL_ABS_PRESSURE = 6
-    COL_INDOOR_TEMP = 7
-    COL_INDOOR_REL_HUMIDITY = 8
-    COL_RAINFALL = 9
-    COL_AVG_WIND_SPEED = 10
-    COL_GUST_WIND_SPEED = 11
-    COL_WIND_DIRECTION = 12
-    COL_PREV_TIMESTAMP = 13
-    COL_PREV_SAMPLE_MISSING = 14
-    COL_UV_INDEX = 15
-    COL_SOLAR_RADIATION = 16
-
     # Fields in the data file for gnuplot. Field numbers start at 1.
     FIELD_TIMESTAMP = COL_TIMESTAMP + 1
     FIELD_TEMPERATURE = COL_TEMPERATURE + 1
@@ -58,92 +112,6 @@ def charts_1_day(cur, dest_dir, plot_date, station_code, output_format,
 
     data_filename = dest_dir + 'gnuplot_data.dat'
 
-    if write_data:
-        cur.execute("""select cur.time_stamp::time,
-       round(cur.temperature::numeric,2),
-       round(cur.dew_point::numeric, 1),
-       round(cur.apparent_temperature::numeric, 1),
-       round(cur.wind_chill::numeric,1),
-       cur.relative_humidity,
-       round(coalesce(cur.mean_sea_level_pressure, cur.absolute_pressure)::numeric,2),
-       round(cur.indoor_temperature::numeric,2),
-       cur.indoor_relative_humidity,
-       round(cur.rainfall::numeric, 1),
-       round(cur.average_wind_speed::numeric,2),
-       round(cur.gust_wind_speed::numeric,2),
-       cur.wind_direction,
-       cur.time_stamp::time - (s.sample_interval * '1 minute'::interval) as prev_sample_time,
-       CASE WHEN (cur.time_stamp - prev.time_stamp) > ((s.sample_interval * 2) * '1 minute'::interval) THEN
-          true
-       else
-          false
-       end as gap,
-       ds.average_uv_index as uv_index,
-       ds.solar_radiation
-from sample cur
-inner join sample prev on prev.time_stamp = (
-        select max(x.time_stamp)
-        from sample x
-        where x.time_stamp < cur.time_stamp
-        and x.station_id = cur.station_id) and prev.station_id = cur.station_id
-inner join station s on s.station_id = cur.station_id
-left outer join davis_sample ds on ds.sample_id = cur.sample_id
-where date(cur.time_stamp) = %s
-  and lower(s.code) = lower(%s)
-order by cur.time_stamp""", (plot_date, station_code,))
-        weather_data = cur.fetchall()
-
-        # Write the data file for gnuplot
-        file_data = [
-            '# timestamp\ttemperature\tdew point\tapparent temperature\twind chill'
-            '\trelative humidity\tpressure\tindoor temperature\t'
-            'indoor relative humidity\trainfall\taverage wind speed\t'
-            'gust wind speed\twind direction\tuv index\tsolar radiation\n']
-
-        FORMAT_STRING = '{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6}\t{7}\t{8}\t{9}\t' \
-                        '{10}\t{11}\t{12}\t{13}\t{14}\n'
-        for record in weather_data:
-            # Handle missing data.
-            if record[COL_PREV_SAMPLE_MISSING]:
-                file_data.append(
-                    FORMAT_STRING.format(str(record[COL_PREV_TIMESTAMP]),
-                                         '?', '?', '?', '?', '?', '?', '?', '?',
-                                         '?', '?', '?', '?', '?', '?'))
-
-            file_data.append(FORMAT_STRING.format(str(record[COL_TIMESTAMP]),
-                                                  str(record[COL_TEMPERATURE]),
-                                                  str(record[COL_DEW_POINT]),
-                                                  str(record[COL_APPARENT_TEMP]),
-                                                  str(record[COL_WIND_CHILL]),
-                                                  str(record[COL_REL_HUMIDITY]),
-                                                  str(record[COL_ABS_PRESSURE]),
-                                                  str(record[COL_INDOOR_TEMP]),
-                                                  str(record[
-                                                      COL_INDOOR_REL_HUMIDITY]),
-                                                  str(record[COL_RAINFALL]),
-                                                  str(record[COL_AVG_WIND_SPEED]),
-                                                  str(record[COL_GUST_WIND_SPEED]),
-                                                  str(record[COL_WIND_DIRECTION]),
-                                                  str(record[COL_UV_INDEX]),
-                                                  str(record[COL_SOLAR_RADIATION])
-            ))
-        x_range = (str(weather_data[0][COL_TIMESTAMP]),
-                   str(weather_data[len(weather_data) - 1][COL_TIMESTAMP]))
-
-        file = open(data_filename, 'w+')
-        file.writelines(file_data)
-        file.close()
-    else:
-        cur.execute("""select min(cur.time_stamp)::time as min_ts, max(cur.time_stamp)::time as max_ts
-        from sample cur
-inner join station s on s.station_id = cur.station_id
-where date(cur.time_stamp) = %s
-  and lower(s.code) = lower(%s)""", (plot_date, station_code,))
-        weather_data = cur.fetchone()
-
-        x_range = (str(weather_data[0]),
-                   str(weather_data[1]))
-
     for large in [True, False]:
         # Create both large and regular versions of each plot.
         if output_format == "txt":
@@ -323,32 +291,17 @@ where date(cur.time_stamp) = %s
                        output_format=output_format)
 
 
-def rainfall_1_day(cur, dest_dir, plot_date, station_code, output_format):
+def write_1_day_rainfall_data(dest_dir, rainfall_data):
     """
-    Plots 1-day hourly rainfall charts
-    :param cur: Database cursor
-    :param dest_dir: Directory to write images to
-    :param plot_date: Date to chart for
-    :type plot_date: date
-    :param station_code: The code for the station to plot data for
-    :type station_code: str
-    :param output_format: Output format (eg, "pngcairo")
-    :type output_format: str
+    Writes the data file for the 1-day hourly rainfall charts
+    :param dest_dir: Directory to write the data file to
+    :type dest_dir: str
+    :param rainfall_data: (hour, rainfall) for each hour with samples
+    :type rainfall_data: list
+    :return: If there was no rain
+    :rtype: bool
     """
-
-    cur.execute("""
-    select extract(hour from s.time_stamp)::integer  as time_stamp,
-       coalesce(sum(s.rainfall),0)
-    from sample s
-    inner join station st on st.station_id = s.station_id
-    where date(s.time_stamp) = %s
-      and lower(st.code) = lower(%s)
-    group by extract(hour from s.time_stamp)
-    order by extract(hour from s.time_stamp)
-    """, (plot_date, station_code,))
-    rainfall_data = cur.fetchall()
-
-    # Columns in the query
+    # Columns in rainfall_data
     COL_HOUR = 0
     COL_RAINFALL = 1
 
@@ -367,7 +320,21 @@ def rainfall_1_day(cur, dest_dir, plot_date, station_code, output_format):
     data_file.writelines(file_data)
     data_file.close()
 
-    empty = rain_total == 0.0
+    return rain_total == 0.0
+
+
+def rainfall_1_day(dest_dir, empty, output_format):
+    """
+    Plots 1-day hourly rainfall charts. The data file must have already been
+    written by write_1_day_rainfall_data.
+    :param dest_dir: Directory to write images to
+    :param empty: If there was no rain
+    :type empty: bool
+    :param output_format: Output format (eg, "pngcairo")
+    :type output_format: str
+    """
+
+    data_filename = dest_dir + 'hourly_rainfall.dat'
 
     for large in [True, False]:
         # Create both large and regular versions of each plot.
@@ -392,15 +359,66 @@ def rainfall_1_day(cur, dest_dir, plot_date, station_code, output_format):
                       output_format=output_format)
 
 
-def charts_7_days(cur, dest_dir, plot_date, station_code, output_format,
-                 hw_config, write_data):
+def write_7_day_data(dest_dir, temperature_data):
     """
-    Creates 7-day charts for the specified day
-    :param cur: Database cursor
+    Writes the data file for the 7-day charts
+    :param dest_dir: Directory to write the data file to
+    :type dest_dir: str
+    :param temperature_data: Samples for the 7 days
+    :type temperature_data: list
+    :return: X range for the charts
+    :rtype: tuple
+    """
+    data_filename = dest_dir + '7-day_gnuplot_data.dat'
+
+    # Write the data file for gnuplot
+    file_data = [
+        '# timestamp\ttemperature\tdew point\tapparent temperature\twind chill'
+        '\trelative humidity\tpressure\tindoor temperature'
+        '\tindoor relative humidity\trainfall\taverage wind speed\tgust wind speed\twind direction\tuv index\tsolar radiation\n']
+    FORMAT_STRING = '{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6}\t{7}\t{8}\t{9}\t' \
+                    '{10}\t{11}\t{12}\t{13}\t{14}\n'
+    for record in temperature_data:
+        # Handle missing data.
+        if record[COL_PREV_SAMPLE_MISSING]:
+            file_data.append(
+                FORMAT_STRING.format(str(record[COL_PREV_TIMESTAMP]),
+                                     '?', '?', '?', '?', '?', '?', '?', '?',
+                                     '?', '?', '?', '?', '?', '?'))
+
+        file_data.append(FORMAT_STRING.format(str(record[COL_TIMESTAMP]),
+                                              str(record[COL_TEMPERATURE]),
+                                              str(record[COL_DEW_POINT]),
+                                              str(record[COL_APPARENT_TEMP]),
+                                              str(record[COL_WIND_CHILL]),
+                                              str(record[COL_REL_HUMIDITY]),
+                                              str(record[COL_ABS_PRESSURE]),
+                                              str(record[COL_INDOOR_TEMP]),
+                                              str(record[
+                                                  COL_INDOOR_REL_HUMIDITY]),
+                                              str(record[COL_RAINFALL]),
+                                              str(record[COL_AVG_WIND_SPEED]),
+                                              str(record[COL_GUST_WIND_SPEED]),
+                                              str(record[COL_WIND_DIRECTION]),
+                                              str(record[COL_UV_INDEX]),
+                                              str(record[COL_SOLAR_RADIATION])
+        ))
+    x_range = (str(temperature_data[0][COL_TIMESTAMP]),
+               str(temperature_data[len(temperature_data) - 1][COL_TIMESTAMP]))
+    file = open(data_filename, 'w+')
+    file.writelines(file_data)
+    file.close()
+
+    return x_range
+
+
+def charts_7_days(dest_dir, x_range, output_format, hw_config):
+    """
+    Creates 7-day charts for a day. The data file must have already been
+    written by write_7_day_data.
     :param dest_dir: Destination directory
-    :param plot_date: Date to plot for
-    :param station_code: The code for the station to plot data for
-    :type station_code: str
+    :param x_range: X range for the charts as returned by write_7_day_data
+    :type x_range: tuple
     :param output_format: The output format (eg, "pngcairo")
     :type output_format: str
     :param hw_config: station hardware configuration details
@@ -409,25 +427,6 @@ def charts_7_days(cur, dest_dir, plot_date, station_code, output_format,
 
     data_filename = dest_dir + '7-day_gnuplot_data.dat'
 
-    # Columns in the query
-    COL_TIMESTAMP = 0
-    COL_TEMPERATURE = 1
-    COL_DEW_POINT = 2
-    COL_APPARENT_TEMP = 3
-    COL_WIND_CHILL = 4
-    COL_REL_HUMIDITY = 5
-    COL_ABS_PRESSURE = 6
-    COL_INDOOR_TEMP = 7
-    COL_INDOOR_REL_HUMIDITY = 8
-    COL_RAINFALL = 9
-    COL_AVG_WIND_SPEED = 10
-    COL_GUST_WIND_SPEED = 11
-    COL_WIND_DIRECTION = 12
-    COL_PREV_TIMESTAMP = 13
-    COL_PREV_SAMPLE_MISSING = 14
-    COL_UV_INDEX = 15
-    COL_SOLAR_RADIATION = 16
-
     # Fields in the data file for gnuplot. Field numbers start at 1.
     FIELD_TIMESTAMP = COL_TIMESTAMP + 1
 
@@ -448,94 +447,6 @@ def charts_7_days(cur, dest_dir, plot_date, station_code, output_format,
     FIELD_UV_INDEX = 15
     FIELD_SOLAR_RADIATION = 16
 
-    if write_data:
-        cur.execute("""select s.time_stamp,
-       round(s.temperature::numeric,2),
-       round(s.dew_point::numeric, 1),
-       round(s.apparent_temperature::numeric, 1),
-       round(s.wind_chill::numeric,1),
-       s.relative_humidity,
-       round(coalesce(s.mean_sea_level_pressure, s.absolute_pressure)::numeric,2),
-       round(s.indoor_temperature::numeric,2),
-       s.indoor_relative_humidity,
-       round(s.rainfall::numeric, 1),
-       round(s.average_wind_speed::numeric,2),
-       round(s.gust_wind_speed::numeric,2),
-       s.wind_direction,
-       s.time_stamp::time - (st.sample_interval * '1 minute'::interval) as prev_sample_time,
-       CASE WHEN (s.time_stamp - prev.time_stamp) > ((st.sample_interval * 2) * '1 minute'::interval) THEN
-          true
-       else
-          false
-       end as gap,
-       ds.average_uv_index as uv_index,
-       ds.solar_radiation
-from (select max(time_stamp) as ts, station_id from sample where time_stamp::date = %s group by station_id) as max_ts
-inner join sample s on s.time_stamp <= max_ts.ts
-        and s.time_stamp >= (max_ts.ts - (604800 * '1 second'::interval))
-inner join sample prev on prev.station_id = s.station_id
-        and prev.time_stamp = (
-            select max(ps.time_stamp)
-            from sample ps
-            where ps.time_stamp < s.time_stamp
-            and ps.station_id = s.station_id)
-inner join station st on st.station_id = s.station_id
-left outer join davis_sample ds on ds.sample_id = s.sample_id
-where lower(st.code) = lower(%s)
-order by s.time_stamp
-""", (plot_date, station_code,))
-        temperature_data = cur.fetchall()
-
-        # Write the data file for gnuplot
-        file_data = [
-            '# timestamp\ttemperature\tdew point\tapparent temperature\twind chill'
-            '\trelative humidity\tpressure\tindoor temperature'
-            '\tindoor relative humidity\trainfall\taverage wind speed\tgust wind speed\twind direction\tuv index\tsolar radiation\n']
-        FORMAT_STRING = '{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6}\t{7}\t{8}\t{9}\t' \
-                        '{10}\t{11}\t{12}\t{13}\t{14}\n'
-        for record in temperature_data:
-            # Handle missing data.
-            if record[COL_PREV_SAMPLE_MISSING]:
-                file_data.append(
-                    FORMAT_STRING.format(str(record[COL_PREV_TIMESTAMP]),
-                                         '?', '?', '?', '?', '?', '?', '?', '?',
-                                         '?', '?', '?', '?', '?', '?'))
-
-            file_data.append(FORMAT_STRING.format(str(record[COL_TIMESTAMP]),
-                                                  str(record[COL_TEMPERATURE]),
-                                                  str(record[COL_DEW_POINT]),
-                                                  str(record[COL_APPARENT_TEMP]),
-                                                  str(record[COL_WIND_CHILL]),
-                                                  str(record[COL_REL_HUMIDITY]),
-                                                  str(record[COL_ABS_PRESSURE]),
-                                                  str(record[COL_INDOOR_TEMP]),
-                                                  str(record[
-                                                      COL_INDOOR_REL_HUMIDITY]),
-                                                  str(record[COL_RAINFALL]),
-                                                  str(record[COL_AVG_WIND_SPEED]),
-                                                  str(record[COL_GUST_WIND_SPEED]),
-                                                  str(record[COL_WIND_DIRECTION]),
-                                                  str(record[COL_UV_INDEX]),
-                                                  str(record[COL_SOLAR_RADIATION])
-            ))
-        x_range = (str(temperature_data[0][COL_TIMESTAMP]),
-                   str(temperature_data[len(temperature_data) - 1][COL_TIMESTAMP]))
-        file = open(data_filename, 'w+')
-        file.writelines(file_data)
-        file.close()
-    else:
-        cur.execute("""select min(s.time_stamp) as min_ts, max(s.time_stamp) as max_ts
-        from (select max(time_stamp) as ts, station_id from sample where time_stamp::date = %s group by station_id) as max_ts
-        inner join sample s on s.time_stamp <= max_ts.ts
-                and s.time_stamp >= (max_ts.ts - (604800 * '1 second'::interval))
-        inner join station st on st.station_id = s.station_id
-        left outer join davis_sample ds on ds.sample_id = s.sample_id
-        where lower(st.code) = lower(%s)
-        """, (plot_date, station_code,))
-        weather_data = cur.fetchone()
-        x_range = (str(weather_data[0]),
-                   str(weather_data[1]))
-
     for large in [True, False]:
         # Create both large and regular versions of each plot.
         if output_format == "txt":
@@ -1,43 +1,243 @@
 from __future__ import print_function
 import subprocess
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 __author__ = 'David Goodwin'
 
 
 gnuplot_binary = r'gnuplot'
 
-# TODO: rewrite this garbage to be less garbage-y
-
-gnuplot_instance = None
+# Number of gnuplot processes to run scripts on
 gnuplot_count = 1
-next_gnuplot = 0
+
+# Printed by gnuplot (to stderr) once it has finished running a script
+_PLOT_COMPLETE = "--plot complete--"
+
+_pool = None
+_current_batch = None
+
+
+class _Batch(object):
+    """
+    A group of scripts. The batches callback is called once the batch has been
+    closed and every script in it has finished running.
+    """
+
+    def __init__(self, on_complete):
+        self._on_complete = on_complete
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._closed = False
+
+    def add(self):
+        with self._lock:
+            self._pending += 1
+
+    def script_finished(self):
+        with self._lock:
+            self._pending -= 1
+            done = self._closed and self._pending == 0
+        if done:
+            self._on_complete()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            done = self._pending == 0
+        if done:
+            self._on_complete()
+
+
+class _Worker(object):
+    """
+    A gnuplot process. Output on stderr is watched for the marker printed
+    after each script so the worker can be returned to the pool.
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._process = subprocess.Popen([gnuplot_binary],
+                                         stdin=subprocess.PIPE,
+                                         stderr=subprocess.PIPE)
+        self.batch = None
+        self.busy = False
+        self.exited = False
+
+        reader = threading.Thread(target=self._read_output)
+        reader.daemon = True
+        reader.start()
+
+    def run(self, script, batch):
+        self.batch = batch
+        self.busy = True
+        try:
+            self._process.stdin.write(script)
+            self._process.stdin.flush()
+        except (IOError, OSError):
+            # gnuplot has died. The output reader will clean up.
+            pass
+
+    def _read_output(self):
+        for line in iter(self._process.stderr.readline, b''):
+            line = line.decode('utf-8', 'replace').rstrip()
+            if line == _PLOT_COMPLETE:
+                self._pool.script_finished(self)
+            elif line:
+                # Errors and warnings from the script
+                print(line)
+
+        self.exited = True
+        self._pool.worker_exited(self)
+
+    def close(self):
+        try:
+            self._process.stdin.close()
+        except (IOError, OSError):
+            pass  # Already gone
+        self._process.wait()
+
+
+class _GnuplotPool(object):
+    """
+    Runs scripts on a fixed number of gnuplot processes. Submitting a script
+    blocks until a process is free so the amount of outstanding work is
+    bounded.
+    """
+
+    def __init__(self, process_count):
+        self._idle = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._running = 0
+        self._all_finished = threading.Condition(self._lock)
+        self._closing = False
+
+        for _ in range(process_count):
+            self._add_worker()
+
+    def _add_worker(self):
+        worker = _Worker(self)
+        self._workers.append(worker)
+        self._idle.put(worker)
+
+    def run(self, script, batch):
+        worker = self._idle.get()
+        while worker.exited:
+            # Died while idle. Its replacement is already in the queue.
+            worker = self._idle.get()
+
+        with self._lock:
+            self._running += 1
+        if batch is not None:
+            batch.add()
+        worker.run(script, batch)
+
+    def _finished(self, worker):
+        batch = worker.batch
+        worker.batch = None
+        worker.busy = False
+
+        with self._lock:
+            self._running -= 1
+            self._all_finished.notify_all()
+
+        if batch is not None:
+            batch.script_finished()
+
+    def script_finished(self, worker):
+        self._finished(worker)
+        self._idle.put(worker)
+
+    def worker_exited(self, worker):
+        if self._closing:
+            return
+
+        # gnuplot died. Whatever it was running is lost - replace it so the
+        # pool doesn't shrink.
+        print("gnuplot exited unexpectedly. Restarting.")
+        self._workers.remove(worker)
+        if worker.busy:
+            self._finished(worker)
+        self._add_worker()
+
+    def wait(self):
+        with self._lock:
+            while self._running > 0:
+                self._all_finished.wait(1)
+
+    def close(self):
+        self.wait()
+        self._closing = True
+        workers = self._workers
+        self._workers = []
+        for worker in workers:
+            worker.close()
 
 
 def run_plot_script(script):
     """
-    Runs a gnuplot script
+    Runs a gnuplot script. This blocks until a gnuplot process is free to run
+    the script but does not wait for it to finish.
     :param script: Script to run
     :type script: bytes
     """
-    global gnuplot_instance, gnuplot_binary, next_gnuplot, gnuplot_count
-    if gnuplot_instance is None:
-
-        gnuplot_instance = []
-
-        while len(gnuplot_instance) < gnuplot_count:
-            ins = subprocess.Popen([gnuplot_binary], stdin=subprocess.PIPE)
-            gnuplot_instance.append(ins)
+    global _pool
+    if _pool is None:
+        _pool = _GnuplotPool(gnuplot_count)
 
     to_run = bytearray()
     to_run.extend(b'reset\n')
     to_run.extend(script)
     to_run.extend(b'\n')
+    to_run.extend('print "{0}"\n'.format(_PLOT_COMPLETE).encode('utf-8'))
+
+    _pool.run(bytes(to_run), _current_batch)
+
+
+def start_batch(on_complete):
+    """
+    Starts a batch of scripts. on_complete will be called (possibly from
+    another thread) once end_batch() has been called and all scripts run
+    since start_batch() have finished.
+    :param on_complete: Function to call when the batch is complete
+    :type on_complete: callable
+    """
+    global _current_batch
+    _current_batch = _Batch(on_complete)
+
+
+def end_batch():
+    """
+    Ends the current batch of scripts
+    """
+    global _current_batch
+    batch = _current_batch
+    _current_batch = None
+    if batch is not None:
+        batch.close()
 
-    gnuplot_instance[next_gnuplot].stdin.write(bytes(to_run))
 
-    next_gnuplot += 1
-    if next_gnuplot >= gnuplot_count:
-        next_gnuplot = 0
+def wait():
+    """
+    Waits for all scripts that have been run to finish.
+    """
+    if _pool is not None:
+        _pool.wait()
+
+
+def close():
+    """
+    Waits for all scripts to finish then terminates the gnuplot processes.
+    """
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
 
 
 def get_file_extension(output_format):
@@ -1,19 +1,75 @@
-from datetime import date
 from gnuplot import plot_graph
+from day_charts import COL_TIMESTAMP, COL_TEMPERATURE, COL_DEW_POINT, \
+    COL_APPARENT_TEMP, COL_WIND_CHILL, COL_REL_HUMIDITY, COL_ABS_PRESSURE, \
+    COL_INDOOR_TEMP, COL_INDOOR_REL_HUMIDITY, COL_RAINFALL, \
+    COL_AVG_WIND_SPEED, COL_GUST_WIND_SPEED, COL_WIND_DIRECTION, \
+    COL_PREV_TIMESTAMP, COL_PREV_SAMPLE_MISSING, COL_UV_INDEX, \
+    COL_SOLAR_RADIATION
 
 __author__ = 'David Goodwin'
 
 
-def month_charts(cur, dest_dir, month, year, station_code, output_format,
-                 hw_config, write_data):
+def write_month_data(dest_dir, weather_data):
     """
-    Charts detailing weather for a single month.
-    :param cur: Database cursor
+    Writes the data file for the month charts
+    :param dest_dir: Directory to write the data file to
+    :type dest_dir: str
+    :param weather_data: Samples for the month
+    :type weather_data: list
+    :return: X range for the charts
+    :rtype: tuple
+    """
+    data_filename = dest_dir + 'gnuplot_data.dat'
+
+    # Write the data file for gnuplot
+    file_data = [
+        '# timestamp\ttemperature\tdew point\tapparent temperature\twind chill'
+        '\trelative humidity\tabsolute pressure\tindoor temperature'
+        '\tindoor relative humidity\trainfall\taverage wind speed\tgust wind speed\twind direction\tuv index\tsolar radiation\n']
+
+    FORMAT_STRING = '{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6}\t{7}\t{8}\t{9}\t' \
+                    '{10}\t{11}\t{12}\t{13}\t{14}\n'
+    for record in weather_data:
+        # Handle missing data.
+        if record[COL_PREV_SAMPLE_MISSING]:
+            file_data.append(
+                FORMAT_STRING.format(str(record[COL_PREV_TIMESTAMP]),
+                                     '?', '?', '?', '?', '?', '?', '?', '?',
+                                     '?', '?', '?', '?', '?', '?'))
+
+        file_data.append(FORMAT_STRING.format(str(record[COL_TIMESTAMP]),
+                                              str(record[COL_TEMPERATURE]),
+                                              str(record[COL_DEW_POINT]),
+                                              str(record[COL_APPARENT_TEMP]),
+                                              str(record[COL_WIND_CHILL]),
+                                              str(record[COL_REL_HUMIDITY]),
+                                              str(record[COL_ABS_PRESSURE]),
+                                              str(record[COL_INDOOR_TEMP]),
+                                              str(record[
+                                                  COL_INDOOR_REL_HUMIDITY]),
+                                              str(record[COL_RAINFALL]),
+                                              str(record[COL_AVG_WIND_SPEED]),
+                                              str(record[COL_GUST_WIND_SPEED]),
+                                              str(record[COL_WIND_DIRECTION]),
+                                              str(record[COL_UV_INDEX]),
+                                              str(record[COL_SOLAR_RADIATION])
+        ))
+    x_range = (str(weather_data[0][COL_TIMESTAMP]),
+               str(weather_data[len(weather_data) - 1][COL_TIMESTAMP]))
+    file = open(data_filename, 'w+')
+    file.writelines(file_data)
+    file.close()
+
+    return x_range
+
+
+def month_charts(dest_dir, x_range, output_format, hw_config):
+    """
+    Charts detailing weather for a single month. The data file must have
+    already been written by write_month_data.
     :param dest_dir: Directory to write images to
-    :param month: Month to chart for
-    :param year: Year to chart for
-    :param station_code: The code for the station to plot data for
-    :type station_code: str
+    :param x_range: X range for the charts as returned by write_month_data
+    :type x_range: tuple
     :param output_format: The output format (eg, "pngcairo")
     :type output_format: str
     :param hw_config: station hardware configuration details
@@ -23,25 +79,6 @@ def month_charts(cur, dest_dir, month, year, station_code, output_format,
 
     data_filename = dest_dir + 'gnuplot_data.dat'
 
-    # Columns in the query
-    COL_TIMESTAMP = 0
-    COL_TEMPERATURE = 1
-    COL_DEW_POINT = 2
-    COL_APPARENT_TEMP = 3
-    COL_WIND_CHILL = 4
-    COL_REL_HUMIDITY = 5
-    COL_ABS_PRESSURE = 6
-    COL_INDOOR_TEMP = 7
-    COL_INDOOR_REL_HUMIDITY = 8
-    COL_RAINFALL = 9
-    COL_AVG_WIND_SPEED = 10
-    COL_GUST_WIND_SPEED = 11
-    COL_WIND_DIRECTION = 12
-    COL_PREV_TIMESTAMP = 13
-    COL_PREV_SAMPLE_MISSING = 14
-    COL_UV_INDEX = 15
-    COL_SOLAR_RADIATION = 16
-
     # Fields in the data file for gnuplot. Field numbers start at 1.
     FIELD_TIMESTAMP = COL_TIMESTAMP + 1
 
@@ -62,94 +99,6 @@ def month_charts(cur, dest_dir, month, year, station_code, output_format,
     FIELD_UV_INDEX = 15
     FIELD_SOLAR_RADIATION = 16
 
-    if write_data:
-        cur.execute("""select cur.time_stamp,
-       round(cur.temperature::numeric, 2),
-       round(cur.dew_point::numeric, 1),
-       round(cur.apparent_temperature::numeric, 1),
-       round(cur.wind_chill::numeric,1),
-       cur.relative_humidity,
-       round(coalesce(cur.mean_sea_level_pressure, cur.absolute_pressure)::numeric,2),
-       round(cur.indoor_temperature::numeric,2),
-       cur.indoor_relative_humidity,
-       round(cur.rainfall::numeric, 1),
-       round(cur.average_wind_speed::numeric,2),
-       round(cur.gust_wind_speed::numeric,2),
-       cur.wind_direction,
-       cur.time_stamp::time - (s.sample_interval * '1 minute'::interval) as prev_sample_time,
-       CASE WHEN (cur.time_stamp - prev.time_stamp) > ((s.sample_interval * 2) * '1 minute'::interval) THEN
-          true
-       else
-          false
-       end as gap,
-       ds.average_uv_index as uv_index,
-       ds.solar_radiation
-from sample cur
-inner join sample prev on prev.station_id = cur.station_id
-        and prev.time_stamp = (
-            select max(pm.time_stamp)
-            from sample pm
-            where pm.time_stamp < cur.time_stamp
-            and pm.station_id = cur.station_id)
-inner join station s on s.station_id = cur.station_id
-left outer join davis_sample ds on ds.sample_id = cur.sample_id
-where date(date_trunc('month',cur.time_stamp)) = %s
-  and lower(s.code) = lower(%s)
-order by cur.time_stamp""", (date(year, month, 1), station_code))
-
-        weather_data = cur.fetchall()
-
-        # Write the data file for gnuplot
-        file_data = [
-            '# timestamp\ttemperature\tdew point\tapparent temperature\twind chill'
-            '\trelative humidity\tabsolute pressure\tindoor temperature'
-            '\tindoor relative humidity\trainfall\taverage wind speed\tgust wind speed\twind direction\tuv index\tsolar radiation\n']
-
-        FORMAT_STRING = '{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6}\t{7}\t{8}\t{9}\t' \
-                        '{10}\t{11}\t{12}\t{13}\t{14}\n'
-        for record in weather_data:
-            # Handle missing data.
-            if record[COL_PREV_SAMPLE_MISSING]:
-                file_data.append(
-                    FORMAT_STRING.format(str(record[COL_PREV_TIMESTAMP]),
-                                         '?', '?', '?', '?', '?', '?', '?', '?',
-                                         '?', '?', '?', '?', '?', '?'))
-
-            file_data.append(FORMAT_STRING.format(str(record[COL_TIMESTAMP]),
-                                                  str(record[COL_TEMPERATURE]),
-                                                  str(record[COL_DEW_POINT]),
-                                                  str(record[COL_APPARENT_TEMP]),
-                                                  str(record[COL_WIND_CHILL]),
-                                                  str(record[COL_REL_HUMIDITY]),
-                                                  str(record[COL_ABS_PRESSURE]),
-                                                  str(record[COL_INDOOR_TEMP]),
-                                                  str(record[
-                                                      COL_INDOOR_REL_HUMIDITY]),
-                                                  str(record[COL_RAINFALL]),
-                                                  str(record[COL_AVG_WIND_SPEED]),
-                                                  str(record[COL_GUST_WIND_SPEED]),
-                                                  str(record[COL_WIND_DIRECTION]),
-                                                  str(record[COL_UV_INDEX]),
-                                                  str(record[COL_SOLAR_RADIATION])
-            ))
-        x_range = (str(weather_data[0][COL_TIMESTAMP]),
-                   str(weather_data[len(weather_data) - 1][COL_TIMESTAMP]))
-        file = open(data_filename, 'w+')
-        file.writelines(file_data)
-        file.close()
-    else:
-        cur.execute("""select min(cur.time_stamp) min_ts, max(cur.time_stamp) as max_ts
-        from sample cur
-        inner join station s on s.station_id = cur.station_id
-        left outer join davis_sample ds on ds.sample_id = cur.sample_id
-        where date(date_trunc('month',cur.time_stamp)) = %s
-          and lower(s.code) = lower(%s)""", (date(year, month, 1), station_code))
-
-        weather_data = cur.fetchone()
-
-        x_range = (str(weather_data[0]),
-                   str(weather_data[1]))
-
     for large in [True, False]:
         # Create both large and regular versions of each plot.
         if large:
@@ -0,0 +1,202 @@
+# coding=utf-8
+"""
+Works out which charts need to be replotted. Each day and month directory
+gets a stamp file per output format recording how many samples its charts were
+plotted from and the time of the latest one. A day only needs replotting if
+either has changed for it and the week before it (which the 7-day charts
+cover), and a month only if either has changed for the days in it. Samples
+uploaded or pushed from elsewhere keep the time they were downloaded at the
+origin so that can't be used to tell when samples arrived here.
+"""
+import calendar
+import os
+from datetime import date, timedelta
+
+__author__ = 'David Goodwin'
+
+month_name = {1: 'january',
+              2: 'february',
+              3: 'march',
+              4: 'april',
+              5: 'may',
+              6: 'june',
+              7: 'july',
+              8: 'august',
+              9: 'september',
+              10: 'october',
+              11: 'november',
+              12: 'december'}
+
+STAMP_FILENAME = ".weatherplot_{0}"
+
+# The 7-day charts for a day reach back into the seventh day before it
+_SEVEN_DAY_LOOKBACK = 7
+
+
+def month_directory(station_dir, year, month):
+    """
+    Directory the charts for a month are written to
+    """
+    return "{0}{1}/{2}/".format(station_dir, year, month_name[month])
+
+
+def day_directory(station_dir, day):
+    """
+    Directory the charts for a day are written to
+    """
+    return "{0}{1}/".format(month_directory(station_dir, day.year, day.month),
+                            day.day)
+
+
+def _stamp_filename(directory, output_format):
+    return os.path.join(directory, STAMP_FILENAME.format(output_format))
+
+
+def read_stamp(directory, output_format):
+    """
+    Returns the stamp recorded when charts in the specified format were last
+    plotted in a directory or None if they never have been.
+    """
+    try:
+        with open(_stamp_filename(directory, output_format), 'r') as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def write_stamp(directory, output_format, stamp):
+    """
+    Records that charts in the specified format have been plotted in a
+    directory.
+
+    :param directory: Chart directory
+    :type directory: str
+    :param output_format: Output format the charts were plotted in
+    :type output_format: str
+    :param stamp: Stamp for the samples the charts were plotted from as
+        planned by plan_station(). Any change to it will cause a replot.
+    :type stamp: str
+    """
+    with open(_stamp_filename(directory, output_format), 'w') as f:
+        f.write(stamp + "\n")
+
+
+def get_day_summaries(cur, station_code):
+    """
+    Returns the number of samples and the time of the latest sample for each
+    day with data.
+
+    :param cur: Database cursor
+    :param station_code: Station to get summaries for
+    :type station_code: str
+    :return: Sample count and unix timestamp of the latest sample for each day
+    :rtype: dict[date, (int, int)]
+    """
+    cur.execute("""select date(s.time_stamp),
+       count(*),
+       max(s.time_stamp)
+from sample s
+inner join station st on st.station_id = s.station_id
+where lower(st.code) = lower(%s)
+group by date(s.time_stamp)
+order by date(s.time_stamp)""", (station_code,))
+
+    return dict((row[0], (row[1], calendar.timegm(row[2].utctimetuple())))
+                for row in cur.fetchall())
+
+
+def _stamp(summaries):
+    # Stamp for charts plotted from the days with the specified summaries
+    return "{0} {1}".format(sum(count for count, _ in summaries),
+                            max(latest for _, latest in summaries))
+
+
+class MonthPlan(object):
+    """
+    Charts that need plotting for a single month
+    """
+
+    def __init__(self, year, month):
+        self.year = year
+        self.month = month
+
+        # Formats the month charts need plotting in
+        self.month_formats = set()
+
+        # Stamp to write once the month charts are plotted
+        self.month_stamp = None
+
+        # Formats the charts for each day need plotting in
+        self.days = {}
+
+        # Stamps to write once the charts for each day are plotted
+        self.day_stamps = {}
+
+    @property
+    def empty(self):
+        return not self.month_formats and not self.days
+
+
+def plan_station(station_dir, day_summaries, output_formats, start_dates,
+                 force=False):
+    """
+    Works out which day and month charts are out of date for a station.
+
+    :param station_dir: Directory charts for the station are written to
+    :type station_dir: str
+    :param day_summaries: Samples in each day as returned by
+        get_day_summaries()
+    :type day_summaries: dict[date, (int, int)]
+    :param output_formats: Formats charts are plotted in
+    :type output_formats: list[str]
+    :param start_dates: Date to start plotting from for each output format
+    :type start_dates: dict[str, date]
+    :param force: Replot everything on or after the start dates regardless of
+        when it was last plotted
+    :type force: bool
+    :return: Months with charts needing plotting in date order
+    :rtype: list[MonthPlan]
+    """
+    plans = {}
+
+    def _plan(day):
+        key = (day.year, day.month)
+        if key not in plans:
+            plans[key] = MonthPlan(day.year, day.month)
+        return plans[key]
+
+    month_summaries = {}
+    for day, summary in day_summaries.items():
+        month_summaries.setdefault((day.year, day.month), []).append(summary)
+
+    for day in sorted(day_summaries.keys()):
+        # Everything the days charts cover
+        stamp = _stamp([day_summaries[day - timedelta(days=i)]
+                        for i in range(_SEVEN_DAY_LOOKBACK + 1)
+                        if day - timedelta(days=i) in day_summaries])
+
+        directory = day_directory(station_dir, day)
+        for output_format in output_formats:
+            if day < start_dates[output_format]:
+                continue
+
+            if force or read_stamp(directory, output_format) != stamp:
+                plan = _plan(day)
+                plan.days.setdefault(day, set()).add(output_format)
+                plan.day_stamps[day] = stamp
+
+    for (year, month), summaries in month_summaries.items():
+        stamp = _stamp(summaries)
+
+        directory = month_directory(station_dir, year, month)
+        for output_format in output_formats:
+            start = start_dates[output_format]
+            if (year, month) < (start.year, start.month):
+                continue
+
+            if force or read_stamp(directory, output_format) != stamp:
+                plan = _plan(date(year, month, 1))
+                plan.month_formats.add(output_format)
+                plan.month_stamp = stamp
+
+    return [plans[key] for key in sorted(plans.keys())]
@@ -10,27 +10,18 @@ import datetime
 import psycopg2
 import time
 import signal
-from day_charts import charts_1_day, charts_7_days, rainfall_1_day
+from datasets import load_month
+from day_charts import charts_1_day, charts_7_days, rainfall_1_day, \
+    write_1_day_data, write_1_day_rainfall_data, write_7_day_data
 import gnuplot
-from month_charts import month_charts
+from month_charts import month_charts, write_month_data
+from planner import month_name, month_directory, day_directory, \
+    get_day_summaries, plan_station, write_stamp
 
 __author__ = 'David Goodwin'
 
 # TODO: Refactor this entire program. Its a horrible mess.
 
-month_name = {1: 'january',
-              2: 'february',
-              3: 'march',
-              4: 'april',
-              5: 'may',
-              6: 'june',
-              7: 'july',
-              8: 'august',
-              9: 'september',
-              10: 'october',
-              11: 'november',
-              12: 'december'}
-
 
 class StationConfig(object):
     def __init__(self, hw_type, config_data):
@@ -79,183 +70,133 @@ def handler(signum, frame):
 signal.signal(signal.SIGINT, handler)
 
 
-def plot_day(dest_dir, cur, plot_date, station_code, start_date, output_format,
-             hw_config, write_data):
+def _stamp_on_complete(directory, output_format, stamp):
+    # Called from a gnuplot reader thread once all charts in the batch have
+    # been plotted
+    def _complete():
+        write_stamp(directory, output_format, stamp)
+    return _complete
+
+
+def plot_day(station_dir, data, plot_date, station_code, output_formats,
+             hw_config, stamp):
     """
-    Plots charts for a single day.
+    Plots charts for a single day. The data files are written once and then
+    the charts plotted in each output format.
 
-    :param dest_dir: Directory to write charts to
-    :type dest_dir: str
-    :param cur: Database cursor
+    :param station_dir: Directory charts for the station are written to
+    :type station_dir: str
+    :param data: Samples for the month the day is in
+    :type data: MonthData
     :param plot_date: Date to plot for
     :type plot_date: date
     :param station_code: The code for the station to plot data for
     :type station_code: str
-    :param start_date: The date to plot from
-    :type start_date: date
-    :param output_format: The output format (eg, "pngcairo")
-    :type output_format: str
+    :param output_formats: The output formats (eg, "pngcairo") to plot in
+    :type output_formats: set[str]
     :param hw_config: Station hardware configuration
     :type hw_config: StationConfig
-    :param write_data: If data file should be re-written.
-    :type write_data: bool
-    :return:
+    :param stamp: Stamp for the samples the charts are plotted from
+    :type stamp: str
     """
 
     print("Plotting graphs for {0} {1} {2}, station {3}...".format(
         plot_date.year, month_name[plot_date.month], plot_date.day,
-        station_code), end='')
+        station_code))
 
-    if plot_date < start_date:
-        print("Skip")
-        return
-    else:
-        print("")  # newline
-
-    dest_dir += str(plot_date.day) + '/'
+    dest_dir = day_directory(station_dir, plot_date)
 
     try:
         os.makedirs(dest_dir)
     except Exception:
         pass
 
-    # Plot the 1-day charts
-    charts_1_day(cur, dest_dir, plot_date, station_code, output_format,
-                 hw_config, write_data)
-    rainfall_1_day(cur, dest_dir, plot_date, station_code, output_format)
-    charts_7_days(cur, dest_dir, plot_date, station_code, output_format,
-                  hw_config, write_data)
+    x_range_1_day = write_1_day_data(dest_dir, data.day_rows(plot_date))
+    rain_empty = write_1_day_rainfall_data(dest_dir,
+                                           data.day_rainfall(plot_date))
+    x_range_7_day = write_7_day_data(dest_dir,
+                                     data.seven_day_rows(plot_date))
 
-    # Disabled because the graph is fairly unreadable
-    # rainfall_7_day(cur, dest_dir, plot_date, station_code, output_format)
+    for output_format in sorted(output_formats):
+        gnuplot.start_batch(_stamp_on_complete(dest_dir, output_format,
+                                               stamp))
 
+        charts_1_day(dest_dir, x_range_1_day, output_format, hw_config)
+        rainfall_1_day(dest_dir, rain_empty, output_format)
+        charts_7_days(dest_dir, x_range_7_day, output_format, hw_config)
 
-def plot_month(dest_dir, cur, year, month, station_code, start_date,
-               output_format, hw_config, write_data):
-    """
-    Plots charts for a particular month
-    :param dest_dir:
-    :param cur: Database cursor
-    :param year: Year to plot charts for
-    :param month: Month to plot charts for
-    :param station_code: The code for the station to plot data for
-    :type station_code: str
-    :param start_date: The date to plot from
-    :type start_date: date
-    :param output_format: The output format (eg, "pngcairo")
-    :type output_format: str
-    :param hw_config: Station hardware configuration
-    :type hw_config: StationConfig
-    :param write_data: If data should be re-written
-    :type write_data: bool
-    :return: The final date plotted for
-    :rtype: date
-    """
+        # Disabled because the graph is fairly unreadable
+        # rainfall_7_day(cur, dest_dir, plot_date, station_code, output_format)
 
-    print("Plotting graphs for {0} {1}, station {2}...".format(
-        year, month_name[month], station_code), end="")
+        gnuplot.end_batch()
 
-    if year < start_date.year or \
-            (year == start_date.year and month < start_date.month):
-        print("Skip")
-        return
-    else:
-        print("")  # newline
-
-    dest_dir += month_name[month] + '/'
 
-    try:
-        os.makedirs(dest_dir)
-    except Exception:
-        pass  # Directory probably already exists.
-
-    # Generate graphs for the entire month
-    month_charts(cur, dest_dir, month, year, station_code, output_format,
-                 hw_config, write_data)
-
-    # Then deal with each day
-    cur.execute("""select distinct extract(day from s.time_stamp)
-        from sample s
-        inner join station st on st.station_id = s.station_id
-        where extract(year from s.time_stamp) = %s
-          and extract(month from s.time_stamp) = %s
-          and lower(st.code) = lower(%s)
-        order by extract(day from s.time_stamp)""", (year,month, station_code,))
-    days = cur.fetchall()
-
-    final_date = None
-    for day in days:
-        final_date = date(year, month, int(day[0]))
-        plot_day(dest_dir, cur, final_date, station_code, start_date,
-                 output_format, hw_config, write_data)
-    return final_date
-
-
-def plot_year(dest_dir, cur, year, station_code, start_date, output_format, hw_config, write_data):
+def plot_month(station_dir, cur, plan, station_code, hw_config):
     """
-    Plots summary graphs for the specified year. It will then call
-    plot_month() for each month in the database for this year.
-    :param dest_dir: The directory to write graphs to
-    :type dest_dir: string
-    :param cur: Database cursor to use for queries
-    :type cur: cursor
-    :param year: The year to plot charts for
-    :type year: int
+    Plots the out of date charts for a particular month. Samples for the month
+    are loaded once and used for the month charts and every day in it.
+
+    :param station_dir: Directory charts for the station are written to
+    :type station_dir: str
+    :param cur: Database cursor
+    :param plan: Charts needing plotting for the month
+    :type plan: MonthPlan
     :param station_code: The code for the station to plot data for
     :type station_code: str
-    :param start_date: The date to plot from
-    :type start_date: date
-    :param output_format: The output format (eg "pngcairo")
-    :type output_format: str
-    :param hw_config: Hardware configuration data
+    :param hw_config: Station hardware configuration
     :type hw_config: StationConfig
-    :param write_data: If data file should be rewritten
-    :type write_data: bool
-    :return: The final date plotted for
-    :rtype: date
     """
 
-    print("Plotting graphs for {0}, station {1}...".format(year, station_code),
-          end="")
+    print("Plotting graphs for {0} {1}, station {2}...".format(
+        plan.year, month_name[plan.month], station_code))
 
-    if year < start_date.year:
-        print("Skip")
-        return
-    else:
-        print("") # newline
+    # Anything arriving after the plan was made will change the stamps so it
+    # will be picked up next time round
+    data = load_month(cur, station_code, plan.year, plan.month)
 
-    dest_dir += str(year) + '/'
+    if plan.month_formats:
+        dest_dir = month_directory(station_dir, plan.year, plan.month)
 
-    # Generate graphs for the entire year
+        try:
+            os.makedirs(dest_dir)
+        except Exception:
+            pass  # Directory probably already exists.
 
-    # Then deal with each month
-    cur.execute("""select distinct extract(month from s.time_stamp)
-        from sample s
-        inner join station st on st.station_id = s.station_id
-        where extract(year from s.time_stamp) = %s
-          and lower(st.code) = lower(%s)
-        order by extract(month from s.time_stamp)""", (year, station_code,))
-    months = cur.fetchall()
+        month_rows = data.month_rows()
+        if month_rows:
+            x_range = write_month_data(dest_dir, month_rows)
 
-    final_date = None
-    for month in months:
-        final_date = plot_month(dest_dir, cur, year, int(month[0]),
-                                station_code, start_date, output_format,
-                                hw_config, write_data)
+            for output_format in sorted(plan.month_formats):
+                gnuplot.start_batch(_stamp_on_complete(dest_dir, output_format,
+                                                       plan.month_stamp))
+                month_charts(dest_dir, x_range, output_format, hw_config)
+                gnuplot.end_batch()
 
-    return final_date
+    days_with_data = set(data.days())
+    for day in sorted(plan.days.keys()):
+        if day in days_with_data:
+            plot_day(station_dir, data, day, station_code, plan.days[day],
+                     hw_config, plan.day_stamps[day])
 
 
-def plot_for_station(code, cur, dest_dir, start_date, output_format, write_data):
+def plot_for_station(code, cur, dest_dir, start_dates, output_formats, force):
+    """
+    Plots all out of date charts for a station.
 
-    # First up, figure out what years we have
-    cur.execute("""select distinct extract(year from s.time_stamp)
-from sample s
-inner join station st on st.station_id = s.station_id
-where lower(st.code) = lower(%s)
-order by extract(year from s.time_stamp)
-                           """, (code,))
-    years = cur.fetchall()
+    :param code: The code for the station to plot data for
+    :type code: str
+    :param cur: Database cursor
+    :param dest_dir: The directory to write charts to
+    :type dest_dir: str
+    :param start_dates: Date to plot from for each output format
+    :type start_dates: dict[str, date]
+    :param output_formats: Output formats to plot in
+    :type output_formats: list[str]
+    :param force: Replot charts even if they're up to date
+    :type force: bool
+    :return: The most recent date with data
+    :rtype: date
+    """
 
     cur.execute("""select s.station_config as config_data,
        st.code as hw_type
@@ -266,23 +207,34 @@ where lower(s.code) = lower(%s)""", (code,))
 
     hw_config = StationConfig(result[1], result[0])
 
-    dest_dir += code + '/'
+    station_dir = dest_dir + code + '/'
 
-    final_date = None
-    for year in years:
-        final_date = plot_year(dest_dir, cur, int(year[0]), code, start_date,
-                               output_format, hw_config, write_data)
+    day_summaries = get_day_summaries(cur, code)
+
+    plans = plan_station(station_dir, day_summaries, output_formats,
+                         start_dates, force)
+    for plan in plans:
+        plot_month(station_dir, cur, plan, code, hw_config)
 
     print("Plot completed at {0} for station {1}".format(
         datetime.datetime.now(), code))
 
-    return final_date
+    if not day_summaries:
+        return None
+    return max(day_summaries.keys())
+
+
+def _format_key(station_code, output_format, output_formats):
+    # Key for the date to plot from in the --plot-new file
+    if len(output_formats) == 1 and output_format == "pngcairo":
+        return station_code
+    return "{0}_{1}".format(station_code, output_format)
 
 
 def main():
     """
     Program entry point. Parses options, connects to the database and then
-    calls plot_year() once for each year present in the database.
+    plots any out of date charts for each station.
     :return:
     :rtype:
     """
@@ -312,8 +264,9 @@ def main():
                            "Default is 1.")
     parser.add_option("-s", "--station", dest="station_codes", action="append",
                       help="The stations to plot charts for")
-
-    # TODO: Don't rewrite the data file for each format
+    parser.add_option("-F", "--force", dest="force", action="store_true",
+                      default=False,
+                      help="Replot all charts even if they are up to date")
     parser.add_option("-f", "--output-format", dest="output_formats",
                       action="append",
                       help="The formats to generate output in. Default is "
@@ -433,10 +386,8 @@ def main():
 
     for code in options.station_codes:
         for output_format in options.output_formats:
-            if len(options.output_formats) == 1 and output_format == "pngcairo":
-                format_key = code
-            else:
-                format_key = "{0}_{1}".format(code, output_format)
+            format_key = _format_key(code, output_format,
+                                     options.output_formats)
             if format_key not in plot_dates:
                 plot_dates[format_key] = date(1900, 1, 1)
 
@@ -447,23 +398,30 @@ def main():
         exec_start = time.time()
 
         for station in options.station_codes:
-            write_data = True
+            start_dates = {}
             for output_format in options.output_formats:
-                if len(options.output_formats) == 1 and \
-                        output_format == "pngcairo":
-                    format_key = station
-                else:
-                    format_key = "{0}_{1}".format(station, output_format)
-
-                plot_dates[format_key] = plot_for_station(
-                    station, cur, dest_dir, plot_dates[format_key],
-                    output_format, write_data)
-                write_data = False
-
-                # Update stored date for next time
-                if options.plot_new is not None:
-                    with open(options.plot_new, "wb") as update_file:
-                        pickle.dump(plot_dates, update_file)
+                start_dates[output_format] = plot_dates[
+                    _format_key(station, output_format, options.output_formats)]
+
+            final_date = plot_for_station(station, cur, dest_dir, start_dates,
+                                          options.output_formats,
+                                          options.force)
+
+            if final_date is not None:
+                for output_format in options.output_formats:
+                    format_key = _format_key(station, output_format,
+                                             options.output_formats)
+                    plot_dates[format_key] = max(plot_dates[format_key],
+                                                 final_date)
+
+            # Update stored date for next time
+            if options.plot_new is not None:
+                with open(options.plot_new, "wb") as update_file:
+                    pickle.dump(plot_dates, update_file)
+
+        # Data files get rewritten next time round so everything needs to be
+        # finished with them first.
+        gnuplot.wait()
 
         print("Plot completed in {0} seconds".format(time.time() - exec_start))
 
@@ -475,6 +433,7 @@ def main():
                   "terminate.".format(options.replot_pause))
             time.sleep(float(options.replot_pause))
 
+    gnuplot.close()
     print("Finished.")
 
 
@@ -346,9 +346,11 @@ base_syntaxes = [
     ##### UPLOAD #####
     syntax(
         name="upload_syntax",
-        deny_qualifiers=True,
         deny_parameters=True,
-        handler="upload"
+        handler="upload",
+        qualifiers=[
+            qualifier(name="bulk")
+        ]
     ),
 
     ##### LOGOUT #####
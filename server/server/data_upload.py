@@ -3,19 +3,25 @@
 Implements the command for uploading data and all the stuff for processing
 the incoming CSV records.
 """
-from twisted.internet import defer
+from twisted.internet import defer, reactor
 from twisted.python import log
 from server.command import Command
 from server.database import get_station_hw_type, BaseSampleRecord, \
     WH1080SampleRecord, insert_wh1080_sample, BaseLiveRecord, \
     update_base_live, insert_generic_sample, DavisSampleRecord, \
     insert_davis_sample, DavisLiveRecord, update_davis_live, get_station_id, \
-    insert_samples
+    insert_samples, bulk_insert_samples
 
 __author__ = 'david'
 
 # Max-ERR - ERR-010 (next is ERR-011)
 
+# In bulk mode samples are inserted once this many have been received...
+BULK_BATCH_SIZE = 1000
+
+# ... or when no further samples have been received for this many seconds.
+BULK_FLUSH_DELAY = 0.5
+
 
 def _float_or_none(val):
     if val == "Null" or val == "None":
@@ -45,6 +51,7 @@ def _get_base_sample_record(values):
         indoor_temperature = _float_or_none(values[4]),
         indoor_humidity = _int_or_none(values[5]),
         pressure = _float_or_none(values[6]),
+        msl_pressure = None, # Not supplied by clients
         average_wind_speed = _float_or_none(values[7]),
         gust_wind_speed = _float_or_none(values[8]),
         wind_direction = _int_or_none(values[9]),
@@ -138,12 +145,13 @@ def _get_davis_sample_record(values):
     return rec
 
 
-def insert_csv_samples(value_set):
+def _get_sample_tuples(value_set):
     """
-    Inserts CSV sample data.
+    Validates CSV sample data and converts it to the sample tuples expected
+    by insert_samples.
     :type value_set: list
-    :Returns: a failure message or None all wrapped in a Deferred
-    :rtype: Deferred
+    :Returns: List of sample tuples, failure message or None
+    :rtype: list, str
     """
 
     samples = []
@@ -158,9 +166,7 @@ def insert_csv_samples(value_set):
             if len(values) != 20:
                 msg = "# ERR-003: Invalid FOWH1080 sample record - " \
                       "column count not 20. Rejecting."
-                # Yeah, this is stupid - succeeding with a value is failure,
-                # succeeding with nothing is success.
-                return defer.succeed(msg)
+                return None, msg
 
             wh1080 = _get_wh1080_sample_record(values)
 
@@ -172,7 +178,7 @@ def insert_csv_samples(value_set):
                 msg = "# ERR-008: Invalid DAVIS sample record - column count not " \
                       "43. Rejecting."
 
-                return defer.succeed(msg)
+                return None, msg
 
             davis = _get_davis_sample_record(values)
 
@@ -184,9 +190,7 @@ def insert_csv_samples(value_set):
             if len(values) != 13:
                 msg = "# ERR-003: Invalid GENERIC sample record - "\
                       "column count not 13. Rejecting."
-                # Yeah, this is stupid - succeeding with a value is failure,
-                # succeeding with nothing is success.
-                return defer.succeed(msg)
+                return None, msg
 
             samples.append(('GENERIC', station_id, base,))
             #return insert_generic_sample(base)
@@ -194,10 +198,33 @@ def insert_csv_samples(value_set):
         else:
             msg = "# ERR-004: Unsupported hardware type {0}. Record " \
                   "rejected.".format(hw_type)
-            return defer.succeed(msg)
+            return None, msg
+
+    return samples, None
+
+
+def insert_csv_samples(value_set, bulk=False):
+    """
+    Inserts CSV sample data.
+    :type value_set: list
+    :param bulk: Insert the samples in bulk using COPY
+    :type bulk: bool
+    :Returns: a failure message or None all wrapped in a Deferred
+    :rtype: Deferred
+    """
+
+    samples, msg = _get_sample_tuples(value_set)
+
+    if msg is not None:
+        # Yeah, this is stupid - succeeding with a value is failure,
+        # succeeding with nothing is success.
+        return defer.succeed(msg)
 
     log.msg('Insert {0} samples...'.format(len(samples)))
 
+    if bulk:
+        return bulk_insert_samples(samples)
+
     return insert_samples(samples)
 
 
@@ -325,6 +352,16 @@ class UploadCommand(Command):
             self._processSamples()
             return
 
+    def _live_result_handler(self, result):
+        # Unlike _result_handler this leaves the sample lock alone: a live
+        # record finishing says nothing about any sample insert that may
+        # still be in flight.
+        if isinstance(result, str):
+            self.writeLine(result)
+        elif result is not None:
+            for item in result:
+                self.writeLine(item)
+
     def _setErrorCondition(self):
         # Something went wrong inserting a new sample. We will now throw away
         # any existing samples and stop processing new ones.
@@ -333,6 +370,20 @@ class UploadCommand(Command):
         # filled manually by the user editing the database directly.
         self._error = True
         self._samples = []
+        self._cancelFlush()
+
+    def _cancelFlush(self):
+        if self._flush_call is not None and self._flush_call.active():
+            self._flush_call.cancel()
+        self._flush_call = None
+
+    def _flushSamples(self):
+        """
+        Inserts all buffered samples (bulk mode only)
+        """
+        self._flush_call = None
+        self._flush_pending = True
+        self._processSamples()
 
     def _error_handler(self, failure):
         # Something went wrong - probably a database error related to bad
@@ -350,6 +401,18 @@ class UploadCommand(Command):
             # The last sample hasn't been successfully inserted yet.
             return
 
+        if self._bulk and not self._flush_pending:
+            # In bulk mode samples are buffered up until we've got a full
+            # batch or the client stops sending for a moment.
+            if len(self._samples) < BULK_BATCH_SIZE:
+                if self._flush_call is None:
+                    self._flush_call = reactor.callLater(BULK_FLUSH_DELAY,
+                                                         self._flushSamples)
+                return
+            self._cancelFlush()
+
+        self._flush_pending = False
+
         try:
             # We won't insert a sample until the previous insert has
             # completed successfully. This is an alternative to adding a bunch
@@ -360,7 +423,7 @@ class UploadCommand(Command):
             sample_set = self._samples
             self._samples = []
 
-            insert_csv_samples(sample_set).addErrback(
+            insert_csv_samples(sample_set, self._bulk).addErrback(
                 self._error_handler).addCallback(self._result_handler)
         except Exception as e:
             self.writeLine("# ERR-006: " + e.message)
@@ -402,7 +465,7 @@ class UploadCommand(Command):
 
         try:
             insert_csv_live(values).addErrback(
-                self._error_handler).addCallback(self._result_handler)
+                self._error_handler).addCallback(self._live_result_handler)
         except Exception as e:
             self.writeLine("# ERR-006: " + e.message)
 
@@ -429,12 +492,20 @@ class UploadCommand(Command):
 
     def cleanUp(self):
         """  Clean up """
+        self._cancelFlush()
         if self.exit_message is not None:
             self.writeLine(self.exit_message)
 
     def main(self):
         """Entry """
         self.exit_message = "# Finished"
+
+        # In bulk mode samples are buffered and inserted in large batches
+        # using COPY. Confirmations are still sent for each sample.
+        self._bulk = "bulk" in self.qualifiers
+        self._flush_call = None
+        self._flush_pending = False
+
         if not self.authenticated():
             self.exit_message = None
             return
@@ -4,6 +4,7 @@ Functions for querying the database.
 """
 import json
 from collections import namedtuple
+from io import StringIO
 from twisted.enterprise import adbapi
 from twisted.internet import defer
 from twisted.internet import reactor
@@ -11,6 +12,8 @@ from twisted.internet.defer import returnValue
 from twisted.internet.error import ReactorNotRunning
 from twisted.python import log
 
+from server.sample_writer import SampleWriter
+
 __author__ = 'david'
 
 station_code_id = dict()
@@ -457,89 +460,7 @@ def _insert_davis_sample_int(txn, base, davis, station_id):
     :type station_id: int
     """
 
-    # Insert the base sample record.
-    query = """
-        insert into sample(download_timestamp, time_stamp,
-            indoor_relative_humidity, indoor_temperature, relative_humidity,
-            temperature, absolute_pressure, average_wind_speed,
-            gust_wind_speed, wind_direction, rainfall, station_id)
-        values(%s::timestamp at time zone 'gmt',
-               %s::timestamp at time zone 'gmt',
-               %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        returning sample_id
-        """
-    txn.execute(
-        query,
-        (
-            base.download_timestamp,
-            base.time_stamp,
-            base.indoor_humidity,
-            base.indoor_temperature,
-            base.humidity,
-            base.temperature,
-            base.pressure,
-            base.average_wind_speed,
-            base.gust_wind_speed,
-            base.wind_direction,
-            base.rainfall,
-            station_id,
-        )
-    )
-
-    sample_id = txn.fetchone()[0]
-
-    # Now insert the Davis record
-    query = """
-        insert into davis_sample(sample_id, record_time, record_date,
-            high_temperature, low_temperature, high_rain_rate, solar_radiation,
-            wind_sample_count, gust_wind_direction, average_uv_index,
-            evapotranspiration, high_solar_radiation, high_uv_index,
-            forecast_rule_id, leaf_wetness_1, leaf_wetness_2, 
-            leaf_temperature_1, leaf_temperature_2, soil_moisture_1,
-            soil_moisture_2, soil_moisture_3, soil_moisture_4, 
-            soil_temperature_1, soil_temperature_2, soil_temperature_3,
-            soil_temperature_4, extra_temperature_1, extra_temperature_2,
-            extra_temperature_3, extra_humidity_1, extra_humidity_2)
-        values(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 
-               %s, %s, %s, %s, %s, %s, %s, %s,%s, %s, %s, %s, %s, %s, %s)"""
-
-    txn.execute(query,
-                (
-                    sample_id,
-                    davis.record_time,
-                    davis.record_date,
-                    davis.high_temperature,
-                    davis.low_temperature,
-                    davis.high_rain_rate,
-                    davis.solar_radiation,
-                    davis.wind_sample_count,
-                    davis.gust_wind_direction,
-                    davis.average_uv_index,
-                    davis.evapotranspiration,
-                    davis.high_solar_radiation,
-                    davis.high_uv_index,
-                    davis.forecast_rule_id,
-                    davis.leaf_wetness_1,
-                    davis.leaf_wetness_2,
-                    davis.leaf_temperature_1,
-                    davis.leaf_temperature_2,
-                    davis.soil_moisture_1,
-                    davis.soil_moisture_2,
-                    davis.soil_moisture_3,
-                    davis.soil_moisture_4,
-                    davis.soil_temperature_1,
-                    davis.soil_temperature_2,
-                    davis.soil_temperature_3,
-                    davis.soil_temperature_4,
-                    davis.extra_temperature_1,
-                    davis.extra_temperature_2,
-                    davis.extra_temperature_3,
-                    davis.extra_humidity_1,
-                    davis.extra_humidity_2
-                ))
-
-    # Done!
-    return None
+    _insert_davis_samples_int(txn, [(base, davis, station_id)])
 
 
 def _insert_generic_sample_int(txn, data, station_id):
@@ -575,10 +496,77 @@ def _insert_generic_sample_int(txn, data, station_id):
     )
 
 
+# Inserts batches of Davis samples. Timestamps are supplied as strings in GMT
+# which postgres parses.
+_davis_sample_writer = SampleWriter(
+    [
+        ("download_timestamp", "%s::timestamp at time zone 'gmt'"),
+        ("time_stamp", "%s::timestamp at time zone 'gmt'"),
+        ("indoor_relative_humidity", "%s::integer"),
+        ("indoor_temperature", "%s::real"),
+        ("relative_humidity", "%s::integer"),
+        ("temperature", "%s::real"),
+        ("absolute_pressure", "%s::real"),
+        ("average_wind_speed", "%s::real"),
+        ("gust_wind_speed", "%s::real"),
+        ("wind_direction", "%s::integer"),
+        ("rainfall", "%s::real"),
+        ("station_id", "%s::integer"),
+    ],
+    DavisSampleRecord._fields)
+
+
+def _davis_sample_writer_row(base, davis, station_id):
+    """
+    Builds the values for a Davis sample as expected by _davis_sample_writer
+    """
+    return (
+        (
+            base.download_timestamp,
+            base.time_stamp,
+            base.indoor_humidity,
+            base.indoor_temperature,
+            base.humidity,
+            base.temperature,
+            base.pressure,
+            base.average_wind_speed,
+            base.gust_wind_speed,
+            base.wind_direction,
+            base.rainfall,
+            station_id,
+        ),
+        tuple(davis)
+    )
+
+
+def _insert_davis_samples_int(txn, samples):
+    """
+    Inserts a batch of samples for Davis-type stations. If any sample can't be
+    inserted the error is raised so the whole interaction is rolled back as it
+    would be if the samples were inserted one at a time.
+
+    :param txn: Database transaction cursor thing
+    :param samples: List of (base, davis, station_id) tuples
+    :type samples: list[(BaseSampleRecord, DavisSampleRecord, int)]
+    """
+    failed = _davis_sample_writer.insert_samples(
+        txn, [_davis_sample_writer_row(base, davis, station_id)
+              for base, davis, station_id in samples])
+
+    if len(failed) > 0:
+        raise failed[0][1]
+
+
 def _insert_samples_int(txn, samples):
 
     results = []
 
+    # Runs of Davis samples are inserted as a single batch. The batch is
+    # inserted before any other sample so everything still goes in in the
+    # order it was uploaded.
+    davis_samples = []
+    davis_sample_keys = set()
+
     for sample in samples:
         hw_type = sample[0]
         station_id = sample[1]
@@ -587,21 +575,30 @@ def _insert_samples_int(txn, samples):
         station_code = base.station_code
         time_stamp = base.time_stamp
 
-        if _sample_exists(txn, station_id, base.time_stamp):
+        if _sample_exists(txn, station_id, base.time_stamp) or \
+                (station_id, time_stamp) in davis_sample_keys:
             # Sample already exists. Don't bother trying to insert - it will
             # just fail.
             results.append("# WARN-001: Duplicate sample {0} {1}".format(station_code.lower(),
                                                                time_stamp))
         else:
-            if hw_type == 'FOWH1080':
-                _insert_wh1080_sample_int(txn, base, sample[3], station_id)
-            elif hw_type == 'DAVIS':
-                _insert_davis_sample_int(txn, base, sample[3], station_id)
-            elif hw_type == 'GENERIC':
-                _insert_generic_sample_int(txn, base, station_id)
+            if hw_type == 'DAVIS':
+                davis_samples.append((base, sample[3], station_id))
+                davis_sample_keys.add((station_id, time_stamp))
+            else:
+                _insert_davis_samples_int(txn, davis_samples)
+                davis_samples = []
+
+                if hw_type == 'FOWH1080':
+                    _insert_wh1080_sample_int(txn, base, sample[3],
+                                              station_id)
+                elif hw_type == 'GENERIC':
+                    _insert_generic_sample_int(txn, base, station_id)
 
         results.append("CONFIRM {0}\t{1}".format(station_code.lower(), time_stamp))
 
+    _insert_davis_samples_int(txn, davis_samples)
+
     return results
 
 
@@ -619,6 +616,191 @@ def insert_samples(samples):
     )
 
 
+# Columns in the temporary table bulk uploads are loaded into. Base sample
+# columns come first followed by the WH1080 and Davis specific columns.
+_bulk_upload_columns = (
+    ('row_num', 'integer'),
+    ('hw_type', 'varchar(8)'),
+    ('station_id', 'integer'),
+    ('download_timestamp', 'timestamp'),
+    ('time_stamp', 'timestamp'),
+    ('indoor_relative_humidity', 'double precision'),
+    ('indoor_temperature', 'double precision'),
+    ('relative_humidity', 'double precision'),
+    ('temperature', 'double precision'),
+    ('absolute_pressure', 'double precision'),
+    ('average_wind_speed', 'double precision'),
+    ('gust_wind_speed', 'double precision'),
+    ('wind_direction', 'double precision'),
+    ('rainfall', 'double precision'),
+    ('sample_interval', 'integer'),
+    ('record_number', 'integer'),
+    ('last_in_batch', 'boolean'),
+    ('invalid_data', 'boolean'),
+    ('wh1080_wind_direction', 'varchar(3)'),
+    ('total_rain', 'double precision'),
+    ('rain_overflow', 'boolean'),
+) + tuple((f, 'double precision') for f in DavisSampleRecord._fields)
+
+_bulk_upload_column_names = [c[0] for c in _bulk_upload_columns]
+
+
+def _copy_value(value):
+    """
+    Encodes a value for COPY ... FROM in the default text format.
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t")\
+        .replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _bulk_upload_row(row_num, sample):
+    """
+    Builds the temporary table row for a sample tuple as accepted by
+    insert_samples.
+    """
+    hw_type = sample[0]
+    station_id = sample[1]
+    base = sample[2]
+
+    row = [row_num, hw_type, station_id, base.download_timestamp,
+           base.time_stamp, base.indoor_humidity, base.indoor_temperature,
+           base.humidity, base.temperature, base.pressure,
+           base.average_wind_speed, base.gust_wind_speed, base.wind_direction,
+           base.rainfall if hw_type == 'DAVIS' else None]
+
+    if hw_type == 'FOWH1080':
+        wh1080 = sample[3]
+        row += [wh1080.sample_interval, wh1080.record_number,
+                wh1080.last_in_batch, wh1080.invalid_data,
+                wh1080.wind_direction, wh1080.total_rain,
+                wh1080.rain_overflow]
+    else:
+        row += [None] * 7
+
+    if hw_type == 'DAVIS':
+        row += list(sample[3])
+    else:
+        row += [None] * len(DavisSampleRecord._fields)
+
+    return row
+
+
+def _bulk_insert_samples_int(txn, samples):
+    """
+    Inserts a batch of samples using COPY. The samples are loaded into a
+    temporary table then merged into the sample table (skipping any that
+    already exist) followed by the hardware-specific tables.
+
+    Results are the same as for _insert_samples_int: a confirmation for each
+    sample in the order supplied plus a warning for each duplicate.
+    """
+    txn.execute("create temporary table bulk_upload_sample ({0}, "
+                "sample_id integer, duplicate boolean not null default false) "
+                "on commit drop".format(
+                    ", ".join(["{0} {1}".format(c[0], c[1])
+                               for c in _bulk_upload_columns])))
+
+    buf = StringIO()
+    for row_num, sample in enumerate(samples):
+        buf.write(u"\t".join([_copy_value(v) for v in
+                              _bulk_upload_row(row_num, sample)]))
+        buf.write(u"\n")
+    buf.seek(0)
+
+    txn.copy_from(buf, "bulk_upload_sample",
+                  columns=_bulk_upload_column_names)
+
+    # Samples already in the database or appearing earlier in the same batch
+    # are duplicates.
+    txn.execute("""
+        update bulk_upload_sample t set duplicate = true
+        where exists(
+            select 1 from sample s
+            where s.station_id = t.station_id
+              and s.time_stamp = t.time_stamp at time zone 'gmt')
+          or exists(
+            select 1 from bulk_upload_sample p
+            where p.station_id = t.station_id
+              and p.time_stamp = t.time_stamp
+              and p.row_num < t.row_num)
+        returning row_num""")
+    duplicates = set([r[0] for r in txn.fetchall()])
+
+    txn.execute("""
+        with inserted as (
+            insert into sample(download_timestamp, time_stamp,
+                indoor_relative_humidity, indoor_temperature,
+                relative_humidity, temperature, absolute_pressure,
+                average_wind_speed, gust_wind_speed, wind_direction, rainfall,
+                station_id)
+            select download_timestamp at time zone 'gmt',
+                   time_stamp at time zone 'gmt',
+                   indoor_relative_humidity, indoor_temperature,
+                   relative_humidity, temperature, absolute_pressure,
+                   average_wind_speed, gust_wind_speed, wind_direction,
+                   rainfall, station_id
+            from bulk_upload_sample
+            where not duplicate
+            order by station_id, time_stamp
+            returning sample_id, station_id, time_stamp
+        )
+        update bulk_upload_sample t set sample_id = i.sample_id
+        from inserted i
+        where i.station_id = t.station_id
+          and i.time_stamp = t.time_stamp at time zone 'gmt'
+          and not t.duplicate""")
+
+    # WH1080 rainfall is calculated by a trigger from the previous sample so
+    # these must go in in timestamp order.
+    txn.execute("""
+        insert into wh1080_sample(sample_id, sample_interval, record_number,
+            last_in_batch, invalid_data, total_rain, rain_overflow,
+            wind_direction)
+        select sample_id, sample_interval, record_number, last_in_batch,
+               invalid_data, total_rain, rain_overflow, wh1080_wind_direction
+        from bulk_upload_sample
+        where hw_type = 'FOWH1080' and not duplicate
+        order by station_id, time_stamp""")
+
+    txn.execute("""
+        insert into davis_sample(sample_id, {0})
+        select sample_id, {0}
+        from bulk_upload_sample
+        where hw_type = 'DAVIS' and not duplicate
+        order by station_id, time_stamp""".format(
+        ", ".join(DavisSampleRecord._fields)))
+
+    results = []
+    for row_num, sample in enumerate(samples):
+        base = sample[2]
+        station_code = base.station_code.lower()
+        if row_num in duplicates:
+            results.append("# WARN-001: Duplicate sample {0} {1}".format(
+                station_code, base.time_stamp))
+        results.append("CONFIRM {0}\t{1}".format(station_code,
+                                                 base.time_stamp))
+
+    return results
+
+
+def bulk_insert_samples(samples):
+    """
+    Inserts a batch of samples for any supported station type using COPY.
+    This is much faster than insert_samples for large numbers of samples.
+    :param samples: List of sample tuples as for insert_samples
+    :type samples: list
+    :return: Deferred
+    """
+
+    return database_pool.runInteraction(
+        _bulk_insert_samples_int, samples
+    )
+
+
 def insert_wh1080_sample(base_data, wh1080_data):
     """
     Inserts a new sample for WH1080-type stations. This includes a record in
@@ -10,28 +10,43 @@ from server.subscriptions import station_live_updated, new_station_sample, \
 __author__ = 'david'
 
 
-def observer(notify):
+def dispatch_notification(channel, payload):
     """
-    Called when ever notifications are received.
-    :param notify: The notification.
+    Broadcasts a database notification out to all local subscribers.
+    :param channel: Channel the notification was received on
+    :type channel: str
+    :param payload: Notification payload
+    :type payload: str
     """
 
-    if notify.channel == "live_data_updated":
-        station_live_updated(notify.payload)
-    elif notify.channel == "new_sample_id":
-        bits = notify.payload.split(":")
+    if channel == "live_data_updated":
+        station_live_updated(payload)
+    elif channel == "new_sample_id":
+        bits = payload.split(":")
         station_code = bits[0]
         sample_id = bits[1]
         new_station_sample(station_code, sample_id)
-    elif notify.channel == "new_image":
-        new_image(notify.payload)
+    elif channel == "new_image":
+        new_image(payload)
+
+
+def observer(notify):
+    """
+    Called when ever notifications are received.
+    :param notify: The notification.
+    """
+    dispatch_notification(notify.channel, notify.payload)
 
 
-def listener_connect(connection_string):
+def listener_connect(connection_string, notification_handler=None):
     """
     Connects the database notification listener
     :param connection_string: Database connection string
     :type connection_string: str
+    :param notification_handler: Function to receive the channel and payload
+        of each notification. If None notifications are delivered to local
+        subscribers.
+    :type notification_handler: callable
     """
     global _listen_conn, _listen_conn_d, _last_sample_ts
 
@@ -40,7 +55,12 @@ def listener_connect(connection_string):
     _listen_conn_d = _listen_conn.connect(connection_string)
 
     # add a NOTIFY observer
-    _listen_conn.addNotifyObserver(observer)
+    if notification_handler is None:
+        _listen_conn.addNotifyObserver(observer)
+    else:
+        _listen_conn.addNotifyObserver(
+            lambda notify: notification_handler(notify.channel,
+                                                notify.payload))
 
     _listen_conn_d.addCallback(lambda _: _listen_conn.runOperation(
             "listen live_data_updated"))
@@ -10,25 +10,59 @@ __author__ = 'david'
 _instance = None
 
 
-def mq_listener_connect(hostname, port, username, password, vhost, exchange):
+def mq_listener_connect(hostname, port, username, password, vhost, exchange,
+                        live_handler=None):
     global _instance
     _instance = RabbitMqReceiver(username, password, vhost,
-                                 hostname, port, exchange)
+                                 hostname, port, exchange, live_handler)
     _instance.connect()
 
 
+def live_data_received(station_code, body):
+    """
+    Decodes a live data message received from RabbitMQ and broadcasts it out
+    to all local subscribers.
+
+    :param station_code: Station the live data is for
+    :type station_code: str
+    :param body: JSON-encoded live data
+    :type body: str or bytes
+    """
+    data = json.loads(body)
+
+    if data["startDateOfCurrentStorm"] is not None:
+        current_storm_date = datetime.strptime(data["startDateOfCurrentStorm"],
+                                               "%Y-%m-%d").date()
+    else:
+        current_storm_date = None
+
+    data["startDateOfCurrentStorm"] = current_storm_date
+
+    station_live_updated(station_code, data)
+
+
 class RabbitMqReceiver(object):
     """
     Receives live data updates via RabbitMQ
     """
 
-    def __init__(self, username, password, vhost, hostname, port, exchange):
+    def __init__(self, username, password, vhost, hostname, port, exchange,
+                 live_handler=None):
+        """
+        :param live_handler: Function to receive the station code and JSON
+            body of each live data message. If None messages are decoded and
+            delivered to local subscribers.
+        :type live_handler: callable
+        """
         self._username = username
         self._password = password
         self._vhost = vhost
         self._hostname = hostname
         self._port = port
         self._exchange = exchange
+        self._live_handler = live_handler
+        if self._live_handler is None:
+            self._live_handler = live_data_received
 
     def connect(self):
         """
@@ -119,16 +153,6 @@ class RabbitMqReceiver(object):
                 properties.type, properties.app_id
             ))
 
-        data = json.loads(body)
-
-        if data["startDateOfCurrentStorm"] is not None:
-            current_storm_date = datetime.strptime(data["startDateOfCurrentStorm"],
-                                                   "%Y-%m-%d").date()
-        else:
-            current_storm_date = None
-
-        data["startDateOfCurrentStorm"] = current_storm_date
-
-        station_live_updated(station_code, data)
+        self._live_handler(station_code, body)
 
 
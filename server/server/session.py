@@ -5,6 +5,41 @@ _session_tracking_sessions = {}
 
 _session_tracking_total_sessions = 0
 
+# Session counts for other worker processes when running in multi-process mode
+_remote_current_sessions = 0
+_remote_total_sessions = 0
+
+# Function to call whenever the local session counts change
+_session_count_observer = None
+
+
+def _session_counts_changed():
+    if _session_count_observer is not None:
+        _session_count_observer()
+
+
+def set_session_count_observer(observer):
+    """
+    Sets a function to be called whenever a session is registered or ended.
+    :param observer: Function taking no arguments or None
+    """
+    global _session_count_observer
+    _session_count_observer = observer
+
+
+def set_remote_session_counts(current, total):
+    """
+    Sets the session counts for all other worker processes. These are included
+    in the counts returned by get_session_counts().
+    :param current: Current sessions in other processes
+    :type current: int
+    :param total: Total sessions in other processes
+    :type total: int
+    """
+    global _remote_current_sessions, _remote_total_sessions
+    _remote_current_sessions = current
+    _remote_total_sessions = total
+
 def register_session(sid, data=None):
     """
     Registers a new session
@@ -18,6 +53,7 @@ def register_session(sid, data=None):
 
     _session_tracking_sessions[sid] = data
     _session_tracking_total_sessions += 1
+    _session_counts_changed()
 
 def update_session(sid, key, data):
     """
@@ -50,10 +86,11 @@ def end_session(sid):
     """
     global _session_tracking_sessions
     _session_tracking_sessions.pop(sid)
+    _session_counts_changed()
 
-def get_session_counts():
+def get_local_session_counts():
     """
-    Gets session counts
+    Gets session counts for this process only
     :return: Current sessions, Total sessions
     :rtype: int,int
     """
@@ -61,6 +98,16 @@ def get_session_counts():
 
     return len(_session_tracking_sessions), _session_tracking_total_sessions
 
+def get_session_counts():
+    """
+    Gets session counts across all worker processes
+    :return: Current sessions, Total sessions
+    :rtype: int,int
+    """
+    current, total = get_local_session_counts()
+
+    return current + _remote_current_sessions, total + _remote_total_sessions
+
 def get_session_id_list():
     """
     Returns a list of all active sessions
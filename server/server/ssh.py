@@ -72,11 +72,9 @@ class ZxwRealm(object):
             raise Exception("Invalid interface requested in ZxwRealm")
 
 
-def getSSHService(port, private_key_file, public_key_file, passwords_file):
+def getSSHFactory(private_key_file, public_key_file, passwords_file):
     """
-    Gets the zxweatherd SSH Service.
-    :param port: Port to listen on
-    :type port: int
+    Gets the protocol factory for the zxweatherd SSH Service.
     :param private_key_file: Private key filename
     :type private_key_file: str
     :param public_key_file: Public key filename
@@ -98,4 +96,20 @@ def getSSHService(port, private_key_file, public_key_file, passwords_file):
     sshFactory.portal = cred_portal.Portal(ZxwRealm())
     sshFactory.portal.registerChecker(FilePasswordDB(passwords_file))
 
-    return internet.TCPServer(port, sshFactory)
\ No newline at end of file
+    return sshFactory
+
+
+def getSSHService(port, private_key_file, public_key_file, passwords_file):
+    """
+    Gets the zxweatherd SSH Service.
+    :param port: Port to listen on
+    :type port: int
+    :param private_key_file: Private key filename
+    :type private_key_file: str
+    :param public_key_file: Public key filename
+    :type public_key_file: str
+    :param passwords_file: File to read usernames and passwords from
+    :type passwords_file: str
+    """
+    return internet.TCPServer(port, getSSHFactory(
+        private_key_file, public_key_file, passwords_file))
\ No newline at end of file
@@ -16,6 +16,12 @@ class ShellProtocolFactory(Factory):
     def buildProtocol(self, addr):
         return insults.ServerProtocol(ZxweatherShellProtocol, None, self._protocol_name)
 
+def getTCPFactory():
+    """
+    Gets the protocol factory for the raw TCP service.
+    """
+    return ShellProtocolFactory("raw")
+
 def getTCPService(port):
     """
     Listens for commands on a TCP port. The session is setup for non-interactive
@@ -24,4 +30,4 @@ def getTCPService(port):
     :return:
     """
 
-    return internet.TCPServer(port, ShellProtocolFactory("raw"))
+    return internet.TCPServer(port, getTCPFactory())
@@ -10,12 +10,9 @@ from twisted.conch.telnet import TelnetTransport, TelnetBootstrapProtocol
 from server.shell import ZxweatherShellProtocol
 from twisted.internet import  protocol as tiProtocol
 
-def getTelnetService(port):
+def getTelnetFactory():
     """
-    Creates the zxweatherd Telnet service. This allows unauthenticated
-    access to read-only zxweather server functions.
-
-    :param port: Port to listen on.
+    Creates the protocol factory for the zxweatherd Telnet service.
     """
     proto = tiProtocol.ServerFactory()
     proto.protocol = lambda: TelnetTransport(
@@ -23,4 +20,13 @@ def getTelnetService(port):
         insults.ServerProtocol,
         lambda : ZxweatherShellProtocol(None, "telnet")) # Pass 'None' as user (unauthenticated)
 
-    return internet.TCPServer(port, proto)
+    return proto
+
+def getTelnetService(port):
+    """
+    Creates the zxweatherd Telnet service. This allows unauthenticated
+    access to read-only zxweather server functions.
+
+    :param port: Port to listen on.
+    """
+    return internet.TCPServer(port, getTelnetFactory())
@@ -63,12 +63,24 @@ def getWebSocketService(host, port):
     :type port: int
     """
 
+    return internet.TCPServer(port, getWebSocketFactory(host, port))
+
+
+def getWebSocketFactory(host, port):
+    """
+    Gets the protocol factory for the WebSocket service
+    :param host: The hostname the server is available under
+    :type host: str
+    :param port: Port number
+    :type port: int
+    """
+
     txaio.use_twisted()
 
     factory = WebSocketServerFactory("ws://{1}:{0}".format(port, host))
     factory.protocol = WebSocketShellProtocol
 
-    return internet.TCPServer(port, factory)
+    return factory
 
 
 def getWebSocketSecureService(host, port, key, certificate, chain,
@@ -90,6 +102,21 @@ def getWebSocketSecureService(host, port, key, certificate, chain,
     :type ssl_reload_password: str or None
     """
 
+    factory, contextFactory = getWebSocketSecureFactory(
+        host, port, key, certificate, chain, ssl_reload_password)
+
+    return internet.SSLServer(port, factory, contextFactory)
+
+
+def getWebSocketSecureFactory(host, port, key, certificate, chain,
+                              ssl_reload_password):
+    """
+    Gets the protocol factory and SSL context factory for the SSL WebSocket
+    service. Parameters are the same as for getWebSocketSecureService.
+
+    :return: WebSocket protocol factory, SSL context factory
+    """
+
     # To make self-signed keys:
     # openssl genrsa -out server.key 2048
     # openssl req -new -key server.key -out server.csr
@@ -105,7 +132,7 @@ def getWebSocketSecureService(host, port, key, certificate, chain,
 
     factory.protocol = ssl_proto_factory
 
-    return internet.SSLServer(port, factory, contextFactory)
+    return factory, contextFactory
 
 
 class WebSocketShellProtocol(WebSocketServerProtocol, BaseShell):
@@ -0,0 +1,523 @@
+# coding=utf-8
+"""
+Multi-process support for zxweatherd.
+
+In multi-process mode the main zxweatherd process acts as a notification hub.
+It opens all of the listening sockets, receives database notifications and
+live data from RabbitMQ and then starts a number of worker processes. Each
+worker adopts the listening sockets and handles client sessions exactly as
+zxweatherd does in single-process mode. Notifications are fanned out to the
+workers over a local unix socket where each message is a single line of JSON.
+Workers report their session counts back to the hub which shares the totals
+with all other workers so session statistics cover the whole server.
+
+Multi-process mode is only supported on POSIX systems.
+"""
+import json
+import os
+import socket
+import sys
+import tempfile
+
+from twisted.application import internet
+from twisted.application.service import MultiService, Service
+from twisted.internet import reactor, defer
+from twisted.internet.protocol import ServerFactory, ProcessProtocol, \
+    ReconnectingClientFactory
+from twisted.protocols.basic import LineReceiver
+from twisted.python import log
+
+__author__ = 'david'
+
+# Environment variable the worker configuration is passed in. This keeps the
+# database connection string out of the process list.
+WORKER_CONFIG_ENV = "ZXW_WORKER_CONFIG"
+
+# Hub -> Worker messages
+MSG_NOTIFY = "notify"
+MSG_LIVE = "live"
+MSG_REMOTE_SESSIONS = "remote_sessions"
+
+# Worker -> Hub messages
+MSG_SESSIONS = "sessions"
+
+# How long to wait before restarting a worker that has died
+WORKER_RESTART_DELAY = 5
+
+# How long to wait for session changes to settle before reporting counts
+SESSION_REPORT_DELAY = 1
+
+
+def encode_message(message_type, **kwargs):
+    """
+    Encodes a message for transmission between the hub and its workers.
+    :param message_type: Type of message (one of the MSG_ constants)
+    :type message_type: str
+    :param kwargs: Message parameters. Must be JSON serialisable.
+    :rtype: bytes
+    """
+    kwargs["type"] = message_type
+    return json.dumps(kwargs).encode("utf-8")
+
+
+def decode_message(line):
+    """
+    Decodes a message received from the hub or one of its workers
+    :param line: The encoded message
+    :type line: bytes
+    :return: Message type, message parameters
+    :rtype: str, dict
+    """
+    message = json.loads(line.decode("utf-8"))
+    return message.pop("type"), message
+
+
+###############################################################################
+# Hub #########################################################################
+###############################################################################
+
+class HubProtocol(LineReceiver):
+    """
+    The hubs end of a connection to a single worker process.
+    """
+    delimiter = b'\n'
+
+    def __init__(self):
+        self.current_sessions = 0
+        self.total_sessions = 0
+
+    def connectionMade(self):
+        self.factory.worker_connected(self)
+
+    def connectionLost(self, reason=None):
+        self.factory.worker_disconnected(self)
+
+    def lineReceived(self, line):
+        try:
+            message_type, message = decode_message(line)
+        except ValueError:
+            log.msg("Discarding malformed message from worker")
+            return
+
+        if message_type == MSG_SESSIONS:
+            self.current_sessions = message["current"]
+            self.total_sessions = message["total"]
+            self.factory.session_counts_changed()
+
+    def send_message(self, message):
+        """
+        Sends a pre-encoded message to the worker
+        :param message: Message from encode_message()
+        :type message: bytes
+        """
+        self.sendLine(message)
+
+
+class HubFactory(ServerFactory):
+    """
+    Tracks all connected workers and broadcasts notifications to them.
+    """
+    protocol = HubProtocol
+
+    def __init__(self):
+        self._workers = []
+
+        # Total sessions handled by workers that have since disconnected
+        self._retired_total_sessions = 0
+
+    def worker_connected(self, worker):
+        self._workers.append(worker)
+        self.session_counts_changed()
+
+    def worker_disconnected(self, worker):
+        if worker in self._workers:
+            self._workers.remove(worker)
+            self._retired_total_sessions += worker.total_sessions
+            self.session_counts_changed()
+
+    def worker_count(self):
+        """
+        Returns the number of currently connected workers
+        :rtype: int
+        """
+        return len(self._workers)
+
+    def broadcast(self, message):
+        """
+        Sends a message to all connected workers.
+        :param message: Message from encode_message()
+        :type message: bytes
+        """
+        for worker in self._workers:
+            worker.send_message(message)
+
+    def notification_received(self, channel, payload):
+        """
+        Called when a database notification is received. The notification is
+        forwarded to all workers.
+        :param channel: Notification channel
+        :type channel: str
+        :param payload: Notification payload
+        :type payload: str
+        """
+        self.broadcast(encode_message(MSG_NOTIFY, channel=channel,
+                                      payload=payload))
+
+    def live_data_received(self, station_code, body):
+        """
+        Called when live data is received from RabbitMQ. The data is forwarded
+        to all workers undecoded.
+        :param station_code: Station the data is for
+        :type station_code: str
+        :param body: JSON-encoded live data
+        :type body: bytes or str
+        """
+        if isinstance(body, bytes):
+            body = body.decode("utf-8")
+
+        self.broadcast(encode_message(MSG_LIVE, station=station_code,
+                                      body=body))
+
+    def session_counts_changed(self):
+        """
+        Sends every worker the combined session counts of all other workers.
+        """
+        current = sum(w.current_sessions for w in self._workers)
+        total = sum(w.total_sessions for w in self._workers) + \
+            self._retired_total_sessions
+
+        for worker in self._workers:
+            worker.send_message(encode_message(
+                MSG_REMOTE_SESSIONS,
+                current=current - worker.current_sessions,
+                total=total - worker.total_sessions))
+
+
+class WorkerProcessProtocol(ProcessProtocol):
+    """
+    Monitors a worker process, logging its output and restarting it if it
+    exits while the hub is still running.
+    """
+
+    def __init__(self, hub, worker_id):
+        self._hub = hub
+        self.worker_id = worker_id
+        self.ended = defer.Deferred()
+        self._buffers = {1: b'', 2: b''}
+
+    def _log_output(self, fd, data):
+        lines = (self._buffers[fd] + data).split(b'\n')
+        self._buffers[fd] = lines.pop()
+        for line in lines:
+            log.msg("[worker {0}] {1}".format(
+                self.worker_id, line.rstrip().decode("utf-8", "replace")))
+
+    def outReceived(self, data):
+        self._log_output(1, data)
+
+    def errReceived(self, data):
+        self._log_output(2, data)
+
+    def processEnded(self, reason):
+        log.msg("Worker {0} exited: {1}".format(
+            self.worker_id, reason.getErrorMessage()))
+        self.ended.callback(None)
+        self._hub.worker_ended(self)
+
+
+class HubService(MultiService):
+    """
+    The notification hub. Opens all listening sockets, starts the worker
+    processes and forwards notifications to them.
+    """
+
+    def __init__(self, worker_count, worker_config, socket_path=None):
+        """
+        :param worker_count: Number of worker processes to run
+        :type worker_count: int
+        :param worker_config: Configuration passed to each worker. Must
+            contain the database connection string (dsn) and a protocols
+            dictionary mapping protocol names to their configuration.
+        :type worker_config: dict
+        :param socket_path: Filename for the unix socket workers connect to.
+            If None a temporary filename is used.
+        :type socket_path: str
+        """
+        MultiService.__init__(self)
+
+        if socket_path is None:
+            socket_path = os.path.join(
+                tempfile.gettempdir(),
+                "zxweatherd-hub-{0}.sock".format(os.getpid()))
+
+        self._worker_count = worker_count
+        self._worker_config = worker_config
+        self._socket_path = socket_path
+        self._sockets = []
+        self._workers = {}
+        self._running = False
+
+        self.factory = HubFactory()
+
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+        hub_server = internet.UNIXServer(socket_path, self.factory)
+        hub_server.setServiceParent(self)
+
+    def _open_sockets(self):
+        ports = []
+        for name, config in self._worker_config["protocols"].items():
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(('', config["port"]))
+            sock.listen(50)
+            sock.setblocking(False)
+            self._sockets.append(sock)
+            ports.append((name, sock.fileno()))
+        return ports
+
+    def _spawn_worker(self, worker_id):
+        log.msg("Starting worker {0}".format(worker_id))
+
+        config = dict(self._worker_config)
+        config["worker_id"] = worker_id
+        config["hub_socket"] = self._socket_path
+        config["ports"] = self._ports
+
+        # The worker needs to be able to import the server package
+        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(
+            __file__)))
+        env = dict(os.environ)
+        env[WORKER_CONFIG_ENV] = json.dumps(config)
+        env["PYTHONPATH"] = os.pathsep.join(
+            [package_dir] + [p for p in [env.get("PYTHONPATH")] if p])
+
+        child_fds = {0: 'w', 1: 'r', 2: 'r'}
+        for name, fd in self._ports:
+            child_fds[fd] = fd
+
+        proto = WorkerProcessProtocol(self, worker_id)
+        reactor.spawnProcess(
+            proto, sys.executable,
+            [sys.executable, "-m", "server.workers"],
+            env=env, path=os.getcwd(), childFDs=child_fds)
+        self._workers[worker_id] = proto
+
+    def worker_ended(self, worker):
+        """
+        Called when a worker process exits. If the hub is still running the
+        worker is restarted after a short delay.
+        :param worker: The worker that has exited
+        :type worker: WorkerProcessProtocol
+        """
+        if self._workers.get(worker.worker_id) is worker:
+            del self._workers[worker.worker_id]
+
+        if self._running:
+            reactor.callLater(WORKER_RESTART_DELAY, self._restart_worker,
+                              worker.worker_id)
+
+    def _restart_worker(self, worker_id):
+        if self._running and worker_id not in self._workers:
+            self._spawn_worker(worker_id)
+
+    def startService(self):
+        MultiService.startService(self)
+        self._running = True
+        self._ports = self._open_sockets()
+        for worker_id in range(self._worker_count):
+            self._spawn_worker(worker_id)
+
+    def stopService(self):
+        self._running = False
+
+        ended = []
+        for worker in self._workers.values():
+            ended.append(worker.ended)
+            try:
+                worker.transport.signalProcess("TERM")
+            except Exception:
+                pass  # Already gone
+
+        for sock in self._sockets:
+            sock.close()
+        self._sockets = []
+
+        d = defer.DeferredList(ended)
+        d.addCallback(lambda _: MultiService.stopService(self))
+        return d
+
+
+###############################################################################
+# Worker ######################################################################
+###############################################################################
+
+class HubClientProtocol(LineReceiver):
+    """
+    The workers end of the connection to the hub.
+    """
+    delimiter = b'\n'
+
+    def __init__(self):
+        self._report_call = None
+
+    def connectionMade(self):
+        from server.session import set_session_count_observer
+        set_session_count_observer(self.session_counts_changed)
+        self.factory.resetDelay()
+        self._report_session_counts()
+
+    def connectionLost(self, reason=None):
+        from server.session import set_session_count_observer
+        set_session_count_observer(None)
+        if self._report_call is not None and self._report_call.active():
+            self._report_call.cancel()
+
+    def lineReceived(self, line):
+        from server.dbupdates import dispatch_notification
+        from server.mq_receiver import live_data_received
+        from server.session import set_remote_session_counts
+
+        try:
+            message_type, message = decode_message(line)
+        except ValueError:
+            log.msg("Discarding malformed message from hub")
+            return
+
+        if message_type == MSG_NOTIFY:
+            dispatch_notification(message["channel"], message["payload"])
+        elif message_type == MSG_LIVE:
+            live_data_received(message["station"], message["body"])
+        elif message_type == MSG_REMOTE_SESSIONS:
+            set_remote_session_counts(message["current"], message["total"])
+
+    def session_counts_changed(self):
+        """
+        Called whenever a session starts or ends. Reports are delayed slightly
+        so a burst of new connections results in a single report to the hub.
+        """
+        if self._report_call is None or not self._report_call.active():
+            self._report_call = reactor.callLater(
+                SESSION_REPORT_DELAY, self._report_session_counts)
+
+    def _report_session_counts(self):
+        from server.session import get_local_session_counts
+        current, total = get_local_session_counts()
+        self.sendLine(encode_message(MSG_SESSIONS, current=current,
+                                     total=total))
+
+
+class HubClientFactory(ReconnectingClientFactory):
+    protocol = HubClientProtocol
+    maxDelay = 10
+
+
+class AdoptedPortService(Service):
+    """
+    Listens on a socket inherited from the hub process.
+    """
+
+    def __init__(self, fd, factory, context_factory=None):
+        """
+        :param fd: File descriptor of the listening socket
+        :type fd: int
+        :param factory: Protocol factory
+        :param context_factory: SSL context factory if the port uses TLS
+        """
+        self._fd = fd
+        self._factory = factory
+        self._context_factory = context_factory
+        self._port = None
+
+    def startService(self):
+        Service.startService(self)
+
+        factory = self._factory
+        if self._context_factory is not None:
+            from twisted.protocols.tls import TLSMemoryBIOFactory
+            factory = TLSMemoryBIOFactory(self._context_factory, False,
+                                          factory)
+
+        self._port = reactor.adoptStreamPort(self._fd, socket.AF_INET,
+                                             factory)
+
+    def stopService(self):
+        Service.stopService(self)
+        if self._port is not None:
+            d = self._port.stopListening()
+            self._port = None
+            return d
+
+
+def _get_protocol_factory(name, config):
+    """
+    Builds the protocol factory for the named protocol
+    :param name: Protocol name: ssh, telnet, tcp, ws or wss
+    :param config: Protocol configuration as passed to getServerService
+    :type config: dict
+    :return: Protocol factory, SSL context factory (or None)
+    """
+    config = dict(config)
+    port = config.pop("port")
+
+    if name == "ssh":
+        from server.ssh import getSSHFactory
+        return getSSHFactory(**config), None
+    elif name == "telnet":
+        from server.telnet import getTelnetFactory
+        return getTelnetFactory(), None
+    elif name == "tcp":
+        from server.tcp import getTCPFactory
+        return getTCPFactory(), None
+    elif name == "ws":
+        from server.websocket import getWebSocketFactory
+        return getWebSocketFactory(config["host"], port), None
+    elif name == "wss":
+        from server.websocket import getWebSocketSecureFactory
+        return getWebSocketSecureFactory(port=port, **config)
+
+    raise Exception("Unsupported protocol {0}".format(name))
+
+
+def getWorkerService(config):
+    """
+    Gets the service for a worker process.
+    :param config: Worker configuration as supplied by the hub
+    :type config: dict
+    """
+    from server.database import database_connect
+
+    database_connect(config["dsn"])
+
+    service = MultiService()
+
+    hub_client = internet.UNIXClient(config["hub_socket"], HubClientFactory())
+    hub_client.setServiceParent(service)
+
+    for name, fd in config["ports"]:
+        protocol_config = config["protocols"][name]
+        factory, context_factory = _get_protocol_factory(name,
+                                                         protocol_config)
+        port_service = AdoptedPortService(fd, factory, context_factory)
+        port_service.setServiceParent(service)
+
+    return service
+
+
+def worker_main():
+    """
+    Entry point for worker processes started by the hub.
+    """
+    log.startLogging(sys.stdout, setStdout=False)
+
+    config = json.loads(os.environ[WORKER_CONFIG_ENV])
+
+    service = getWorkerService(config)
+    service.startService()
+    reactor.addSystemEventTrigger('before', 'shutdown', service.stopService)
+    reactor.run()
+
+
+if __name__ == "__main__":
+    worker_main()
@@ -12,6 +12,7 @@ from server.ssh import getSSHService
 from server.tcp import getTCPService
 from server.websocket import getWebSocketService, getWebSocketSecureService
 from server.telnet import getTelnetService
+from server.workers import HubService
 
 def setupDatabase(dsn):
     """
@@ -24,8 +25,39 @@ def setupDatabase(dsn):
     listener_connect(dsn)
 
 
+def getHubService(dsn, ssh_config, telnet_config, tcp_config, ws_config,
+                  wss_config, rabbitmq_config, worker_count, hub_socket):
+    """
+    Gets the notification hub service for multi-process mode. Parameters
+    are the same as for getServerService.
+    :return: Hub service
+    """
+
+    protocols = {}
+    for name, config in (("ssh", ssh_config), ("telnet", telnet_config),
+                         ("tcp", tcp_config), ("ws", ws_config),
+                         ("wss", wss_config)):
+        if config is not None:
+            protocols[name] = config
+
+    service = HubService(worker_count,
+                         {"dsn": dsn, "protocols": protocols},
+                         hub_socket)
+
+    # The hub doesn't handle any sessions itself so it only needs the
+    # notification listener. Everything it receives goes to the workers.
+    listener_connect(dsn, service.factory.notification_received)
+
+    if rabbitmq_config is not None:
+        mq_listener_connect(live_handler=service.factory.live_data_received,
+                            **rabbitmq_config)
+
+    return service
+
+
 def getServerService(dsn, ssh_config, telnet_config, tcp_config, ws_config,
-                     wss_config, rabbitmq_config):
+                     wss_config, rabbitmq_config, worker_count=0,
+                     hub_socket=None):
     """
     Gets the zxweatherd server service.
     :param dsn: Database connection string
@@ -42,6 +74,13 @@ def getServerService(dsn, ssh_config, telnet_config, tcp_config, ws_config,
     :type wss_config: dict
     :param rabbitmq_config: RabbitMQ Connection Settings
     :type rabbitmq_config: dict
+    :param worker_count: Number of worker processes to handle sessions. If
+        zero all sessions are handled by this process.
+    :type worker_count: int
+    :param hub_socket: Unix socket filename workers use to receive
+        notifications from this process. Only used when worker_count is not
+        zero. If None a temporary file is used.
+    :type hub_socket: str
     :return: Server service.
     """
 
@@ -49,6 +88,11 @@ def getServerService(dsn, ssh_config, telnet_config, tcp_config, ws_config,
             and ws_config is None and wss_config is None:
         raise Exception('No protocols enabled')
 
+    if worker_count > 0:
+        return getHubService(dsn, ssh_config, telnet_config, tcp_config,
+                             ws_config, wss_config, rabbitmq_config,
+                             worker_count, hub_socket)
+
     setupDatabase(dsn)
 
     if rabbitmq_config is not None:
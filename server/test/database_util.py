@@ -0,0 +1,75 @@
+# coding=utf-8
+"""
+Support for tests that need a PostgreSQL database with the zxweather schema
+(database/database.sql) loaded. Set the ZXW_TEST_DSN environment variable to
+a connection string for the database to run them, otherwise they're skipped.
+Everything a test does is rolled back afterwards.
+"""
+import os
+import unittest
+
+__author__ = 'david'
+
+DSN_VARIABLE = "ZXW_TEST_DSN"
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """
+    Test case with a database cursor (self.txn) in a transaction that is
+    rolled back after each test. The cursor counts the statements executed
+    through it.
+    """
+
+    def setUp(self):
+        dsn = os.environ.get(DSN_VARIABLE)
+        if not dsn:
+            raise unittest.SkipTest(
+                "{0} not set: no test database".format(DSN_VARIABLE))
+
+        import psycopg2
+        import psycopg2.extensions
+
+        class CountingCursor(psycopg2.extensions.cursor):
+            statements = 0
+
+            def execute(self, query, vars=None):
+                CountingCursor.statements += 1
+                return super(CountingCursor, self).execute(query, vars)
+
+        self.connection = psycopg2.connect(dsn)
+        self.txn = self.connection.cursor(cursor_factory=CountingCursor)
+        self._cursor_class = CountingCursor
+
+        # Timestamps are given to the database in GMT
+        self.txn.execute("set time zone 'UTC'")
+
+    def tearDown(self):
+        self.connection.rollback()
+        self.connection.close()
+
+    @property
+    def statements(self):
+        """
+        Number of statements executed so far
+        """
+        return self._cursor_class.statements
+
+    def add_station(self, code, hw_type):
+        """
+        Creates a station
+
+        :param code: Station code
+        :param hw_type: Hardware type code (DAVIS, FOWH1080 or GENERIC)
+        :returns: The new stations ID
+        """
+        self.txn.execute(
+            "insert into station(code, title, station_type_id, "
+            "                    sample_interval) "
+            "select %s, %s, station_type_id, 300 from station_type "
+            "where code = %s "
+            "returning station_id", (code, code, hw_type))
+        return self.txn.fetchone()[0]
+
+    def query(self, query, params=None):
+        self.txn.execute(query, params)
+        return self.txn.fetchall()
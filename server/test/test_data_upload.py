@@ -0,0 +1,212 @@
+# coding=utf-8
+"""
+Tests batching and flushing samples in the upload command with the database
+inserts replaced by deferreds the tests complete.
+"""
+import unittest
+
+from twisted.internet import defer
+from twisted.internet.task import Clock
+
+from server import data_upload
+from server.data_upload import UploadCommand, BULK_BATCH_SIZE, \
+    BULK_FLUSH_DELAY
+
+__author__ = 'david'
+
+
+def _sample_line(number):
+    return "s," + ",".join([str(number)] * 13)
+
+
+def _live_line():
+    return "l," + ",".join(["1"] * 10)
+
+
+class FakeInserts(object):
+    """
+    Records inserts and hands back a deferred for each one
+    """
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, values, bulk=None):
+        d = defer.Deferred()
+        self.calls.append((values, bulk, d))
+        return d
+
+    def complete(self, index=0):
+        values, bulk, d = self.calls[index]
+        d.callback(["CONFIRM {0}".format(v[1]) for v in values]
+                   if bulk is not None else None)
+
+
+class UploadCommandTests(unittest.TestCase):
+
+    def setUp(self):
+        self._reactor = data_upload.reactor
+        self._insert_csv_samples = data_upload.insert_csv_samples
+        self._insert_csv_live = data_upload.insert_csv_live
+
+        self.clock = Clock()
+        self.samples = FakeInserts()
+        self.live = FakeInserts()
+        data_upload.reactor = self.clock
+        data_upload.insert_csv_samples = self.samples
+        data_upload.insert_csv_live = self.live
+
+        self.output = []
+
+    def tearDown(self):
+        data_upload.reactor = self._reactor
+        data_upload.insert_csv_samples = self._insert_csv_samples
+        data_upload.insert_csv_live = self._insert_csv_live
+
+    def _command(self, bulk=True):
+        qualifiers = {"bulk": True} if bulk else {}
+        command = UploadCommand(
+            lambda text: self.output.append(text.rstrip("\n")), lambda: None,
+            lambda: None, lambda: None,
+            {"ui_json": False, "authenticated": True}, {}, qualifiers)
+        command.execute()
+        return command
+
+    def _send(self, command, first, count):
+        for number in range(first, first + count):
+            command.lineReceived(_sample_line(number))
+
+    def _uploaded(self, index):
+        return [int(v[1]) for v in self.samples.calls[index][0]]
+
+    def _confirmed(self):
+        return [int(line.split()[1]) for line in self.output
+                if line.startswith("CONFIRM")]
+
+    def test_not_bulk_inserts_each_sample(self):
+        command = self._command(False)
+        self._send(command, 0, 3)
+
+        # Straight away, but waiting for each insert to finish before
+        # sending the samples that arrived meanwhile
+        self.assertEqual(len(self.samples.calls), 1)
+        self.assertEqual(self._uploaded(0), [0])
+        self.assertFalse(self.samples.calls[0][1])
+
+        self.samples.complete(0)
+
+        self.assertEqual(len(self.samples.calls), 2)
+        self.assertEqual(self._uploaded(1), [1, 2])
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_flushed_after_delay(self):
+        command = self._command()
+        self._send(command, 0, 5)
+
+        self.clock.advance(BULK_FLUSH_DELAY - 0.1)
+        self.assertEqual(self.samples.calls, [])
+
+        self.clock.advance(0.1)
+        self.assertEqual(len(self.samples.calls), 1)
+        self.assertEqual(self._uploaded(0), [0, 1, 2, 3, 4])
+        self.assertTrue(self.samples.calls[0][1])
+
+    def test_full_batch_inserted_immediately(self):
+        command = self._command()
+        self._send(command, 0, BULK_BATCH_SIZE)
+
+        self.assertEqual(len(self.samples.calls), 1)
+        self.assertEqual(len(self.samples.calls[0][0]), BULK_BATCH_SIZE)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_samples_wait_for_insert_in_flight(self):
+        command = self._command()
+        self._send(command, 0, BULK_BATCH_SIZE)
+        self._send(command, BULK_BATCH_SIZE, 3)
+
+        # No timer while the first batch is in flight...
+        self.clock.advance(BULK_FLUSH_DELAY * 10)
+        self.assertEqual(len(self.samples.calls), 1)
+
+        # ...the rest wait for the next flush once it's done
+        self.samples.complete(0)
+        self.assertEqual(len(self.samples.calls), 1)
+        self.clock.advance(BULK_FLUSH_DELAY)
+
+        self.assertEqual(len(self.samples.calls), 2)
+        self.assertEqual(self._uploaded(1), [BULK_BATCH_SIZE,
+                                             BULK_BATCH_SIZE + 1,
+                                             BULK_BATCH_SIZE + 2])
+        self.samples.complete(1)
+        self.assertEqual(self._confirmed(),
+                         list(range(BULK_BATCH_SIZE + 3)))
+
+    def test_flush_pending_while_insert_in_flight(self):
+        command = self._command()
+        self._send(command, 0, 2)
+        self.clock.advance(BULK_FLUSH_DELAY)
+        self.assertEqual(len(self.samples.calls), 1)
+
+        # A live record finishing while samples are being inserted must not
+        # let the next flush start a second insert alongside the first.
+        self._send(command, 2, 2)
+        command.lineReceived(_live_line())
+        self.live.complete()
+        self.clock.advance(BULK_FLUSH_DELAY)
+
+        self.assertEqual(len(self.samples.calls), 1)
+
+        self.samples.complete(0)
+        self.clock.advance(BULK_FLUSH_DELAY)
+
+        self.assertEqual(len(self.samples.calls), 2)
+        self.assertEqual(self._uploaded(1), [2, 3])
+
+    def test_flush_timer_firing_with_insert_in_flight(self):
+        command = self._command()
+        self._send(command, 0, 2)
+        self.clock.advance(BULK_FLUSH_DELAY)
+
+        # Pretend the timer fired while the insert was running
+        self._send(command, 2, 2)
+        command._flushSamples()
+        self.assertEqual(len(self.samples.calls), 1)
+
+        # The pending flush goes as soon as the insert completes without
+        # waiting for another timer
+        self.samples.complete(0)
+        self.assertEqual(len(self.samples.calls), 2)
+        self.assertEqual(self._uploaded(1), [2, 3])
+
+        # and doesn't carry over to the samples after
+        self.samples.complete(1)
+        self._send(command, 4, 1)
+        self.assertEqual(len(self.samples.calls), 2)
+
+    def test_error_discards_buffered_samples(self):
+        command = self._command()
+        self._send(command, 0, 2)
+        self.clock.advance(BULK_FLUSH_DELAY)
+        self._send(command, 2, 2)
+
+        self.samples.calls[0][2].errback(Exception("insert failed"))
+
+        self.assertIn("# ERR-006: insert failed", self.output)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+        self._send(command, 4, 1)
+        self.assertEqual(self.output[-1],
+                         "# ERR-007: Sample ignored due to previous error.")
+        self.clock.advance(BULK_FLUSH_DELAY)
+        self.assertEqual(len(self.samples.calls), 1)
+
+    def test_clean_up_cancels_flush(self):
+        command = self._command()
+        self._send(command, 0, 2)
+
+        command.cleanUp()
+
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,243 @@
+# coding=utf-8
+"""
+Tests inserting uploaded samples
+"""
+import unittest
+
+from server.database import BaseSampleRecord, DavisSampleRecord, \
+    WH1080SampleRecord, _insert_samples_int, _bulk_insert_samples_int, \
+    _copy_value
+from test.database_util import DatabaseTestCase
+
+__author__ = 'david'
+
+
+def _base(station_code, minute):
+    return BaseSampleRecord(
+        station_code=station_code, temperature=10.0 + minute, humidity=50,
+        indoor_temperature=20.0, indoor_humidity=40, pressure=1010.0,
+        msl_pressure=None, average_wind_speed=1.0, gust_wind_speed=2.0,
+        wind_direction=90, rainfall=0.2,
+        download_timestamp="2020-01-01 12:00:00",
+        time_stamp="2020-01-01 10:{0:02d}:00".format(minute))
+
+
+def _davis(wind_sample_count=20):
+    values = dict((f, None) for f in DavisSampleRecord._fields)
+    values.update(record_time=0, record_date=0,
+                  wind_sample_count=wind_sample_count)
+    return DavisSampleRecord(**values)
+
+
+def _wh1080(total_rain):
+    return WH1080SampleRecord(sample_interval=300, record_number=1,
+                              last_in_batch=False, invalid_data=False,
+                              wind_direction='N', total_rain=total_rain,
+                              rain_overflow=False)
+
+
+class SamplesTestCase(DatabaseTestCase):
+
+    def setUp(self):
+        super(SamplesTestCase, self).setUp()
+        self.davis_id = self.add_station("tdav", "DAVIS")
+        self.generic_id = self.add_station("tgen", "GENERIC")
+
+    def _davis_sample(self, minute, wind_sample_count=20):
+        return ('DAVIS', self.davis_id, _base('TDAV', minute),
+                _davis(wind_sample_count))
+
+    def _generic_sample(self, minute):
+        return 'GENERIC', self.generic_id, _base('TGEN', minute)
+
+    def _stored(self):
+        return self.query("""
+            select st.code, to_char(s.time_stamp, 'MI')::integer,
+                   ds.wind_sample_count
+            from sample s
+            inner join station st on st.station_id = s.station_id
+            left outer join davis_sample ds on ds.sample_id = s.sample_id
+            where s.station_id in (%s, %s)
+            order by s.sample_id""", (self.davis_id, self.generic_id))
+
+
+class InsertSamplesTests(SamplesTestCase):
+
+    def test_upload_order(self):
+        results = _insert_samples_int(self.txn, [
+            self._davis_sample(0),
+            self._davis_sample(5),
+            self._generic_sample(0),
+            self._davis_sample(10),
+            self._generic_sample(5),
+        ])
+
+        self.assertEqual(results, [
+            "CONFIRM tdav\t2020-01-01 10:00:00",
+            "CONFIRM tdav\t2020-01-01 10:05:00",
+            "CONFIRM tgen\t2020-01-01 10:00:00",
+            "CONFIRM tdav\t2020-01-01 10:10:00",
+            "CONFIRM tgen\t2020-01-01 10:05:00",
+        ])
+
+        # Samples are inserted in the order they were uploaded
+        self.assertEqual(self._stored(), [
+            ("tdav", 0, 20), ("tdav", 5, 20), ("tgen", 0, None),
+            ("tdav", 10, 20), ("tgen", 5, None)])
+
+    def test_duplicates(self):
+        _insert_samples_int(self.txn, [self._davis_sample(0, 1),
+                                       self._generic_sample(0)])
+
+        results = _insert_samples_int(self.txn, [
+            self._davis_sample(0, 2),
+            self._davis_sample(5, 3),
+            self._davis_sample(5, 4),
+            self._generic_sample(0),
+        ])
+
+        self.assertEqual(results, [
+            "# WARN-001: Duplicate sample tdav 2020-01-01 10:00:00",
+            "CONFIRM tdav\t2020-01-01 10:00:00",
+            "CONFIRM tdav\t2020-01-01 10:05:00",
+            "# WARN-001: Duplicate sample tdav 2020-01-01 10:05:00",
+            "CONFIRM tdav\t2020-01-01 10:05:00",
+            "# WARN-001: Duplicate sample tgen 2020-01-01 10:00:00",
+            "CONFIRM tgen\t2020-01-01 10:00:00",
+        ])
+
+        self.assertEqual(self._stored(), [
+            ("tdav", 0, 1), ("tgen", 0, None), ("tdav", 5, 3)])
+
+
+class CopyValueTests(unittest.TestCase):
+
+    def test_null(self):
+        self.assertEqual(_copy_value(None), "\\N")
+
+    def test_bool(self):
+        self.assertEqual(_copy_value(True), "t")
+        self.assertEqual(_copy_value(False), "f")
+
+    def test_escaped(self):
+        self.assertEqual(_copy_value("a\tb\nc\rd\\e"),
+                         "a\\tb\\nc\\rd\\\\e")
+
+    def test_numbers(self):
+        self.assertEqual(_copy_value(0), "0")
+        self.assertEqual(_copy_value(1.5), "1.5")
+
+
+class BulkInsertSamplesTests(SamplesTestCase):
+
+    def setUp(self):
+        super(BulkInsertSamplesTests, self).setUp()
+        self.wh1080_id = self.add_station("twh", "FOWH1080")
+
+    def _bulk_insert(self, samples):
+        results = _bulk_insert_samples_int(self.txn, samples)
+        # Normally dropped when the transaction commits
+        self.txn.execute("drop table bulk_upload_sample")
+        return results
+
+    def _wh1080_sample(self, minute, total_rain):
+        return ('FOWH1080', self.wh1080_id, _base('TWH', minute),
+                _wh1080(total_rain))
+
+    def test_merged(self):
+        results = _bulk_insert_samples_int(self.txn, [
+            self._davis_sample(5, 2),
+            self._generic_sample(0),
+            self._davis_sample(0, 1),
+        ])
+
+        # Confirmations are in upload order
+        self.assertEqual(results, [
+            "CONFIRM tdav\t2020-01-01 10:05:00",
+            "CONFIRM tgen\t2020-01-01 10:00:00",
+            "CONFIRM tdav\t2020-01-01 10:00:00",
+        ])
+
+        # Samples are inserted by station and time
+        self.assertEqual(self._stored(), [
+            ("tdav", 0, 1), ("tdav", 5, 2), ("tgen", 0, None)])
+
+        self.assertEqual(self.query("""
+            select temperature, relative_humidity, rainfall, wind_direction
+            from sample where station_id = %s""", (self.generic_id,)),
+                         [(10.0, 50, None, 90)])
+
+    def test_statements_per_batch(self):
+        before = self.statements
+        self._bulk_insert([self._davis_sample(m) for m in range(0, 60, 5)])
+        small = self.statements - before
+
+        before = self.statements
+        self._bulk_insert([self._generic_sample(m) for m in range(0, 60)])
+
+        self.assertEqual(self.statements - before, small)
+
+    def test_duplicates(self):
+        self._bulk_insert([self._davis_sample(0, 1),
+                           self._generic_sample(0)])
+
+        results = self._bulk_insert([
+            self._davis_sample(0, 2),
+            self._davis_sample(5, 3),
+            self._davis_sample(5, 4),
+            self._generic_sample(0),
+        ])
+
+        self.assertEqual(results, [
+            "# WARN-001: Duplicate sample tdav 2020-01-01 10:00:00",
+            "CONFIRM tdav\t2020-01-01 10:00:00",
+            "CONFIRM tdav\t2020-01-01 10:05:00",
+            "# WARN-001: Duplicate sample tdav 2020-01-01 10:05:00",
+            "CONFIRM tdav\t2020-01-01 10:05:00",
+            "# WARN-001: Duplicate sample tgen 2020-01-01 10:00:00",
+            "CONFIRM tgen\t2020-01-01 10:00:00",
+        ])
+
+        # The first of each duplicate is kept
+        self.assertEqual(self._stored(), [
+            ("tdav", 0, 1), ("tgen", 0, None), ("tdav", 5, 3)])
+
+    def test_same_as_insert_samples(self):
+        samples = [self._davis_sample(0), self._generic_sample(0),
+                   self._davis_sample(0)]
+
+        bulk = self._bulk_insert(samples)
+        self.txn.execute("delete from davis_sample where sample_id in ("
+                         "select sample_id from sample where station_id = %s)",
+                         (self.davis_id,))
+        self.txn.execute("delete from sample where station_id in (%s, %s)",
+                         (self.davis_id, self.generic_id))
+
+        self.assertEqual(_insert_samples_int(self.txn, samples), bulk)
+
+    def test_wh1080_rainfall(self):
+        # Rainfall is calculated from the previous samples total so they
+        # must go in in time order however they were uploaded
+        _bulk_insert_samples_int(self.txn, [
+            self._wh1080_sample(10, 2.1),
+            self._wh1080_sample(0, 1.2),
+            self._wh1080_sample(5, 1.5),
+        ])
+
+        rows = self.query("""
+            select to_char(s.time_stamp, 'MI')::integer,
+                   round(s.rainfall::numeric, 1), s.wind_direction,
+                   w.total_rain
+            from sample s
+            inner join wh1080_sample w on w.sample_id = s.sample_id
+            where s.station_id = %s
+            order by s.time_stamp""", (self.wh1080_id,))
+
+        self.assertEqual([(r[0], r[1] and float(r[1]), r[2], r[3])
+                          for r in rows],
+                         [(0, None, 0, 1.2), (5, 0.3, 0, 1.5),
+                          (10, 0.6, 0, 2.1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+# coding=utf-8
+"""
+Tests the batch Davis sample writer
+"""
+import os
+import unittest
+
+import psycopg2
+
+from server.sample_writer import SampleWriter
+from test.database_util import DatabaseTestCase
+
+__author__ = 'david'
+
+
+class SampleWriterTests(DatabaseTestCase):
+
+    def setUp(self):
+        super(SampleWriterTests, self).setUp()
+        self.station_id = self.add_station("tst1", "DAVIS")
+        self.writer = SampleWriter(
+            [
+                ("time_stamp", "%s::timestamp at time zone 'gmt'"),
+                ("temperature", "%s::real"),
+                ("station_id", "%s::integer"),
+            ],
+            ["record_time", "record_date", "wind_sample_count"])
+
+    def _sample(self, minute, wind_sample_count=20, record_time=0):
+        return (("2020-01-01 10:{0:02d}:00".format(minute), 10.0 + minute,
+                 self.station_id),
+                (record_time, 0, wind_sample_count))
+
+    def _stored(self):
+        return self.query("""
+            select to_char(s.time_stamp, 'MI')::integer, s.temperature,
+                   ds.wind_sample_count
+            from sample s
+            left outer join davis_sample ds on ds.sample_id = s.sample_id
+            where s.station_id = %s
+            order by s.sample_id""", (self.station_id,))
+
+    def test_batch(self):
+        start = self.statements
+
+        failed = self.writer.insert_samples(
+            self.txn, [self._sample(i, 10 + i) for i in range(0, 30, 5)])
+
+        # Savepoint, samples, Davis samples, release savepoint
+        self.assertEqual(self.statements - start, 4)
+
+        self.assertEqual(failed, [])
+        self.assertEqual(self._stored(),
+                         [(i, 10.0 + i, 10 + i) for i in range(0, 30, 5)])
+
+    def test_empty(self):
+        start = self.statements
+        self.assertEqual(self.writer.insert_samples(self.txn, []), [])
+        self.assertEqual(self.statements, start)
+
+    def test_single_sample(self):
+        self.assertEqual(
+            self.writer.insert_samples(self.txn, [self._sample(5)]), [])
+        self.assertEqual(self._stored(), [(5, 15.0, 20)])
+
+    def test_existing_sample(self):
+        self.writer.insert_samples(self.txn, [self._sample(5, 1)])
+
+        failed = self.writer.insert_samples(
+            self.txn, [self._sample(0), self._sample(5), self._sample(10)])
+
+        # The batch fails and the samples are inserted individually
+        self.assertEqual([i for i, e in failed], [1])
+        self.assertIsInstance(failed[0][1], psycopg2.IntegrityError)
+        self.assertEqual(self._stored(),
+                         [(5, 15.0, 1), (0, 10.0, 20), (10, 20.0, 20)])
+
+    def test_duplicate_in_batch(self):
+        failed = self.writer.insert_samples(
+            self.txn, [self._sample(0, 1), self._sample(0, 2),
+                       self._sample(5, 3)])
+
+        self.assertEqual([i for i, e in failed], [1])
+        self.assertEqual(self._stored(), [(0, 10.0, 1), (5, 15.0, 3)])
+
+    def test_bad_davis_sample(self):
+        # A Davis sample that can't be inserted takes its sample row with it
+        failed = self.writer.insert_samples(
+            self.txn, [self._sample(0), self._sample(5, record_time=None),
+                       self._sample(10)])
+
+        self.assertEqual([i for i, e in failed], [1])
+        self.assertEqual(self._stored(), [(0, 10.0, 20), (10, 20.0, 20)])
+
+    def test_transaction_usable_after_failure(self):
+        self.writer.insert_samples(self.txn, [self._sample(0)])
+        self.writer.insert_samples(self.txn, [self._sample(0),
+                                              self._sample(0)])
+
+        self.txn.execute("select 1")
+        self.assertEqual(self.txn.fetchone(), (1,))
+
+
+class SampleWriterCopyTests(unittest.TestCase):
+
+    def test_davis_logger_copy_identical(self):
+        # davis-logger has its own copy of the sample writer as the two
+        # don't share code.
+        here = os.path.dirname(os.path.abspath(__file__))
+        server_copy = os.path.join(here, "..", "server", "sample_writer.py")
+        logger_copy = os.path.join(here, "..", "..", "davis-logger",
+                                   "davis_logger", "sample_writer.py")
+
+        if not os.path.exists(logger_copy):
+            raise unittest.SkipTest("davis-logger not available")
+
+        with open(server_copy, 'rb') as f:
+            server_source = f.read()
+        with open(logger_copy, 'rb') as f:
+            logger_source = f.read()
+
+        self.assertEqual(server_source, logger_source)
+
+
+if __name__ == '__main__':
+    unittest.main()
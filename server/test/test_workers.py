@@ -0,0 +1,105 @@
+"""
+Unit tests for the multi-process notification hub
+"""
+import unittest
+
+from twisted.test.proto_helpers import StringTransport
+
+from server import session
+from server.workers import HubFactory, encode_message, decode_message, \
+    MSG_NOTIFY, MSG_LIVE, MSG_SESSIONS, MSG_REMOTE_SESSIONS
+
+
+class HubFactoryTestCase(unittest.TestCase):
+
+    def _connect_worker(self, factory):
+        worker = factory.buildProtocol(None)
+        transport = StringTransport()
+        worker.makeConnection(transport)
+        return worker, transport
+
+    @staticmethod
+    def _messages(transport):
+        lines = transport.value().split(b'\n')
+        transport.clear()
+        return [decode_message(l) for l in lines if l]
+
+    def test_message_round_trip(self):
+        msg = encode_message(MSG_NOTIFY, channel="new_sample_id",
+                             payload="rua:1234")
+
+        message_type, message = decode_message(msg)
+
+        self.assertEqual(MSG_NOTIFY, message_type)
+        self.assertEqual({"channel": "new_sample_id", "payload": "rua:1234"},
+                         message)
+
+    def test_notification_sent_to_all_workers(self):
+        factory = HubFactory()
+        _, t1 = self._connect_worker(factory)
+        _, t2 = self._connect_worker(factory)
+        t1.clear()
+        t2.clear()
+
+        factory.notification_received("live_data_updated", "rua")
+
+        expected = [(MSG_NOTIFY, {"channel": "live_data_updated",
+                                  "payload": "rua"})]
+        self.assertEqual(expected, self._messages(t1))
+        self.assertEqual(expected, self._messages(t2))
+
+    def test_live_data_body_decoded(self):
+        factory = HubFactory()
+        _, t1 = self._connect_worker(factory)
+        t1.clear()
+
+        factory.live_data_received("rua", b'{"windSpeed": 1.5}')
+
+        self.assertEqual(
+            [(MSG_LIVE, {"station": "rua", "body": '{"windSpeed": 1.5}'})],
+            self._messages(t1))
+
+    def test_workers_receive_other_workers_session_counts(self):
+        factory = HubFactory()
+        w1, t1 = self._connect_worker(factory)
+        w2, t2 = self._connect_worker(factory)
+
+        w1.lineReceived(encode_message(MSG_SESSIONS, current=3, total=10))
+        t1.clear()
+        t2.clear()
+        w2.lineReceived(encode_message(MSG_SESSIONS, current=2, total=4))
+
+        self.assertEqual(
+            [(MSG_REMOTE_SESSIONS, {"current": 2, "total": 4})],
+            self._messages(t1))
+        self.assertEqual(
+            [(MSG_REMOTE_SESSIONS, {"current": 3, "total": 10})],
+            self._messages(t2))
+
+    def test_disconnected_worker_total_sessions_retained(self):
+        factory = HubFactory()
+        w1, t1 = self._connect_worker(factory)
+        w2, t2 = self._connect_worker(factory)
+
+        w1.lineReceived(encode_message(MSG_SESSIONS, current=3, total=10))
+        t2.clear()
+        w1.connectionLost()
+
+        self.assertEqual(1, factory.worker_count())
+        self.assertEqual(
+            [(MSG_REMOTE_SESSIONS, {"current": 0, "total": 10})],
+            self._messages(t2))
+
+
+class RemoteSessionCountsTestCase(unittest.TestCase):
+
+    def tearDown(self):
+        session.set_remote_session_counts(0, 0)
+
+    def test_remote_counts_included_in_session_counts(self):
+        local_current, local_total = session.get_local_session_counts()
+
+        session.set_remote_session_counts(5, 20)
+
+        self.assertEqual((local_current + 5, local_total + 20),
+                         session.get_session_counts())
@@ -40,6 +40,7 @@ class ZXWServerServiceMaker(object):
         S_WSS = 'websocket-ssl'
         S_DATABASE = 'database'
         S_BROKER = 'message_broker'
+        S_WORKERS = 'workers'
 
         config = ConfigParser()
         config.read([filename])
@@ -118,8 +119,16 @@ class ZXWServerServiceMaker(object):
                 'exchange': config.get(S_BROKER, 'exchange')
             }
 
+        worker_count = 0
+        hub_socket = None
+        if config.has_section(S_WORKERS):
+            if config.has_option(S_WORKERS, 'count'):
+                worker_count = config.getint(S_WORKERS, 'count')
+            if config.has_option(S_WORKERS, 'hub_socket'):
+                hub_socket = config.get(S_WORKERS, 'hub_socket')
+
         return ssh_config, telnet_config, raw_config, ws_config, wss_config, \
-               dsn, broker_config
+               dsn, broker_config, worker_count, hub_socket
 
     def makeService(self, options):
         """
@@ -133,13 +142,15 @@ class ZXWServerServiceMaker(object):
             raise Exception('Configuration file required')
 
         ssh_config, telnet_config, raw_config, websocket_config, wss_config, \
-            dsn, broker_config = self._readConfigFile(options['config-file'])
+            dsn, broker_config, worker_count, hub_socket = \
+            self._readConfigFile(options['config-file'])
 
 
         # All OK. Go get the service.
         return getServerService(
             dsn, ssh_config, telnet_config, raw_config,
-            websocket_config, wss_config, broker_config)
+            websocket_config, wss_config, broker_config, worker_count,
+            hub_socket)
 
 
 serviceMaker = ZXWServerServiceMaker()
@@ -0,0 +1,186 @@
+# coding=utf-8
+"""
+Benchmarks the chart renderers by plotting the day and 7-day charts for a
+number of days of generated samples and reporting charts plotted per second.
+Data files are written for each day as the service would before the charts
+are queued so the time to write them is included for both renderers.
+
+    python benchmark.py --days 30
+    python benchmark.py --days 30 --workers 4 --renderer matplotlib
+    python benchmark.py --days 7 --solar --gnuplot /usr/local/bin/gnuplot
+"""
+import argparse
+import math
+import os
+import random
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from timeit import default_timer as timer
+
+from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
+
+from static_data_service.datafile import DailySampleDataFile, \
+    WeeklySampleDataFile
+from static_data_service.gnuplot import ChartScheduler, \
+    make_day_chart_settings, make_7day_chart_settings, PRIORITY_ARCHIVE
+from static_data_service.samplestore import SampleStore
+
+__author__ = 'david'
+
+_SAMPLE_INTERVAL = timedelta(minutes=5)
+
+
+def _generate_samples(days):
+    """
+    Generates days worth of samples in the layout used by the data files
+    """
+    rows = []
+    ts = datetime(2020, 1, 1)
+    end = ts + timedelta(days=days)
+    temperature = 15.0
+    pressure = 1013.0
+
+    while ts < end:
+        hour = ts.hour + ts.minute / 60.0
+        temperature += random.uniform(-0.2, 0.2)
+        pressure += random.uniform(-0.1, 0.1)
+        humidity = random.randint(40, 100)
+        solar = max(0.0, 800 * math.sin(math.pi * (hour - 6) / 12))
+        rain = random.choice([0.0] * 20 + [0.2, 0.4])
+
+        rows.append((
+            ts, round(temperature, 1), round(temperature - 3, 1),
+            round(temperature - 1, 1), round(temperature, 1), humidity,
+            round(pressure, 1), 20.0, 50, rain, 2.5, 4.1,
+            random.randint(0, 359), round(solar / 100, 1), round(solar),
+            100, round(temperature + 0.3, 1), round(temperature - 0.3, 1),
+            0.0, random.randint(0, 359), 0.01, round(solar), 1.0, 1))
+        ts += _SAMPLE_INTERVAL
+
+    return rows
+
+
+def _build_charts(rows, days, data_dir, charts_dir, output_format, solar):
+    """
+    Writes the data files for each day and returns the charts to plot along
+    with the data files they're plotted from.
+    """
+    batches = []
+
+    store = SampleStore(retain=timedelta(days=days + 8))
+    store.extend(rows)
+
+    # The first week of samples is only there to fill the 7-day charts
+    start = rows[0][0].date() + timedelta(days=7)
+
+    for i in range(days):
+        day = start + timedelta(days=i)
+
+        day_file = DailySampleDataFile("bench", day.year, day.month, day.day,
+                                       store)
+        week_file = WeeklySampleDataFile("bench", day.year, day.month,
+                                         day.day, store)
+        rain_file = day_file.to_rain_file()
+
+        day_filename = day_file.write_file(data_dir)
+        rain_filename = rain_file.write_file(data_dir)
+        week_filename = week_file.write_file(data_dir)
+
+        dest_dir = os.path.join(charts_dir, str(day))
+        specs = make_day_chart_settings(
+            dest_dir, day_filename, rain_filename, day_file.range,
+            output_format, solar, rain_file.total_rain())
+        specs += make_7day_chart_settings(dest_dir, week_filename,
+                                          week_file.range, output_format,
+                                          solar)
+
+        batches.append((specs, {day_filename: day_file,
+                                rain_filename: rain_file,
+                                week_filename: week_file}))
+
+    return batches
+
+
+def _run(scheduler, args, rows, output_dir):
+    """
+    Plots all the charts with a scheduler returning the number plotted and
+    the time taken.
+    """
+    data_dir = os.path.join(output_dir, "data")
+    charts_dir = os.path.join(output_dir, "charts")
+
+    result = {}
+
+    def _check():
+        if scheduler.plotted >= result["count"] and \
+                scheduler.queue_depth == 0:
+            result["time"] = timer() - result["start"]
+            checker.stop()
+            scheduler.stop()
+            reactor.stop()
+
+    def _start():
+        scheduler.start()
+
+        result["start"] = timer()
+        batches = _build_charts(rows, args.days, data_dir, charts_dir,
+                                args.format, args.solar)
+        result["count"] = sum(len(specs) for specs, _ in batches)
+        for specs, data in batches:
+            scheduler.queue(specs, PRIORITY_ARCHIVE, data)
+
+        checker.start(0.01)
+
+    checker = LoopingCall(_check)
+    reactor.callWhenRunning(_start)
+    reactor.run()
+
+    return result["count"], result["time"]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the gnuplot and matplotlib chart renderers")
+    parser.add_argument("--days", type=int, default=7,
+                        help="Number of days to plot charts for")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="Number of render processes")
+    parser.add_argument("--renderer", choices=["gnuplot", "matplotlib"],
+                        default="gnuplot", help="Renderer to benchmark")
+    parser.add_argument("--gnuplot", default="gnuplot",
+                        help="Gnuplot binary to use")
+    parser.add_argument("--format", default="png",
+                        help="Output format")
+    parser.add_argument("--solar", action="store_true",
+                        help="Include the solar radiation and UV charts")
+    parser.add_argument("--keep", action="store_true",
+                        help="Don't delete the charts afterwards")
+    args = parser.parse_args()
+
+    if args.renderer == "matplotlib":
+        from static_data_service.mplrender import MatplotlibChartScheduler
+        scheduler = MatplotlibChartScheduler(args.workers)
+    else:
+        scheduler = ChartScheduler(args.gnuplot, args.workers)
+
+    random.seed(1)
+    rows = _generate_samples(args.days + 7)
+
+    output_dir = tempfile.mkdtemp(prefix="sds-bench-")
+    try:
+        count, elapsed = _run(scheduler, args, rows, output_dir)
+    finally:
+        if args.keep:
+            print("Charts left in {0}".format(output_dir))
+        else:
+            shutil.rmtree(output_dir)
+
+    print("{0}: {1} charts in {2:.2f} seconds ({3:.1f} charts per second, "
+          "{4} workers)".format(args.renderer, count, elapsed,
+                                count / elapsed, args.workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -81,44 +81,91 @@ class DictConnection(txpostgres.Connection):
 class DatabaseReceiver(object):
     """
     Provides access to live data in a weather database.
+
+    New sample notifications are collected for a short while before the
+    samples are fetched so a burst of samples (such as a backfill from
+    WeatherPush) is fetched with one query per station and handed over as a
+    single batch.
     """
 
-    def __init__(self, dsn):
+    def __init__(self, dsn, coalesce_delay=2.0):
         """
+        :param dsn: Database connection string
+        :type dsn: str
+        :param coalesce_delay: How long to collect new sample notifications
+            for before fetching the samples (in seconds)
+        :type coalesce_delay: float
         """
-        self.NewSample = Event()
+        # Fired with the station code and a list of new samples in
+        # timestamp order
+        self.NewSamples = Event()
         self._connection_string = dsn
         #self._database_pool = None
         self._conn = None
         self._conn_d = None
         self._broadcast_ids = {}
 
-    def _fetch_sample(self, sample_info):
+        self._coalesce_delay = coalesce_delay
+
+        # Sample IDs waiting to be fetched by station code
+        self._pending = {}
+        self._fetch_call = None
+
+    def _queue_sample(self, sample_info):
         """
-        Fetch a new sample from the database
+        Queues a new sample to be fetched along with any others arriving
+        shortly after it.
         :param sample_info: Sample information - "station-code:sample-id"
         :type sample_info: str
-        :return: 
         """
         # sample_info is "station_code:sample_id"
         bits = sample_info.split(":")
         station_code = bits[0]
         sample_id = int(bits[1])
 
+        self._pending.setdefault(station_code, []).append(sample_id)
+
+        if self._fetch_call is None:
+            self._fetch_call = reactor.callLater(self._coalesce_delay,
+                                                 self._fetch_pending)
+
+    def _fetch_pending(self):
+        """
+        Fetches all samples queued since the last fetch
+        """
+        self._fetch_call = None
+        pending = self._pending
+        self._pending = {}
+
+        for station_code in sorted(pending.keys()):
+            self._fetch_samples(station_code, pending[station_code])
+
+    def _fetch_samples(self, station_code, sample_ids):
+        """
+        Fetch new samples for a station from the database
+        :param station_code: Station the samples are for
+        :type station_code: str
+        :param sample_ids: IDs of the new samples
+        :type sample_ids: List[int]
+        """
         broadcast_id = None
         if station_code in self._broadcast_ids:
             broadcast_id = self._broadcast_ids[station_code]
 
         query = SAMPLE_QUERY + """
-where cur.sample_id = %(sample_id)s"""
+where cur.sample_id = any(%(sample_ids)s)
+order by cur.time_stamp"""
 
         def _process_result(result):
             if len(result) > 0:
-                self.NewSample.fire(station_code, result[0])
+                log.msg("Fetched {0} new samples for {1}".format(
+                    len(result), station_code))
+                self.NewSamples.fire(station_code, result)
 
         self._conn.runQuery(query,
                             {"broadcast_id": broadcast_id,
-                             "sample_id": sample_id}).addCallback(_process_result)
+                             "sample_ids": sample_ids}
+                            ).addCallback(_process_result)
 
     def _get_station_config(self):
         query = """
@@ -148,7 +195,7 @@ where cur.sample_id = %(sample_id)s"""
         """
 
         if notify.channel == "new_sample_id":
-            self._fetch_sample(notify.payload)
+            self._queue_sample(notify.payload)
 
     def connect(self):
         """
@@ -274,6 +321,47 @@ where date(date_trunc('month',cur.time_stamp)) = %(date)s
 
         returnValue(result[0][0])
 
+    @defer.inlineCallbacks
+    def get_rainfall_seed(self, station_code):
+        """
+        Gets the rainfall needed to seed the station-level rainfall totals in
+        a single query: every sample from the 168 hours up to the latest
+        sample plus daily totals from the start of that year up to the 168
+        hour window.
+
+        :param station_code: Station to get rainfall for
+        :type station_code: str
+        :return: (time_stamp, rainfall) rows in time_stamp order
+        :rtype: list
+        """
+        query = """
+with latest as (
+    select s.station_id, max(s.time_stamp) as ts
+    from sample s
+    inner join station stn on stn.station_id = s.station_id
+    where lower(stn.code) = lower(%(station)s)
+    group by s.station_id
+)
+select s.time_stamp, s.rainfall
+from sample s, latest
+where s.station_id = latest.station_id
+  and s.time_stamp >= latest.ts - '168 hours'::interval
+  and s.time_stamp <= latest.ts
+union all
+select date_trunc('day', s.time_stamp) as time_stamp,
+       sum(s.rainfall) as rainfall
+from sample s, latest
+where s.station_id = latest.station_id
+  and s.time_stamp >= date_trunc('year', latest.ts)
+  and s.time_stamp < latest.ts - '168 hours'::interval
+group by date_trunc('day', s.time_stamp)
+order by 1"""
+
+        result = yield self._database_pool.runQuery(query,
+                                                    {"station": station_code})
+
+        returnValue(result)
+
     @inlineCallbacks
     def get_station_codes(self):
         """
@@ -2,13 +2,19 @@
 Classes for dealing with tab-delimited data files
 """
 import json
+import math
 import os
+from bisect import bisect_left
 from datetime import date, datetime, timedelta
 
 from dateutil.relativedelta import relativedelta
+
 from twisted.internet import defer
 from twisted.python import log
 
+from static_data_service.rainfall import RollingWindow, PeriodTotal, \
+    day_start, week_start, month_start, year_start
+
 
 class DataFile(object):
     TSV_HEADER = '# \n'
@@ -19,13 +25,18 @@ class DataFile(object):
 
     FILENAME = ""
 
-    def __init__(self, rows, dir_fragment, date, station_code):
-        self._rows = rows
-        self._sort_rows()
+    def __init__(self, dir_fragment, date, station_code):
         self._dir_fragment = dir_fragment
         self._date = date
         self._station_code = station_code
 
+        # The file on disk as of the last write along with the key and
+        # on-disk length of each record so it can be patched rather than
+        # rewritten.
+        self._disk_filename = None
+        self._disk_keys = []
+        self._record_lengths = []
+
     @property
     def file_date(self):
         """
@@ -36,11 +47,12 @@ class DataFile(object):
 
     @property
     def range(self):
-        if len(self._rows) == 0:
+        rows = self.rows()
+        if len(rows) == 0:
             return None
 
-        return (self._rows[0][self.SORT_COLUMN],
-                self._rows[-1][self.SORT_COLUMN])
+        return (rows[0][self.SORT_COLUMN],
+                rows[-1][self.SORT_COLUMN])
 
     def _filename(self, base_directory):
         return os.path.join(base_directory, self._dir_fragment, self.FILENAME)
@@ -48,12 +60,26 @@ class DataFile(object):
     def filename(self, base_directory):
         return self._filename(base_directory)
 
-    def _sort_rows(self):
+    def rows(self):
+        raise NotImplementedError()
+
+    def _keys(self, start):
         """
-        Sorts rows by timestamp
+        Returns the keys of rows from start onwards
+        :param start: Index of the first row
+        :type start: int
+        :rtype: List
         """
-        self._rows = sorted(self._rows,
-                            key=lambda row: row[DataFile.SORT_COLUMN])
+        return [row[self.SORT_COLUMN] for row in self.rows()[start:]]
+
+    def _records(self, start):
+        """
+        Returns the tab-delimited records for rows from start onwards
+        :param start: Index of the first row
+        :type start: int
+        :rtype: List[str]
+        """
+        return [self._record_to_string(row) for row in self.rows()[start:]]
 
     def _record_to_string(self, sample):
         """
@@ -65,6 +91,15 @@ class DataFile(object):
         """
         return self.TSV_ROW.format(*sample)
 
+    @staticmethod
+    def _encode(text):
+        # Files are written in binary mode so records can be patched at known
+        # offsets. Line endings are translated as text mode would have.
+        return text.replace('\n', os.linesep).encode('utf-8')
+
+    def _encoded_records(self, start):
+        return [self._encode(record) for record in self._records(start)]
+
     def _write_file(self, filename):
         """
         Writes the data file to disk
@@ -72,9 +107,6 @@ class DataFile(object):
         :type filename: str
         """
 
-        # Data must be sorted before writing to disk
-        self._sort_rows()
-
         # Ensure the output directory exists
         path = os.path.dirname(filename)
         if not os.path.exists(path):
@@ -83,14 +115,87 @@ class DataFile(object):
         # Write out full sample data
         log.msg("Write file: {0}".format(filename))
 
-        with open(filename, "w") as f:
-            f.write(self.TSV_HEADER)
-            for row in self._rows:
-                f.write(self._record_to_string(row))
+        records = self._encoded_records(0)
+
+        with open(filename, "wb") as f:
+            f.write(self._encode(self.TSV_HEADER))
+            for record in records:
+                f.write(record)
+            f.flush()
+
+        self._disk_filename = filename
+        self._disk_keys = self._keys(0)
+        self._record_lengths = [len(record) for record in records]
+
+    def _dropped_records(self):
+        """
+        Returns how many records at the start of the file on disk are no
+        longer in the data file (such as when a 7-day file moves on) or None
+        if the file on disk doesn't start with a run of records that are.
+        """
+        keys = self._keys(0)
+        if not keys:
+            return None
+        if not self._disk_keys or keys[0] == self._disk_keys[0]:
+            return 0
+
+        dropped = bisect_left(self._disk_keys, keys[0])
+        if dropped == len(self._disk_keys) \
+                or self._disk_keys[dropped] != keys[0]:
+            return None
+        return dropped
+
+    def _patch_file(self, filename, index):
+        """
+        Updates the on-disk file after rows from index onwards have changed.
+        Only records from index onwards are rewritten; records dropped from
+        the start of the file are removed by copying what follows them. If
+        the file on disk isn't known to match the rows before index it is
+        rewritten in full.
+
+        :param filename: File to update
+        :type filename: str
+        :param index: Index of the first changed row
+        :type index: int
+        """
+        dropped = None
+        if filename == self._disk_filename and os.path.exists(filename):
+            dropped = self._dropped_records()
+
+        if dropped is None or dropped + index > len(self._record_lengths):
+            self._write_file(filename)
+            return
+
+        header_length = len(self._encode(self.TSV_HEADER))
+        offset = header_length + sum(self._record_lengths[:dropped + index])
+        records = self._encoded_records(index)
+
+        with open(filename, "r+b") as f:
+            if dropped > 0:
+                # Move the unchanged records up to follow the header
+                start = header_length + sum(self._record_lengths[:dropped])
+                f.seek(start)
+                unchanged = f.read(offset - start)
+                f.seek(header_length)
+                f.write(unchanged)
+            else:
+                f.seek(offset)
+            for record in records:
+                f.write(record)
+            f.truncate()
             f.flush()
 
+        del self._record_lengths[dropped + index:]
+        del self._record_lengths[:dropped]
+        self._record_lengths.extend(len(record) for record in records)
+        self._disk_keys = self._keys(0)
+
 
 class SampleDataFile(DataFile):
+    """
+    A data file of samples. Sample data files don't hold any samples
+    themselves; they're a view over a range of the stations SampleStore.
+    """
     TSV_HEADER = '# timestamp\ttemperature\tdew point\tapparent temperature\t' \
                  'wind chill\trelative humidity\tpressure\t' \
                  'indoor temperature\tindoor relative humidity\trainfall\t' \
@@ -129,18 +234,83 @@ class SampleDataFile(DataFile):
     COL_HIGH_UV_INDEX = 22
     COL_FORECAST_RULE_ID = 23
 
+    # TSV_ROW with the values already formatted and joined by the store
+    _STORE_ROW = '{0}\t{1}\n'
+
     FILENAME = ""
     SORT_COLUMN = COL_TIMESTAMP
 
-    def __init__(self, station_code, rows, date, dir_fragment):
-        super(SampleDataFile, self).__init__(rows, dir_fragment, date, station_code)
+    def __init__(self, station_code, store, date, dir_fragment):
+        super(SampleDataFile, self).__init__(dir_fragment, date, station_code)
+        self._store = store
+
+    @property
+    def store(self):
+        """
+        Sample store this file is a view over
+        :rtype: SampleStore
+        """
+        return self._store
+
+    def _bounds(self):
+        """
+        Returns the range of samples in the store this file covers
+        :return: Index of the first sample and the index following the last
+        :rtype: (int, int)
+        """
+        raise NotImplementedError()
+
+    def rows(self):
+        start, end = self._bounds()
+        return self._store.rows(start, end)
 
-        self._sort_rows()
+    def timestamps(self):
+        """
+        Timestamps of the samples in this file
+        :rtype: List[datetime]
+        """
+        start, end = self._bounds()
+        return self._store.timestamps(start, end)
+
+    def column(self, number):
+        """
+        Values of a column for the samples in this file. Missing values are
+        NaN.
+
+        :param number: Column number (one of the COL_ constants)
+        :type number: int
+        :rtype: array
+        """
+        start, end = self._bounds()
+        return self._store.column(number, start, end)
+
+    @property
+    def range(self):
+        start, end = self._bounds()
+        if start == end:
+            return None
+
+        return (self._store.timestamp(start), self._store.timestamp(end - 1))
 
     def get_last_ts(self):
-        if len(self._rows) == 0:
+        start, end = self._bounds()
+        if start == end:
             return None
-        return self._rows[-1][SampleDataFile.COL_TIMESTAMP]
+        return self._store.timestamp(end - 1)
+
+    def _keys(self, start):
+        first, end = self._bounds()
+        return self._store.timestamps(first + start, end)
+
+    def _format_timestamp(self, ts):
+        return str(ts)
+
+    def _records(self, start):
+        first, end = self._bounds()
+        return [self._STORE_ROW.format(
+                    self._format_timestamp(self._store.timestamp(i)),
+                    self._store.formatted_values(i))
+                for i in range(first + start, end)]
 
     def write_file(self, base_directory):
         """
@@ -155,9 +325,30 @@ class SampleDataFile(DataFile):
         self._write_file(fn)
         return fn
 
+    def update_file(self, base_directory, since=None):
+        """
+        Updates the on-disk file after rows have been added to the store.
+        Only records from the earliest changed row onwards are rewritten.
+
+        :param base_directory: Root dir where on-disk files belong
+        :type base_directory: str
+        :param since: Timestamp of the earliest row added or None to
+            rewrite the whole file
+        :type since: datetime
+        """
+        if since is None:
+            self.write_file(base_directory)
+            return
+
+        start, end = self._bounds()
+        index = self._store.index_at(since, start, end) - start
+        self._patch_file(self._filename(base_directory), index)
+
     def add_row(self, row, base_directory):
         """
-        Adds a row and updates the on-disk file
+        Adds a row to the store and updates the on-disk file. Other files
+        viewing the same store see the row too but their on-disk files are
+        only updated when add_row (or update_file) is called on them.
 
         :param row: Row to add 
         :type row: List
@@ -165,29 +356,20 @@ class SampleDataFile(DataFile):
         :type base_directory: str
         """
 
-        last_row_ts = self.get_last_ts()
-
-        self._rows.append(row)
+        index = self._store.add(row)
 
         if base_directory is None:
             # No base directory? No update file on disk
             return
 
-        file_exists = os.path.exists(self._filename(base_directory))
+        start, end = self._bounds()
+        if not start <= index < end:
+            return  # Not in this file
 
-        if last_row_ts is not None and \
-                last_row_ts < row[SampleDataFile.COL_TIMESTAMP] and \
-                file_exists:
-            # Row is newer than all previous rows! Append to existing on-disk
-            # file
-            with open(self._filename(base_directory), "a") as f:
-                f.write(self._record_to_string(row))
-
-        else:
-            # row is either out-of-order or file doesn't exist on disk. The file
-            # must be created from scratch (which will cause self._rows to be
-            # sorted
-            self.write_file(base_directory)
+        # If the row is newer than all previous rows this just appends it to
+        # the on-disk file. Out-of-order rows only rewrite the records
+        # following them.
+        self._patch_file(self._filename(base_directory), index - start)
 
 
 class DailyRainDataFile(DataFile):
@@ -201,46 +383,55 @@ class DailyRainDataFile(DataFile):
     SORT_COLUMN = COL_HOUR
     FILENAME = "hourly_rainfall.dat"
 
-    def __init__(self, station_code, year, month, day, rows):
+    def __init__(self, station_code, year, month, day, store):
         """
-        Creates a new day level hourly rain data file
+        Creates a new day level hourly rain data file. Hourly totals are
+        summed from the days samples in the store when needed.
+
         :param station_code: Station code the data file is for
         :type station_code: str
         :param year: Year the data covers
         :type year: int
         :param month: Month the data covers
         :type month: int
-        :param day: Day the data covers or null if this is a month-level data set
-        :type day: Optional[int]
-        :param rows: Row data. Data will be sorted automatically
-        :type rows: List[Tuple[timestamp,Optional[float],Optional[float],
-            Optional[float],Optional[float],Optional[int],float,float,int,
-            Optional[float],Optional[float],Optional[float],Optional[float],
-            Optional[float],Optional[float],Optional[float],Optional[float],
-            Optional[float],Optional[float],Optional[float],Optional[float],
-            Optional[float],Optional[float],Optional[float]]]
+        :param day: Day the data covers
+        :type day: int
+        :param store: Samples for the station
+        :type store: SampleStore
         """
 
         dir_fragment = os.path.join(str(year), str(month), str(day))
-        super(self.__class__, self).__init__([], dir_fragment,
+        super(self.__class__, self).__init__(dir_fragment,
                                              date(year, month, day),
                                              station_code)
+        self._store = store
 
-        self._rain_data = {}
-        for h in range(0,24):
-            ts = datetime(year=year, month=month, day=day, hour=h, minute=0)
-            self._rain_data[ts] = 0
+    def _day_bounds(self):
+        return self._store.date_index(self.file_date), \
+            self._store.date_index(self.file_date + timedelta(days=1))
 
-        for row in rows:
-            row_time = row[SampleDataFile.COL_TIMESTAMP]
-            row_rain = row[SampleDataFile.COL_RAINFALL]
-            hour = datetime(year=row_time.year, month=row_time.month,
-                            day=row_time.day, hour=row_time.hour, minute=0)
+    def rows(self):
+        """
+        Returns the rainfall for each hour of the day as (hour, rainfall)
+        rows. Hours without any rainfall readings have a total of 0.
+        """
+        start, end = self._day_bounds()
+        timestamps = self._store.timestamps(start, end)
+        rainfall = self._store.column(SampleDataFile.COL_RAINFALL, start, end)
 
-            if row_rain is not None:
-                self._rain_data[hour] += row_rain
+        # Rainfall is recorded to 0.1 so totals are kept in tenths to come
+        # out exactly the same as summing the Decimals from the database.
+        tenths = [None] * 24
+        for ts, rain in zip(timestamps, rainfall):
+            if math.isnan(rain):
+                continue
+            tenths[ts.hour] = (tenths[ts.hour] or 0) + int(round(rain * 10))
 
-        self._rebuild_rows()
+        day = self.file_date
+        return [(datetime(year=day.year, month=day.month, day=day.day,
+                          hour=h, minute=0),
+                 0 if total is None else total / 10.0)
+                for h, total in enumerate(tenths)]
 
     def _record_to_string(self, sample):
         """
@@ -254,14 +445,12 @@ class DailyRainDataFile(DataFile):
         # Hourly rainfall includes only the hour number
         s = list(sample)
         s[DailyRainDataFile.COL_HOUR] = s[DailyRainDataFile.COL_HOUR].hour
+        if isinstance(s[DailyRainDataFile.COL_RAIN_TOTAL], float):
+            s[DailyRainDataFile.COL_RAIN_TOTAL] = "{0:.1f}".format(
+                s[DailyRainDataFile.COL_RAIN_TOTAL])
 
         return super(self.__class__, self)._record_to_string(tuple(s))
 
-    def _rebuild_rows(self):
-        self._rows = []
-        for hour in sorted(self._rain_data.keys()):
-            self._rows.append((hour, self._rain_data[hour]))
-
     def write_file(self, base_directory):
         """
         Writes the data file to the appropriate place under the specified base
@@ -272,13 +461,24 @@ class DailyRainDataFile(DataFile):
         :rtype: str
         """
         fn = self._filename(base_directory)
-        self._rebuild_rows()
         self._write_file(fn)
         return fn
 
+    def update_file(self, base_directory, since=None):
+        """
+        Updates the on-disk file after rows have been added to the store.
+        The file is small so its always rewritten in full.
+
+        :param base_directory: Root dir where on-disk files belong
+        :type base_directory: str
+        :param since: Timestamp of the earliest row added (unused)
+        :type since: datetime
+        """
+        self.write_file(base_directory)
+
     def add_row(self, new_sample, base_directory):
         """
-        Adds a row and updates the on-disk file
+        Adds a row to the store and updates the on-disk file
 
         :param new_sample: Row to add 
         :type new_sample: List
@@ -287,24 +487,18 @@ class DailyRainDataFile(DataFile):
         """
 
         sample_time = new_sample[SampleDataFile.COL_TIMESTAMP]
-        sample_hour = datetime(year=sample_time.year, month=sample_time.month,
-                                day=sample_time.day, hour=sample_time.hour,
-                               minute=0)
-        sample_rain = new_sample[SampleDataFile.COL_RAINFALL]
-
-        if sample_hour in self._rain_data:
-            if sample_rain is not None:
-                self._rain_data[sample_hour] += sample_rain
-        else:
+
+        if sample_time.date() != self.file_date:
             log.msg("Warning: Attempt to add row dated {0} to file dated {1} "
                     "ignored".format(sample_time.date(), self.file_date))
             return  # Sample not for this date.
 
+        self._store.add(new_sample)
         self.write_file(base_directory)
 
     def total_rain(self):
         t = 0
-        for row in self._rows:
+        for row in self.rows():
             t += row[DailyRainDataFile.COL_RAIN_TOTAL]
         return t
 
@@ -312,7 +506,7 @@ class DailyRainDataFile(DataFile):
 class DailySampleDataFile(SampleDataFile):
     FILENAME = "samples.dat"
 
-    def __init__(self, station_code, year, month, day, rows):
+    def __init__(self, station_code, year, month, day, store):
         """
         Creates a new data file
         :param station_code: Station code the data file is for
@@ -321,40 +515,28 @@ class DailySampleDataFile(SampleDataFile):
         :type year: int
         :param month: Month the data covers
         :type month: int
-        :param day: Day the data covers or null if this is a month-level data set
-        :type day: Optional[int]
-        :param rows: Row data. Data will be sorted automatically
-        :type rows: List[Tuple[timestamp,Optional[float],Optional[float],
-            Optional[float],Optional[float],Optional[int],float,float,int,
-            Optional[float],Optional[float],Optional[float],Optional[float],
-            Optional[float],Optional[float],Optional[float],Optional[float],
-            Optional[float],Optional[float],Optional[float],Optional[float],
-            Optional[float],Optional[float],Optional[float]]]
+        :param day: Day the data covers
+        :type day: int
+        :param store: Samples for the station
+        :type store: SampleStore
         """
         dir_fragment = os.path.join(str(year), str(month), str(day))
-        super(self.__class__, self).__init__(station_code, rows,
+        super(self.__class__, self).__init__(station_code, store,
                                              date(year, month, day),
                                              dir_fragment)
 
-    def _record_to_string(self, sample):
-        """
-        Serialise the row to a tab-delimited record
-        :param sample: Row to serialise
-        :type sample: List
-        :return: Tab delimited record
-        :rtype: str
-        """
+    def _bounds(self):
+        return self._store.date_index(self.file_date), \
+            self._store.date_index(self.file_date + timedelta(days=1))
 
+    def _format_timestamp(self, ts):
         # Day level data files exclude the date
-        s = list(sample)
-        s[SampleDataFile.COL_TIMESTAMP] = s[SampleDataFile.COL_TIMESTAMP].time()
-
-        return super(self.__class__, self)._record_to_string(tuple(s))
+        return str(ts.time())
 
     def to_rain_file(self):
         return DailyRainDataFile(self._station_code, self.file_date.year,
                                  self.file_date.month, self.file_date.day,
-                                 self._rows)
+                                 self._store)
 
     def add_row(self, row, base_directory):
         row_date = row[SampleDataFile.COL_TIMESTAMP].date()
@@ -370,42 +552,34 @@ class DailySampleDataFile(SampleDataFile):
 class WeeklySampleDataFile(SampleDataFile):
     FILENAME = "7-day_samples.dat"
 
-    def __init__(self, station_code, year, month, day, rows):
+    def __init__(self, station_code, year, month, day, store):
         """
-        Creates a new data file
+        Creates a new data file covering the 7 days (168h) up to the last
+        sample on or before the specified day.
+
         :param station_code: Station code the data file is for
         :type station_code: str
         :param year: Year the data covers
         :type year: int
         :param month: Month the data covers
         :type month: int
-        :param day: Day the data covers or null if this is a month-level data set
-        :type day: Optional[int]
-        :param rows: Row data. Data will be sorted automatically
-        :type rows: List[Tuple[timestamp,Optional[float],Optional[float],
-            Optional[float],Optional[float],Optional[int],float,float,int,
-            Optional[float],Optional[float],Optional[float],Optional[float],
-            Optional[float],Optional[float],Optional[float],Optional[float],
-            Optional[float],Optional[float],Optional[float],Optional[float],
-            Optional[float],Optional[float],Optional[float]]]
+        :param day: Day the data covers
+        :type day: int
+        :param store: Samples for the station
+        :type store: SampleStore
         """
         dir_fragment = os.path.join(str(year), str(month), str(day))
-        super(self.__class__, self).__init__(station_code, rows,
+        super(self.__class__, self).__init__(station_code, store,
                                              date(year, month, day),
                                              dir_fragment)
-        self._trim()
 
-    def _trim(self):
-        self._sort_rows()
-        min_ts = self.get_last_ts() - timedelta(days=7)
+    def _bounds(self):
+        end = self._store.date_index(self.file_date + timedelta(days=1))
+        if end == 0:
+            return 0, 0
 
-        # Remove any records that don't belong in this file because they fall
-        # outside the 7 day time span defined by the most recent record
-        x = self._rows
-        self._rows = []
-        for row in x:
-            if row[SampleDataFile.COL_TIMESTAMP] > min_ts:
-                self._rows.append(row)
+        min_ts = self._store.timestamp(end - 1) - timedelta(days=7)
+        return self._store.index_after(min_ts, 0, end), end
 
     def add_row(self, row, base_directory):
         """
@@ -416,22 +590,18 @@ class WeeklySampleDataFile(SampleDataFile):
         :param base_directory: Root dir where on-disk files belong
         :type base_directory: str
         """
-        self._rows.append(row)
-        self._trim()
-
-        # We can't update the on-disk file in place as we have likely removed
-        # a line from near the start of the file in addition to adding a new one
-        # at the end.
-        self.write_file(base_directory)
+        last_ts = self.get_last_ts()
+        if last_ts is not None and \
+                row[SampleDataFile.COL_TIMESTAMP] <= last_ts - timedelta(days=7):
+            return  # Too old to belong in this file
 
-    def rows(self):
-        return self._rows
+        super(self.__class__, self).add_row(row, base_directory)
 
 
 class MonthlySampleDataFile(SampleDataFile):
     FILENAME = "samples.dat"
 
-    def __init__(self, station_code, year, month, rows, previous):
+    def __init__(self, station_code, year, month, store):
         """
         Creates a new data file
         :param station_code: Station code the data file is for
@@ -440,24 +610,29 @@ class MonthlySampleDataFile(SampleDataFile):
         :type year: int
         :param month: Month the data covers
         :type month: int
-        :param rows: Row data. Data will be sorted automatically
-        :type rows:  List[Tuple[timestamp,Optional[float],Optional[float],
-            Optional[float],Optional[float],Optional[int],float,float,int,
-            Optional[float],Optional[float],Optional[float],Optional[float],
-            Optional[float],Optional[float],Optional[float],Optional[float],
-            Optional[float],Optional[float],Optional[float],Optional[float],
-            Optional[float],Optional[float],Optional[float]]]
-        :param previous: Previous data file (only used at the month level)
-        :type previous: Optional[MonthlySampleDataFile]
+        :param store: Samples for the station. To build complete 7-day files
+            for the start of the month this should also hold the last week
+            of the previous month.
+        :type store: SampleStore
         """
         super(self.__class__, self).__init__(
-            station_code, rows, date(year, month, 1),
+            station_code, store, date(year, month, 1),
             os.path.join(str(year), str(month)))
 
-        if previous is not None:
-            self._previous_7days = previous.latest_weekly_file()
-        else:
-            self._previous_7days = None
+    def _bounds(self):
+        return self._store.date_index(self.file_date), \
+            self._store.date_index(self.file_date + relativedelta(months=1))
+
+    def _day_slices(self):
+        """
+        Yields the date and store range covered by each day in the month
+        """
+        start, month_end = self._bounds()
+        while start < month_end:
+            day = self._store.timestamp(start).date()
+            end = self._store.date_index(day + timedelta(days=1))
+            yield day, start, end
+            start = end
 
     def to_day_files(self, day=None):
         """
@@ -465,36 +640,23 @@ class MonthlySampleDataFile(SampleDataFile):
         :return: 
         """
 
-        # Split the rows out by date
-        file_rows = {}
-        for row in self._rows:
-            row_date = row[SampleDataFile.COL_TIMESTAMP].date()
-
-            if day is not None and row_date != day:
-                continue  # Not interested in rows for this date
-
-            if row_date not in file_rows:
-                file_rows[row_date] = []
-
-            file_rows[row_date].append(row)
+        if day is not None:
+            start = self._store.date_index(day)
+            end = self._store.date_index(day + timedelta(days=1))
+            days = [day] if end > start else []
+        else:
+            days = [dt for dt, start, end in self._day_slices()]
 
-        # Then wrap them up
         files = {}
-        for file_date in file_rows.keys():
-            rows = file_rows[file_date]
-            f = DailySampleDataFile(self._station_code, file_date.year,
-                                    file_date.month, file_date.day, rows)
-            files[file_date] = f
+        for file_date in days:
+            files[file_date] = DailySampleDataFile(
+                self._station_code, file_date.year, file_date.month,
+                file_date.day, self._store)
 
         return files
 
     def _dates(self):
-        dates = set()
-
-        for r in self._rows:
-            dates.add(r[SampleDataFile.COL_TIMESTAMP].date())
-
-        return dates
+        return set(day for day, start, end in self._day_slices())
 
     def latest_weekly_file(self):
         """
@@ -507,26 +669,14 @@ class MonthlySampleDataFile(SampleDataFile):
         if max_ts is None:
             return None
 
-        min_ts = self.get_last_ts() - timedelta(days=7)
-
         dt = max_ts.date()
 
-        if self._previous_7days is not None:
-            source = list(self._rows) + list(self._previous_7days.rows())
-        else:
-            source = list(self._rows)
-
-        log.msg("Selecting latest weekly set from {0} to {1} "
-                "from set of {2} rows".format(min_ts, max_ts, len(source)))
+        week_file = WeeklySampleDataFile(self._station_code, dt.year,
+                                         dt.month, dt.day, self._store)
+        log.msg("Selected {0} rows for latest weekly set ending {1}".format(
+            len(week_file.timestamps()), max_ts))
 
-        week_rows = [r for r in source
-                     if min_ts < r[SampleDataFile.COL_TIMESTAMP] <= max_ts]
-        log.msg("Selected {0} rows".format(len(week_rows)))
-
-        # We can just hand all our rows to the weekly file - it will trim as
-        # necessary
-        return WeeklySampleDataFile(self._station_code, dt.year, dt.month,
-                                    dt.day, week_rows)
+        return week_file
 
     def to_weekly_files(self, day=None):
         """
@@ -538,27 +688,15 @@ class MonthlySampleDataFile(SampleDataFile):
         :rtype: List[WeeklySampleDataFile]
         """
         if day is None:
-            files = []
-            for dt in self._dates():
-                files += self.to_weekly_files(dt)
-            return files
-
-        # Prepare the source rows. If we have access to the previous months
-        # data we'll add in the last week of data from that month too so we can
-        # build the full files for the first six days of this month.
-        if self._previous_7days is not None:
-            source = self._rows + self._previous_7days.rows()
+            days = [dt for dt, start, end in self._day_slices()]
         else:
-            source = self._rows
-
-        rows = []
-        for r in source:
-            rts = r[SampleDataFile.COL_TIMESTAMP].date()
-            if rts <= day:
-                rows.append(r)
+            days = [day]
 
-        return [WeeklySampleDataFile(self._station_code, day.year, day.month,
-                                     day.day, rows), ]
+        # Where the store still holds the last week of the previous month
+        # the full files for the first six days of this month are built.
+        return [WeeklySampleDataFile(self._station_code, dt.year, dt.month,
+                                     dt.day, self._store)
+                for dt in days]
 
     def add_row(self, row, base_directory):
         row_date = row[SampleDataFile.COL_TIMESTAMP].date()
@@ -572,189 +710,154 @@ class MonthlySampleDataFile(SampleDataFile):
         super(self.__class__, self).add_row(row, base_directory)
 
 
+def _replace_file(filename, data):
+    """
+    Writes a file via a temporary file so readers never see a partially
+    written file
+    :param filename: File to write
+    :type filename: str
+    :param data: New file contents
+    :type data: str
+    """
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, "w") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    try:
+        os.rename(temp_filename, filename)
+    except OSError:
+        # Windows won't rename over an existing file
+        os.unlink(filename)
+        os.rename(temp_filename, filename)
+
+
 class RainFiles(object):
+    """
+    Maintains the station-level rainfall totals files (rain_summary.json,
+    current_day_rainfall_totals.json and 24hr_rainfall_totals.json) from
+    running totals updated as each new sample arrives.
+    """
+
+    SUMMARY_PERIODS = ("today", "yesterday", "this_week", "this_month",
+                       "this_year")
+
     def __init__(self, directory):
+        """
+        :param directory: Station data directory to write files to
+        :type directory: str
+        """
         self._summary_file = os.path.join(directory, "rain_summary.json")
         self._day_file = os.path.join(directory,
                                       "current_day_rainfall_totals.json")
         self._rolling_file = os.path.join(directory,
                                           "24hr_rainfall_totals.json")
 
-        self._year_start = None
-        self._year_total = 0.0
-        self._year_end = None
+        # Contents last written to each file
+        self._written = {}
+
+        self._today = PeriodTotal(day_start)
+        self._yesterday = PeriodTotal(day_start)
+        self._week = PeriodTotal(week_start)
+        self._month = PeriodTotal(month_start)
+        self._year = PeriodTotal(year_start)
+
+        self._24h = RollingWindow(timedelta(hours=24))
+        self._168h = RollingWindow(timedelta(hours=168), include_start=True)
+
+    def _add_sample(self, ts, rain):
+        day = day_start(ts)
+
+        if self._today.start is not None and day > self._today.start:
+            # New day. Today becomes yesterday unless we've skipped over some
+            # days in which case there was no yesterday.
+            previous_today = self._today
+            self._today = PeriodTotal(day_start)
+            if day.date() - timedelta(days=1) == previous_today.start.date():
+                self._yesterday = previous_today
+            else:
+                self._yesterday = PeriodTotal(day_start)
+                self._yesterday.reset(day_start(day - timedelta(hours=12)))
+
+        if self._today.start is not None and day < self._today.start:
+            # A late sample. Yesterday is the only earlier day still reported.
+            if day.date() == self._today.start.date() - timedelta(days=1):
+                self._yesterday.add(ts, rain)
+        else:
+            self._today.add(ts, rain)
+
+        self._week.add(ts, rain)
+        self._month.add(ts, rain)
+        self._year.add(ts, rain)
+        self._24h.add(ts, rain)
+        self._168h.add(ts, rain)
 
-        self._week_start = None
-        self._week_total = 0.0
-        self._week_end = None
+    def new_samples(self, samples):
+        """
+        Updates totals with new samples and rewrites any files whose content
+        has changed as a result.
 
-        self._yesterday_start = None
-        self._yesterday_total = 0.0
-        self._yesterday_end = None
+        :param samples: Sample data file rows in timestamp order
+        :type samples: List
+        """
+        for sample in samples:
+            self._add_sample(sample[SampleDataFile.COL_TIMESTAMP],
+                             sample[SampleDataFile.COL_RAINFALL])
+        self._write_files()
 
-        self._today_start = None
-        self._today_total = 0.0
-        self._today_end = None
+    @defer.inlineCallbacks
+    def create(self, db, station_code):
+        """
+        Seeds totals from the database and writes out all files. This must
+        be called before new_samples.
 
-        self._month_start = None
-        self._month_total = 0.0
-        self._month_end = None
+        :param db: Database to load rainfall from
+        :type db: Database
+        :param station_code: Station to load rainfall for
+        :type station_code: str
+        """
+        rows = yield db.get_rainfall_seed(station_code)
 
-        self._24h_samples = []
-        self._168h_samples = []
-        self._7day_samples = []
+        for row in rows:
+            self._add_sample(row[0], row[1])
 
-    def new_sample(self, sample):
-        ts = sample[SampleDataFile.COL_TIMESTAMP]
-        rain = sample[SampleDataFile.COL_RAINFALL]
+        self._write_files()
 
-        new_sample_date = ts.date()
+    def _write_json(self, filename, document):
+        data = json.dumps(document, sort_keys=True)
 
-        last_ts = self._today_end
-        if last_ts is None:
-            last_ts = new_sample_date.date() - relativedelta(days=1)
-        today = last_ts.date()
+        if self._written.get(filename) == data:
+            return  # Unchanged
 
-        if new_sample_date < today:
-            # Samples from the past! Ignore.
-            return
+        _replace_file(filename, data)
+        self._written[filename] = data
 
-        if new_sample_date > today:
-            # New day! We need to figure out what we need to reset.
-
-            # At the very least, today and yesterday are resset
-            self._yesterday_start = self._today_start
-            self._yesterday_total = self._today_total
-            self._yesterday_end = self._today_end
-            self._today_start = ts
-            self._today_total = 0
-            self._today_end = ts
-            # Note the above may glitch if we skip over multiple days. If this
-            # happens, just delete the summary file and restart the service
-
-            if today.weekday() == 6 and new_sample_date.weekday() == 0:
-                # New week!
-                self._week_start = ts
-                self._week_end = ts
-                self._week_total = 0
-
-            if today.month != new_sample_date.month:
-                # Month has also changed. Reset that too
-                self._month_start = ts
-                self._month_end = ts
-                self._month_total = 0
-
-            if today.year != new_sample_date.year:
-                # New year! Reset..
-                self._year_start = ts
-                self._year_end = ts
-                self._year_total = 0
-
-        self._24h_samples.append((ts,rain))
-        self._168h_samples.append((ts,rain))
-        self._7day_samples.append((ts,rain))
-
-        min_24h = ts - relativedelta(hours=24)
-        min_168h = ts - relativedelta(hours=168)
-        min_7day = ts.date() - relativedelta(days=7)
-
-        # Trim samples outside the acceptable range
-        self._24h_samples = [s for s in self._24h_samples if s[0] > min_24h]
-        self._168h_samples = [s for s in self._168h_samples if s[0] > min_168h]
-        self._7day_samples = [s for s in self._7day_samples if s[0] > min_7day]
-
-        # Update totals and timespans
-        self._today_start = min(self._today_start, ts)
-        self._today_end = max(self._today_end, ts)
-        self._today_total += rain
-
-        self._week_start = min(self._today_start, ts)
-        self._week_end = max(self._today_end, ts)
-        self._week_total += rain
-
-        self._month_start = min(self._month_start, ts)
-        self._month_end = max(self._month_end, ts)
-        self._month_total += rain
-
-        self._year_start = min(self._year_start, ts)
-        self._year_end = max(self._year_end, ts)
-        self._year_total += rain
-
-        self._write_file()
+    def _write_files(self):
+        if self._today.end is None:
+            return  # No samples yet
 
-    @defer.inlineCallbacks
-    def create(self, db):
-
-
-        # TODO: these queries need to return ts and rain, not a total
-        day_query = """select sum(rainfall) as day_rainfall
-            from sample
-            where time_stamp::date = $time
-            and station_id = $station"""
-        week_query = """select sum(rainfall) as sevenday_rainfall
-        from sample s,
-          (
-             select max(time_stamp) as ts from sample
-             where date(time_stamp) = $time::date
-             and station_id = $station
-          ) as max_ts
-        where s.time_stamp <= max_ts.ts     -- 604800 seconds in a week.
-          and s.time_stamp >= (max_ts.ts - (604800 * '1 second'::interval))
-          and s.station_id = $station"""
-        rolling_24h_query = """select sum(rainfall) as day_rainfall
-            from sample
-            where (time_stamp < $time and time_stamp > $time - '1 hour'::interval * 24)
-            and station_id = $station"""
-        rolling_168h_query = """select sum(rainfall) as sevenday_rainfall
-        from sample s
-        where s.time_stamp <= $time     -- 604800 seconds in a week.
-          and s.time_stamp >= ($time - (604800 * '1 second'::interval))
-          and s.station_id = $station"""
-
-    def _write_file(self):
-        summary = {
-            "this_year": {
-                "start": self._year_start.isoformat(),
-                "total": self._year_total,
-                "end": self._year_end.isoformat()
-            },
-            "this_week": {
-                "start": self._week_start.isoformat(),
-                "total": self._week_total,
-                "end": self._week_end.isoformat()
-            },
-            "yesterday": {
-                "start": self._yesterday_start.isoformat(),
-                "total": self._yesterday_total,
-                "end": self._yesterday_end.isoformat()
-            },
-            "today": {
-                "start": self._today_start.isoformat(),
-                "total": self._today_total,
-                "end": self._today_end.isoformat()
-            },
-            "this_month": {
-                "start": self._month_start.isoformat(),
-                "total": self._month_total,
-                "end": self._month_end.isoformat()
-            }
-        }
+        summary = {}
+        periods = (self._today, self._yesterday, self._week, self._month,
+                   self._year)
+        for name, period in zip(self.SUMMARY_PERIODS, periods):
+            # Periods with no samples are left out
+            period_dict = period.to_dict()
+            if period_dict is not None:
+                summary[name] = period_dict
 
+        # The 7-day total for the current day covers the week ending at the
+        # latest sample so its the same as the rolling 168h total.
         day_totals = {
-            "rainfall": self._today_total,
-            "7day_rainfall": sum([r[1] for r in self._7day_samples])
+            "rainfall": self._today.total,
+            "7day_rainfall": self._168h.total
         }
 
         rolling_totals = {
-            "rainfall": sum([r[1] for r in self._24h_samples]),
-            "7day_rainfall": sum([r[1] for r in self._168h_samples])
+            "rainfall": self._24h.total,
+            "7day_rainfall": self._168h.total
         }
 
-        with open(self._summary_file, "w") as f:
-            f.write(json.dumps(summary))
-
-        with open(self._day_file, "w") as f:
-            f.write(json.dumps(day_totals))
-
-        with open(self._rolling_file, "w") as f:
-            f.write(json.dumps(rolling_totals))
\ No newline at end of file
+        self._write_json(self._summary_file, summary)
+        self._write_json(self._day_file, day_totals)
+        self._write_json(self._rolling_file, rolling_totals)
@@ -4,8 +4,10 @@ Handles production of charts using gnuplot
 """
 
 import os
+from collections import deque
+from timeit import default_timer as timer
 
-from twisted.internet import protocol
+from twisted.internet import protocol, reactor
 from twisted.python import log
 
 from static_data_service.util import Event
@@ -22,6 +24,26 @@ class GnuplotSettings(object):
         self._height = height
         self._output_format = output_format
 
+    @property
+    def output_filename(self):
+        return self._output_filename
+
+    @property
+    def title(self):
+        return self._title
+
+    @property
+    def width(self):
+        return self._width
+
+    @property
+    def height(self):
+        return self._height
+
+    @property
+    def output_format(self):
+        return self._output_format
+
     @staticmethod
     def _get_file_extension(output_format):
         """
@@ -131,6 +153,42 @@ class StandardChart(GnuplotSettings):
         return "Standard Line Chart - {0} {1}".format(self._title,
                                                       self._x_range)
 
+    @property
+    def series(self):
+        return self._series
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def value_axis_label(self):
+        return self._ylabel
+
+    @property
+    def value_axis_range(self):
+        return self._yrange
+
+    @property
+    def key_axis_label(self):
+        return self._xlabel
+
+    @property
+    def key_axis_range(self):
+        return self._x_range
+
+    @property
+    def key_axis_format(self):
+        return self._x_format
+
+    @property
+    def key_axis_is_time(self):
+        return self._key_axis_is_time
+
+    @property
+    def time_includes_date(self):
+        return self._time_has_date
+
     def to_script(self):
         # Line graph with a grid written to output_filename.
         # 'set datafile missing "?"' sets the ? character to mean missing data.
@@ -278,6 +336,18 @@ class RainfallChart(GnuplotSettings):
         return "Rainfall Chart - {0} {1}".format(self._title,
                                                       self._data_file)
 
+    @property
+    def data_file(self):
+        return self._data_file
+
+    @property
+    def columns(self):
+        return self._columns
+
+    @property
+    def empty(self):
+        return self._empty
+
     def to_script(self):
         xlabel = 'Hour'
         ylabel = 'Rainfall (mm)'
@@ -512,49 +582,296 @@ def make_7day_chart_settings(dest_dir, data_filename, x_range, output_format,
     return small + large
 
 
+# Written to stderr by gnuplot once it has finished a script
+_PLOT_COMPLETE = "--plot complete--"
+
+# Chart priorities. Charts for the current day are plotted before archival
+# charts.
+PRIORITY_CURRENT = 0
+PRIORITY_ARCHIVE = 1
+
+
 class GnuplotProcessProtocol(protocol.ProcessProtocol):
+    """
+    A gnuplot process which plots one chart at a time.
+    """
 
     def __init__(self):
         self._idle = False
-        self._received_output = ""
+        self._partial = ""
+        self._started = None
+        self.specs = None
+
+        # Fired with (worker, render time) when the worker is ready for another
+        # chart
         self.Ready = Event()
 
+        # Fired with the worker when gnuplot exits
+        self.Exited = Event()
+
     def connectionMade(self):
         log.msg("Gnuplot started!")
         self._idle = True
-        self.Ready.fire()
-        pass
+        self.Ready.fire(self, None)
 
     def errReceived(self, data):
-        # self._received_output += data.strip()
-        log.msg(data)
+        if not isinstance(data, str):
+            data = data.decode("utf-8", "replace")
 
-        # if self._received_output.endswith("--plot complete--"):
-        #     self._received_output = ""
-        #     self._idle = True
-        #     log.msg("gnuplot ready")
-        #     self.Ready.fire()
+        # Gnuplot prints its messages (and our completion marker) on stderr
+        lines = (self._partial + data).split("\n")
+        self._partial = lines.pop()
 
+        for line in lines:
+            if line.strip() == _PLOT_COMPLETE:
+                self._plot_complete()
+            elif line.strip():
+                log.msg("gnuplot: {0} ({1})".format(line, self.specs))
 
     def outReceived(self, data):
-        #self._received_output += data
         log.msg(data)
 
-        # if self._received_output.endswith("gnuplot>"):
-        #     self._received_output = ""
-        #     self._idle = True
-        #     log.msg("gnuplot ready")
-        #     self.Ready.fire()
-
-    def plot(self, script):
-        #log.msg(script)
+    def processEnded(self, reason):
+        log.msg("Gnuplot exited: {0}".format(reason.value))
         self._idle = False
-        s = "reset\n{0}\n".format(script)
-        self.transport.write(s)
+        self.Exited.fire(self)
+
+    def _plot_complete(self):
+        render_time = timer() - self._started
         self._idle = True
-        self.Ready.fire()
+        self.specs = None
+        self.Ready.fire(self, render_time)
+
+    def plot(self, specs):
+        """
+        Sends a chart to gnuplot. The Ready event fires once its finished.
+
+        :param specs: Chart to plot
+        :type specs: GnuplotSettings
+        """
+        self._idle = False
+        self.specs = specs
+        self._started = timer()
+
+        s = "reset\n{0}\nset output\nprint \"{1}\"\n".format(
+            specs.to_script(), _PLOT_COMPLETE)
+        self.transport.write(s.encode("utf-8"))
+
+    def close(self):
+        """
+        Asks gnuplot to exit once its finished any work in progress.
+        """
+        self.transport.closeStdin()
 
     @property
     def idle(self):
         return self._idle
 
+
+class ChartScheduler(object):
+    """
+    Plots charts using a pool of gnuplot processes. Charts for the current
+    day are plotted ahead of archival charts and if a chart is queued while an
+    earlier version of it is still waiting only the latest is plotted.
+    """
+
+    # How often (in charts plotted) to log progress while the queue is busy
+    _REPORT_INTERVAL = 500
+
+    # Delay before replacing a worker that exited (in seconds). This doubles
+    # each time a worker exits without a chart being plotted in between, up
+    # to the maximum.
+    _RESTART_DELAY = 1
+    _MAX_RESTART_DELAY = 300
+
+    def __init__(self, gnuplot_binary, workers=1, clock=reactor):
+        """
+        :param gnuplot_binary: Gnuplot binary to use
+        :type gnuplot_binary: str
+        :param workers: Number of gnuplot processes to run
+        :type workers: int
+        :param clock: Reactor used to schedule restarting workers
+        """
+        self._gnuplot_binary = gnuplot_binary
+        self._worker_count = workers
+        self._workers = []
+        self._stopping = False
+        self._clock = clock
+
+        # Workers that have exited since a chart was last plotted
+        self._restarts = 0
+        self._restart_calls = []
+
+        # Charts which have already crashed gnuplot once
+        self._retried = set()
+
+        # Output filenames waiting to be plotted for each priority. The specs
+        # to plot and the priority they're queued at are kept separately so a
+        # newer chart can replace one that's already waiting.
+        self._queues = (deque(), deque())
+        self._pending = {}
+        self._pending_priority = {}
+
+        # Metrics
+        self.queued = 0
+        self.coalesced = 0
+        self.plotted = 0
+        self.total_render_time = 0.0
+        self.max_render_time = 0.0
+        self._busy_since = None
+        self._busy_plotted = 0
+
+    @property
+    def queue_depth(self):
+        """
+        Number of charts waiting to be plotted
+        """
+        return len(self._pending)
+
+    @property
+    def mean_render_time(self):
+        if self.plotted == 0:
+            return None
+        return self.total_render_time / self.plotted
+
+    def start(self):
+        """
+        Starts the gnuplot processes
+        """
+        for _ in range(self._worker_count):
+            self._start_worker()
+
+    def stop(self):
+        """
+        Shuts down the gnuplot processes. Charts still queued are discarded.
+        """
+        self._stopping = True
+        for worker in self._workers:
+            worker.close()
+        for call in self._restart_calls:
+            if call.active():
+                call.cancel()
+        self._restart_calls = []
+
+    def _create_worker(self):
+        return GnuplotProcessProtocol()
+
+    def _launch_worker(self, worker):
+        reactor.spawnProcess(worker, self._gnuplot_binary,
+                             [self._gnuplot_binary],
+                             path=os.path.dirname(self._gnuplot_binary))
+
+    def _start_worker(self):
+        self._restart_calls = [c for c in self._restart_calls if c.active()]
+        worker = self._create_worker()
+        worker.Ready += self._worker_ready
+        worker.Exited += self._worker_exited
+        self._workers.append(worker)
+        self._launch_worker(worker)
+
+    def queue(self, chart_specs, priority=PRIORITY_CURRENT, data=None):
+        """
+        Queues charts to be plotted.
+
+        :param chart_specs: Charts to plot
+        :type chart_specs: list[GnuplotSettings]
+        :param priority: PRIORITY_CURRENT or PRIORITY_ARCHIVE
+        :type priority: int
+        :param data: Data files the charts are plotted from by filename.
+            Gnuplot reads them back from disk so this is ignored.
+        :type data: dict[str, DataFile]
+        """
+        if self._busy_since is None:
+            self._busy_since = timer()
+            self._busy_plotted = self.plotted
+
+        for specs in chart_specs:
+            filename = specs.output_filename
+            self.queued += 1
+
+            if filename in self._pending:
+                # Only the newest version of a chart is plotted
+                self.coalesced += 1
+                self._pending[filename] = specs
+                if priority >= self._pending_priority[filename]:
+                    continue
+
+            self._pending[filename] = specs
+            self._pending_priority[filename] = priority
+            self._queues[priority].append(filename)
+
+        self._dispatch()
+
+    def _next(self):
+        for priority, queue in enumerate(self._queues):
+            while queue:
+                filename = queue.popleft()
+                if self._pending_priority.get(filename) != priority:
+                    # Already plotted or moved to a higher priority
+                    continue
+                del self._pending_priority[filename]
+                return self._pending.pop(filename)
+        return None
+
+    def _dispatch(self):
+        for worker in self._workers:
+            if not worker.idle:
+                continue
+
+            specs = self._next()
+            if specs is None:
+                return
+            worker.plot(specs)
+
+    def _worker_ready(self, worker, render_time):
+        if render_time is not None:
+            self._restarts = 0
+            self.plotted += 1
+            self.total_render_time += render_time
+            self.max_render_time = max(self.max_render_time, render_time)
+
+            if self.plotted % self._REPORT_INTERVAL == 0:
+                log.msg("Plotted {0} charts, {1} waiting".format(
+                    self.plotted, self.queue_depth))
+
+        self._dispatch()
+
+        if self._busy_since is not None and not self._pending and \
+                all(w.idle for w in self._workers):
+            log.msg("Chart queue empty. Plotted {0} charts in {1:.1f} "
+                    "seconds. Mean render time {2:.3f}s, max {3:.3f}s, "
+                    "{4} duplicate charts skipped.".format(
+                        self.plotted - self._busy_plotted,
+                        timer() - self._busy_since,
+                        self.mean_render_time or 0.0,
+                        self.max_render_time, self.coalesced))
+            self._busy_since = None
+
+    def _worker_exited(self, worker):
+        self._workers.remove(worker)
+        if self._stopping:
+            return
+
+        if worker.specs is not None:
+            # Plot the chart again unless a newer version is already waiting
+            # or its already crashed gnuplot before.
+            log.msg("Gnuplot exited while plotting {0}".format(worker.specs))
+            filename = worker.specs.output_filename
+            if filename in self._retried:
+                log.msg("Giving up on {0}".format(filename))
+            elif filename not in self._pending:
+                self._retried.add(filename)
+                self.queue([worker.specs], PRIORITY_ARCHIVE)
+
+        # Replace the worker. If workers keep exiting (gnuplot missing or
+        # broken) back off rather than respawning it every second forever.
+        self._restarts += 1
+        delay = min(self._RESTART_DELAY * 2 ** (self._restarts - 1),
+                    self._MAX_RESTART_DELAY)
+        if self._restarts > 1:
+            log.msg("*** Gnuplot has exited {0} times without plotting a "
+                    "chart. Check gnuplot is installed and working. "
+                    "Restarting it in {1} seconds. ***".format(
+                        self._restarts, delay))
+        self._restart_calls.append(
+            self._clock.callLater(delay, self._start_worker))
@@ -0,0 +1,628 @@
+# coding=utf-8
+"""
+Handles production of charts using matplotlib as an alternative to gnuplot.
+Charts are described by the same GnuplotSettings objects but are plotted from
+data held in memory rather than from data files on disk. Rendering is done by
+a pool of worker processes using the Agg backend each of which reuses its
+figures from one chart to the next.
+"""
+
+import io
+import multiprocessing
+import re
+import sys
+from datetime import date, datetime, time
+from timeit import default_timer as timer
+
+import numpy
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.dates import DateFormatter, DayLocator, HourLocator, date2num
+from matplotlib.figure import Figure
+from matplotlib.ticker import AutoLocator, ScalarFormatter
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from twisted.internet import reactor
+from twisted.python import log
+
+from static_data_service.datafile import DailyRainDataFile, \
+    DailySampleDataFile, SampleDataFile
+from static_data_service.gnuplot import ChartScheduler, StandardChart, \
+    RainfallChart, PRIORITY_CURRENT
+from static_data_service.util import Event
+
+# Time-only key axis values are plotted against this date
+_TIME_BASE_DATE = date(2000, 1, 1)
+
+# Figures are sized in pixels at this resolution
+_DPI = 100
+
+# Space around the plot for the title, axis labels and tic labels in pixels:
+# left, right, top, bottom
+_MARGINS = (70, 20, 30, 45)
+
+# Charts narrower than this get smaller tic labels
+_SMALL_WIDTH = 760
+
+# Colours used by the gnuplot chart styles
+_SERIES_COLOURS = ['#8b1a0e', '#5e9c36']
+_BORDER_COLOUR = '#808080'
+_RAINFALL_COLOUR = 'blue'
+
+# Formats savefig can write directly by file extension. GIF is written via
+# Pillow from a PNG.
+_SAVE_FORMATS = {
+    ".png": "png",
+    ".jpg": "jpeg",
+    ".pdf": "pdf",
+    ".ps": "ps",
+    ".svg": "svg",
+}
+
+_RAINFALL_COLUMNS = re.compile(r"^(\d+):(\d+)(?::xtic\((\d+)\))?$")
+
+# How long to wait for a chart to be rendered (in seconds) before giving up on
+# it. Charts normally take well under a second.
+RENDER_TIMEOUT = 60
+
+# Pool.apply_async only takes an error_callback on Python 3. On Python 2 a
+# chart that never comes back from the pool is given up on by the timeout.
+_ERROR_CALLBACK = sys.version_info[0] >= 3
+
+
+def _key_axis_value(value, includes_date):
+    # Converts a timestamp from a data file (or a chart range) to the naive
+    # local time it is plotted at.
+    if not includes_date:
+        if isinstance(value, datetime):
+            value = value.time()
+        elif not isinstance(value, time):
+            value = datetime.strptime(str(value)[:8], "%H:%M:%S").time()
+        return datetime.combine(_TIME_BASE_DATE, value.replace(tzinfo=None))
+
+    if not isinstance(value, datetime):
+        value = datetime.strptime(str(value)[:19], "%Y-%m-%d %H:%M:%S")
+    return value.replace(tzinfo=None)
+
+
+class ChartData(object):
+    """
+    Columns of a data file numbered the way gnuplot numbers them (starting
+    from 1) so chart specs can refer to them in the same way.
+    """
+
+    def __init__(self, columns, labels=None):
+        """
+        :param columns: Numeric columns by gnuplot column number
+        :type columns: dict[int, numpy.ndarray]
+        :param labels: Text columns by gnuplot column number. Used for tic
+            labels.
+        :type labels: dict[int, list[str]]
+        """
+        self._columns = columns
+        self._labels = labels or {}
+
+    def __len__(self):
+        if not self._columns:
+            return 0
+        return len(self._columns[1])
+
+    def column(self, number):
+        """
+        Returns a column as an array. Missing values are NaN.
+
+        :param number: Gnuplot column number
+        :type number: int
+        :rtype: numpy.ndarray
+        """
+        return self._columns[number]
+
+    def labels(self, number):
+        """
+        Returns a column as text
+        :param number: Gnuplot column number
+        :type number: int
+        :rtype: list[str]
+        """
+        return self._labels[number]
+
+    @staticmethod
+    def from_sample_file(data_file, includes_date):
+        """
+        Builds chart data from a sample data file. Value columns are copied
+        straight out of the files sample store.
+
+        :param data_file: Sample data file
+        :type data_file: SampleDataFile
+        :param includes_date: If the data file is written with dates as well
+            as times. Gnuplot sees the date and time as two columns which
+            shifts all the values along by one.
+        :type includes_date: bool
+        :rtype: ChartData
+        """
+        first_value = 3 if includes_date else 2
+
+        columns = {
+            1: numpy.array([date2num(_key_axis_value(ts, includes_date))
+                            for ts in data_file.timestamps()], dtype=float)
+        }
+
+        if len(columns[1]):
+            # Missing values are already NaN which breaks the line just like
+            # gnuplots missing data does.
+            for number in range(SampleDataFile.COL_TEMPERATURE,
+                                SampleDataFile.COL_FORECAST_RULE_ID + 1):
+                columns[first_value + number - 1] = numpy.frombuffer(
+                    data_file.column(number), dtype=float)
+
+        return ChartData(columns)
+
+    @staticmethod
+    def from_rain_rows(rows):
+        """
+        Builds chart data from hourly rainfall data file rows (as held by
+        DailyRainDataFile)
+
+        :param rows: (hour timestamp, rainfall) rows
+        :type rows: list
+        :rtype: ChartData
+        """
+        hours = [row[0].hour for row in rows]
+        return ChartData({
+            1: numpy.array(hours, dtype=float),
+            2: numpy.array([row[1] for row in rows], dtype=float)
+        }, {
+            1: [str(hour) for hour in hours]
+        })
+
+    @staticmethod
+    def from_data_file(data_file):
+        """
+        Builds chart data from the rows of a data file
+
+        :param data_file: Data file
+        :type data_file: DataFile
+        :rtype: ChartData
+        """
+        if isinstance(data_file, DailyRainDataFile):
+            return ChartData.from_rain_rows(data_file.rows())
+
+        # Only day level data files leave out the date
+        return ChartData.from_sample_file(
+            data_file, not isinstance(data_file, DailySampleDataFile))
+
+    @staticmethod
+    def load(filename, includes_date):
+        """
+        Loads chart data from a tab-delimited data file on disk. This is only
+        used for charts queued without their data.
+
+        :param filename: Data file to load
+        :type filename: str
+        :param includes_date: If timestamps in the data file include the date
+        :type includes_date: bool
+        :rtype: ChartData
+        """
+        records = []
+        with open(filename, 'r') as f:
+            for line in f:
+                if line.startswith('#') or not line.strip():
+                    continue
+                records.append(line.split())
+
+        def _number(value):
+            try:
+                return float(value)
+            except ValueError:
+                return numpy.nan
+
+        key_columns = 2 if includes_date else 1
+        columns = {}
+        labels = {}
+        if records:
+            labels[1] = [record[0] for record in records]
+            columns[1] = numpy.array([
+                date2num(_key_axis_value(
+                    " ".join(record[:key_columns]), includes_date))
+                if ':' in record[0] or includes_date else _number(record[0])
+                for record in records], dtype=float)
+
+            for col in range(key_columns, max(len(r) for r in records)):
+                columns[col + 1] = numpy.array([
+                    _number(record[col]) if col < len(record) else numpy.nan
+                    for record in records], dtype=float)
+
+        return ChartData(columns, labels)
+
+
+class RenderJob(object):
+    """
+    A chart along with the data to plot it from. Only the columns the chart
+    uses are included so jobs are cheap to send to the worker processes.
+    """
+
+    def __init__(self, specs, data=None):
+        """
+        :param specs: Chart to plot
+        :type specs: StandardChart or RainfallChart
+        :param data: Data for the chart by normalised data filename. Data
+            files not included are loaded from disk and added to it.
+        :type data: dict[str, ChartData]
+        """
+        self.specs = specs
+        self.lines = []
+        self.bars = None
+
+        if data is None:
+            data = {}
+
+        def _data(filename, includes_date):
+            filename = _normalise_filename(filename)
+            if filename not in data:
+                data[filename] = ChartData.load(filename, includes_date)
+            return data[filename]
+
+        if isinstance(specs, StandardChart):
+            for series in specs.series or []:
+                d = _data(series.data_file, specs.time_includes_date)
+                if not len(d):
+                    continue
+                self.lines.append((series.title,
+                                   d.column(series.x_column),
+                                   d.column(series.y_column)))
+        elif isinstance(specs, RainfallChart):
+            match = _RAINFALL_COLUMNS.match(specs.columns)
+            if match is None:
+                raise ValueError("Unsupported rainfall columns {0}".format(
+                    specs.columns))
+            d = _data(specs.data_file, False)
+            if len(d):
+                labels = None
+                if match.group(3) is not None:
+                    labels = d.labels(int(match.group(3)))
+                self.bars = (d.column(int(match.group(1))),
+                             d.column(int(match.group(2))),
+                             labels)
+        else:
+            raise ValueError("Unsupported chart type {0}".format(specs))
+
+    @property
+    def output_filename(self):
+        return self.specs.output_filename
+
+    def __str__(self):
+        return str(self.specs)
+
+
+def _normalise_filename(filename):
+    return filename.replace("\\", "/")
+
+
+# Figures by size in the current worker process
+_figures = {}
+
+
+def _new_figure(width, height):
+    figure = Figure(figsize=(width / float(_DPI), height / float(_DPI)),
+                    dpi=_DPI)
+    FigureCanvasAgg(figure)
+
+    # Fixed margins (in pixels) rather than working out a tight layout for
+    # every chart
+    left, right, top, bottom = _MARGINS
+    axes = figure.add_axes([left / float(width),
+                            bottom / float(height),
+                            1 - (left + right) / float(width),
+                            1 - (top + bottom) / float(height)])
+
+    # Equivalent of the border, tics and grid settings in the gnuplot scripts
+    for side in ('top', 'right'):
+        axes.spines[side].set_visible(False)
+    for side in ('left', 'bottom'):
+        axes.spines[side].set_color(_BORDER_COLOUR)
+    axes.tick_params(colors=_BORDER_COLOUR, labelcolor='black',
+                     top=False, right=False,
+                     labelsize=8 if width < _SMALL_WIDTH else 10)
+    axes.grid(True, color=_BORDER_COLOUR, linestyle=':', linewidth=1)
+    axes.set_axisbelow(True)
+
+    return figure, axes
+
+
+def _figure(width, height):
+    # Figures are reused from one chart to the next. Rather than clearing the
+    # axes (which throws away the tick objects that are expensive to create)
+    # only what the previous chart plotted is removed.
+    key = (width, height)
+    if key not in _figures:
+        _figures[key] = _new_figure(width, height)
+
+    figure, axes = _figures[key]
+
+    for container in list(axes.containers):
+        container.remove()
+    for artist in list(axes.lines) + list(axes.patches):
+        artist.remove()
+    if axes.get_legend() is not None:
+        axes.get_legend().remove()
+
+    axes.xaxis.set_major_locator(AutoLocator())
+    axes.xaxis.set_major_formatter(ScalarFormatter())
+    axes.relim()
+    axes.set_autoscale_on(True)
+
+    return figure, axes
+
+
+def _set_labels(axes, specs, key_axis_label, value_axis_label):
+    # An explicit title position saves working it out from the axes
+    # bounding box.
+    axes.set_title(specs.title or "", y=1.0)
+    axes.set_xlabel(key_axis_label or "")
+    axes.set_ylabel(value_axis_label or "")
+
+
+def _plot_line_chart(axes, job):
+    specs = job.specs
+
+    for i, (title, x, y) in enumerate(job.lines):
+        axes.plot(x, y, label=title, linewidth=2,
+                  color=_SERIES_COLOURS[i % len(_SERIES_COLOURS)])
+
+    if specs.key_axis_is_time:
+        if specs.time_includes_date:
+            axes.xaxis.set_major_locator(DayLocator())
+        else:
+            # Every hour on the large charts, every few on the small ones
+            axes.xaxis.set_major_locator(HourLocator(
+                interval=max(1, int(round(_SMALL_WIDTH * 1.5 /
+                                          specs.width)))))
+        if specs.key_axis_format is not None:
+            axes.xaxis.set_major_formatter(
+                DateFormatter(specs.key_axis_format))
+        if specs.key_axis_range is not None:
+            axes.set_xlim(*[date2num(_key_axis_value(
+                v, specs.time_includes_date)) for v in specs.key_axis_range])
+
+    _set_labels(axes, specs, specs.key_axis_label, specs.value_axis_label)
+
+    if specs.value_axis_range is not None:
+        axes.set_ylim(float(specs.value_axis_range[0]),
+                      float(specs.value_axis_range[1]))
+    if specs.key and job.lines:
+        axes.legend(loc='upper right', frameon=False)
+
+
+def _plot_rainfall_chart(axes, job):
+    specs = job.specs
+
+    if job.bars is not None:
+        x, y, labels = job.bars
+        axes.bar(x, y, width=0.8, color=_RAINFALL_COLOUR, edgecolor='black')
+        if labels is not None:
+            axes.set_xticks(x)
+            axes.set_xticklabels(labels)
+
+    _set_labels(axes, specs, 'Hour', 'Rainfall (mm)')
+    if specs.empty:
+        axes.set_ylim(0, 1)
+
+
+def _save(figure, filename):
+    ext = filename[filename.rfind('.'):].lower() if '.' in filename else ""
+
+    if ext == ".gif":
+        from PIL import Image
+        buf = io.BytesIO()
+        figure.savefig(buf, format="png", dpi=_DPI)
+        buf.seek(0)
+        Image.open(buf).convert("RGB").save(filename, "GIF")
+        return
+
+    if ext not in _SAVE_FORMATS:
+        raise ValueError("Unsupported output format for {0}".format(filename))
+
+    figure.savefig(filename, format=_SAVE_FORMATS[ext], dpi=_DPI)
+
+
+def render(job):
+    """
+    Renders a chart. This runs in the worker processes.
+
+    :param job: Chart to render
+    :type job: RenderJob
+    :return: Render time and an error message if rendering failed
+    :rtype: (float, str or None)
+    """
+    start = timer()
+    try:
+        specs = job.specs
+        figure, axes = _figure(specs.width, specs.height)
+
+        if isinstance(specs, RainfallChart):
+            _plot_rainfall_chart(axes, job)
+        else:
+            _plot_line_chart(axes, job)
+
+        _save(figure, specs.output_filename)
+        error = None
+    except Exception as e:
+        error = "{0}: {1}".format(type(e).__name__, e)
+    return timer() - start, error
+
+
+class MatplotlibWorker(object):
+    """
+    A slot in the render process pool which plots one chart at a time. This
+    behaves like GnuplotProcessProtocol so ChartScheduler can use it in the
+    same way.
+    """
+
+    def __init__(self, pool, timeout=RENDER_TIMEOUT, clock=reactor):
+        """
+        :param pool: Render process pool
+        :type pool: multiprocessing.Pool
+        :param timeout: How long to wait for a chart before giving up on it
+            (in seconds)
+        :type timeout: float
+        :param clock: Reactor used for timeouts and to get results back from
+            the pools threads
+        """
+        self._pool = pool
+        self._timeout = timeout
+        self._clock = clock
+        self._idle = False
+        self._plot_id = 0
+        self._timeout_call = None
+        self.specs = None
+
+        # Fired with (worker, render time) when the worker is ready for another
+        # chart
+        self.Ready = Event()
+
+        # Never fired. The process pool replaces any render processes that
+        # exit by itself.
+        self.Exited = Event()
+
+    def start(self):
+        self._idle = True
+        self.Ready.fire(self, None)
+
+    def plot(self, specs):
+        """
+        Sends a chart to the process pool. The Ready event fires once its
+        finished.
+
+        :param specs: Chart to plot
+        :type specs: RenderJob
+        """
+        self._idle = False
+        self.specs = specs
+
+        # Results for a chart that has already been given up on are ignored
+        self._plot_id += 1
+        plot_id = self._plot_id
+
+        # The callbacks run on one of the pools threads
+        def _callback(result):
+            self._clock.callFromThread(self._plot_complete, plot_id, result)
+
+        def _error_callback(e):
+            self._clock.callFromThread(self._plot_complete, plot_id, (
+                None, "{0}: {1}".format(type(e).__name__, e)))
+
+        kwargs = dict(callback=_callback)
+        if _ERROR_CALLBACK:
+            kwargs["error_callback"] = _error_callback
+
+        self._timeout_call = self._clock.callLater(
+            self._timeout, self._plot_timed_out, plot_id)
+
+        try:
+            self._pool.apply_async(render, (specs,), **kwargs)
+        except Exception as e:
+            # Such as the pool having been closed
+            self._clock.callLater(0, self._plot_complete, plot_id, (
+                None, "{0}: {1}".format(type(e).__name__, e)))
+
+    def _plot_timed_out(self, plot_id):
+        self._timeout_call = None
+        log.msg("matplotlib: *** Gave up on {0} after {1} seconds. The "
+                "render process may be stuck. ***".format(self.specs,
+                                                         self._timeout))
+        self._plot_complete(plot_id, (None, None))
+
+    def _plot_complete(self, plot_id, result):
+        if plot_id != self._plot_id or self.specs is None:
+            # Already given up on
+            return
+
+        if self._timeout_call is not None and self._timeout_call.active():
+            self._timeout_call.cancel()
+        self._timeout_call = None
+
+        render_time, error = result
+        if error is not None:
+            log.msg("matplotlib: {0} ({1})".format(error, self.specs))
+        self._idle = True
+        self.specs = None
+        self.Ready.fire(self, render_time)
+
+    def close(self):
+        self._idle = False
+        if self._timeout_call is not None and self._timeout_call.active():
+            self._timeout_call.cancel()
+        self._timeout_call = None
+
+    @property
+    def idle(self):
+        return self._idle
+
+
+class MatplotlibChartScheduler(ChartScheduler):
+    """
+    Plots charts using a pool of processes rendering with matplotlib.
+    Scheduling is the same as for ChartScheduler but charts are plotted from
+    the data files passed to queue() rather than reading them back from
+    disk.
+    """
+
+    def __init__(self, workers=1, render_timeout=RENDER_TIMEOUT):
+        """
+        :param workers: Number of render processes to run
+        :type workers: int
+        :param render_timeout: How long to wait for a chart before giving up
+            on it (in seconds)
+        :type render_timeout: float
+        """
+        super(MatplotlibChartScheduler, self).__init__(None, workers)
+        self._pool = None
+        self._render_timeout = render_timeout
+
+    def start(self):
+        """
+        Starts the render processes
+        """
+        self._pool = multiprocessing.Pool(self._worker_count)
+        super(MatplotlibChartScheduler, self).start()
+
+    def stop(self):
+        """
+        Shuts down the render processes once charts currently being plotted
+        are finished. Charts still queued are discarded.
+        """
+        super(MatplotlibChartScheduler, self).stop()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    def _create_worker(self):
+        return MatplotlibWorker(self._pool, self._render_timeout)
+
+    def _launch_worker(self, worker):
+        worker.start()
+
+    def queue(self, chart_specs, priority=PRIORITY_CURRENT, data=None):
+        """
+        Queues charts to be plotted.
+
+        :param chart_specs: Charts to plot
+        :type chart_specs: list[GnuplotSettings]
+        :param priority: PRIORITY_CURRENT or PRIORITY_ARCHIVE
+        :type priority: int
+        :param data: Data files the charts are plotted from by filename. Any
+            not included are loaded from disk.
+        :type data: dict[str, DataFile]
+        """
+        # Data files loaded from disk are shared by all charts in the batch
+        data = dict((_normalise_filename(k), ChartData.from_data_file(v))
+                    for k, v in (data or {}).items())
+
+        jobs = []
+        for specs in chart_specs:
+            try:
+                jobs.append(RenderJob(specs, data))
+            except (IOError, OSError, ValueError) as e:
+                log.msg("Unable to plot {0}: {1}".format(specs, e))
+
+        super(MatplotlibChartScheduler, self).queue(jobs, priority)
@@ -0,0 +1,223 @@
+# coding=utf-8
+"""
+Running rainfall totals over rolling windows (the last 24 hours, the last 168
+hours) and calendar periods (today, this week, this month, etc). Totals are
+maintained incrementally as samples arrive so nothing needs to be summed or
+queried from the database after the initial seed.
+"""
+from collections import deque
+from datetime import timedelta
+
+__author__ = 'david'
+
+# Running totals are adjusted by adding and subtracting floats which slowly
+# accumulates rounding error. Totals are rounded to this many places on the
+# way out to hide it.
+_TOTAL_PLACES = 6
+
+
+class RollingWindow(object):
+    """
+    Total rainfall over a fixed span of time ending at the most recent sample.
+    Samples are kept in timestamp order in a deque along with a running total;
+    samples falling out of the window are evicted from the left as time
+    advances.
+    """
+
+    def __init__(self, span, include_start=False):
+        """
+        :param span: Length of the window
+        :type span: timedelta
+        :param include_start: If a sample exactly span before the most recent
+            sample is inside the window
+        :type include_start: bool
+        """
+        self._span = span
+        self._include_start = include_start
+        self._samples = deque()
+        self._total = 0.0
+
+    def __len__(self):
+        return len(self._samples)
+
+    @property
+    def total(self):
+        """
+        Total rainfall over the window
+        :rtype: float
+        """
+        return round(self._total, _TOTAL_PLACES)
+
+    @property
+    def end(self):
+        """
+        Timestamp of the most recent sample in the window or None if the
+        window is empty
+        :rtype: datetime
+        """
+        if not self._samples:
+            return None
+        return self._samples[-1][0]
+
+    def _outside(self, ts, end):
+        start = end - self._span
+        if self._include_start:
+            return ts < start
+        return ts <= start
+
+    def add(self, ts, rain):
+        """
+        Adds a sample to the window. Samples may arrive out of order; a sample
+        for a timestamp already in the window replaces it.
+
+        :param ts: Sample timestamp
+        :type ts: datetime
+        :param rain: Rainfall for the sample
+        :type rain: float
+        :returns: True if the total may have changed
+        :rtype: bool
+        """
+        rain = float(rain or 0.0)
+
+        if not self._samples or ts > self._samples[-1][0]:
+            # The common case: a new sample for the current time.
+            self._samples.append((ts, rain))
+            self._total += rain
+            self._evict()
+            return True
+
+        if self._outside(ts, self._samples[-1][0]):
+            # Too old to be part of the window
+            return False
+
+        # Out of order. Its almost always only a few samples behind so walk
+        # back from the end to find where it belongs.
+        newer = []
+        while self._samples and self._samples[-1][0] > ts:
+            newer.append(self._samples.pop())
+
+        if self._samples and self._samples[-1][0] == ts:
+            # Replacing an existing sample
+            self._total -= self._samples.pop()[1]
+
+        self._samples.append((ts, rain))
+        self._total += rain
+
+        while newer:
+            self._samples.append(newer.pop())
+
+        return True
+
+    def _evict(self):
+        end = self._samples[-1][0]
+        while self._samples and self._outside(self._samples[0][0], end):
+            self._total -= self._samples.popleft()[1]
+
+        if len(self._samples) == 1:
+            # Nothing else left to accumulate error against
+            self._total = self._samples[0][1]
+
+
+class PeriodTotal(object):
+    """
+    Total rainfall over a calendar period (a day, week, month or year). When a
+    sample arrives for a later period the total restarts from that sample so
+    gaps of any length are handled. Samples for earlier periods are ignored.
+    """
+
+    def __init__(self, period_start):
+        """
+        :param period_start: Function returning the start of the period
+            containing the supplied timestamp
+        :type period_start: callable
+        """
+        self._period_start = period_start
+        self.start = None
+        self.end = None
+        self._total = 0.0
+
+    @property
+    def total(self):
+        """
+        Total rainfall for the period
+        :rtype: float
+        """
+        return round(self._total, _TOTAL_PLACES)
+
+    def reset(self, start):
+        """
+        Starts a new, empty, period
+
+        :param start: Start of the period
+        :type start: datetime
+        """
+        self.start = start
+        self.end = None
+        self._total = 0.0
+
+    def add(self, ts, rain):
+        """
+        Adds a sample to the period total.
+
+        :param ts: Sample timestamp
+        :type ts: datetime
+        :param rain: Rainfall for the sample
+        :type rain: float
+        :returns: True if the sample was within the current (or a new) period
+        :rtype: bool
+        """
+        start = self._period_start(ts)
+
+        if self.start is not None and start < self.start:
+            return False  # From a period we've finished with
+
+        if self.start is None or start > self.start:
+            self.reset(start)
+
+        self._total += float(rain or 0.0)
+        if self.end is None or ts > self.end:
+            self.end = ts
+        return True
+
+    def to_dict(self):
+        """
+        Returns the period in the form used by rain_summary.json or None if
+        no samples have been seen for the period.
+        :rtype: dict or None
+        """
+        if self.end is None:
+            return None
+        return {
+            "start": self.start.isoformat(),
+            "total": self.total,
+            "end": self.end.isoformat()
+        }
+
+
+def day_start(ts):
+    """
+    Midnight at the start of the day containing ts
+    """
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def week_start(ts):
+    """
+    Midnight at the start of the week (Sunday) containing ts
+    """
+    # weekday() is 0 for Monday
+    return day_start(ts) - timedelta(days=(ts.weekday() + 1) % 7)
+
+
+def month_start(ts):
+    """
+    Midnight at the start of the month containing ts
+    """
+    return day_start(ts).replace(day=1)
+
+
+def year_start(ts):
+    """
+    Midnight at the start of the year containing ts
+    """
+    return day_start(ts).replace(month=1, day=1)
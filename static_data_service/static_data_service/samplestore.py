@@ -0,0 +1,251 @@
+# coding=utf-8
+"""
+Columnar in-memory store for the recent samples of a single station. The
+month, day, 7-day and hourly rainfall data files are all views over a store
+so each sample is only held (and inserted) once no matter how many files it
+appears in. Values are kept in typed arrays rather than as boxed Decimal, int
+and float objects in lists of rows.
+"""
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+__author__ = 'david'
+
+
+# Formats for numeric values rounded by the database to a fixed number of
+# places (str(Decimal) always gives exactly that many), integers and floats.
+_FIXED_1 = ":.1f"
+_FIXED_2 = ":.2f"
+_INTEGER = ":.0f"
+_FLOAT = "!s"
+
+# How each value column (following the timestamp) of a sample row as
+# returned by SAMPLE_QUERY is written to a data file. Values are stored as
+# doubles and formatted the same way str() formats the value the database
+# gave us so data files are unchanged.
+VALUE_FORMATS = [
+    _FIXED_2,  # temperature
+    _FIXED_1,  # dew point
+    _FIXED_1,  # apparent temperature
+    _FIXED_1,  # wind chill
+    _INTEGER,  # relative humidity
+    _FIXED_2,  # pressure
+    _FIXED_2,  # indoor temperature
+    _INTEGER,  # indoor relative humidity
+    _FIXED_1,  # rainfall
+    _FIXED_2,  # average wind speed
+    _FIXED_2,  # gust wind speed
+    _INTEGER,  # wind direction
+    _FIXED_1,  # uv index
+    _INTEGER,  # solar radiation
+    _FLOAT,    # reception
+    _FIXED_2,  # high temperature
+    _FIXED_2,  # low temperature
+    _FIXED_2,  # high rain rate
+    _FLOAT,    # gust direction
+    _FLOAT,    # evapotranspiration
+    _INTEGER,  # high solar radiation
+    _FIXED_1,  # high uv index
+    _INTEGER,  # forecast rule id
+]
+
+# Most stations are missing the same values from every sample (stations
+# without solar sensors, etc) so only a handful of record formats are ever
+# needed. This stops a station missing values at random building too many.
+_MAX_RECORD_FORMATS = 64
+
+_MISSING = float('nan')
+
+# Store from the most recent sample back this far by default. This covers a
+# whole month plus the week before it for the first 7-day files of the month.
+DEFAULT_RETAIN = timedelta(days=40)
+
+# Old samples are evicted in batches of at least this much time so eviction
+# doesn't shuffle every column along on every new sample.
+_EVICT_SLACK = timedelta(days=1)
+
+
+class SampleStore(object):
+    """
+    Samples for a station ordered by timestamp. Timestamps are held in a list
+    (so they keep their time zone) and every other column in an array of
+    doubles with NaN for missing values. Samples older than the retention
+    period are evicted from the start as new samples arrive.
+    """
+
+    def __init__(self, retain=DEFAULT_RETAIN):
+        """
+        :param retain: How far back from the most recent sample to keep
+            samples for
+        :type retain: timedelta
+        """
+        self._retain = retain
+        self._timestamps = []
+        self._columns = [array('d') for _ in VALUE_FORMATS]
+
+        # Format string for a whole record by which values are missing
+        self._record_formats = {}
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    @staticmethod
+    def _values(row):
+        return [_MISSING if value is None else float(value)
+                for value in row[1:len(VALUE_FORMATS) + 1]]
+
+    def _evict(self):
+        if not self._timestamps:
+            return
+
+        oldest = self._timestamps[-1] - self._retain
+        if self._timestamps[0] >= oldest - _EVICT_SLACK:
+            return
+
+        count = bisect_left(self._timestamps, oldest)
+        del self._timestamps[:count]
+        for column in self._columns:
+            del column[:count]
+
+    def add(self, row):
+        """
+        Adds a sample. A sample with the same timestamp as one already in the
+        store replaces it.
+
+        :param row: Sample row (timestamp followed by values) as returned by
+            SAMPLE_QUERY
+        :type row: List
+        :return: Index the sample was stored at
+        :rtype: int
+        """
+        ts = row[0]
+        values = self._values(row)
+
+        if not self._timestamps or ts > self._timestamps[-1]:
+            # New samples almost always arrive in order
+            self._timestamps.append(ts)
+            for column, value in zip(self._columns, values):
+                column.append(value)
+            self._evict()
+            return len(self._timestamps) - 1
+
+        i = bisect_left(self._timestamps, ts)
+        if i < len(self._timestamps) and self._timestamps[i] == ts:
+            for column, value in zip(self._columns, values):
+                column[i] = value
+        else:
+            self._timestamps.insert(i, ts)
+            for column, value in zip(self._columns, values):
+                column.insert(i, value)
+        return i
+
+    def extend(self, rows):
+        """
+        Adds many samples, such as a month loaded from the database
+
+        :param rows: Sample rows in any order
+        :type rows: List
+        """
+        for row in sorted(rows, key=lambda r: r[0]):
+            self.add(row)
+
+    def timestamp(self, index):
+        return self._timestamps[index]
+
+    def timestamps(self, start, end):
+        """
+        Returns the timestamps of samples start to end (exclusive)
+        :rtype: List[datetime]
+        """
+        return self._timestamps[start:end]
+
+    def column(self, number, start, end):
+        """
+        Returns values from a column for samples start to end (exclusive).
+        Missing values are NaN.
+
+        :param number: Column number in the sample row (1 is the first value
+            following the timestamp)
+        :type number: int
+        :rtype: array
+        """
+        return self._columns[number - 1][start:end]
+
+    def index_at(self, ts, start=0, end=None):
+        """
+        Index of the first sample at or later than ts
+        """
+        if end is None:
+            end = len(self._timestamps)
+        return bisect_left(self._timestamps, ts, start, end)
+
+    def index_after(self, ts, start=0, end=None):
+        """
+        Index of the first sample later than ts
+        """
+        if end is None:
+            end = len(self._timestamps)
+        return bisect_right(self._timestamps, ts, start, end)
+
+    def date_index(self, day):
+        """
+        Returns the index of the first sample on or after the specified date.
+        Dates are compared in each samples own timezone so this can't bisect
+        on a timestamp directly.
+
+        :param day: Date to search for
+        :type day: date
+        :rtype: int
+        """
+        lo = 0
+        hi = len(self._timestamps)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._timestamps[mid].date() < day:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def row(self, index):
+        """
+        Returns a sample as a row: its timestamp followed by its values with
+        None for missing values.
+        :rtype: tuple
+        """
+        values = []
+        for column, fmt in zip(self._columns, VALUE_FORMATS):
+            value = column[index]
+            if math.isnan(value):
+                value = None
+            elif fmt is _INTEGER:
+                value = int(value)
+            values.append(value)
+        return (self._timestamps[index],) + tuple(values)
+
+    def rows(self, start, end):
+        return [self.row(i) for i in range(start, end)]
+
+    def _record_format(self, missing):
+        fmt = self._record_formats.get(missing)
+        if fmt is None:
+            fields = []
+            for i, spec in enumerate(VALUE_FORMATS):
+                fields.append("None" if missing[i]
+                              else "{" + str(i) + spec + "}")
+            fmt = "\t".join(fields)
+            if len(self._record_formats) < _MAX_RECORD_FORMATS:
+                self._record_formats[missing] = fmt
+        return fmt
+
+    def formatted_values(self, index):
+        """
+        Returns the values of a sample formatted for a data file and
+        separated by tabs. Missing values are written as None.
+        :rtype: str
+        """
+        values = [column[index] for column in self._columns]
+        missing = tuple([value != value for value in values])
+        return self._record_format(missing).format(*values)
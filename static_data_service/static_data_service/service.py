@@ -1,10 +1,10 @@
 # coding=utf-8
 import os
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 
 from dateutil.relativedelta import relativedelta
 from twisted.application import service
-from twisted.internet import defer, reactor
+from twisted.internet import defer
 from twisted.internet.defer import returnValue
 from twisted.python import log
 
@@ -37,7 +37,7 @@ from static_data_service.database import DatabaseReceiver, Database
 # Done  /data/<station>/samplerange.json
 # TODO  /data/<station>/image_sources.json
 # TODO  /data/<station>/image_sources_by_date.json
-# TODO  /data/<station>/rain_summary.json  <----
+# Done  /data/<station>/rain_summary.json
 # Done  /data/<station>/<year>/<month>/samples.dat
 # TODO  /data/<station>/<year>/<month>/<day>/images/index.json
 # TODO  /data/<station>/<year>/<month>/<day>/images/<source>/<time-HH_MM_SS>/<type>_<format>.<extension>
@@ -107,31 +107,106 @@ from static_data_service.database import DatabaseReceiver, Database
 #   updated in place while the rainfall, 7-day and chart files are regenerated
 #   whenever a new sample arrives.
 #
+#   New samples arriving close together (such as during a backfill) are
+#   fetched and processed as a single batch per station. Each affected file is
+#   written once per batch and the current charts are replotted every
+#   chart_interval samples.
+#
 #   Station-level rain total files (rain_summary.json,
-#   current_day_rainfall_totals.json, 24hr_rainfall_totals.json) are rewritten
-#   on each new sample and on startup.
+#   current_day_rainfall_totals.json, 24hr_rainfall_totals.json) are seeded
+#   from the database when the first new sample arrives for a station and
+#   after that are maintained from running totals, only being rewritten when
+#   their content changes.
 #
 #  TODO: init rainfall whenever month file changes? This should result in it
 #  being reset whenever the month or year changes limiting how long glitches
 #  could survive.
 #
 #
-# Currently working on:
-# 24hr_rainfall_totals.json
-# current_day_rainfall_totals.json
-# rain_summary.json
-# in datafile.py::RainFiles
-#
 #
 
-from static_data_service.datafile import MonthlySampleDataFile
+from static_data_service.datafile import MonthlySampleDataFile, RainFiles
+from static_data_service.samplestore import SampleStore
 from static_data_service.gnuplot import make_day_chart_settings, \
-    make_7day_chart_settings, GnuplotProcessProtocol
+    make_7day_chart_settings, ChartScheduler, PRIORITY_CURRENT, \
+    PRIORITY_ARCHIVE
 from static_data_service.metadatafile import SysConfigJson, SampleRangeJson
 
+def _create_chart_scheduler(chart_renderer, gnuplot, workers):
+    if chart_renderer == "matplotlib":
+        try:
+            from static_data_service.mplrender import MatplotlibChartScheduler
+            return MatplotlibChartScheduler(workers)
+        except ImportError:
+            log.msg("*** WARNING: matplotlib is not available. Charts will "
+                    "be plotted with gnuplot instead.")
+    elif chart_renderer != "gnuplot":
+        log.msg("*** WARNING: Unknown chart renderer {0}. Charts will be "
+                "plotted with gnuplot instead.".format(chart_renderer))
+
+    return ChartScheduler(gnuplot, workers)
+
+
+class _SampleBatch(object):
+    """
+    Collects the outputs affected by a batch of new samples for a station so
+    each is only written (or plotted) once for the whole batch.
+    """
+
+    def __init__(self):
+        # Data files whose on-disk copy needs updating along with the
+        # timestamp of the earliest sample added to them (or None to rewrite
+        # them in full)
+        self.files = {}
+
+        # Days that received late samples by month level data file
+        self.late_days = {}
+
+        # If the latest sample time for the station may have changed
+        self.latest_changed = False
+
+        # Number of samples added to the current month
+        self.current_samples = 0
+
+        # If the current charts must be plotted regardless of the chart
+        # interval
+        self.current_charts = False
+
+    def file_changed(self, data_file, since=None):
+        """
+        Records that samples have been added to a data file
+
+        :param data_file: Data file samples were added to
+        :type data_file: DataFile
+        :param since: Timestamp of the sample or None if the whole file needs
+            writing
+        :type since: datetime
+        """
+        if data_file in self.files:
+            previous = self.files[data_file]
+            if previous is None or since is None:
+                since = None
+            else:
+                since = min(previous, since)
+        self.files[data_file] = since
+
+    def late_day(self, data_file, day):
+        """
+        Records that a late sample arrived for a day so its outputs need
+        rebuilding
+
+        :param data_file: Month level data file the sample was added to
+        :type data_file: MonthlySampleDataFile
+        :param day: Date of the sample
+        :type day: date
+        """
+        self.late_days.setdefault(data_file, set()).add(day)
+
+
 class StaticDataService(service.Service):
     def __init__(self, dsn, output_directory, build_charts, chart_formats,
-                 chart_interval, gnuplot):
+                 chart_interval, gnuplot, gnuplot_workers=1,
+                 chart_renderer="gnuplot", sample_coalesce_delay=2.0):
         """
         Constructs the Static Data Service
         
@@ -147,6 +222,15 @@ class StaticDataService(service.Service):
         :type chart_interval: int
         :param gnuplot: Gnuplot binary to use
         :type gnuplot: str
+        :param gnuplot_workers: Number of gnuplot (or matplotlib) processes
+            to plot charts with
+        :type gnuplot_workers: int
+        :param chart_renderer: What to plot charts with: "gnuplot" or
+            "matplotlib"
+        :type chart_renderer: str
+        :param sample_coalesce_delay: How long to collect new samples for
+            before processing them as a batch (in seconds)
+        :type sample_coalesce_delay: float
         """
 
         # Root directory for all output (both data files and charts).
@@ -154,28 +238,40 @@ class StaticDataService(service.Service):
         # into output_directory/station-code/
         self._output_directory = output_directory
 
-        self._db_receiver = DatabaseReceiver(dsn)
-        self._db_receiver.NewSample += self._new_sample
+        self._db_receiver = DatabaseReceiver(dsn, sample_coalesce_delay)
+        self._db_receiver.NewSamples += self._new_samples
         self._db = Database(dsn)
         self._db.DatabaseReady += self._database_ready
 
+        # Recent samples by station code. The current data files are all
+        # views over these.
+        self._stores = {}
+
         # Current day and month data files by station code
         self._monthly = {}
         self._weekly = {}
         self._daily = {}
         self._daily_rain = {}
+        self._rain_files = {}
+
+        # Month file most recently receiving backfilled samples by station
+        # code
+        self._backfill_month = {}
+
+        # Batches of new samples are processed one at a time per station
+        self._ingest_locks = {}
 
         # metadata files we maintain
         self._sysconfig = SysConfigJson(self._db, self._data_dir())
         self._samplerange = SampleRangeJson(self._db, self._data_dir())
 
-        # Queue of gnuplot tasks
-        self._gnuplot_queue = []
-
         # Charting settings
         self._build_charts = build_charts
         self._chart_formats = chart_formats
-        self._gnuplot_binary = gnuplot
+        self._chart_interval = chart_interval
+        self._samples_since_charts = {}
+        self._charts = _create_chart_scheduler(chart_renderer, gnuplot,
+                                               gnuplot_workers)
 
         # Dictionary of broadcast IDs keyed by lowercase station code
         self._broadcast_ids = {}
@@ -186,10 +282,7 @@ class StaticDataService(service.Service):
         service.Service.startService(self)
 
         if self._build_charts:
-            self._gnuplot = GnuplotProcessProtocol()
-            self._gnuplot.Ready += self._gnuplot_ready
-            reactor.spawnProcess(self._gnuplot, self._gnuplot_binary,
-                                 path=os.path.dirname(self._gnuplot_binary))
+            self._charts.start()
 
         # Connect to the database. This will eventually fire the ready event
         # resulting in self._database_ready being called
@@ -200,10 +293,64 @@ class StaticDataService(service.Service):
     def stopService(self):
         service.Service.stopService(self)
 
+        if self._build_charts:
+            self._charts.stop()
+
+    def _new_samples(self, station_code, samples):
+        """
+        Handles a batch of new samples for a station. Batches for the same
+        station are processed one at a time in the order they arrive.
+
+        :param station_code: Station the samples are for
+        :type station_code: str
+        :param samples: New samples in timestamp order
+        :type samples: List
+        """
+        if station_code not in self._ingest_locks:
+            self._ingest_locks[station_code] = defer.DeferredLock()
+
+        return self._ingest_locks[station_code].run(
+            self._apply_samples, station_code, samples)
+
+    @defer.inlineCallbacks
+    def _apply_samples(self, station_code, samples):
+        """
+        Adds a batch of new samples to the in-memory data files in timestamp
+        order and then writes out each affected file, updates the latest
+        sample time and queues charts once for the whole batch.
+
+        :param station_code: Station the samples are for
+        :type station_code: str
+        :param samples: New samples in timestamp order
+        :type samples: List
+        """
+        log.msg("{0} new samples for station {1}".format(len(samples),
+                                                          station_code))
+        batch = _SampleBatch()
+
+        for sample in samples:
+            yield self._new_sample(station_code, sample, batch)
+
+        self._write_batch(station_code, batch)
+
+        yield self._update_rain_files(station_code, samples)
+
     @defer.inlineCallbacks
-    def _new_sample(self, station_code, sample):
+    def _new_sample(self, station_code, sample, batch):
+        """
+        Adds a new sample to the in-memory data files recording which outputs
+        need updating in the batch.
+
+        :param station_code: Station the sample is for
+        :type station_code: str
+        :param sample: The sample
+        :type sample: List
+        :param batch: Outputs affected by the batch the sample is part of
+        :type batch: _SampleBatch
+        """
 
         row_date = sample[0].date()
+        ts = sample[0]
 
         data_dir = self._station_data_dir(station_code)
 
@@ -212,29 +359,37 @@ class StaticDataService(service.Service):
         log.msg("New sample for {0}/{1} station {2}".format(
             row_date.month, row_date.year, station_code))
 
-        if station_code in self._monthly:
-            latest = self._monthly[station_code].get_last_ts()
-            if sample[0] < latest:
-                # Sample is from the past! Force regeneration of the entire
-                # month
-                self._monthly[station_code] = None
-
-        if station_code in self._monthly \
+        if self._monthly.get(station_code) is not None \
+                and month < self._monthly[station_code].file_date:
+            log.msg("Backfilled sample for a previous month")
+            yield self._backfill_sample(station_code, sample, batch)
+        elif station_code in self._monthly \
                 and self._monthly[station_code] is not None \
                 and self._monthly[station_code].file_date == month:
 
             log.msg("Add to month file")
-            # We have the current data file in memory; append the row!
-            self._monthly[station_code].add_row(sample, data_dir)
+            # We have the current data file in memory; add the row! Rows for
+            # earlier in the month only rewrite the end of the file. The day
+            # and week files are views over the same samples so they see the
+            # row too.
+            self._monthly[station_code].add_row(sample, None)
+            batch.file_changed(self._monthly[station_code], ts)
 
             # Now deal with the day-level file
             if station_code in self._daily \
                     and self._daily[station_code].file_date == row_date:
                 log.msg("Add to day and week files")
                 # We have the current day-level file; append!
-                self._daily[station_code].add_row(sample, data_dir)
-                self._weekly[station_code].add_row(sample, data_dir)
-                self._daily_rain[station_code].add_row(sample, data_dir)
+                batch.file_changed(self._daily[station_code], ts)
+                batch.file_changed(self._weekly[station_code], ts)
+                batch.file_changed(self._daily_rain[station_code], ts)
+            elif station_code in self._daily \
+                    and self._daily[station_code].file_date > row_date:
+                log.msg("Late sample for {0}. Rebuilding outputs for that "
+                        "day".format(row_date))
+                # The current 7-day file may or may not include the sample
+                batch.file_changed(self._weekly[station_code], ts)
+                batch.late_day(self._monthly[station_code], row_date)
             else:
                 log.msg("Day file missing or wrong date. "
                         "Recreating day and week")
@@ -242,22 +397,28 @@ class StaticDataService(service.Service):
                 # a new one for the current date as well as a new weekly file.
                 day_files = self._monthly[station_code].to_day_files(row_date)
                 # There should only be one
-                self._daily[station_code] = day_files[day_files.keys()[0]]
+                self._daily[station_code] = list(day_files.values())[0]
                 self._weekly[station_code] = \
                     self._monthly[station_code].latest_weekly_file()
                 self._daily_rain[station_code] = \
                     self._daily[station_code].to_rain_file()
 
-            # Update sysconfig.json and samplerange.json
-            self._set_latest_sample_time(station_code, sample[0])
+                batch.file_changed(self._daily[station_code])
+                batch.file_changed(self._weekly[station_code])
+                batch.file_changed(self._daily_rain[station_code])
+
+            batch.latest_changed = True
+            batch.current_samples += 1
         else:
             log.msg("Month file missing or wrong month. Recreating.")
 
-            if station_code not in self._monthly:
-                self._monthly[station_code] = None
+            # The store keeps the end of the previous month (if we had it)
+            # for the first week of 7-day files.
+            if station_code not in self._stores:
+                self._stores[station_code] = SampleStore()
 
             self._monthly[station_code] = yield self._month_datafile(
-                station_code, month, self._monthly[station_code])
+                station_code, month, self._stores[station_code])
 
             if month.day > 1:
                 # We're picking up part way through the month. Make sure all the
@@ -270,7 +431,7 @@ class StaticDataService(service.Service):
             day_files = self._monthly[station_code].to_day_files(row_date)
 
             # There should only be one
-            self._daily[station_code] = day_files[day_files.keys()[0]]
+            self._daily[station_code] = list(day_files.values())[0]
             self._weekly[station_code] = self._monthly[
                 station_code].latest_weekly_file()
             self._daily_rain[station_code] = self._daily[
@@ -281,10 +442,61 @@ class StaticDataService(service.Service):
             self._weekly[station_code].write_file(data_dir)
             self._daily_rain[station_code].write_file(data_dir)
 
+            batch.latest_changed = True
+            batch.current_charts = True
+
+    def _write_batch(self, station_code, batch):
+        """
+        Writes out everything affected by a batch of new samples: updates
+        data files, rebuilds outputs for days that received late samples,
+        updates the latest sample time and queues the current charts.
+
+        :param station_code: Station the batch was for
+        :type station_code: str
+        :param batch: Outputs affected by the batch
+        :type batch: _SampleBatch
+        """
+        data_dir = self._station_data_dir(station_code)
+
+        for data_file, since in batch.files.items():
+            data_file.update_file(data_dir, since)
+
+        for data_file, days in batch.late_days.items():
+            before = None
+            if data_file is self._monthly.get(station_code) \
+                    and station_code in self._daily:
+                # The current days outputs are already up-to-date
+                before = self._daily[station_code].file_date
+            self._build_backfilled_outputs(station_code, data_file, days,
+                                           before)
+
+        if batch.latest_changed:
+            # Update sysconfig.json and samplerange.json
             self._set_latest_sample_time(
                 station_code, self._monthly[station_code].get_last_ts())
 
+        self._samples_since_charts[station_code] = \
+            self._samples_since_charts.get(station_code, 0) + \
+            batch.current_samples
+
+        if batch.current_charts or (
+                batch.current_samples > 0 and
+                self._samples_since_charts[station_code] >=
+                self._chart_interval):
             self._build_current_charts(station_code)
+            self._samples_since_charts[station_code] = 0
+
+    @defer.inlineCallbacks
+    def _update_rain_files(self, station_code, samples):
+        if station_code in self._rain_files:
+            self._rain_files[station_code].new_samples(samples)
+            return
+
+        # First samples for the station. Seeding picks up these samples too as
+        # they're already in the database.
+        rain_files = RainFiles(self._station_data_dir(station_code))
+        yield rain_files.create(self._db, station_code)
+        self._rain_files[station_code] = rain_files
 
     def _build_current_charts(self, station_code):
         if self._build_charts:
@@ -295,6 +507,16 @@ class StaticDataService(service.Service):
                                       dt.strftime("%B").lower(),
                                       str(dt.day))
 
+            data_dir = self._station_data_dir(station_code)
+            day_filename = self._daily[station_code].filename(data_dir)
+            rain_filename = self._daily_rain[station_code].filename(data_dir)
+            month_filename = self._monthly[station_code].filename(data_dir)
+            data = {
+                day_filename: self._daily[station_code],
+                rain_filename: self._daily_rain[station_code],
+                month_filename: self._monthly[station_code]
+            }
+
             dr = self._daily[station_code].range
             if dr is not None:
                 day_range = (dr[0], dr[1])
@@ -302,17 +524,15 @@ class StaticDataService(service.Service):
                 for fmt in self._chart_formats:
                     chart_specs = make_day_chart_settings(
                         charts_dir,
-                        self._daily[station_code].filename(
-                            self._station_data_dir(station_code)),
-                        self._daily_rain[station_code].filename(
-                            self._station_data_dir(station_code)),
+                        day_filename,
+                        rain_filename,
                         day_range,
                         fmt,  # Chart format
                         self._has_solar[station_code],
                         self._daily_rain[station_code].total_rain()
                     )
 
-                    self.queue_charts(chart_specs)
+                    self.queue_charts(chart_specs, data=data)
 
             dr = self._weekly[station_code].range
             if dr is not None:
@@ -321,14 +541,13 @@ class StaticDataService(service.Service):
                 for fmt in self._chart_formats:
                     chart_specs = make_7day_chart_settings(
                         charts_dir,
-                        self._monthly[station_code].filename(
-                            self._station_data_dir(station_code)),
+                        month_filename,
                         week_range,
                         fmt,  # Chart format
                         self._has_solar[station_code]
                     )
 
-                    self.queue_charts(chart_specs)
+                    self.queue_charts(chart_specs, data=data)
 
     @defer.inlineCallbacks
     def _get_station_codes(self):
@@ -406,32 +625,46 @@ class StaticDataService(service.Service):
         # Update sysconfig.json
         self._sysconfig.set_latest_sample_time(station, time)
 
-    def queue_charts(self, chart_specs):
+    def queue_charts(self, chart_specs, priority=PRIORITY_CURRENT,
+                     data=None):
         """
         Queues a list of chart specs
         :param chart_specs: 
          :type chart_specs: list
+        :param priority: PRIORITY_CURRENT for current day charts or
+            PRIORITY_ARCHIVE for charts being rebuilt
+         :type priority: int
+        :param data: Data files the charts are plotted from by filename
+         :type data: dict
         :return: 
         """
-        self._gnuplot_queue += chart_specs
-
-        # If gnuplot is currently idle, start processing
-        if self._gnuplot.idle:
-            self._gnuplot_ready()
-
-    def _gnuplot_ready(self):
-        if len(self._gnuplot_queue) > 0:
-            specs = self._gnuplot_queue.pop(0)
-            #log.msg("Plotting: {0}".format(specs))
-            self._gnuplot.plot(specs.to_script())
+        self._charts.queue(chart_specs, priority, data)
 
     @defer.inlineCallbacks
-    def _month_datafile(self, station_code, month, previous_month=None):
+    def _month_datafile(self, station_code, month, store=None):
+        """
+        Loads a month of samples into a store returning the month-level data
+        file for it.
+
+        :param station_code: Station to load samples for
+        :type station_code: str
+        :param month: Month to load
+        :type month: date
+        :param store: Store to load samples into. A new one is created if
+            this is None.
+        :type store: SampleStore
+        :rtype: MonthlySampleDataFile
+        """
         month_data = yield self._db.get_month_samples(
             station_code, self._broadcast_ids[station_code],
             month.year, month.month)
+
+        if store is None:
+            store = SampleStore()
+        store.extend(month_data)
+
         df = MonthlySampleDataFile(station_code, month.year, month.month,
-                                   month_data, previous_month)
+                                   store)
         returnValue(df)
 
     @defer.inlineCallbacks
@@ -465,12 +698,11 @@ class StaticDataService(service.Service):
             # We don't want to generate the data file for this month/today -
             # we'll do that when the first sample for the station comes in to
             # reduce the chances of missing a new sample
-            data_file = None
+            store = SampleStore()
             while dt < this_month:
                 log.msg("Month: {0}".format(dt.strftime("%b-%Y").upper()))
 
-                data_file = yield self._month_datafile(station, dt,
-                                                      data_file)
+                data_file = yield self._month_datafile(station, dt, store)
 
                 if data_file.get_last_ts() is not None:
                     # Only bother creating the month data file if there is data
@@ -494,66 +726,164 @@ class StaticDataService(service.Service):
          :type data_file: MonthlySampleDataFile
         """
 
-        station_data_dir = self._station_data_dir(station_code)
-        station_charts_dir = self._station_dir(station_code)
-        solar_enabled = self._has_solar[station_code]
-
-        data_file.write_file(station_data_dir)
+        data_file.write_file(self._station_data_dir(station_code))
 
         day_files = data_file.to_day_files()
         for file_date in sorted(day_files.keys()):
-            charts_dir = os.path.join(station_charts_dir,
-                                      str(file_date.year),
-                                      file_date.strftime("%B").lower(),
-                                      str(file_date.day))
+            self._build_day_outputs(station_code, day_files[file_date],
+                                    PRIORITY_ARCHIVE)
 
-            f = day_files[file_date]
-            day_filename = f.write_file(station_data_dir)
-            rain_file = f.to_rain_file()
-            rain_filename = rain_file.write_file(station_data_dir)
+        for f in data_file.to_weekly_files():
+            self._build_week_outputs(station_code, f, PRIORITY_ARCHIVE)
 
-            if self._build_charts:
-                dr = f.range
-                if dr is None:
-                    continue  # No range - no chart!
+    def _charts_dir(self, station_code, file_date):
+        return os.path.join(self._station_dir(station_code),
+                            str(file_date.year),
+                            file_date.strftime("%B").lower(),
+                            str(file_date.day))
 
-                day_range = (dr[0], dr[1])
+    def _build_day_outputs(self, station_code, day_file, priority):
+        """
+        Writes out a day-level data file along with its hourly rainfall file
+        and queues its charts (where enabled).
 
-                for fmt in self._chart_formats:
-                    chart_specs = make_day_chart_settings(
-                        charts_dir,
-                        day_filename,
-                        rain_filename,
-                        day_range,
-                        fmt,  # Chart format
-                        solar_enabled,
-                        rain_file.total_rain()
-                    )
+        :param station_code: Station to plot for
+         :type station_code: str
+        :param day_file: Day level data file
+         :type day_file: DailySampleDataFile
+        :param priority: Chart priority
+         :type priority: int
+        """
+        station_data_dir = self._station_data_dir(station_code)
 
-                    self.queue_charts(chart_specs)
+        day_filename = day_file.write_file(station_data_dir)
+        rain_file = day_file.to_rain_file()
+        rain_filename = rain_file.write_file(station_data_dir)
 
-        week_files = data_file.to_weekly_files()
-        for f in week_files:
-            charts_dir = os.path.join(station_charts_dir,
-                                      str(f.file_date.year),
-                                      f.file_date.strftime("%B").lower(),
-                                      str(f.file_date.day))
-            weekly_filename = f.write_file(station_data_dir)
+        if self._build_charts:
+            dr = day_file.range
+            if dr is None:
+                return  # No range - no chart!
+
+            day_range = (dr[0], dr[1])
+
+            for fmt in self._chart_formats:
+                chart_specs = make_day_chart_settings(
+                    self._charts_dir(station_code, day_file.file_date),
+                    day_filename,
+                    rain_filename,
+                    day_range,
+                    fmt,  # Chart format
+                    self._has_solar[station_code],
+                    rain_file.total_rain()
+                )
+
+                self.queue_charts(chart_specs, priority,
+                                  {day_filename: day_file,
+                                   rain_filename: rain_file})
+
+    def _build_week_outputs(self, station_code, week_file, priority):
+        """
+        Writes out a 7-day data file and queues its charts (where enabled).
 
-            if self._build_charts:
-                dr = f.range
-                if dr is None:
-                    continue  # No range - no chart!
+        :param station_code: Station to plot for
+         :type station_code: str
+        :param week_file: 7-day data file
+         :type week_file: WeeklySampleDataFile
+        :param priority: Chart priority
+         :type priority: int
+        """
+        weekly_filename = week_file.write_file(
+            self._station_data_dir(station_code))
 
-                week_range = (dr[0], dr[1])
+        if self._build_charts:
+            dr = week_file.range
+            if dr is None:
+                return  # No range - no chart!
+
+            week_range = (dr[0], dr[1])
+
+            for fmt in self._chart_formats:
+                chart_specs = make_7day_chart_settings(
+                    self._charts_dir(station_code, week_file.file_date),
+                    weekly_filename,
+                    week_range,
+                    fmt,  # Chart format
+                    self._has_solar[station_code]
+                )
+
+                self.queue_charts(chart_specs, priority,
+                                  {weekly_filename: week_file})
+
+    def _build_backfilled_outputs(self, station_code, data_file, days,
+                                  before=None):
+        """
+        Rebuilds the outputs affected by late samples: the day-level files
+        for the days they belong to and the 7-day files for those days and
+        the following week. Outputs are only rebuilt once no matter how many
+        samples arrived for them.
 
-                for fmt in self._chart_formats:
-                    chart_specs = make_7day_chart_settings(
-                        charts_dir,
-                        weekly_filename,
-                        week_range,
-                        fmt,  # Chart format
-                        solar_enabled
-                    )
+        :param station_code: Station the samples are for
+         :type station_code: str
+        :param data_file: Month level data file containing the samples
+         :type data_file: MonthlySampleDataFile
+        :param days: Dates of the samples
+         :type days: set[date]
+        :param before: Don't rebuild 7-day files for this date or later
+         :type before: date
+        """
+        week_days = set()
+        for day in sorted(days):
+            day_files = data_file.to_day_files(day)
+            if day in day_files:
+                self._build_day_outputs(station_code, day_files[day],
+                                        PRIORITY_ARCHIVE)
+
+            for offset in range(8):
+                dt = day + timedelta(days=offset)
+                if dt.month != day.month or \
+                        (before is not None and dt >= before):
+                    break
+                week_days.add(dt)
+
+        for dt in sorted(week_days):
+            for f in data_file.to_weekly_files(dt):
+                if f.range is not None and f.file_date == dt \
+                        and f.get_last_ts().date() == dt:
+                    self._build_week_outputs(station_code, f,
+                                             PRIORITY_ARCHIVE)
+
+    @defer.inlineCallbacks
+    def _backfill_sample(self, station_code, sample, batch):
+        """
+        Handles a sample for a month earlier than the current one. The month
+        file is loaded from the database (which will include the sample) the
+        first time and patched for subsequent samples in the same month.
 
-                    self.queue_charts(chart_specs)
+        :param station_code: Station the sample is for
+         :type station_code: str
+        :param sample: The sample
+         :type sample: List
+        :param batch: Outputs affected by the batch the sample is part of
+         :type batch: _SampleBatch
+        """
+        row_date = sample[0].date()
+        month = date(row_date.year, row_date.month, 1)
+
+        data_file = self._backfill_month.get(station_code)
+        if data_file is not None and data_file.file_date == month:
+            data_file.add_row(sample, None)
+            batch.file_changed(data_file, sample[0])
+        else:
+            log.msg("Loading {0} for backfilled samples".format(
+                month.strftime("%b-%Y").upper()))
+            # The previous month is needed for the first week of 7-day files
+            store = SampleStore()
+            yield self._month_datafile(
+                station_code, month - relativedelta(months=1), store)
+            data_file = yield self._month_datafile(station_code, month,
+                                                   store)
+            batch.file_changed(data_file)
+            self._backfill_month[station_code] = data_file
+
+        batch.late_day(data_file, row_date)
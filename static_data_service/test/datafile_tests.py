@@ -0,0 +1,277 @@
+"""
+Tests patching sample data files on disk. After every change the patched
+file must be identical to the file written from scratch.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+import os
+import shutil
+import tempfile
+import unittest
+
+from static_data_service.datafile import MonthlySampleDataFile, \
+    WeeklySampleDataFile, DailySampleDataFile
+from static_data_service.samplestore import SampleStore
+from test.samplestore_tests import sample_row
+
+START = datetime(2020, 3, 1, 0, 0)
+
+
+def _read(filename):
+    with open(filename, "rb") as f:
+        return f.read()
+
+
+class DataFileTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.rewrite_directory = tempfile.mkdtemp()
+        self.store = SampleStore()
+        self.rewrites = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        shutil.rmtree(self.rewrite_directory)
+
+    def _samples(self, start, count, interval=timedelta(minutes=30)):
+        self.store.extend([sample_row(start + interval * i,
+                                      Decimal("{0}.25".format(i % 30)))
+                           for i in range(count)])
+
+    def _count_rewrites(self, data_file):
+        write_file = data_file._write_file
+
+        def _write_file(filename):
+            self.rewrites += 1
+            write_file(filename)
+
+        data_file._write_file = _write_file
+        return data_file
+
+    def assertMatchesRewrite(self, data_file, new_file):
+        """
+        Checks the patched file is what writing the file in full gives
+        """
+        filename = data_file.filename(self.directory)
+        expected = new_file().write_file(self.rewrite_directory)
+        self.assertEqual(_read(filename), _read(expected))
+
+
+class MonthlyFileTests(DataFileTestCase):
+
+    def _month(self):
+        return MonthlySampleDataFile("tst", 2020, 3, self.store)
+
+    def setUp(self):
+        super(MonthlyFileTests, self).setUp()
+        self._samples(START, 100)
+        self.data_file = self._month()
+        self.data_file.write_file(self.directory)
+        self._count_rewrites(self.data_file)
+
+    def test_append(self):
+        for i in range(100, 110):
+            self.data_file.add_row(
+                sample_row(START + timedelta(minutes=30 * i)),
+                self.directory)
+            self.assertMatchesRewrite(self.data_file, self._month)
+
+        self.assertEqual(self.rewrites, 0)
+
+    def test_out_of_order(self):
+        for minutes in (15, 1000, 45, 2955):
+            self.data_file.add_row(
+                sample_row(START + timedelta(minutes=minutes),
+                           Decimal("-3.50")),
+                self.directory)
+            self.assertMatchesRewrite(self.data_file, self._month)
+
+        self.assertEqual(self.rewrites, 0)
+
+    def test_before_first(self):
+        self.data_file.add_row(sample_row(START), self.directory)
+        self.store.add(sample_row(START - timedelta(days=1)))
+
+        # In the store but not in this month
+        self.data_file.add_row(sample_row(START + timedelta(minutes=5)),
+                               self.directory)
+        self.assertMatchesRewrite(self.data_file, self._month)
+
+    def test_duplicate(self):
+        # Same timestamps with different values. The record lengths change
+        # so everything following has to move.
+        for i in (0, 50, 99):
+            self.data_file.add_row(
+                sample_row(START + timedelta(minutes=30 * i),
+                           Decimal("-123.25"), None, Decimal("1.5")),
+                self.directory)
+            self.assertMatchesRewrite(self.data_file, self._month)
+
+        self.assertEqual(self.rewrites, 0)
+
+    def test_update_file_since(self):
+        self.store.extend([
+            sample_row(START + timedelta(minutes=20)),
+            sample_row(START + timedelta(minutes=30 * 100)),
+        ])
+
+        self.data_file.update_file(self.directory,
+                                   START + timedelta(minutes=20))
+
+        self.assertMatchesRewrite(self.data_file, self._month)
+        self.assertEqual(self.rewrites, 0)
+
+    def test_update_file_without_since_rewrites(self):
+        self.store.add(sample_row(START + timedelta(minutes=20)))
+
+        self.data_file.update_file(self.directory)
+
+        self.assertMatchesRewrite(self.data_file, self._month)
+        self.assertEqual(self.rewrites, 1)
+
+    def test_file_changed_elsewhere_rewritten(self):
+        other = self._count_rewrites(self._month())
+
+        # The file on disk now hasn't been written by this data file
+        os.remove(self.data_file.filename(self.directory))
+        self.data_file.add_row(sample_row(START + timedelta(days=10)),
+                               self.directory)
+
+        self.assertMatchesRewrite(self.data_file, self._month)
+        self.assertEqual(self.rewrites, 1)
+
+        # and it never knew what was on disk
+        other.add_row(sample_row(START + timedelta(days=11)), self.directory)
+        self.assertMatchesRewrite(other, self._month)
+        self.assertEqual(self.rewrites, 2)
+
+    def test_dropped_records_none_dropped(self):
+        self.store.add(sample_row(START + timedelta(days=10)))
+        self.assertEqual(self.data_file._dropped_records(), 0)
+
+
+class WeeklyFileTests(DataFileTestCase):
+
+    def _week(self):
+        return WeeklySampleDataFile("tst", 2020, 3, 10, self.store)
+
+    def setUp(self):
+        super(WeeklyFileTests, self).setUp()
+        # Every 30 minutes from the 1st to 11:30 on the 9th
+        self._samples(START, 8 * 48 + 24)
+        self.data_file = self._week()
+        self.data_file.write_file(self.directory)
+        self._count_rewrites(self.data_file)
+
+    def test_week_moves_on(self):
+        ts = START + timedelta(days=8, hours=12)
+        for _ in range(10):
+            self.data_file.add_row(sample_row(ts), self.directory)
+            self.assertMatchesRewrite(self.data_file, self._week)
+            ts += timedelta(minutes=30)
+
+        self.assertEqual(self.rewrites, 0)
+
+    def test_week_moves_on_several_records(self):
+        ts = START + timedelta(days=8, hours=15)
+        self.data_file.add_row(sample_row(ts), self.directory)
+
+        self.assertEqual(self.data_file._dropped_records(), 0)
+        self.assertMatchesRewrite(self.data_file, self._week)
+        self.assertEqual(self.rewrites, 0)
+
+    def test_dropped_records(self):
+        old_first = self.data_file.timestamps()[0]
+        self.store.add(sample_row(START + timedelta(days=8, hours=13)))
+
+        self.assertEqual(self.data_file.timestamps()[0],
+                         old_first + timedelta(hours=1, minutes=30))
+        self.assertEqual(self.data_file._dropped_records(), 3)
+
+    def test_new_first_record_not_on_disk(self):
+        # Moves the week on then adds a sample right at its new start which
+        # the file on disk never had
+        self.store.add(sample_row(START + timedelta(days=8, hours=13)))
+        self.data_file.add_row(
+            sample_row(START + timedelta(days=1, hours=13, minutes=10)),
+            self.directory)
+
+        self.assertMatchesRewrite(self.data_file, self._week)
+        self.assertEqual(self.rewrites, 1)
+
+    def test_out_of_order_and_duplicates(self):
+        for ts in (START + timedelta(days=5, minutes=10),
+                   START + timedelta(days=6),
+                   START + timedelta(days=8, hours=14),
+                   START + timedelta(days=3, minutes=5)):
+            self.data_file.add_row(sample_row(ts, Decimal("99.99")),
+                                   self.directory)
+            self.assertMatchesRewrite(self.data_file, self._week)
+
+        self.assertEqual(self.rewrites, 0)
+
+    def test_too_old_ignored(self):
+        self.data_file.add_row(sample_row(START, Decimal("1.00")),
+                               self.directory)
+        self.assertEqual(self.store.row(0)[1], 0.25)
+
+
+class EvictionTests(DataFileTestCase):
+
+    def setUp(self):
+        super(EvictionTests, self).setUp()
+        self.store = SampleStore(retain=timedelta(days=2))
+        self._samples(START, 3 * 48 + 1)
+
+    def _week(self):
+        return WeeklySampleDataFile("tst", 2020, 3, 6, self.store)
+
+    def test_eviction_drops_records(self):
+        data_file = self._week()
+        data_file.write_file(self.directory)
+        self._count_rewrites(data_file)
+        first = len(self.store)
+
+        ts = START + timedelta(days=3)
+        for _ in range(6):
+            ts += timedelta(minutes=30)
+            data_file.add_row(sample_row(ts), self.directory)
+            self.assertMatchesRewrite(data_file, self._week)
+
+        # Samples were evicted from the store and so dropped from the start
+        # of the file without rewriting it
+        self.assertLess(len(self.store), first)
+        self.assertEqual(self.store.timestamp(0),
+                         START + timedelta(days=1, minutes=30))
+        self.assertEqual(self.rewrites, 0)
+
+
+class DailyFileTests(DataFileTestCase):
+
+    def _day(self):
+        return DailySampleDataFile("tst", 2020, 3, 2, self.store)
+
+    def test_patched(self):
+        self._samples(START, 3 * 48)
+        data_file = self._day()
+        data_file.write_file(self.directory)
+        self._count_rewrites(data_file)
+
+        for ts in (START + timedelta(days=1, minutes=5),
+                   START + timedelta(days=1, hours=12),
+                   START + timedelta(days=1, hours=23, minutes=59)):
+            data_file.add_row(sample_row(ts, Decimal("5.00")),
+                              self.directory)
+            self.assertMatchesRewrite(data_file, self._day)
+
+        self.assertEqual(self.rewrites, 0)
+
+    def test_other_day_ignored(self):
+        data_file = self._day()
+        data_file.add_row(sample_row(START), self.directory)
+        self.assertEqual(len(self.store), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
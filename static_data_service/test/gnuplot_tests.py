@@ -0,0 +1,250 @@
+"""
+Tests the chart scheduler with fake workers in place of gnuplot
+"""
+import unittest
+
+from twisted.internet.task import Clock
+
+from static_data_service.gnuplot import ChartScheduler, PRIORITY_ARCHIVE, \
+    PRIORITY_CURRENT
+from static_data_service.util import Event
+
+
+class FakeSpecs(object):
+    def __init__(self, filename, version=1):
+        self.output_filename = filename
+        self.version = version
+
+    def __repr__(self):
+        return "<{0} v{1}>".format(self.output_filename, self.version)
+
+
+class FakeWorker(object):
+    """
+    Worker which plots charts when the test finishes them
+    """
+    def __init__(self):
+        self.idle = False
+        self.specs = None
+        self.closed = False
+        self.plotted = []
+        self.Ready = Event()
+        self.Exited = Event()
+
+    def start(self):
+        self.idle = True
+        self.Ready.fire(self, None)
+
+    def plot(self, specs):
+        self.idle = False
+        self.specs = specs
+        self.plotted.append(specs)
+
+    def finish(self, render_time=0.5):
+        self.idle = True
+        self.specs = None
+        self.Ready.fire(self, render_time)
+
+    def exit(self):
+        self.idle = False
+        self.Exited.fire(self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeScheduler(ChartScheduler):
+    def __init__(self, workers, clock):
+        super(FakeScheduler, self).__init__("gnuplot", workers, clock)
+        self.launched = []
+
+    def _create_worker(self):
+        return FakeWorker()
+
+    def _launch_worker(self, worker):
+        self.launched.append(worker)
+        worker.start()
+
+
+class ChartSchedulerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.scheduler = self._scheduler(1)
+
+    def _scheduler(self, workers):
+        scheduler = FakeScheduler(workers, self.clock)
+        scheduler.start()
+        return scheduler
+
+    @property
+    def worker(self):
+        return self.scheduler.launched[-1]
+
+    def _plot_all(self, worker=None):
+        """
+        Finishes charts on a worker until the queue is empty and returns
+        what it plotted
+        """
+        worker = worker or self.worker
+        while worker.specs is not None:
+            worker.finish()
+        return worker.plotted
+
+
+class QueueTests(ChartSchedulerTestCase):
+
+    def test_plotted_in_order(self):
+        self.scheduler.queue([FakeSpecs("a"), FakeSpecs("b"), FakeSpecs("c")])
+
+        self.assertEqual([s.output_filename for s in self._plot_all()],
+                         ["a", "b", "c"])
+        self.assertEqual(self.scheduler.plotted, 3)
+        self.assertEqual(self.scheduler.queue_depth, 0)
+        self.assertEqual(self.scheduler.mean_render_time, 0.5)
+
+    def test_coalesced(self):
+        self.scheduler.queue([FakeSpecs("busy")])
+        self.scheduler.queue([FakeSpecs("a", 1), FakeSpecs("b")])
+        self.scheduler.queue([FakeSpecs("a", 2)])
+        self.scheduler.queue([FakeSpecs("a", 3)])
+
+        self.assertEqual(self.scheduler.queue_depth, 2)
+
+        plotted = self._plot_all()
+
+        self.assertEqual([repr(s) for s in plotted],
+                         ["<busy v1>", "<a v3>", "<b v1>"])
+        self.assertEqual(self.scheduler.queued, 5)
+        self.assertEqual(self.scheduler.coalesced, 2)
+
+    def test_current_before_archive(self):
+        self.scheduler.queue([FakeSpecs("busy")])
+        self.scheduler.queue([FakeSpecs("old1"), FakeSpecs("old2")],
+                             PRIORITY_ARCHIVE)
+        self.scheduler.queue([FakeSpecs("new")], PRIORITY_CURRENT)
+
+        self.assertEqual([s.output_filename for s in self._plot_all()],
+                         ["busy", "new", "old1", "old2"])
+
+    def test_moved_to_higher_priority(self):
+        self.scheduler.queue([FakeSpecs("busy")])
+        self.scheduler.queue([FakeSpecs("a", 1), FakeSpecs("b")],
+                             PRIORITY_ARCHIVE)
+        self.scheduler.queue([FakeSpecs("a", 2)], PRIORITY_CURRENT)
+
+        self.assertEqual([repr(s) for s in self._plot_all()],
+                         ["<busy v1>", "<a v2>", "<b v1>"])
+
+    def test_not_moved_to_lower_priority(self):
+        self.scheduler.queue([FakeSpecs("busy")])
+        self.scheduler.queue([FakeSpecs("old")], PRIORITY_ARCHIVE)
+        self.scheduler.queue([FakeSpecs("a", 1)], PRIORITY_CURRENT)
+        self.scheduler.queue([FakeSpecs("a", 2)], PRIORITY_ARCHIVE)
+
+        self.assertEqual([repr(s) for s in self._plot_all()],
+                         ["<busy v1>", "<a v2>", "<old v1>"])
+
+    def test_requeued_after_plotting(self):
+        self.scheduler.queue([FakeSpecs("a", 1)])
+        self.worker.finish()
+        self.scheduler.queue([FakeSpecs("a", 2)])
+
+        self.assertEqual([repr(s) for s in self._plot_all()],
+                         ["<a v1>", "<a v2>"])
+        self.assertEqual(self.scheduler.coalesced, 0)
+
+    def test_next_empty(self):
+        self.assertIsNone(self.scheduler._next())
+
+    def test_next_skips_stale_entries(self):
+        self.scheduler.queue([FakeSpecs("busy")])
+        self.scheduler.queue([FakeSpecs("a", 1)], PRIORITY_ARCHIVE)
+        self.scheduler.queue([FakeSpecs("a", 2)], PRIORITY_CURRENT)
+
+        self.assertEqual(repr(self.scheduler._next()), "<a v2>")
+        # The archive queue still has a for its old priority
+        self.assertIsNone(self.scheduler._next())
+
+    def test_multiple_workers(self):
+        self.scheduler = self._scheduler(2)
+        first, second = self.scheduler.launched
+
+        self.scheduler.queue([FakeSpecs("a"), FakeSpecs("b"),
+                              FakeSpecs("c")])
+
+        self.assertEqual(first.specs.output_filename, "a")
+        self.assertEqual(second.specs.output_filename, "b")
+
+        second.finish()
+        self.assertEqual(second.specs.output_filename, "c")
+        self.assertEqual(self.scheduler.queue_depth, 0)
+
+
+class WorkerExitTests(ChartSchedulerTestCase):
+
+    def test_chart_retried_once(self):
+        self.scheduler.queue([FakeSpecs("a")])
+        self.worker.exit()
+        self.clock.advance(1)
+
+        self.assertEqual(len(self.scheduler.launched), 2)
+        self.assertEqual(self.worker.specs.output_filename, "a")
+
+        self.worker.exit()
+        self.clock.advance(2)
+
+        self.assertEqual(len(self.scheduler.launched), 3)
+        self.assertIsNone(self.worker.specs)
+        self.assertEqual(self.scheduler.queue_depth, 0)
+
+    def test_newer_version_waiting_not_retried(self):
+        self.scheduler.queue([FakeSpecs("a", 1)])
+        self.scheduler.queue([FakeSpecs("a", 2)])
+        self.worker.exit()
+        self.clock.advance(1)
+
+        self.assertEqual([repr(s) for s in self._plot_all()], ["<a v2>"])
+
+    def test_restart_backs_off(self):
+        delays = []
+        for _ in range(12):
+            self.worker.exit()
+            delays.append(self.clock.getDelayedCalls()[0].getTime() -
+                          self.clock.seconds())
+            self.clock.advance(delays[-1])
+
+        self.assertEqual(delays, [1, 2, 4, 8, 16, 32, 64, 128, 256, 300,
+                                  300, 300])
+        self.assertEqual(len(self.scheduler.launched), 13)
+
+    def test_backoff_reset_after_plotting(self):
+        for _ in range(3):
+            self.worker.exit()
+            self.clock.advance(10)
+
+        self.scheduler.queue([FakeSpecs("a")])
+        self.worker.finish()
+        self.worker.exit()
+
+        self.assertEqual(self.clock.getDelayedCalls()[0].getTime() -
+                         self.clock.seconds(), 1)
+
+    def test_no_restart_when_stopping(self):
+        self.scheduler.stop()
+        self.assertTrue(self.worker.closed)
+
+        self.worker.exit()
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_stop_cancels_restart(self):
+        self.worker.exit()
+        self.scheduler.stop()
+
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+        self.clock.advance(10)
+        self.assertEqual(len(self.scheduler.launched), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
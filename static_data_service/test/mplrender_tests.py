@@ -0,0 +1,139 @@
+"""
+Tests the matplotlib render workers
+"""
+import unittest
+
+from twisted.internet.task import Clock
+
+from static_data_service import mplrender
+from static_data_service.mplrender import MatplotlibWorker
+
+
+class FakeClock(Clock):
+    """
+    Clock that runs calls from the pools threads straight away
+    """
+    def callFromThread(self, f, *args, **kwargs):
+        f(*args, **kwargs)
+
+
+class FakePool(object):
+    """
+    Process pool which keeps charts sent to it until the test finishes them
+    """
+    def __init__(self, error=None):
+        self.calls = []
+        self._error = error
+
+    def apply_async(self, func, args, callback=None, error_callback=None):
+        if self._error is not None:
+            raise self._error
+        self.calls.append((func, args, callback, error_callback))
+
+    def finish(self, result=(0.5, None)):
+        self.calls.pop(0)[2](result)
+
+    def fail(self, error):
+        self.calls.pop(0)[3](error)
+
+
+class MatplotlibWorkerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.pool = FakePool()
+        self.ready = []
+        self.worker = self._worker(self.pool)
+
+    def _worker(self, pool):
+        worker = MatplotlibWorker(pool, 30, self.clock)
+        worker.Ready += lambda w, render_time: self.ready.append(render_time)
+        worker.start()
+        return worker
+
+    def test_start_ready(self):
+        self.assertTrue(self.worker.idle)
+        self.assertEqual(self.ready, [None])
+
+    def test_plot_complete(self):
+        self.worker.plot("chart")
+
+        self.assertFalse(self.worker.idle)
+        self.assertEqual(self.worker.specs, "chart")
+        self.assertEqual(self.pool.calls[0][:2], (mplrender.render,
+                                                  ("chart",)))
+
+        self.pool.finish((0.5, None))
+
+        self.assertTrue(self.worker.idle)
+        self.assertIsNone(self.worker.specs)
+        self.assertEqual(self.ready, [None, 0.5])
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_render_error_reported_as_complete(self):
+        self.worker.plot("chart")
+        self.pool.finish((0.1, "ValueError: bad chart"))
+
+        self.assertTrue(self.worker.idle)
+        self.assertEqual(self.ready, [None, 0.1])
+
+    @unittest.skipUnless(mplrender._ERROR_CALLBACK,
+                         "Pool has no error_callback on Python 2")
+    def test_pool_error_marks_ready(self):
+        self.worker.plot("chart")
+        self.pool.fail(TypeError("can't pickle chart"))
+
+        self.assertTrue(self.worker.idle)
+        self.assertIsNone(self.worker.specs)
+        self.assertEqual(self.ready, [None, None])
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_apply_async_error_marks_ready(self):
+        self.ready = []
+        worker = self._worker(FakePool(ValueError("Pool not running")))
+        worker.plot("chart")
+
+        self.assertFalse(worker.idle)
+        self.clock.advance(0)
+
+        self.assertTrue(worker.idle)
+        self.assertEqual(self.ready, [None, None])
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_timeout_marks_ready(self):
+        self.worker.plot("chart")
+
+        self.clock.advance(29)
+        self.assertFalse(self.worker.idle)
+
+        self.clock.advance(1)
+        self.assertTrue(self.worker.idle)
+        self.assertIsNone(self.worker.specs)
+        self.assertEqual(self.ready, [None, None])
+
+    def test_late_result_ignored(self):
+        self.worker.plot("chart")
+        self.clock.advance(30)
+        self.worker.plot("chart2")
+
+        # The first chart finally finishes
+        self.pool.finish((45.0, None))
+
+        self.assertFalse(self.worker.idle)
+        self.assertEqual(self.worker.specs, "chart2")
+        self.assertEqual(self.ready, [None, None])
+
+        self.pool.finish((0.5, None))
+        self.assertTrue(self.worker.idle)
+        self.assertEqual(self.ready, [None, None, 0.5])
+
+    def test_close_cancels_timeout(self):
+        self.worker.plot("chart")
+        self.worker.close()
+
+        self.assertFalse(self.worker.idle)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
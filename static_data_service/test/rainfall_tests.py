@@ -0,0 +1,335 @@
+"""
+Tests the running rainfall totals and the station rainfall files
+"""
+from datetime import datetime, timedelta
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from twisted.internet import defer
+
+from static_data_service.datafile import RainFiles, SampleDataFile
+from static_data_service.rainfall import RollingWindow, PeriodTotal, \
+    day_start, week_start, month_start, year_start
+
+# A Sunday
+START = datetime(2020, 3, 1, 0, 0)
+
+
+def _hours(hours, minutes=0):
+    return START + timedelta(hours=hours, minutes=minutes)
+
+
+class RollingWindowTests(unittest.TestCase):
+
+    def setUp(self):
+        self.window = RollingWindow(timedelta(hours=24))
+
+    def test_empty(self):
+        self.assertEqual(self.window.total, 0.0)
+        self.assertIsNone(self.window.end)
+        self.assertEqual(len(self.window), 0)
+
+    def test_in_order(self):
+        for h in range(5):
+            self.assertTrue(self.window.add(_hours(h), 0.2))
+
+        self.assertEqual(self.window.total, 1.0)
+        self.assertEqual(self.window.end, _hours(4))
+
+    def test_missing_rainfall(self):
+        self.window.add(_hours(0), None)
+        self.window.add(_hours(1), 0.3)
+        self.assertEqual(self.window.total, 0.3)
+
+    def test_evicts_old_samples(self):
+        self.window.add(_hours(0), 1.0)
+        self.window.add(_hours(1), 2.0)
+        self.window.add(_hours(24), 4.0)
+
+        # The sample exactly 24 hours ago is outside the window
+        self.assertEqual(self.window.total, 6.0)
+        self.assertEqual(len(self.window), 2)
+
+    def test_include_start(self):
+        window = RollingWindow(timedelta(hours=24), include_start=True)
+        window.add(_hours(0), 1.0)
+        window.add(_hours(24), 4.0)
+
+        self.assertEqual(window.total, 5.0)
+
+        window.add(_hours(24, 1), 0.0)
+        self.assertEqual(window.total, 4.0)
+
+    def test_out_of_order(self):
+        self.window.add(_hours(0), 1.0)
+        self.window.add(_hours(2), 1.0)
+
+        self.assertTrue(self.window.add(_hours(1), 0.5))
+
+        self.assertEqual(self.window.total, 2.5)
+        self.assertEqual(self.window.end, _hours(2))
+
+        # Still in timestamp order so eviction takes the right samples
+        self.window.add(_hours(24, 30), 0.0)
+        self.assertEqual(self.window.total, 1.5)
+
+    def test_out_of_order_too_old(self):
+        self.window.add(_hours(30), 1.0)
+
+        self.assertFalse(self.window.add(_hours(6), 5.0))
+        self.assertEqual(self.window.total, 1.0)
+        self.assertEqual(len(self.window), 1)
+
+    def test_replacement(self):
+        self.window.add(_hours(0), 1.0)
+        self.window.add(_hours(1), 1.0)
+        self.window.add(_hours(2), 1.0)
+
+        self.window.add(_hours(1), 0.2)
+        self.assertEqual(self.window.total, 2.2)
+        self.assertEqual(len(self.window), 3)
+
+        # Replacing the latest sample
+        self.window.add(_hours(2), 0.0)
+        self.assertEqual(self.window.total, 1.2)
+        self.assertEqual(len(self.window), 3)
+
+    def test_gap_longer_than_window(self):
+        self.window.add(_hours(0), 1.0)
+        self.window.add(_hours(1), 1.0)
+        self.window.add(_hours(24 * 3), 0.4)
+
+        self.assertEqual(self.window.total, 0.4)
+        self.assertEqual(len(self.window), 1)
+
+    def test_rounding_error_hidden(self):
+        for i in range(1000):
+            self.window.add(START + timedelta(minutes=5 * i), 0.1)
+
+        # 288 five minute samples in 24 hours
+        self.assertEqual(self.window.total, 28.8)
+
+
+class PeriodTotalTests(unittest.TestCase):
+
+    def setUp(self):
+        self.day = PeriodTotal(day_start)
+
+    def test_empty(self):
+        self.assertIsNone(self.day.start)
+        self.assertEqual(self.day.total, 0.0)
+        self.assertIsNone(self.day.to_dict())
+
+    def test_total(self):
+        self.day.add(_hours(1), 0.2)
+        self.day.add(_hours(2), 0.3)
+
+        self.assertEqual(self.day.to_dict(), {
+            "start": "2020-03-01T00:00:00",
+            "total": 0.5,
+            "end": "2020-03-01T02:00:00",
+        })
+
+    def test_new_period_restarts(self):
+        self.day.add(_hours(23), 1.0)
+        self.assertTrue(self.day.add(_hours(24), 0.4))
+
+        self.assertEqual(self.day.start, _hours(24))
+        self.assertEqual(self.day.total, 0.4)
+
+    def test_multi_day_gap(self):
+        self.day.add(_hours(1), 1.0)
+        self.day.add(_hours(24 * 5 + 3), 0.2)
+
+        self.assertEqual(self.day.start, START + timedelta(days=5))
+        self.assertEqual(self.day.total, 0.2)
+        self.assertEqual(self.day.end, _hours(24 * 5 + 3))
+
+    def test_out_of_order_same_period(self):
+        self.day.add(_hours(5), 1.0)
+        self.assertTrue(self.day.add(_hours(3), 0.5))
+
+        self.assertEqual(self.day.total, 1.5)
+        self.assertEqual(self.day.end, _hours(5))
+
+    def test_earlier_period_ignored(self):
+        self.day.add(_hours(25), 1.0)
+        self.assertFalse(self.day.add(_hours(23), 0.5))
+        self.assertEqual(self.day.total, 1.0)
+
+    def test_reset(self):
+        self.day.add(_hours(1), 1.0)
+        self.day.reset(START + timedelta(days=1))
+
+        self.assertIsNone(self.day.to_dict())
+        self.assertEqual(self.day.total, 0.0)
+
+    def test_week_boundaries(self):
+        week = PeriodTotal(week_start)
+        # Saturday night then Sunday morning
+        week.add(datetime(2020, 3, 7, 23, 55), 1.0)
+        self.assertEqual(week.start, datetime(2020, 3, 1))
+        week.add(datetime(2020, 3, 8, 0, 5), 0.2)
+
+        self.assertEqual(week.start, datetime(2020, 3, 8))
+        self.assertEqual(week.total, 0.2)
+
+
+class PeriodStartTests(unittest.TestCase):
+
+    def test_day_start(self):
+        self.assertEqual(day_start(datetime(2020, 3, 4, 13, 5, 7, 9)),
+                         datetime(2020, 3, 4))
+
+    def test_week_start(self):
+        # Sunday is the first day of the week
+        self.assertEqual(week_start(datetime(2020, 3, 1, 12)),
+                         datetime(2020, 3, 1))
+        self.assertEqual(week_start(datetime(2020, 3, 2, 12)),
+                         datetime(2020, 3, 1))
+        self.assertEqual(week_start(datetime(2020, 3, 7, 23, 59)),
+                         datetime(2020, 3, 1))
+        # Across a month and year boundary
+        self.assertEqual(week_start(datetime(2021, 1, 2)),
+                         datetime(2020, 12, 27))
+
+    def test_month_start(self):
+        self.assertEqual(month_start(datetime(2020, 2, 29, 23)),
+                         datetime(2020, 2, 1))
+
+    def test_year_start(self):
+        self.assertEqual(year_start(datetime(2020, 12, 31, 23)),
+                         datetime(2020, 1, 1))
+
+
+class FakeDatabase(object):
+    def __init__(self, rows):
+        self.rows = rows
+        self.stations = []
+
+    def get_rainfall_seed(self, station_code):
+        self.stations.append(station_code)
+        return defer.succeed(self.rows)
+
+
+def _sample(ts, rain):
+    row = [None] * (SampleDataFile.COL_FORECAST_RULE_ID + 1)
+    row[SampleDataFile.COL_TIMESTAMP] = ts
+    row[SampleDataFile.COL_RAINFALL] = rain
+    return row
+
+
+class RainFilesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.files = RainFiles(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _read(self, filename):
+        with open(os.path.join(self.directory, filename)) as f:
+            return json.load(f)
+
+    def _summary(self):
+        return self._read("rain_summary.json")
+
+    def _create(self, rows):
+        db = FakeDatabase(rows)
+        d = self.files.create(db, "tst")
+        self.assertTrue(d.called)
+        self.assertEqual(db.stations, ["tst"])
+
+    def test_create_seeds_totals(self):
+        # Daily totals from the start of the year up to the 168 hour window
+        # then every sample in it
+        latest = datetime(2020, 3, 12, 12, 0)
+        rows = [(datetime(2020, 1, 5), 10.0),
+                (datetime(2020, 3, 2), 5.0),
+                (datetime(2020, 3, 5), 2.0)]
+        ts = latest - timedelta(hours=168)
+        while ts <= latest:
+            rows.append((ts, 0.1))
+            ts += timedelta(hours=1)
+
+        self._create(rows)
+
+        summary = self._summary()
+        self.assertEqual(summary["today"], {
+            "start": "2020-03-12T00:00:00", "total": 1.3,
+            "end": "2020-03-12T12:00:00"})
+        self.assertEqual(summary["yesterday"]["total"], 2.4)
+        # Sunday the 8th onwards
+        self.assertEqual(summary["this_week"]["start"], "2020-03-08T00:00:00")
+        self.assertEqual(summary["this_week"]["total"], 10.9)
+        self.assertEqual(summary["this_month"]["total"], 23.9)
+        self.assertEqual(summary["this_year"]["total"], 33.9)
+
+        self.assertEqual(self._read("current_day_rainfall_totals.json"),
+                         {"rainfall": 1.3, "7day_rainfall": 16.9})
+        self.assertEqual(self._read("24hr_rainfall_totals.json"),
+                         {"rainfall": 2.4, "7day_rainfall": 16.9})
+
+    def test_create_no_samples(self):
+        self._create([])
+
+        self.assertFalse(os.path.exists(os.path.join(self.directory,
+                                                     "rain_summary.json")))
+
+    def test_new_samples(self):
+        self._create([(datetime(2020, 3, 10, 23, 0), 1.0)])
+
+        self.files.new_samples([_sample(datetime(2020, 3, 11, 0, 5), 0.2),
+                                _sample(datetime(2020, 3, 11, 0, 10), 0.2)])
+
+        summary = self._summary()
+        self.assertEqual(summary["today"]["total"], 0.4)
+        self.assertEqual(summary["yesterday"]["total"], 1.0)
+        self.assertEqual(summary["this_month"]["total"], 1.4)
+        self.assertEqual(self._read("24hr_rainfall_totals.json"),
+                         {"rainfall": 1.4, "7day_rainfall": 1.4})
+
+    def test_late_sample_for_yesterday(self):
+        self._create([(datetime(2020, 3, 10, 22, 0), 1.0),
+                      (datetime(2020, 3, 11, 0, 5), 0.2)])
+
+        self.files.new_samples([_sample(datetime(2020, 3, 10, 23, 0), 0.5)])
+
+        summary = self._summary()
+        self.assertEqual(summary["yesterday"]["total"], 1.5)
+        self.assertEqual(summary["today"]["total"], 0.2)
+        self.assertEqual(self._read("24hr_rainfall_totals.json")["rainfall"],
+                         1.7)
+
+    def test_multi_day_gap_clears_yesterday(self):
+        self._create([(datetime(2020, 3, 10, 22, 0), 1.0)])
+
+        self.files.new_samples([_sample(datetime(2020, 3, 13, 9, 0), 0.2)])
+
+        summary = self._summary()
+        self.assertEqual(summary["today"]["total"], 0.2)
+        # No samples yesterday so it's left out
+        self.assertNotIn("yesterday", summary)
+        self.assertEqual(self._read("24hr_rainfall_totals.json")["rainfall"],
+                         0.2)
+
+    def test_unchanged_files_not_rewritten(self):
+        self._create([(datetime(2020, 3, 10, 22, 0), 1.0)])
+        filename = os.path.join(self.directory,
+                                "24hr_rainfall_totals.json")
+        os.remove(filename)
+
+        # Only today's end time changes so the rolling totals are the same
+        self.files.new_samples([_sample(datetime(2020, 3, 10, 22, 5), 0.0)])
+
+        self.assertFalse(os.path.exists(filename))
+        self.assertEqual(self._summary()["today"]["end"],
+                         "2020-03-10T22:05:00")
+
+
+if __name__ == '__main__':
+    unittest.main()
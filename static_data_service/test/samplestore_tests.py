@@ -0,0 +1,171 @@
+"""
+Tests the columnar sample store
+"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import math
+import unittest
+
+from static_data_service.samplestore import SampleStore, VALUE_FORMATS
+
+START = datetime(2020, 3, 1, 0, 0)
+
+
+def sample_row(ts, temperature=Decimal("12.50"), humidity=80, rainfall=None):
+    """
+    Builds a sample row as returned by SAMPLE_QUERY
+    """
+    values = [None] * len(VALUE_FORMATS)
+    values[0] = temperature
+    values[4] = humidity
+    values[8] = rainfall
+    values[14] = 100.0  # reception
+    return [ts] + values
+
+
+def _timestamps(store):
+    return store.timestamps(0, len(store))
+
+
+class SampleStoreTests(unittest.TestCase):
+
+    def test_add_in_order(self):
+        store = SampleStore()
+        for i in range(3):
+            self.assertEqual(store.add(sample_row(
+                START + timedelta(minutes=5 * i))), i)
+
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.timestamp(2), START + timedelta(minutes=10))
+
+    def test_add_out_of_order(self):
+        store = SampleStore()
+        store.add(sample_row(START))
+        store.add(sample_row(START + timedelta(minutes=10)))
+
+        index = store.add(sample_row(START + timedelta(minutes=5),
+                                     Decimal("20.00")))
+
+        self.assertEqual(index, 1)
+        self.assertEqual(_timestamps(store), [
+            START, START + timedelta(minutes=5),
+            START + timedelta(minutes=10)])
+        self.assertEqual(list(store.column(1, 0, 3)), [12.5, 20.0, 12.5])
+
+    def test_add_before_first(self):
+        store = SampleStore()
+        store.add(sample_row(START))
+
+        self.assertEqual(store.add(sample_row(START - timedelta(minutes=5))),
+                         0)
+        self.assertEqual(_timestamps(store), [START - timedelta(minutes=5),
+                                              START])
+
+    def test_duplicate_replaces(self):
+        store = SampleStore()
+        store.add(sample_row(START))
+        store.add(sample_row(START + timedelta(minutes=5)))
+
+        index = store.add(sample_row(START, Decimal("-1.25"), 50))
+
+        self.assertEqual(index, 0)
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.row(0)[1], -1.25)
+        self.assertEqual(store.row(0)[5], 50)
+
+    def test_duplicate_of_latest_replaces(self):
+        store = SampleStore()
+        store.add(sample_row(START))
+        store.add(sample_row(START, Decimal("3.00")))
+
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.row(0)[1], 3.0)
+
+    def test_extend_sorts(self):
+        store = SampleStore()
+        store.extend([sample_row(START + timedelta(minutes=m))
+                      for m in (10, 0, 5)])
+
+        self.assertEqual(_timestamps(store), [
+            START, START + timedelta(minutes=5),
+            START + timedelta(minutes=10)])
+
+    def test_eviction(self):
+        store = SampleStore(retain=timedelta(days=2))
+        ts = START
+        while ts <= START + timedelta(days=3):
+            store.add(sample_row(ts))
+            ts += timedelta(hours=1)
+
+        # Not evicted until the oldest sample is a day past the retention
+        # period
+        self.assertEqual(store.timestamp(0), START)
+
+        store.add(sample_row(ts))
+
+        self.assertEqual(store.timestamp(0),
+                         START + timedelta(days=1, hours=1))
+        self.assertEqual(len(store), 49)
+        self.assertEqual(len(store.column(1, 0, len(store))), 49)
+
+    def test_out_of_order_doesnt_evict(self):
+        store = SampleStore(retain=timedelta(hours=1))
+        store.add(sample_row(START + timedelta(days=2)))
+
+        store.add(sample_row(START))
+
+        self.assertEqual(len(store), 2)
+
+    def test_row_missing_and_integer_values(self):
+        store = SampleStore()
+        store.add(sample_row(START, Decimal("12.50"), 80, None))
+
+        row = store.row(0)
+
+        self.assertEqual(row[0], START)
+        self.assertEqual(row[1], 12.5)
+        self.assertEqual(row[5], 80)
+        self.assertIsInstance(row[5], int)
+        self.assertIsNone(row[2])
+        self.assertIsNone(row[9])
+        self.assertTrue(math.isnan(store.column(9, 0, 1)[0]))
+
+    def test_formatted_values_match_database_formatting(self):
+        store = SampleStore()
+        store.add(sample_row(START, Decimal("-0.50"), 7, Decimal("0.3")))
+
+        values = store.formatted_values(0).split("\t")
+
+        self.assertEqual(len(values), len(VALUE_FORMATS))
+        self.assertEqual(values[0], "-0.50")
+        self.assertEqual(values[1], "None")
+        self.assertEqual(values[4], "7")
+        self.assertEqual(values[8], "0.3")
+        self.assertEqual(values[14], "100.0")
+
+    def test_formatted_values_record_formats_reused(self):
+        store = SampleStore()
+        store.add(sample_row(START, rainfall=Decimal("0.3")))
+        store.add(sample_row(START + timedelta(minutes=5)))
+        store.add(sample_row(START + timedelta(minutes=10),
+                             rainfall=Decimal("0.0")))
+
+        self.assertEqual(store.formatted_values(2).split("\t")[8], "0.0")
+        self.assertEqual(store.formatted_values(1).split("\t")[8], "None")
+        self.assertEqual(len(store._record_formats), 2)
+
+    def test_index_lookups(self):
+        store = SampleStore()
+        store.extend([sample_row(START + timedelta(hours=h))
+                      for h in range(0, 48, 6)])
+
+        self.assertEqual(store.index_at(START + timedelta(hours=6)), 1)
+        self.assertEqual(store.index_after(START + timedelta(hours=6)), 2)
+        self.assertEqual(store.index_at(START + timedelta(hours=7)), 2)
+        self.assertEqual(store.date_index(date(2020, 3, 2)), 4)
+        self.assertEqual(store.date_index(date(2020, 3, 3)), 8)
+        self.assertEqual(store.date_index(date(2020, 2, 1)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -22,5 +22,13 @@
 # Change into working directory
 cd $1
 
+# When the output is configured with use_frame_list the directory contains
+# a list of frames to encode (frames.txt) instead of numbered images
+if [ -f frames.txt ]; then
+    INPUT="-f concat -safe 0 -i frames.txt"
+else
+    INPUT="-start_number 000000 -i %06d.jpg"
+fi
+
 # Generate the video at 30fps
-ffmpeg -r 30 -start_number 000000 -i %06d.jpg -s 1280x720 -metadata title="$3" -metadata description="$4" -metadata comment="$4" -vcodec libx264 -b:v 1800k -y $2
+ffmpeg -r 30 $INPUT -s 1280x720 -metadata title="$3" -metadata description="$4" -metadata comment="$4" -vcodec libx264 -b:v 1800k -y $2
@@ -17,5 +17,13 @@ REM  4 - Comments/description for the video
 REM change into the working directory
 cd /D %1
 
+REM When the output is configured with use_frame_list the directory contains
+REM a list of frames to encode (frames.txt) instead of numbered images
+if exist frames.txt (
+    set INPUT=-f concat -safe 0 -i frames.txt
+) else (
+    set INPUT=-start_number 000000 -i %%06d.jpg
+)
+
 REM Generate the video at 30fps
-ffmpeg -r 30 -start_number 000000 -i %%06d.jpg -s 1280x720 -vcodec libx264 -metadata title=%3 -metadata description=%4 -metadata comment=%4 -y %2
+ffmpeg -r 30 %INPUT% -s 1280x720 -vcodec libx264 -metadata title=%3 -metadata description=%4 -metadata comment=%4 -y %2
@@ -0,0 +1,308 @@
+"""
+Tests running encoder scripts through the encoding scheduler with process
+spawning faked out
+"""
+import os
+import unittest
+
+from twisted.internet import defer
+from twisted.internet.error import ProcessDone, ProcessTerminated
+from twisted.python.failure import Failure
+
+from time_lapse_logger import encoder
+from time_lapse_logger.encoder import EncodingScheduler
+
+
+class FakeTransport(object):
+    def __init__(self):
+        self.stdin_closed = False
+
+    def closeStdin(self):
+        self.stdin_closed = True
+
+
+class FakeProcess(object):
+    """
+    A spawned script. The test writes its output and ends it.
+    """
+    def __init__(self, protocol, executable, args, env):
+        self.protocol = protocol
+        self.executable = executable
+        self.args = args
+        self.env = env
+        self.transport = FakeTransport()
+        protocol.makeConnection(self.transport)
+
+    def out(self, data):
+        self.protocol.outReceived(data)
+
+    def err(self, data):
+        self.protocol.errReceived(data)
+
+    def exit(self, code=0):
+        if code == 0:
+            reason = ProcessDone(0)
+        else:
+            reason = ProcessTerminated(exitCode=code)
+        self.protocol.processEnded(Failure(reason))
+
+    def kill(self):
+        self.protocol.processEnded(Failure(ProcessTerminated(signal=9)))
+
+
+class FakeReactor(object):
+    def __init__(self):
+        self.processes = []
+
+    def spawnProcess(self, protocol, executable, args=(), env=None):
+        self.processes.append(FakeProcess(protocol, executable, args, env))
+
+
+class EncoderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._reactor = encoder.reactor
+        self._os_name = os.name
+        self.reactor = FakeReactor()
+        encoder.reactor = self.reactor
+
+    def tearDown(self):
+        encoder.reactor = self._reactor
+        os.name = self._os_name
+
+    @property
+    def process(self):
+        return self.reactor.processes[-1]
+
+    def _result(self, d):
+        results = []
+        d.addBoth(results.append)
+        self.assertEqual(len(results), 1)
+        return results[0]
+
+
+class ConcurrencyTests(EncoderTestCase):
+
+    def setUp(self):
+        super(ConcurrencyTests, self).setUp()
+        self.scheduler = EncodingScheduler(2)
+        self.jobs = []
+
+    def _job(self, name):
+        d = defer.Deferred()
+        self.jobs.append((name, d))
+        return d
+
+    def _submit(self, *names):
+        return [self.scheduler.submit(self._job, name) for name in names]
+
+    def test_invalid_concurrency(self):
+        self.assertRaises(ValueError, EncodingScheduler, 0)
+
+    def test_limit(self):
+        self._submit("a", "b", "c", "d")
+
+        self.assertEqual([name for name, _ in self.jobs], ["a", "b"])
+        self.assertEqual(self.scheduler.running, 2)
+        self.assertEqual(self.scheduler.waiting, 2)
+
+    def test_next_job_started_when_one_finishes(self):
+        results = self._submit("a", "b", "c")
+
+        self.jobs[1][1].callback("b done")
+
+        self.assertEqual(self._result(results[1]), "b done")
+        self.assertEqual([name for name, _ in self.jobs], ["a", "b", "c"])
+        self.assertEqual(self.scheduler.running, 2)
+        self.assertEqual(self.scheduler.waiting, 0)
+
+    def test_failed_job_frees_slot(self):
+        results = self._submit("a", "b", "c")
+
+        self.jobs[0][1].errback(Exception("encoder missing"))
+
+        self.assertEqual(str(self._result(results[0]).value),
+                         "encoder missing")
+        self.assertEqual(len(self.jobs), 3)
+
+    def test_all_finished(self):
+        self._submit("a", "b", "c")
+        for i in range(3):
+            self.jobs[i][1].callback(None)
+
+        self.assertEqual(self.scheduler.running, 0)
+        self.assertEqual(self.scheduler.waiting, 0)
+
+    def test_single_job_at_a_time(self):
+        self.scheduler = EncodingScheduler()
+        self._submit("a", "b")
+
+        self.assertEqual(len(self.jobs), 1)
+        self.jobs[0][1].callback(None)
+        self.assertEqual(len(self.jobs), 2)
+
+    def test_spawned_jobs(self):
+        # Jobs holding their slot until the script they spawn exits
+        def _job(name):
+            return self.scheduler.spawn(name, "encode.sh " + name)
+
+        results = [self.scheduler.submit(_job, name)
+                   for name in ("a", "b", "c")]
+        self.assertEqual(len(self.reactor.processes), 2)
+
+        self.reactor.processes[0].exit(0)
+
+        self.assertEqual(self._result(results[0]), 0)
+        self.assertEqual(len(self.reactor.processes), 3)
+        self.assertEqual(self.process.args[-1], "encode.sh c")
+
+
+@unittest.skipUnless(os.name == 'posix', "POSIX command lines")
+class NiceTests(EncoderTestCase):
+
+    def test_normal_priority(self):
+        EncodingScheduler().spawn("video", "encode.sh")
+
+        self.assertEqual(self.process.executable, "/bin/sh")
+        self.assertEqual(self.process.args,
+                         ["/bin/sh", "-c", "encode.sh"])
+        self.assertIs(self.process.env, os.environ)
+
+    def test_niceness(self):
+        EncodingScheduler(niceness=10).spawn("video", "encode.sh")
+
+        self.assertEqual(self.process.executable, "nice")
+        self.assertEqual(self.process.args,
+                         ["nice", "-n", "10", "/bin/sh", "-c", "encode.sh"])
+
+    def test_niceness_zero(self):
+        # Zero is still passed on rather than being treated as unset
+        EncodingScheduler(niceness=0).spawn("video", "encode.sh")
+
+        self.assertEqual(self.process.args[:3], ["nice", "-n", "0"])
+
+    def test_niceness_unsupported(self):
+        os.name = 'nt'
+        scheduler = EncodingScheduler(niceness=10)
+        os.name = self._os_name
+
+        scheduler.spawn("video", "encode.sh")
+
+        self.assertEqual(self.process.executable, "/bin/sh")
+
+    def test_windows_command_line(self):
+        scheduler = EncodingScheduler(niceness=10)
+        os.name = 'nt'
+
+        executable, args = scheduler._command_line("encode.bat")
+
+        self.assertEqual(args, [executable, "/c", "encode.bat"])
+
+
+class ProcessTests(EncoderTestCase):
+
+    def setUp(self):
+        super(ProcessTests, self).setUp()
+        self.scheduler = EncodingScheduler()
+        self.progress = []
+        self.scheduler.progress += \
+            lambda *args: self.progress.append(args)
+
+    def _spawn(self, frame_count=None):
+        return self.scheduler.spawn("video", "encode.sh", frame_count)
+
+    def test_stdin_closed(self):
+        self._spawn()
+        self.assertTrue(self.process.transport.stdin_closed)
+
+    def test_exit_code(self):
+        d = self._spawn()
+        self.assertFalse(d.called)
+
+        self.process.exit(0)
+        self.assertEqual(self._result(d), 0)
+
+    def test_failure_exit_code(self):
+        d = self._spawn()
+        self.process.out(b"line 1\nline 2\n")
+
+        self.process.exit(3)
+
+        self.assertEqual(self._result(d), 3)
+        self.assertEqual(list(self.process.protocol.tail),
+                         [b"line 1", b"line 2"])
+
+    def test_killed(self):
+        d = self._spawn()
+        self.process.kill()
+        self.assertEqual(self._result(d), -1)
+
+    def test_progress(self):
+        self._spawn(1000)
+
+        self.process.err(b"frame=  100 fps= 43 q=28.0 size=  4096kB\r"
+                         b"frame=  250 fps= 43 q=28.0 size=  8192kB\r")
+
+        self.assertEqual(self.progress, [("video", 100, 1000),
+                                         ("video", 250, 1000)])
+
+    def test_progress_split_across_reads(self):
+        self._spawn(1000)
+
+        self.process.err(b"frame=  1")
+        self.assertEqual(self.progress, [])
+
+        self.process.err(b"23 fps=43\rfra")
+        self.process.err(b"me=124 fps=43\n")
+
+        self.assertEqual(self.progress, [("video", 123, 1000),
+                                         ("video", 124, 1000)])
+
+    def test_progress_unknown_frame_count(self):
+        self._spawn()
+        self.process.out(b"frame=5\n")
+
+        self.assertEqual(self.progress, [("video", 5, None)])
+
+    def test_other_output_ignored(self):
+        self._spawn(100)
+        self.process.err(b"Input #0, image2, from '%06d.jpg':\n\r\n"
+                         b"  Duration: 00:00:20.00\n")
+
+        self.assertEqual(self.progress, [])
+        self.assertEqual(len(self.process.protocol.tail), 2)
+
+    def test_progress_logged_every_ten_percent(self):
+        logged = []
+        protocol = encoder._ScriptProcessProtocol(
+            "video", 100, self.scheduler.progress)
+        log_msg = encoder.log.msg
+        encoder.log.msg = logged.append
+        try:
+            for frames in (5, 10, 15, 20, 45, 48, 100):
+                protocol._report_progress(frames)
+        finally:
+            encoder.log.msg = log_msg
+
+        self.assertEqual(logged, [
+            "Encoding video: 10 of 100 frames (10%)",
+            "Encoding video: 20 of 100 frames (20%)",
+            "Encoding video: 45 of 100 frames (45%)",
+            "Encoding video: 100 of 100 frames (100%)",
+        ])
+
+    def test_tail_limited(self):
+        self._spawn()
+        self.process.out(b"".join(b"line " + str(i).encode() + b"\n"
+                                  for i in range(25)))
+        self.process.out(b"unterminated")
+        self.process.exit(1)
+
+        tail = list(self.process.protocol.tail)
+        self.assertEqual(len(tail), encoder._ScriptProcessProtocol.TAIL_LINES)
+        self.assertEqual(tail[-1], b"unterminated")
+        self.assertEqual(tail[0], b"line 16")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+"""
+Tests the index of frames captured for the current time-lapse run
+"""
+from datetime import datetime, timedelta
+import os
+import shutil
+import tempfile
+import unittest
+
+from time_lapse_logger.frame_index import FrameIndex, Frame, frame_filename
+
+START = datetime(2020, 3, 1, 6, 0)
+
+
+class FrameIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "frames.csv")
+        self.index = FrameIndex(self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _capture(self, count):
+        for number in range(count):
+            size = 1000 + number
+            with open(os.path.join(self.directory,
+                                   frame_filename(number)), "wb") as f:
+                f.write(b"x" * size)
+            self.index.add(number, size,
+                           START + timedelta(minutes=number))
+
+    def _loaded(self, frame_count):
+        index = FrameIndex(self.filename)
+        index.load(frame_count)
+        return index
+
+    def _write_index(self, text):
+        with open(self.filename, "w") as f:
+            f.write(text)
+
+    def test_frame_filename(self):
+        self.assertEqual(frame_filename(0), "000000.jpg")
+        self.assertEqual(frame_filename(1234), "001234.jpg")
+
+    def test_add(self):
+        self._capture(3)
+
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.frames[2],
+                         Frame(2, 1002, START + timedelta(minutes=2)))
+
+    def test_load(self):
+        self._capture(3)
+
+        index = self._loaded(3)
+
+        self.assertEqual(index.frames, self.index.frames)
+
+    def test_load_missing_index_rebuilds(self):
+        self._capture(3)
+        os.unlink(self.filename)
+
+        index = self._loaded(3)
+
+        # Capture times are lost but the sizes come from the image files
+        self.assertEqual(index.frames, [Frame(0, 1000, None),
+                                        Frame(1, 1001, None),
+                                        Frame(2, 1002, None)])
+        self.assertTrue(os.path.exists(self.filename))
+
+    def test_rebuilt_index_loads(self):
+        self._capture(2)
+        os.unlink(self.filename)
+        rebuilt = self._loaded(2)
+
+        self.assertEqual(self._loaded(2).frames, rebuilt.frames)
+
+    def test_load_incomplete_index_rebuilds(self):
+        # Frame 2 was captured but the logger stopped before indexing it
+        self._capture(3)
+        self._write_index("0,1000,{0}\n1,1001,{1}\n".format(
+            START.isoformat(), (START + timedelta(minutes=1)).isoformat()))
+
+        index = self._loaded(3)
+
+        self.assertEqual([frame.number for frame in index.frames], [0, 1, 2])
+        self.assertEqual(index.frames[2].size, 1002)
+
+    def test_load_partial_line_ignored(self):
+        self._capture(2)
+        with open(self.filename, "a") as f:
+            f.write("2,10")
+
+        index = self._loaded(2)
+
+        self.assertEqual(index.frames, self.index.frames)
+
+    def test_load_invalid_index_rebuilds(self):
+        self._capture(2)
+        self._write_index("0,1000,{0}\none,1001,\n".format(START.isoformat()))
+
+        index = self._loaded(2)
+
+        self.assertEqual(index.frames, [Frame(0, 1000, None),
+                                        Frame(1, 1001, None)])
+
+    def test_rebuild_skips_missing_images(self):
+        self._capture(3)
+        os.unlink(self.filename)
+        os.unlink(os.path.join(self.directory, frame_filename(1)))
+
+        index = self._loaded(3)
+
+        self.assertEqual([frame.number for frame in index.frames], [0, 2])
+
+    def test_clear(self):
+        self._capture(2)
+
+        self.index.clear()
+
+        self.assertEqual(len(self.index), 0)
+        self.assertFalse(os.path.exists(self.filename))
+
+        # Clearing an index that was never written is fine too
+        self.index.clear()
+
+    def test_add_after_clear(self):
+        self._capture(2)
+        self.index.clear()
+
+        self.index.add(0, 50, START)
+
+        self.assertEqual(self._loaded(1).frames, [Frame(0, 50, START)])
+
+    def test_select(self):
+        frames = [Frame(n, 1000, None) for n in range(10)]
+
+        self.assertIs(FrameIndex.select(frames, 1), frames)
+        self.assertIs(FrameIndex.select(frames, 0), frames)
+        self.assertEqual([f.number for f in FrameIndex.select(frames, 3)],
+                         [0, 3, 6, 9])
+        self.assertEqual(FrameIndex.select(frames, 20), frames[:1])
+        self.assertEqual(FrameIndex.select([], 2), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
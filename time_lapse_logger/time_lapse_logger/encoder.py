@@ -0,0 +1,198 @@
+# coding=utf-8
+"""
+Runs encoder (and archive) scripts as child processes so the reactor remains
+free to capture images and receive live data while videos are being built.
+"""
+import os
+import re
+from collections import deque
+
+from twisted.internet import reactor, protocol
+from twisted.internet.defer import Deferred, DeferredSemaphore
+from twisted.python import log
+
+from .util import Event
+
+__author__ = 'david'
+
+# Progress lines written by ffmpeg/avconv look like:
+#   frame=  512 fps= 43 q=28.0 size=    4096kB time=00:00:17.06 ...
+_FRAME_RE = re.compile(br'frame=\s*(\d+)')
+
+
+class _ScriptProcessProtocol(protocol.ProcessProtocol):
+    """
+    Collects output from an encoder script, reports encoding progress and
+    fires a deferred with the scripts exit code when it terminates.
+    """
+
+    # Number of output lines to keep for logging should the script fail
+    TAIL_LINES = 10
+
+    def __init__(self, name, frame_count, progress):
+        """
+        :param name: Job name used in log messages
+        :type name: str
+        :param frame_count: Number of frames being encoded or None if unknown
+        :type frame_count: int or None
+        :param progress: Event fired with (name, frames_encoded, frame_count)
+        :type progress: Event
+        """
+        self.finished = Deferred()
+
+        self._name = name
+        self._frame_count = frame_count
+        self._progress = progress
+        self._next_report = 10
+        self._partial = b''
+        self.tail = deque(maxlen=self.TAIL_LINES)
+
+    def connectionMade(self):
+        # Nothing is ever sent to the script. Closing stdin stops ffmpeg
+        # waiting on the terminal for commands.
+        self.transport.closeStdin()
+
+    def outReceived(self, data):
+        self._data_received(data)
+
+    def errReceived(self, data):
+        self._data_received(data)
+
+    def _data_received(self, data):
+        # ffmpeg rewrites its progress line using carriage returns.
+        lines = (self._partial + data).replace(b'\r', b'\n').split(b'\n')
+        self._partial = lines.pop()
+
+        for line in lines:
+            if not line.strip():
+                continue
+            self.tail.append(line)
+
+            match = _FRAME_RE.search(line)
+            if match is not None:
+                self._report_progress(int(match.group(1)))
+
+    def _report_progress(self, frames):
+        self._progress.fire(self._name, frames, self._frame_count)
+
+        if not self._frame_count:
+            return
+
+        percent = frames * 100 // self._frame_count
+        if percent >= self._next_report:
+            log.msg("Encoding {0}: {1} of {2} frames ({3}%)".format(
+                self._name, frames, self._frame_count, min(percent, 100)))
+            self._next_report = (percent // 10 + 1) * 10
+
+    def processEnded(self, reason):
+        if self._partial.strip():
+            self.tail.append(self._partial)
+            self._partial = b''
+
+        exit_code = reason.value.exitCode
+        if exit_code is None:
+            # Killed by a signal
+            exit_code = -1
+        self.finished.callback(exit_code)
+
+
+class EncodingScheduler(object):
+    """
+    Runs video encoding jobs in parallel up to a concurrency limit. Scripts
+    are run as child processes (optionally at a reduced CPU priority) rather
+    than blocking the reactor.
+    """
+
+    def __init__(self, concurrency=1, niceness=None):
+        """
+        :param concurrency: Maximum number of jobs to run at once
+        :type concurrency: int
+        :param niceness: Amount to increase the niceness of encoder processes
+            by. Only supported on POSIX systems. None to run at the same
+            priority as the logger.
+        :type niceness: int or None
+        """
+        if concurrency < 1:
+            raise ValueError("Encoding concurrency must be at least 1")
+
+        # Fired with (job name, frames encoded, total frames) whenever an
+        # encoder reports progress
+        self.progress = Event()
+
+        self._concurrency = concurrency
+        self._niceness = niceness
+        self._semaphore = DeferredSemaphore(concurrency)
+
+        if niceness is not None and os.name != 'posix':
+            log.msg("Encoder niceness is not supported on this platform. "
+                    "Encoders will run at normal priority.")
+            self._niceness = None
+
+    @property
+    def running(self):
+        """
+        Number of jobs currently running
+        """
+        return self._concurrency - self._semaphore.tokens
+
+    @property
+    def waiting(self):
+        """
+        Number of jobs waiting for a free slot
+        """
+        return len(self._semaphore.waiting)
+
+    def submit(self, f, *args, **kwargs):
+        """
+        Queues a job. The job will be run once fewer than concurrency jobs are
+        running and holds its slot until the deferred it returns fires.
+
+        :param f: Job to run. May return a deferred.
+        :returns: Deferred firing with the result of f
+        :rtype: Deferred
+        """
+        return self._semaphore.run(f, *args, **kwargs)
+
+    def _command_line(self, command):
+        if os.name == 'nt':
+            executable = os.environ.get('COMSPEC', 'cmd.exe')
+            return executable, [executable, '/c', command]
+
+        args = ['/bin/sh', '-c', command]
+        if self._niceness is not None:
+            args = ['nice', '-n', str(self._niceness)] + args
+        return args[0], args
+
+    def spawn(self, name, command, frame_count=None):
+        """
+        Runs a shell command as a child process. This does not wait for a free
+        slot - use it from within a job passed to submit().
+
+        :param name: Name for the job used in log messages and progress
+            reporting
+        :type name: str
+        :param command: Shell command to run
+        :type command: str
+        :param frame_count: Number of frames being encoded. Used to report
+            progress as a percentage.
+        :type frame_count: int or None
+        :returns: Deferred firing with the commands exit code
+        :rtype: Deferred
+        """
+        process_protocol = _ScriptProcessProtocol(name, frame_count,
+                                                  self.progress)
+        executable, args = self._command_line(command)
+
+        reactor.spawnProcess(process_protocol, executable, args,
+                             env=os.environ)
+
+        def _finished(exit_code):
+            if exit_code != 0:
+                log.msg("{0} exited with code {1}. Last output:\n{2}".format(
+                    name, exit_code,
+                    b'\n'.join(process_protocol.tail).decode(
+                        'utf-8', 'replace')))
+            return exit_code
+
+        process_protocol.finished.addCallback(_finished)
+        return process_protocol.finished
@@ -0,0 +1,130 @@
+# coding=utf-8
+"""
+Index of the frames captured for the current time-lapse run. This lets
+outputs select their frames and report the size of their input without
+listing or stat'ing thousands of files in the working directory.
+"""
+import os
+from collections import namedtuple
+
+import dateutil.parser
+from twisted.python import log
+
+__author__ = 'david'
+
+Frame = namedtuple('Frame', ('number', 'size', 'time'))
+
+# ffmpeg concat demuxer script written for outputs using a frame list
+FRAME_LIST_FILENAME = "frames.txt"
+
+
+def frame_filename(number):
+    """
+    Returns the name of the image file for the specified frame number
+    """
+    return "{0:06}.jpg".format(number)
+
+
+class FrameIndex(object):
+    """
+    Keeps the number, size and capture time of every frame in the working
+    directory. The index is appended to a CSV file as frames are captured so
+    it survives a restart of the logger.
+    """
+
+    def __init__(self, filename):
+        """
+        :param filename: File to persist the index in
+        :type filename: str
+        """
+        self._filename = filename
+        self.frames = []
+
+    def __len__(self):
+        return len(self.frames)
+
+    def add(self, number, size, time):
+        """
+        Records a newly captured frame.
+
+        :param number: Frame number
+        :type number: int
+        :param size: Size of the frames image file in bytes
+        :type size: int
+        :param time: Time the frame was captured
+        :type time: datetime
+        """
+        frame = Frame(number, size, time)
+        self.frames.append(frame)
+
+        with open(self._filename, 'a') as f:
+            f.write("{0},{1},{2}\n".format(number, size, time.isoformat()))
+
+    def clear(self):
+        """
+        Empties the index
+        """
+        self.frames = []
+        if os.path.exists(self._filename):
+            os.unlink(self._filename)
+
+    def load(self, frame_count):
+        """
+        Loads the index when recovering an interrupted run. If the index is
+        missing or doesn't cover every frame (the logger was stopped while
+        writing it or was upgraded mid-run) it is rebuilt from the image files
+        in the working directory.
+
+        :param frame_count: Number of frames captured so far
+        :type frame_count: int
+        """
+        frames = []
+        try:
+            with open(self._filename, 'r') as f:
+                for line in f:
+                    parts = line.strip().split(',')
+                    if len(parts) != 3:
+                        # Partially written line
+                        continue
+                    time = None
+                    if parts[2]:
+                        time = dateutil.parser.parse(parts[2])
+                    frames.append(Frame(int(parts[0]), int(parts[1]), time))
+        except (IOError, OSError, ValueError) as e:
+            log.msg("Failed to read frame index: {0}".format(e))
+            frames = []
+
+        if [frame.number for frame in frames] == list(range(frame_count)):
+            self.frames = frames
+        else:
+            log.msg("Frame index is incomplete. Rebuilding...")
+            self._rebuild(frame_count)
+
+    def _rebuild(self, frame_count):
+        directory = os.path.dirname(self._filename)
+
+        self.frames = []
+        for number in range(frame_count):
+            filename = os.path.join(directory, frame_filename(number))
+            if os.path.exists(filename):
+                self.frames.append(Frame(number, os.path.getsize(filename),
+                                         None))
+
+        with open(self._filename, 'w') as f:
+            for frame in self.frames:
+                f.write("{0},{1},\n".format(frame.number, frame.size))
+
+    @staticmethod
+    def select(frames, multiplier):
+        """
+        Selects every nth frame.
+
+        :param frames: Frames to select from
+        :type frames: list[Frame]
+        :param multiplier: Interval multiplier. 1 selects every frame.
+        :type multiplier: int
+        :rtype: list[Frame]
+        """
+        if multiplier <= 1:
+            return frames
+        return frames[::multiplier]
@@ -4,14 +4,14 @@ import json
 import os
 import shutil
 from datetime import datetime, time, timedelta
-import subprocess
 from timeit import default_timer as timer
 
 import pytz
 from astral import Location
 from twisted.application import service
 from twisted.internet import task, reactor
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import inlineCallbacks, returnValue, \
+    DeferredList, Deferred
 from twisted.internet.ssl import ClientContextFactory
 from twisted.python import log
 from twisted.web.client import Agent, WebClientContextFactory
@@ -19,6 +19,8 @@ from twisted.web.http_headers import Headers
 import dateutil.parser
 
 from .database import DatabaseReceiver, Database
+from .encoder import EncodingScheduler
+from .frame_index import FrameIndex, frame_filename, FRAME_LIST_FILENAME
 from .mq_receiver import RabbitMqReceiver
 from .readbody import readBody
 from .util import Event
@@ -58,7 +60,7 @@ class VideoProcessor(object):
     def __init__(self, working_directory, encoder_script, backup_location,
                  store_in_database, database, image_source_code, enabled,
                  variant_name, output_name, interval_multiplier, title,
-                 description):
+                 description, encoder, use_frame_list=False):
 
         self.stopService = Event()
         self.reconnectDatabase = Event()
@@ -78,6 +80,8 @@ class VideoProcessor(object):
         self._interval_multiplier = interval_multiplier
         self._title = title
         self._description = description
+        self._encoder = encoder
+        self._use_frame_list = use_frame_list
 
         # TODO: This produces no output because the log doesn't
         #   start until the service starts
@@ -96,8 +100,8 @@ class VideoProcessor(object):
         return self._output_name
 
     @staticmethod
-    def _select_inputs(working_dir, input_path, multiplier, frame_count):
-        # Symlink (or copy if windows) every nth image into the input path
+    def _link_inputs(working_dir, input_path, frames):
+        # Symlink (or copy if windows) the selected images into the input path
         # The resulting directory should be a smaller set of consecutively
         # numbered images
         # eg, with a multiplier of 2:
@@ -108,51 +112,75 @@ class VideoProcessor(object):
         #    004.jpg        /
         #    005.jpg   ----/
 
-        log.msg("Selecting inputs for multiplier {0}, output to {1}".format(multiplier, input_path))
-
-        if not os.path.exists(input_path):
-            os.makedirs(input_path)
-
-        # First up, these are the frames we've got to work with
-        available_images = ["{0:06}.jpg".format(frame_number)
-                            for frame_number in range(0, frame_count+1)]
-
-        selected_images = []
-        i = 0
-        next_id = 0
-        while i < len(available_images):
-            if i == next_id:
-                selected_images.append(available_images[i])
-                next_id += multiplier
-            i += 1
-
         # Empty target directory
         for f in os.listdir(input_path):
             file_path = os.path.join(input_path, f)
-            if os.path.isfile(file_path):
+            if os.path.isfile(file_path) or os.path.islink(file_path):
                 os.unlink(file_path)
 
-        # Now symlink (or copy) the selected images into the input path for
-        # encoding.
-
-        i = 0
-        if hasattr(os, "symlink"):
-            wd = os.getcwd()
-            os.chdir(input_path)
-            for image in selected_images:
-                relative_path = os.path.join("../", image)
-                os.symlink(relative_path, "{0:06}.jpg".format(i))
-                i += 1
-            os.chdir(wd)
+        use_symlinks = hasattr(os, "symlink")
+        for i, frame in enumerate(frames):
+            link = os.path.join(input_path, frame_filename(i))
+            if use_symlinks:
+                # Symlink targets are relative to the link
+                os.symlink(os.path.join("..", frame_filename(frame.number)),
+                           link)
+            else:
+                shutil.copy(
+                    os.path.join(working_dir, frame_filename(frame.number)),
+                    link)
+
+    @staticmethod
+    def _write_frame_list(input_path, frames):
+        # An ffmpeg concat demuxer script listing the selected images. The
+        # encoder reads the images straight from the working directory.
+        lines = ["ffconcat version 1.0\n"]
+        lines.extend("file '../{0}'\n".format(frame_filename(frame.number))
+                     for frame in frames)
+
+        filename = os.path.join(input_path, FRAME_LIST_FILENAME)
+        with open(filename + ".tmp", 'w') as f:
+            f.write("".join(lines))
+        if os.path.exists(filename):
+            os.unlink(filename)
+        os.rename(filename + ".tmp", filename)
+
+    def _select_inputs(self, frames):
+        """
+        Prepares the encoder input for this output from the frames captured.
+
+        :param frames: Frames captured during the run
+        :type frames: list[Frame]
+        :returns: Encoder input directory and the frames selected
+        :rtype: (str, list[Frame])
+        """
+        selected = FrameIndex.select(frames, self._interval_multiplier)
+
+        if self._interval_multiplier <= 1 and not self._use_frame_list:
+            # Encode every image in the working directory as-is
+            return self._working_dir, selected
+
+        if self._output_name is None or self._output_name == '':
+            input_path = os.path.join(self._working_dir, 'default')
+        else:
+            input_path = os.path.join(self._working_dir, self._output_name)
+
+        log.msg("Selecting inputs for multiplier {0}, output to {1}".format(
+            self._interval_multiplier, input_path))
+
+        if not os.path.exists(input_path):
+            os.makedirs(input_path)
+
+        if self._use_frame_list:
+            self._write_frame_list(input_path, selected)
         else:
-            for image in selected_images:
-                shutil.copy(os.path.join(working_dir, image),
-                            os.path.join(input_path, "{0:06}.jpg".format(i)))
-                i += 1
-        return len(selected_images)
+            self._link_inputs(self._working_dir, input_path, selected)
+
+        return input_path, selected
 
+    @inlineCallbacks
     def build_and_store_video(self, current_time, logging_start_time, interval,
-                              frame_count):
+                              frames):
 
         log.msg("Building video for output '{0}', multiplier {1}, store to db ".format(
                 self._output_name, self._interval_multiplier, not self._redirect_videos_to_disk))
@@ -169,21 +197,9 @@ class VideoProcessor(object):
         title = self._title.format(**metadata_parameters)
         description = self._description.format(**metadata_parameters)
 
-        input_path = self._working_dir
-        if self._interval_multiplier > 1:
-            if self._output_name is None or self._output_name == '':
-                input_path = os.path.join(self._working_dir, 'default')
-            else:
-                input_path = os.path.join(self._working_dir, self._output_name)
-
-            # Prepare a new encoder input directory with a reduced number of frames
-            # and get a new frame count.
-            frame_count = self._select_inputs(self._working_dir, input_path,
-                                              self._interval_multiplier, frame_count)
-
-        input_size = sum(os.path.getsize(os.path.join(input_path, f))
-                         for f in os.listdir(input_path)
-                         if os.path.isfile(os.path.join(input_path, f)))
+        input_path, frames = self._select_inputs(frames)
+        frame_count = len(frames)
+        input_size = sum(frame.size for frame in frames)
 
         dest_file = "output{name}.mp4".format(name=self._output_name)
 
@@ -194,20 +210,21 @@ class VideoProcessor(object):
         log.msg("Encoding video {1} with command: {0}".format(command, dest_file))
 
         # generate the video file using the generator script
-        result = subprocess.call(command, shell=True)
+        result = yield self._encoder.spawn("video " + dest_file, command,
+                                           frame_count)
 
         processing_time = timer() - start
 
         if result != 0:
             log.msg("** ERROR: video script fails")
             self.stopService.fire()
-            return timer() - start
+            returnValue(timer() - start)
 
         metadata = {
             "start": logging_start_time.isoformat(),
             "finish": finish_time.isoformat(),
             "processing_time": processing_time,
-            "frame_count": frame_count + 1,  # +1 to account for number 0
+            "frame_count": frame_count,
             "base_interval": interval,
             "interval": interval * self._interval_multiplier,
             "total_size": input_size,
@@ -225,11 +242,11 @@ class VideoProcessor(object):
                 finish_time, metadata, video_data, mime_type, title,
                 description)
         else:
-            self._store_video_in_database(finish_time, metadata, video_data,
-                                          mime_type, title, description,
-                                          current_time)
+            yield self._store_video_in_database(finish_time, metadata,
+                                                video_data, mime_type, title,
+                                                description, current_time)
         processing_time = timer() - start
-        return processing_time
+        returnValue(processing_time)
 
     @inlineCallbacks
     def _store_video_in_database(self, finish_time, metadata, video_data,
@@ -310,7 +327,8 @@ class TSLoggerService(service.Service):
                  disable_cert_verification, working_dir,
                  calculate_schedule, latitude, longitude, timezone, elevation,
                  sunrise_offset, sunset_offset, output_configurations,
-                 store_frame_info, archive_script):
+                 store_frame_info, archive_script, encoder_concurrency=1,
+                 encoder_niceness=None):
         """
 
         :param dsn: Database connection string
@@ -366,6 +384,12 @@ class TSLoggerService(service.Service):
         :param sunset_offset: Time offset in minutes for calculated sunset
         :type sunset_offset: int
         :param output_configurations: Output configuration data
+        :param encoder_concurrency: Maximum number of outputs to encode at
+            once
+        :type encoder_concurrency: int
+        :param encoder_niceness: Niceness increment for encoder processes or
+            None to run them at normal priority
+        :type encoder_niceness: int or None
         """
 
         self._agent = None
@@ -439,6 +463,11 @@ class TSLoggerService(service.Service):
         self._logging_start_time = None
         self._current_image_number = 0
 
+        # Number, size and capture time of every frame in the working
+        # directory
+        self._frame_index = FrameIndex(
+            os.path.join(self._working_dir, "frames.csv"))
+
         def _stop_service():
             self.stopService()
 
@@ -447,6 +476,13 @@ class TSLoggerService(service.Service):
             if self._db_receiver is not None:
                 self._db_receiver.reconnect()
 
+        # Encoders run as child processes so capture can continue while
+        # videos are built. _encoding is the deferred for video processing
+        # currently in progress (if any).
+        self._encoder = EncodingScheduler(encoder_concurrency,
+                                          encoder_niceness)
+        self._encoding = None
+
         self._image_source_code = image_source_code
         self._video_processors = []
         for c in output_configurations:
@@ -454,7 +490,8 @@ class TSLoggerService(service.Service):
                 self._working_dir, c["script"], c["backup_location"],
                 c["store_in_db"], self._database, image_source_code, True,
                 c["variant_name"], c["output_name"], c["interval_multiplier"],
-                c["title"], c["description"]))
+                c["title"], c["description"], self._encoder,
+                c.get("use_frame_list", False)))
 
         for vp in self._video_processors:
             vp.stopService += _stop_service
@@ -543,6 +580,12 @@ class TSLoggerService(service.Service):
         service.Service.stopService(self)
         self._stop_logging("service stop", False)
 
+        # Don't let the reactor shut down until any videos being built have
+        # been stored.
+        if self._encoding is not None:
+            log.msg("Waiting for video processing to finish...")
+        return self._after_encoding()
+
     @inlineCallbacks
     def _get_image(self):
         log.msg("Obtaining image #{0:06}...".format(self._current_image_number))
@@ -570,9 +613,11 @@ class TSLoggerService(service.Service):
             if response_data is None or not len(response_data):
                 raise Exception("Empty repsonse from camera")
 
-            fn = os.path.join(self._working_dir, "{0:06}.jpg".format(self._current_image_number))
+            fn = os.path.join(self._working_dir, frame_filename(self._current_image_number))
             with open(fn, 'wb') as f:
                 f.write(response_data)
+            self._frame_index.add(self._current_image_number,
+                                  len(response_data), response_time)
 
             # Optionally store some metadata for the frame so it can be later
             # inserted into the database by the user if it has something
@@ -663,15 +708,30 @@ class TSLoggerService(service.Service):
 
         self._current_image_number = 0
 
-        self._recover_run()
-
-        self._looper.start(self._interval, True)
+        if self._encoding is not None and not self._can_resume_run():
+            # Starting a new run empties the working directory which still
+            # holds the frames for the videos being built.
+            log.msg("Capture will start once video processing for the "
+                    "previous run has finished.")
+            self._after_encoding().addCallback(
+                lambda _: self._start_capture())
+        else:
+            self._start_capture()
 
         if not self._daylight_trigger:
             self._schedule_logging_stop()
         # else the logger will be stopped when the associated weather station
         # stops detecting sunlight
 
+    def _start_capture(self):
+        if not self._logging or self._looper.running:
+            # Logging was stopped again while waiting for video processing
+            return
+
+        self._recover_run()
+
+        self._looper.start(self._interval, True)
+
     def _stop_logging(self, trigger, produce_outputs=True):
 
         if not self._logging:
@@ -694,7 +754,10 @@ class TSLoggerService(service.Service):
         log.msg("Stopping logger: {0}".format(trigger))
         self._logging = False
 
-        if self._looper.running:
+        # Capture won't have started if logging started while the previous
+        # runs videos were still being processed.
+        capturing = self._looper.running
+        if capturing:
             self._looper.stop()
 
         if self._calculated_schedule or not self._daylight_trigger:
@@ -702,22 +765,77 @@ class TSLoggerService(service.Service):
         # else the logger will be started when the associated weather station
         # detects sunlight
 
-        if produce_outputs:
+        if produce_outputs and capturing:
             self._build_and_store_video()
 
+    def _after_encoding(self):
+        """
+        Returns a deferred that fires once any video processing currently in
+        progress has finished.
+        """
+        d = Deferred()
+        if self._encoding is None:
+            d.callback(None)
+        else:
+            def _finished(result):
+                d.callback(None)
+                return result
+            self._encoding.addBoth(_finished)
+        return d
+
     def _build_and_store_video(self):
+        # Outputs for the previous run (if its still being processed) write
+        # to the same files so this run has to wait its turn.
+        current_time = self.current_time
+        logging_start_time = self._logging_start_time
+        # Frames captured after this point (if the run is resumed) belong to
+        # the next set of videos
+        frames = list(self._frame_index.frames)
+
+        d = self._after_encoding()
+        self._encoding = d
+
+        d.addCallback(lambda _: self._process_outputs(
+            current_time, logging_start_time, frames))
+
+        def _failed(failure):
+            log.err(failure, "Video processing failed")
+
+        def _finished(_):
+            if self._encoding is d:
+                self._encoding = None
+
+        d.addErrback(_failed)
+        d.addBoth(_finished)
+
+    @inlineCallbacks
+    def _process_outputs(self, current_time, logging_start_time, frames):
+        start = timer()
+
+        def _processed(pt, output):
+            log.msg("Processed output {0} in {1} seconds".format(output, pt))
+
+        jobs = []
         for vp in self._video_processors:
             if vp.enabled:
-                log.msg("Processing for output: " + vp.output)
-                pt = vp.build_and_store_video(self.current_time,
-                                              self._logging_start_time,
-                                              self._interval,
-                                              self._current_image_number - 1)
-                log.msg("Processed output in {0} seconds".format(pt))
+                log.msg("Queueing processing for output: " + vp.output)
+                job = self._encoder.submit(vp.build_and_store_video,
+                                           current_time, logging_start_time,
+                                           self._interval, frames)
+                job.addCallback(_processed, vp.output)
+                jobs.append((vp.output, job))
             else:
                 log.msg("Skipping output {0} - not enabled".format(vp.output))
 
-        log.msg("All video processing completed.")
+        results = yield DeferredList([job for _, job in jobs],
+                                     consumeErrors=True)
+        for (output, _), (success, result) in zip(jobs, results):
+            if not success:
+                log.err(result, "Processing for output {0} failed".format(
+                    output))
+
+        log.msg("All video processing completed after {0} seconds.".format(
+            timer() - start))
 
         # If the user wants to keep a copy of the input frames, take that copy
         # now.
@@ -725,12 +843,12 @@ class TSLoggerService(service.Service):
             command = '{0} "{1}" "{2}"'.format(
                 self._archive_script,
                 self._working_dir,
-                self._logging_start_time.date())
+                logging_start_time.date())
 
             log.msg("Running archive script: {0}".format(command))
 
             start = timer()
-            result = subprocess.call(command, shell=True)
+            result = yield self._encoder.spawn("archive script", command)
             processing_time = timer() - start
 
             if result != 0:
@@ -739,6 +857,21 @@ class TSLoggerService(service.Service):
                 log.msg("Archive script completed after {0}".format(
                     processing_time))
 
+    def _can_resume_run(self):
+        """
+        Checks if the working directory holds an interrupted run for the
+        current date which _recover_run will continue rather than emptying the
+        working directory.
+        """
+        try:
+            with open(os.path.join(self._working_dir, "info.json"), "r") as f:
+                info = json.loads(f.read())
+
+            folder_date = dateutil.parser.parse(info["date"])
+            return folder_date.date() == self._logging_start_time.date()
+        except Exception:
+            return False
+
     def _recover_run(self):
 
         try:
@@ -762,6 +895,7 @@ class TSLoggerService(service.Service):
                         "Recovering...")
                 self._current_image_number = next_image
                 self._logging_start_time = folder_time
+                self._frame_index.load(next_image)
                 log.msg("Now at image {0}, logging from {1}".format(
                     self._current_image_number, self._logging_start_time))
 
@@ -789,6 +923,8 @@ class TSLoggerService(service.Service):
         # Ensure the working directory actually exists
         self.mkdir_p(self._working_dir)
 
+        self._frame_index.clear()
+
         for the_file in os.listdir(self._working_dir):
             file_path = os.path.join(self._working_dir, the_file)
 
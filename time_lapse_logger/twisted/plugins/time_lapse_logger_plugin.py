@@ -39,6 +39,7 @@ class TSLoggerServiceMaker(object):
         S_SCHEDULE = 'schedule'
         S_CAMERA = 'camera'
         S_PROCESSING = 'processing'
+        S_ENCODING = 'encoding'
 
         config = ConfigParser()
         config.read([filename])
@@ -106,6 +107,10 @@ class TSLoggerServiceMaker(object):
             }
             if config.has_option(output, "variant_name"):
                 vp["variant_name"] = config.get(output, "variant_name")
+            vp["use_frame_list"] = False
+            if config.has_option(output, "use_frame_list"):
+                vp["use_frame_list"] = config.getboolean(output,
+                                                         "use_frame_list")
 
             output_configurations.append(vp)
 
@@ -114,13 +119,22 @@ class TSLoggerServiceMaker(object):
         else:
             archive_script = None
 
+        encoder_concurrency = 1
+        encoder_niceness = None
+        if config.has_section(S_ENCODING):
+            if config.has_option(S_ENCODING, "concurrency"):
+                encoder_concurrency = config.getint(S_ENCODING, "concurrency")
+            if config.has_option(S_ENCODING, "niceness"):
+                encoder_niceness = config.getint(S_ENCODING, "niceness")
+
         return dsn, mq_host, mq_port, mq_exchange, mq_user, mq_password, \
             mq_vhost, capture_interval, sunrise_time_t, \
             sunset_time_t, use_solar_sensors, station_code, camera_url, \
             image_source_code, disable_cert_verification, working_dir, \
             calculate_schedule, latitude, longitude, timezone, \
             elevation, sunrise_offset, sunset_offset, output_configurations, \
-            save_frame_information, archive_script
+            save_frame_information, archive_script, encoder_concurrency, \
+            encoder_niceness
 
 
     def makeService(self, options):
@@ -137,7 +151,7 @@ class TSLoggerServiceMaker(object):
             working_dir, calculate_schedule, latitude, \
             longitude, timezone, elevation, sunrise_offset, \
             sunset_offset, output_configurations, save_frame_information, \
-            archive_script \
+            archive_script, encoder_concurrency, encoder_niceness \
             = self._readConfigFile(options['config-file'])
 
         svc = TSLoggerService(dsn, station_code, mq_host, mq_port,
@@ -149,7 +163,8 @@ class TSLoggerServiceMaker(object):
                               latitude, longitude, timezone, elevation,
                               sunrise_offset, sunset_offset,
                               output_configurations, save_frame_information,
-                              archive_script)
+                              archive_script, encoder_concurrency,
+                              encoder_niceness)
 
         # All OK. Go get the service.
         return svc
@@ -74,6 +74,7 @@ class ZXWPushClientServiceMaker(object):
         ssh_user = None
         ssh_password = None
         ssh_host_key = None
+        ssh_bulk_upload = False
 
         authorisation_code = None
 
@@ -83,6 +84,9 @@ class ZXWPushClientServiceMaker(object):
 
             if config.has_option(S_SSH, "host_key"):
                 ssh_host_key = config.get(S_SSH, "host_key")
+
+            if config.has_option(S_SSH, "bulk_upload"):
+                ssh_bulk_upload = config.getboolean(S_SSH, "bulk_upload")
         elif transport_type == "udp" or transport_type == "tcp":
             authorisation_code = config.getint(S_TRANSPORT, "authorisation_code")
 
@@ -103,7 +107,7 @@ class ZXWPushClientServiceMaker(object):
         return dsn, mq_host, mq_port, mq_exchange, mq_user, mq_password, \
             mq_vhost, transport_type, hostname, port, ssh_user, \
             ssh_password, ssh_host_key, authorisation_code, resize_images, \
-            new_size, tcp_port, resize_sources
+            new_size, tcp_port, resize_sources, ssh_bulk_upload
 
     def makeService(self, options):
         """
@@ -115,7 +119,8 @@ class ZXWPushClientServiceMaker(object):
         dsn, mq_host, mq_port, mq_exchange, mq_user, mq_password, \
             mq_vhost, transport_type, hostname, port, ssh_user, \
             ssh_password, ssh_host_key, authorisation_code, resize_images,\
-            new_size, tcp_port, resize_sources = self._readConfigFile(
+            new_size, tcp_port, resize_sources, ssh_bulk_upload = \
+            self._readConfigFile(
                 options['config-file'])
 
         # All OK. Go get the service.
@@ -137,7 +142,8 @@ class ZXWPushClientServiceMaker(object):
             resize_images,
             new_size,
             tcp_port,
-            resize_sources
+            resize_sources,
+            ssh_bulk_upload
         )
 
 
@@ -83,7 +83,8 @@ class ZXDUploadClient(object):
                           "{extra_temperature_3},{extra_humidity_1}," \
                           "{extra_humidity_2}"
 
-    def __init__(self, finished_callback, client_name, client_version=None):
+    def __init__(self, finished_callback, client_name, client_version=None,
+                 bulk_upload=False):
         """
         Sets up the upload client.
         :param finished_callback: Called when the upload client has
@@ -93,6 +94,9 @@ class ZXDUploadClient(object):
         :type client_name: str
         :param client_version: The version string of the client application
         :type client_version: str or None
+        :param bulk_upload: If the servers bulk upload mode should be used.
+        Samples are then inserted in large batches on the server.
+        :type bulk_upload: bool
         """
         self._line_buffer = ""
         self._mode = MODE_INIT
@@ -102,6 +106,7 @@ class ZXDUploadClient(object):
 
         self._client_name = client_name
         self._client_version = client_version
+        self._bulk_upload = bulk_upload
         self._finished_callback = finished_callback
 
         self._sent_data = deque([], maxlen=50)
@@ -159,7 +164,10 @@ class ZXDUploadClient(object):
                 self._writeLine("logout")
                 self._mode = MODE_DONE
             elif self._mode == MODE_UPLOAD_RDY:
-                self._writeLine("upload")
+                if self._bulk_upload:
+                    self._writeLine("upload/bulk")
+                else:
+                    self._writeLine("upload")
                 self._mode = MODE_UPLOAD
         elif self._mode == MODE_GET_LATEST:
             # This should be some JSON data containing details about the last
@@ -182,7 +182,8 @@ class TcpClientService(service.Service):
 def getClientService(hostname, port, username, password, host_key_fingerprint,
                      dsn, transport_type, mq_host, mq_port, mq_exchange,
                      mq_user, mq_password, mq_vhost, authorisation_code,
-                     resize_images, new_image_size, tcp_port, resize_sources):
+                     resize_images, new_image_size, tcp_port, resize_sources,
+                     ssh_bulk_upload=False):
     """
     Connects to a remote WeatherPush server or zxweather daemon
     :param hostname: Remote host to connect to
@@ -222,6 +223,9 @@ def getClientService(hostname, port, username, password, host_key_fingerprint,
     :type tcp_port: int
     :param resize_sources: Image sources to resize images for
     :type resize_sources: [str]
+    :param ssh_bulk_upload: Use the zxweather servers bulk upload mode when
+        uploading samples via SSH. Requires a server that supports UPLOAD/BULK
+    :type ssh_bulk_upload: bool
     """
     global database, mq_client
     log.msg('Connecting...')
@@ -235,7 +239,7 @@ def getClientService(hostname, port, username, password, host_key_fingerprint,
     if transport_type == "ssh":
         # Connecting to a remote zxweather server via SSH
         _upload_client = ZXDUploadClient(
-            client_finished, "weather-push")
+            client_finished, "weather-push", bulk_upload=ssh_bulk_upload)
     elif transport_type == "udp":
         ip_address = socket.gethostbyname(hostname)
 
@@ -51,6 +51,11 @@ max_thumbnail_cache_size = None
 max_video_cache_size = None
 cache_expiry_access_time = False
 
+# Month data file archive settings
+month_archive_directory = None
+month_archive_after_days = 7
+month_archive_revalidate_minutes = 60
+
 # Google analyics tracking ID. Set to a value to enable.
 google_analytics_id = None
 
@@ -75,6 +80,8 @@ def load_settings():
     global cache_thumbnails, cache_directory, thumbnail_size, cache_videos
     global video_cache_directory, max_thumbnail_cache_size, max_video_cache_size
     global cache_expiry_access_time, report_settings, wind_speed_kmh
+    global month_archive_directory, month_archive_after_days
+    global month_archive_revalidate_minutes
 
     try:
         from ConfigParser import ConfigParser
@@ -90,6 +97,7 @@ def load_settings():
     S_S = 'site'        # Site configuration
     S_D = 'zxweatherd'  # zxweatherd configuration information
     S_T = 'image_thumbnails'    # Image thumbnail options
+    S_A = 'month_archive'   # Month data file archive options
 
     # Make sure a few important settings people might overlook are set.
     if not config.has_option(S_S,'site_root'):
@@ -217,6 +225,20 @@ def load_settings():
         if config.has_option(S_T, "expire_cache_by_access_time"):
             cache_expiry_access_time = config.getboolean(S_T, "expire_cache_by_access_time")
 
+    # Month data file archive
+    if config.has_option(S_A, "directory"):
+        month_archive_directory = config.get(S_A, "directory")
+
+        if not os.path.exists(month_archive_directory):
+            os.makedirs(month_archive_directory)
+
+    if config.has_option(S_A, "archive_after_days"):
+        month_archive_after_days = config.getint(S_A, "archive_after_days")
+
+    if config.has_option(S_A, "revalidate_minutes"):
+        month_archive_revalidate_minutes = config.getint(S_A,
+                                                         "revalidate_minutes")
+
     station_report_sections = [s[8:] for s in config.sections() if s.startswith("reports_")]
 
     for stn in station_report_sections:
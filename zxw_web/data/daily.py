@@ -15,6 +15,7 @@ from database import get_daily_records, get_daily_rainfall, get_latest_sample_ti
 import web
 import config
 import json
+from data import downsample
 from data.util import outdoor_sample_result_to_json, rainfall_sample_result_to_json, indoor_sample_result_to_datatable, indoor_sample_result_to_json, outdoor_sample_result_to_datatable, rainfall_to_datatable
 
 __author__ = 'David Goodwin'
@@ -154,9 +155,12 @@ def get_day_rainfall(day, station_id, use_24hr_range=False):
 def get_day_dataset(day, data_function, output_function, station_id):
     """
     Gets day-level JSON data using the supplied data function and then
-    converts it to JSON using the supplied output function.
+    converts it to JSON using the supplied output function. The data is
+    downsampled first if the request includes ?points=N.
 
-    :param day: Day to get data for.
+    :param day: Day to get data for. The station live data sets pass the
+        current time instead.
+    :type day: date or datetime
     :param data_function: Function to supply data.
     :param output_function: Function to format JSON output.
     :param station_id: The ID of the weather station to work with
@@ -164,9 +168,14 @@ def get_day_dataset(day, data_function, output_function, station_id):
     :return: JSON data.
     """
 
-    result = data_function(day, station_id)
+    end = (day.date() if isinstance(day, datetime) else day) \
+        + timedelta(days=1)
 
-    data,age = output_function(result)
+    data,age = downsample.output_dataset(
+        (data_function.__name__, station_id, day),
+        lambda: downsample.is_closed(end),
+        lambda: data_function(day, station_id),
+        output_function)
 
     day_cache_control(age,day, station_id)
 
@@ -418,6 +427,28 @@ order by iq.quadrant asc""", params)
     return result
 
 
+# Reception for each hour from the sample_quarter_hour table. Hours with no
+# samples are gaps.
+_HOURLY_RECEPTION_QUERY = """with hours as (
+        select date_trunc('hour', time_stamp) as time_stamp,
+               sum(wind_sample_count) as wind_sample_count,
+               sum(wind_sample_count_samples) as wind_sample_count_samples
+        from sample_quarter_hour
+        where time_stamp < date_trunc('hour', $time::timestamptz) + '1 hour'::interval
+          and time_stamp >= date_trunc('hour', $time::timestamptz) - '1 hour'::interval * ({hours} - 1)
+          and station_id = $station
+          and wind_sample_count_samples > 0
+        group by date_trunc('hour', time_stamp))
+    select h.time_stamp,
+       round((h.wind_sample_count::numeric / h.wind_sample_count_samples / $maxpackets * 100),1)::float as reception,
+       h.time_stamp - '1 hour'::interval as prev_sample_time,
+       coalesce(h.time_stamp - lag(h.time_stamp) over (order by h.time_stamp)
+                > '1 hour'::interval, false) as gap
+    from hours h
+    order by h.time_stamp asc
+"""
+
+
 def get_days_hourly_rainfall_data(day, station_id):
     """
     Gets the days hourly rainfall data.
@@ -429,13 +460,14 @@ def get_days_hourly_rainfall_data(day, station_id):
 
     params = dict(date = day, station = station_id)
 
-    result = config.db.query("""select date_trunc('hour',time_stamp) as time_stamp,
+    result = config.db.query("""select date_trunc('hour', time_stamp) as time_stamp,
            sum(rainfall) as rainfall
-    from sample
-    where time_stamp::date = $date
-    and station_id = $station
-    group by date_trunc('hour',time_stamp)
-    order by date_trunc('hour',time_stamp) asc""", params)
+    from sample_quarter_hour
+    where time_stamp >= $date::timestamptz
+      and time_stamp < ($date + 1)::timestamptz
+      and station_id = $station
+    group by date_trunc('hour', time_stamp)
+    order by date_trunc('hour', time_stamp) asc""", params)
 
     return result
 
@@ -471,22 +503,22 @@ def get_24hr_hourly_rainfall_data(time, station_id):
 
     params = dict(time = time, station = station_id)
 
-    result = config.db.query("""select date_trunc('hour',time_stamp) as time_stamp,
+    result = config.db.query("""select date_trunc('hour', time_stamp) as time_stamp,
            sum(rainfall) as rainfall
-    from sample
-    where date_trunc('hour', time_stamp) <= date_trunc('hour', $time)
-      and date_trunc('hour', time_stamp) > date_trunc('hour', $time) - '1 hour'::interval * 25
-    and station_id = $station
-    group by date_trunc('hour',time_stamp)
-    order by date_trunc('hour',time_stamp) asc""", params)
+    from sample_quarter_hour
+    where time_stamp < date_trunc('hour', $time::timestamptz) + '1 hour'::interval
+      and time_stamp >= date_trunc('hour', $time::timestamptz) - '1 hour'::interval * 24
+      and station_id = $station
+    group by date_trunc('hour', time_stamp)
+    order by date_trunc('hour', time_stamp) asc""", params)
 
     return result
 
 
 def get_24hr_reception(time, station_id):
     """
-    Gets reception from the wireless sensors over the last 24 hours. This
-    query is specific to Davis weather stations.
+    Gets reception from the wireless sensors for each hour over the last 24
+    hours. This query is specific to Davis weather stations.
     :param time: Maximum time to get samples for.
     :param station_id: The ID of the weather station to work with
     :type station_id: int
@@ -500,25 +532,7 @@ def get_24hr_reception(time, station_id):
 
     params = dict(time=time, station=station_id, maxpackets=max_packets)
 
-    query = """select s.time_stamp::timestamptz,
-       round((ds.wind_sample_count / $maxpackets * 100),1)::float as reception,
-
-       s.time_stamp - (st.sample_interval * '1 second'::interval) as prev_sample_time,
-       CASE WHEN (s.time_stamp - prev.time_stamp) > ((st.sample_interval * 2) * '1 second'::interval) THEN
-	  true
-       else
-	  false
-       end as gap
-
-    from sample s, davis_sample ds, sample prev
-    inner join station st on st.station_id = prev.station_id
-    where (s.time_stamp < $time and s.time_stamp > $time - '1 hour'::interval * 24)
-      and prev.time_stamp = (select max(time_stamp) from sample where time_stamp < s.time_stamp and station_id = $station)
-      and s.station_id = $station
-      and prev.station_id = $station
-      and ds.sample_id = s.sample_id
-    order by s.time_stamp asc
-    """
+    query = _HOURLY_RECEPTION_QUERY.format(hours=24)
 
     result = config.db.query(query, params)
 
@@ -536,18 +550,35 @@ def get_7day_hourly_rainfall_data(day, station_id):
 
     params = dict(date = day, station = station_id)
 
-    result = config.db.query("""select date_trunc('hour',time_stamp) as time_stamp,
-           sum(rainfall) as rainfall
-    from sample, (
-        select max(time_stamp) as ts
+    # The 7 days usually start part way through a quarter hour. That quarter
+    # hour is totaled from the samples and the rest come from
+    # sample_quarter_hour.
+    result = config.db.query("""with period as (
+        select max(time_stamp) as end_ts,
+               max(time_stamp) - (604800 * '1 second'::interval) as start_ts
         from sample
         where time_stamp::date = $date
-        and station_id = $station) as max_ts
-    where time_stamp <= max_ts.ts
-      and time_stamp >= (max_ts.ts - (604800 * '1 second'::interval))
-      and station_id = $station
-    group by date_trunc('hour',time_stamp)
-    order by date_trunc('hour',time_stamp) asc""", params)
+        and station_id = $station),
+    quarter_hours as (
+        select q.time_stamp,
+               q.rainfall
+        from sample_quarter_hour q, period
+        where q.time_stamp <= period.end_ts
+          and q.time_stamp > period.start_ts
+          and q.station_id = $station
+        union all
+        select quarter_hour_start(period.start_ts) as time_stamp,
+               sum(s.rainfall) as rainfall
+        from sample s, period
+        where s.time_stamp >= period.start_ts
+          and s.time_stamp < quarter_hour_start(period.start_ts) + '15 minutes'::interval
+          and s.station_id = $station
+        group by period.start_ts)
+    select date_trunc('hour', time_stamp) as time_stamp,
+           sum(rainfall) as rainfall
+    from quarter_hours
+    group by date_trunc('hour', time_stamp)
+    order by date_trunc('hour', time_stamp) asc""", params)
 
     return result
 
@@ -565,19 +596,27 @@ def get_168hr_hourly_rainfall_data(day, station_id):
 
     params = dict(time = day, station = station_id)
 
-    result = config.db.query("""select date_trunc('hour',time_stamp) as time_stamp,
+    result = config.db.query("""select date_trunc('hour', time_stamp) as time_stamp,
            sum(rainfall) as rainfall
-    from sample
-    where date_trunc('hour', time_stamp) <= date_trunc('hour', $time)
-      and date_trunc('hour', time_stamp) > date_trunc('hour', $time) - '1 hour'::interval * 169
+    from sample_quarter_hour
+    where time_stamp < date_trunc('hour', $time::timestamptz) + '1 hour'::interval
+      and time_stamp >= date_trunc('hour', $time::timestamptz) - '1 hour'::interval * 168
       and station_id = $station
-    group by date_trunc('hour',time_stamp)
-    order by date_trunc('hour',time_stamp) asc""", params)
+    group by date_trunc('hour', time_stamp)
+    order by date_trunc('hour', time_stamp) asc""", params)
 
     return result
 
 
 def get_168hr_reception(time, station_id):
+    """
+    Gets reception from the wireless sensors for each hour over the last 168
+    hours. This query is specific to Davis weather stations.
+    :param time: Maximum time to get samples for.
+    :param station_id: The ID of the weather station to work with
+    :type station_id: int
+    :return: Reception data
+    """
     max_packets = get_davis_max_wireless_packets(station_id)
 
     if max_packets is None:
@@ -585,25 +624,7 @@ def get_168hr_reception(time, station_id):
 
     params = dict(time=time, station=station_id, maxpackets=max_packets)
 
-    query = """select s.time_stamp::timestamptz,
-       round((ds.wind_sample_count / $maxpackets * 100),1)::float as reception,
-
-       s.time_stamp - (st.sample_interval * '1 second'::interval) as prev_sample_time,
-       CASE WHEN (s.time_stamp - prev.time_stamp) > ((st.sample_interval * 2) * '1 second'::interval) THEN
-	  true
-       else
-	  false
-       end as gap
-
-    from sample s, davis_sample ds, sample prev
-    inner join station st on st.station_id = prev.station_id
-    where (s.time_stamp < $time and s.time_stamp > $time - (604800 * '1 second'::interval))
-      and prev.time_stamp = (select max(time_stamp) from sample where time_stamp < s.time_stamp and station_id = $station)
-      and s.station_id = $station
-      and prev.station_id = $station
-      and ds.sample_id = s.sample_id
-    order by s.time_stamp asc
-    """
+    query = _HOURLY_RECEPTION_QUERY.format(hours=168)
 
     result = config.db.query(query, params)
 
@@ -0,0 +1,353 @@
+# coding=utf-8
+"""
+Reduces data sets to a requested number of points before they're sent to the
+browser. Charts for a month or a week can't show more points than the chart is
+wide so there is no point in sending every sample, especially to phones.
+
+JSON and DataTable data sets accept two optional query parameters:
+    points  - Maximum number of points (records) to return
+    method  - How records are chosen:
+                lttb    - Largest-Triangle-Three-Buckets (the default). Keeps
+                          the records that best preserve the shape of the
+                          charts.
+                minmax  - The records with the minimum and maximum value of the
+                          first column in each bucket. Keeps peaks.
+                avg     - The average of each bucket.
+
+Gaps in the data are preserved: buckets never span a gap and the record
+following each gap is always kept so the charts still break in the same
+places.
+
+Downsampled data for periods that have closed (see is_closed()) is cached in
+memory as it won't change.
+"""
+from collections import OrderedDict
+from datetime import date, timedelta
+import threading
+
+import numpy
+import web
+
+import config
+from data.util import outdoor_sample_result_to_json, \
+    outdoor_sample_result_to_datatable, indoor_sample_result_to_json, \
+    indoor_sample_result_to_datatable, rainfall_sample_result_to_json, \
+    rainfall_to_datatable, reception_result_to_json, \
+    reception_result_to_datatable, daily_records_result_to_json, \
+    daily_records_result_to_datatable
+
+__author__ = 'David Goodwin'
+
+METHOD_LTTB = 'lttb'
+METHOD_MIN_MAX = 'minmax'
+METHOD_AVERAGE = 'avg'
+
+METHODS = (METHOD_LTTB, METHOD_MIN_MAX, METHOD_AVERAGE)
+
+# LTTB always keeps the first and last record and needs at least one bucket
+# between them.
+MIN_POINTS = 3
+
+# Number of downsampled data sets to keep in memory
+CACHE_SIZE = 128
+
+_OUTDOOR_COLUMNS = ['temperature', 'dew_point', 'apparent_temperature',
+                    'wind_chill', 'relative_humidity', 'pressure',
+                    'average_wind_speed', 'gust_wind_speed', 'uv_index',
+                    'solar_radiation']
+
+_INDOOR_COLUMNS = ['indoor_temperature', 'indoor_relative_humidity']
+
+_DAILY_RECORDS_COLUMNS = ['max_temp', 'min_temp', 'max_humid', 'min_humid',
+                          'max_pressure', 'min_pressure', 'total_rainfall',
+                          'max_average_wind_speed', 'max_gust_wind_speed']
+
+# Columns considered when downsampling data for each output function. The
+# first column is the one used by the minmax method.
+_output_columns = {
+    outdoor_sample_result_to_json: _OUTDOOR_COLUMNS,
+    outdoor_sample_result_to_datatable: _OUTDOOR_COLUMNS,
+    indoor_sample_result_to_json: _INDOOR_COLUMNS,
+    indoor_sample_result_to_datatable: _INDOOR_COLUMNS,
+    rainfall_sample_result_to_json: ['rainfall'],
+    rainfall_to_datatable: ['rainfall'],
+    reception_result_to_json: ['reception'],
+    reception_result_to_datatable: ['reception'],
+    daily_records_result_to_json: _DAILY_RECORDS_COLUMNS,
+    daily_records_result_to_datatable: _DAILY_RECORDS_COLUMNS,
+}
+
+_cache_lock = threading.Lock()
+_cache = OrderedDict()
+
+
+def get_options():
+    """
+    Gets the downsampling options for the current request.
+
+    :return: (points, method) or None if downsampling wasn't requested
+    :rtype: tuple or None
+    :raise: web.BadRequest if the points or method parameters are invalid
+    """
+    params = web.input(points=None, method=METHOD_LTTB)
+
+    if params.points is None:
+        return None
+
+    try:
+        points = int(params.points)
+    except ValueError:
+        raise web.BadRequest()
+
+    if points < MIN_POINTS or params.method not in METHODS:
+        raise web.BadRequest()
+
+    return points, params.method
+
+
+def is_closed(end):
+    """
+    Checks if a period ended long enough ago that its data shouldn't change
+    anymore. This is the same test used by the month archive.
+
+    :param end: End of the period (exclusive)
+    :type end: date
+    :rtype: bool
+    """
+    return end + timedelta(days=config.month_archive_after_days) \
+        <= date.today()
+
+
+def _cache_get(key):
+    with _cache_lock:
+        value = _cache.pop(key, None)
+        if value is not None:
+            # Move to the end so its the last to be evicted
+            _cache[key] = value
+        return value
+
+
+def _cache_put(key, value):
+    with _cache_lock:
+        _cache[key] = value
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def output_dataset(key, closed_function, data_function, output_function):
+    """
+    Gets a data set and converts it using the supplied output function,
+    downsampling it first if the request asks for that.
+
+    :param key: Identifies the data set for caching. Should include the data
+        set name, station and period.
+    :type key: tuple
+    :param closed_function: Function taking no arguments that returns True if
+        the period the data set covers has closed allowing the downsampled
+        result to be cached. Only called when downsampling was requested.
+    :param data_function: Function taking no arguments that returns the query
+        result for the data set
+    :param output_function: Function to produce JSON output
+    :return: json_data, data_age
+    :raise: web.BadRequest if the downsampling options are invalid
+    """
+    options = get_options()
+    if options is None:
+        return output_function(data_function())
+
+    points, method = options
+    key = key + (output_function.__name__, points, method)
+    closed = closed_function()
+
+    if closed:
+        result = _cache_get(key)
+        if result is not None:
+            return result
+
+    records = downsample(list(data_function()),
+                         _output_columns[output_function], points, method)
+    result = output_function(records)
+
+    if closed:
+        _cache_put(key, result)
+
+    return result
+
+
+def _value(value):
+    if value is None:
+        return numpy.nan
+    return float(value)
+
+
+def _segments(records):
+    """
+    Splits records up at gaps. Returns (start, end) index pairs.
+    """
+    segments = []
+    start = 0
+    for i in range(1, len(records)):
+        if records[i].get('gap'):
+            segments.append((start, i))
+            start = i
+    segments.append((start, len(records)))
+    return segments
+
+
+def _bucket_edges(start, end, buckets):
+    return numpy.linspace(start, end, buckets + 1).astype(int)
+
+
+def _nan_mean(values):
+    # numpy.nanmean warns when a column is entirely NaN. We just want NaN.
+    present = ~numpy.isnan(values)
+    counts = present.sum(axis=0)
+    sums = numpy.where(present, values, 0).sum(axis=0)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+
+def _lttb(x, y, start, end, points):
+    """
+    Largest-Triangle-Three-Buckets over several columns at once. Each column
+    has been scaled to the same range so the area of the triangle for each
+    record is summed across columns to pick the record for each bucket.
+
+    :return: Indexes of the records to keep
+    :rtype: list[int]
+    """
+    count = end - start
+    if count <= points:
+        return list(range(start, end))
+
+    every = float(count - 2) / (points - 2)
+    selected = [start]
+    a = start
+
+    for i in range(points - 2):
+        bucket_start = start + int(i * every) + 1
+        bucket_end = start + int((i + 1) * every) + 1
+        next_end = min(start + int((i + 2) * every) + 1, end)
+
+        # The third point of the triangle is the average of the next bucket
+        next_x = x[bucket_end:next_end].mean()
+        next_y = _nan_mean(y[bucket_end:next_end])
+
+        areas = numpy.abs(
+            (x[a] - next_x) * (y[bucket_start:bucket_end] - y[a]) -
+            (x[a] - x[bucket_start:bucket_end])[:, None] * (next_y - y[a]))
+
+        # Missing values don't contribute to the area.
+        scores = numpy.where(numpy.isnan(areas), 0, areas).sum(axis=1)
+
+        a = bucket_start + int(numpy.argmax(scores))
+        selected.append(a)
+
+    selected.append(end - 1)
+    return selected
+
+
+def _min_max(y, start, end, points):
+    """
+    Keeps the records with the minimum and maximum value of the first column
+    from each bucket along with the first and last records.
+
+    :return: Indexes of the records to keep
+    :rtype: list[int]
+    """
+    if end - start <= points:
+        return list(range(start, end))
+
+    selected = set([start, end - 1])
+    edges = _bucket_edges(start, end, max(1, (points - 2) // 2))
+    for bucket_start, bucket_end in zip(edges[:-1], edges[1:]):
+        values = y[bucket_start:bucket_end, 0]
+        if numpy.isnan(values).all():
+            selected.add(bucket_start)
+            continue
+        selected.add(bucket_start + int(numpy.nanargmin(values)))
+        selected.add(bucket_start + int(numpy.nanargmax(values)))
+    return sorted(selected)
+
+
+def _average(records, columns, y, start, end, points):
+    """
+    Averages each bucket. The timestamp and gap information come from the
+    first record in the bucket.
+
+    :return: Averaged records
+    :rtype: list
+    """
+    if end - start <= points:
+        return records[start:end]
+
+    # Integer columns (relative humidity, etc) are rounded back to integers
+    integers = set(column for column in columns
+                   if any(isinstance(r[column], int)
+                          for r in records[start:end]))
+
+    result = []
+    edges = _bucket_edges(start, end, points)
+    for bucket_start, bucket_end in zip(edges[:-1], edges[1:]):
+        record = web.Storage(records[bucket_start])
+        for column, value in zip(columns,
+                                 _nan_mean(y[bucket_start:bucket_end])):
+            if numpy.isnan(value):
+                value = None
+            elif column in integers:
+                value = int(round(value))
+            else:
+                value = float(value)
+            record[column] = value
+        result.append(record)
+    return result
+
+
+def downsample(records, columns, points, method=METHOD_LTTB):
+    """
+    Reduces a list of records to around the specified number of points. A
+    couple of extra points may be returned for each gap in the data.
+
+    :param records: Query results ordered by time_stamp
+    :type records: list
+    :param columns: Columns to consider when choosing records
+    :type columns: list[str]
+    :param points: Number of points to reduce the records to
+    :type points: int
+    :param method: Downsampling method (one of METHODS)
+    :type method: str
+    :return: Downsampled records
+    :rtype: list
+    """
+    if len(records) <= points:
+        return records
+
+    t0 = records[0].time_stamp
+    x = numpy.array([(r.time_stamp - t0).total_seconds() for r in records])
+    values = numpy.array([[_value(r[column]) for column in columns]
+                          for r in records])
+
+    # Scale each column to the same range so one with large values (solar
+    # radiation) doesn't drown out the rest.
+    scale = numpy.fmax.reduce(values, axis=0) - \
+        numpy.fmin.reduce(values, axis=0)
+    scale[~(scale > 0)] = 1
+    y = values / scale
+
+    result = []
+    for start, end in _segments(records):
+        # Points are shared between segments by how many records they have.
+        segment_points = max(MIN_POINTS, int(round(
+            points * float(end - start) / len(records))))
+
+        if method == METHOD_AVERAGE:
+            result.extend(_average(records, columns, values, start, end,
+                                   segment_points))
+        elif method == METHOD_MIN_MAX:
+            result.extend(records[i]
+                          for i in _min_max(y, start, end, segment_points))
+        else:
+            result.extend(records[i]
+                          for i in _lttb(x, y, start, end, segment_points))
+
+    return result
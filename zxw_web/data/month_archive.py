@@ -0,0 +1,291 @@
+# coding=utf-8
+"""
+On-disk archive for month-level data files (samples.dat, samples_v2.dat).
+
+Data for a month is unlikely to change once the month has been over for a
+while so rather than regenerating the file from the database every time a
+desktop client asks for it the file is generated once and written to disk both
+as-is and gzip compressed. Files are named after the SHA-256 hash of their
+content and a small JSON metadata file records which file belongs to which
+station, month and dataset along with everything needed to answer a HEAD
+request without generating the file.
+
+Samples can still turn up for a month after it has closed (uploaded late by
+WeatherPush or the bulk upload command). The metadata records how many samples
+the month had and the time of the latest one when the file was archived. If
+either has changed since the archived file is out of date and is replaced.
+Checking this needs the database so its only done once every
+month_archive_revalidate_minutes for each file - the rest of the time the file
+is served from the archive alone. The metadata files modification time records
+when it was last checked.
+
+Layout of the archive directory:
+    {sha256}.dat                    - Data file
+    {sha256}.dat.gz                 - Gzip-compressed data file
+    {station}/{year}-{month}-{dataset}.json - Metadata
+"""
+from datetime import date, datetime, timedelta
+import gzip
+import hashlib
+from io import BytesIO
+import json
+import os
+import tempfile
+import threading
+import time
+
+import config
+
+__author__ = 'David Goodwin'
+
+# Size of each chunk when streaming files out of the archive.
+CHUNK_SIZE = 64 * 1024
+
+_locks_lock = threading.Lock()
+_locks = dict()
+
+
+def is_enabled():
+    """
+    Returns True if the month archive has been configured.
+    """
+    return config.month_archive_directory is not None
+
+
+def is_month_closed(year, month):
+    """
+    Checks if the specified month ended long enough ago that its data files
+    can be archived.
+
+    :param year: Year
+    :type year: int
+    :param month: Month
+    :type month: int
+    :rtype: bool
+    """
+    if month == 12:
+        month_end = date(year + 1, 1, 1)
+    else:
+        month_end = date(year, month + 1, 1)
+
+    return month_end + timedelta(days=config.month_archive_after_days) \
+        <= date.today()
+
+
+def _metadata_filename(station_code, year, month, dataset):
+    return os.path.join(config.month_archive_directory, station_code.lower(),
+                        "{0:04d}-{1:02d}-{2}.json".format(year, month, dataset))
+
+
+def data_filename(metadata, gzipped):
+    """
+    Gets the full path to an archived data file.
+
+    :param metadata: Archive metadata for the file
+    :type metadata: dict
+    :param gzipped: If the gzip-compressed file is wanted
+    :type gzipped: bool
+    :rtype: str
+    """
+    filename = metadata["sha256"] + ".dat"
+    if gzipped:
+        filename += ".gz"
+    return os.path.join(config.month_archive_directory, filename)
+
+
+def _samples_metadata(samples):
+    latest_sample = samples.latest_sample
+    if latest_sample is not None:
+        latest_sample = latest_sample.isoformat()
+
+    return {
+        "sample_count": samples.sample_count,
+        "latest_sample": latest_sample
+    }
+
+
+def get_archived_file(station_code, year, month, dataset):
+    """
+    Gets metadata for an archived data file. This doesn't check the file is
+    still up to date - see is_current() and recently_validated().
+
+    :param station_code: Station the file is for
+    :type station_code: str
+    :param year: Year the file is for
+    :type year: int
+    :param month: Month the file is for
+    :type month: int
+    :param dataset: Dataset (file name)
+    :type dataset: str
+    :returns: Metadata for the file or None if it isn't in the archive
+    :rtype: dict or None
+    """
+    try:
+        with open(_metadata_filename(station_code, year, month, dataset),
+                  "r") as f:
+            metadata = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+    if not os.path.isfile(data_filename(metadata, False)) or \
+            not os.path.isfile(data_filename(metadata, True)):
+        return None
+
+    return metadata
+
+
+def is_current(metadata, samples):
+    """
+    Checks if an archived data file still matches the month in the database.
+
+    :param metadata: Archive metadata for the file
+    :type metadata: dict
+    :param samples: The months current sample count and latest sample time as
+        returned by database.get_month_sample_summary()
+    :returns: False if the month has changed since the file was archived
+    :rtype: bool
+    """
+    for key, value in _samples_metadata(samples).items():
+        if metadata.get(key) != value:
+            return False
+    return True
+
+
+def recently_validated(station_code, year, month, dataset):
+    """
+    Checks if an archived data file was checked against the database (or
+    archived) within the last month_archive_revalidate_minutes. If so it can be
+    served without checking again.
+
+    :rtype: bool
+    """
+    try:
+        validated = os.path.getmtime(
+            _metadata_filename(station_code, year, month, dataset))
+    except (IOError, OSError):
+        return False
+
+    age = time.time() - validated
+    return 0 <= age < config.month_archive_revalidate_minutes * 60
+
+
+def mark_validated(station_code, year, month, dataset):
+    """
+    Records that an archived data file has just been checked against the
+    database and found to be up to date.
+    """
+    try:
+        os.utime(_metadata_filename(station_code, year, month, dataset), None)
+    except (IOError, OSError):
+        # It'll just get checked again next time.
+        pass
+
+
+def _write_file(filename, data):
+    """
+    Writes data to a file atomically so readers never see a partial file.
+    """
+    directory = os.path.dirname(filename)
+    fd, temp_filename = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.rename(temp_filename, filename)
+    except:
+        os.remove(temp_filename)
+        raise
+
+
+def _gzip(data):
+    # mtime is fixed so the same data always produces the same file.
+    out = BytesIO()
+    with gzip.GzipFile(filename="", mode="wb", compresslevel=9, fileobj=out,
+                       mtime=0) as f:
+        f.write(data)
+    return out.getvalue()
+
+
+def archive_file(station_code, year, month, dataset, data, last_modified,
+                 samples):
+    """
+    Adds a data file to the archive.
+
+    :param station_code: Station the file is for
+    :type station_code: str
+    :param year: Year the file is for
+    :type year: int
+    :param month: Month the file is for
+    :type month: int
+    :param dataset: Dataset (file name)
+    :type dataset: str
+    :param data: File content
+    :type data: bytes
+    :param last_modified: Last-Modified header value for the file
+    :type last_modified: str
+    :param samples: The months sample count and latest sample time as
+        returned by database.get_month_sample_summary() when the file was
+        generated
+    :returns: Metadata for the archived file
+    :rtype: dict
+    """
+    sha256 = hashlib.sha256(data).hexdigest()
+    gzipped = _gzip(data)
+
+    metadata = {
+        "sha256": sha256,
+        "size": len(data),
+        "gzip_size": len(gzipped),
+        "last_modified": last_modified,
+        "archived": datetime.now().isoformat()
+    }
+    metadata.update(_samples_metadata(samples))
+
+    metadata_filename = _metadata_filename(station_code, year, month, dataset)
+    metadata_dir = os.path.dirname(metadata_filename)
+    if not os.path.exists(metadata_dir):
+        os.makedirs(metadata_dir)
+
+    # Content-addressed so if the file is already there it will be identical
+    raw_filename = data_filename(metadata, False)
+    if not os.path.isfile(raw_filename):
+        _write_file(raw_filename, data)
+
+    gzip_filename = data_filename(metadata, True)
+    if not os.path.isfile(gzip_filename):
+        _write_file(gzip_filename, gzipped)
+
+    # Metadata goes last - until its there the file isn't in the archive.
+    _write_file(metadata_filename, json.dumps(metadata).encode("utf-8"))
+
+    return metadata
+
+
+def get_archive_lock(station_code, year, month, dataset):
+    """
+    Gets a lock for generating a particular data file. This stops a burst of
+    requests for a month that isn't in the archive yet from all generating the
+    same file at the same time.
+
+    :rtype: threading.Lock
+    """
+    key = (station_code.lower(), year, month, dataset)
+    with _locks_lock:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = threading.Lock()
+        return lock
+
+
+def stream_file(filename):
+    """
+    Returns a generator yielding the content of the specified file in chunks.
+
+    :param filename: File to stream
+    :type filename: str
+    """
+    with open(filename, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
@@ -10,10 +10,13 @@ import os
 import web
 from web.contrib.template import render_jinja
 from config import db
+from data import downsample, month_archive
 from data.util import outdoor_sample_result_to_datatable, outdoor_sample_result_to_json, \
     daily_records_result_to_datatable, daily_records_result_to_json
 from database import get_station_id, get_sample_interval, \
-     get_month_data_wp_age, get_extra_sensors_enabled, get_noaa_month_data, get_station_config
+     get_month_data_wp_age, get_extra_sensors_enabled, get_station_config, \
+     get_month_sample_summary
+from noaa import get_noaa_month_data
 
 __author__ = 'David Goodwin'
 
@@ -27,6 +30,9 @@ __author__ = 'David Goodwin'
 #       30 minute averages for the month.
 # /data/{year}/{month}/datatable/daily_records.json
 #       daily records for the month.<b>
+#
+# The samples and 30m_avg_samples data sets can be downsampled by adding
+# ?points=N (see data.downsample).
 
 # TODO: handle gaps of an entire day in the daily records output
 
@@ -342,9 +348,11 @@ def get_30m_avg_month_samples_dataset(year, month, output_function, station_id):
     :return: JSON output.
     """
 
-    query_data = get_30m_avg_month_samples_data(year, month, station_id)
-
-    data, data_age = output_function(query_data)
+    data, data_age = downsample.output_dataset(
+        ("30m_avg_samples", station_id, year, month),
+        lambda: month_archive.is_month_closed(year, month),
+        lambda: get_30m_avg_month_samples_data(year, month, station_id),
+        output_function)
 
     cache_control_headers(station_id, data_age, year, month)
 
@@ -396,18 +404,14 @@ def get_30m_avg_month_samples_json(year, month, station_id):
 # Monthly samples (full data set)
 #
 
-def get_month_samples_dataset(year, month, output_function, station_id):
+def get_month_samples_data(year, month, station_id):
     """
-    Gets samples for the entire month in Googles DataTable format.
-    :param year: Year to get data for
-    :type year: int
-    :param month: Month to get data for
-    :type month: int
-    :param output_function: Function to produce JSON output
+    Gets query data for the full monthly samples data sets.
+    :param year: Data set year
+    :param month: Data set month
     :param station_id: The ID of the weather station to work with
     :type station_id: int
-    :return: JSON data using Googles DataTable structure.
-    :rtype: str
+    :return: Query data
     """
     params = dict(date=date(year, month, 1), station=station_id,
                   sample_interval=get_sample_interval(station_id))
@@ -439,7 +443,27 @@ where date(date_trunc('month',cur.time_stamp)) = $date
   and prev.station_id = $station
 order by cur.time_stamp asc""", params)
 
-    data, data_age = output_function(query_data)
+    return query_data
+
+
+def get_month_samples_dataset(year, month, output_function, station_id):
+    """
+    Gets samples for the entire month in Googles DataTable format.
+    :param year: Year to get data for
+    :type year: int
+    :param month: Month to get data for
+    :type month: int
+    :param output_function: Function to produce JSON output
+    :param station_id: The ID of the weather station to work with
+    :type station_id: int
+    :return: JSON data using Googles DataTable structure.
+    :rtype: str
+    """
+    data, data_age = downsample.output_dataset(
+        ("samples", station_id, year, month),
+        lambda: month_archive.is_month_closed(year, month),
+        lambda: get_month_samples_data(year, month, station_id),
+        output_function)
 
     cache_control_headers(station_id, data_age, year, month)
 
@@ -560,7 +584,123 @@ class data_ascii:
         return result
 
 
+def _month_exists(year, month, station_id):
+    """
+    Checks if there is any data for the specified month.
+
+    :param year: Year
+    :type year: int
+    :param month: Month
+    :type month: int
+    :param station_id: Station to check
+    :type station_id: int
+    :rtype: bool
+    """
+    start = date(year, month, 1)
+    if month == 12:
+        end = date(year + 1, 1, 1)
+    else:
+        end = date(year, month + 1, 1)
+
+    recs = db.query("""select 42 from sample
+    where time_stamp >= $start and time_stamp < $end
+    and station_id = $station
+    limit 1""", dict(start=start, end=end, station=station_id))
+    return recs is not None and len(recs) > 0
+
+
+def _accepts_gzip():
+    """
+    Checks if the client will accept a gzip-encoded response.
+    """
+    accept_encoding = web.ctx.env.get("HTTP_ACCEPT_ENCODING", "")
+    for item in accept_encoding.split(","):
+        bits = item.split(";")
+        if bits[0].strip().lower() != "gzip":
+            continue
+
+        for param in bits[1:]:
+            param = param.replace(" ", "")
+            if param.startswith("q=") and float(param[2:]) == 0:
+                return False
+        return True
+    return False
+
+
+def _archived_file_response(metadata, head=False):
+    """
+    Sends an archived month data file (or just its headers for a HEAD request)
+
+    :param metadata: Archive metadata for the file
+    :type metadata: dict
+    :param head: If only headers should be sent
+    :type head: bool
+    :return: Generator for the file content or None for HEAD requests
+    """
+    gzipped = _accepts_gzip()
+
+    # Each encoding needs its own strong ETag.
+    etag = metadata["sha256"]
+    if gzipped:
+        etag += "-gzip"
+
+    web.header("Content-Type", "text/plain")
+    web.header("Vary", "Accept-Encoding")
+    web.header("Last-Modified", metadata["last_modified"])
+    web.header("Expires", rfcformat(datetime.now() + timedelta(60, 0)))
+
+    # Raises 304 Not Modified if the client already has this version.
+    web.modified(etag=etag)
+
+    if gzipped:
+        web.header("Content-Encoding", "gzip")
+        web.header("Content-Length", str(metadata["gzip_size"]))
+    else:
+        web.header("Content-Length", str(metadata["size"]))
+
+    if head:
+        return None
+
+    return month_archive.stream_file(
+        month_archive.data_filename(metadata, gzipped))
+
+
+def _get_current_archived_file(station, year, month, dataset):
+    """
+    Gets metadata for an archived month data file if its up to date. Files
+    that have been checked against the database recently are trusted without
+    touching the database at all.
+
+    :returns: Archive metadata for the file or None if it isn't in the archive
+        or the month has changed since it was archived
+    :rtype: dict or None
+    """
+    metadata = month_archive.get_archived_file(station, year, month, dataset)
+
+    if metadata is None:
+        return None
+
+    if month_archive.recently_validated(station, year, month, dataset):
+        return metadata
+
+    station_id = get_station_id(station)
+    if station_id is None:
+        return None
+
+    if not month_archive.is_current(
+            metadata, get_month_sample_summary(year, month, station_id)):
+        return None
+
+    month_archive.mark_validated(station, year, month, dataset)
+    return metadata
+
+
 class data_dat:
+    _versions = {
+        'samples': 1,
+        'samples_v2': 2
+    }
+
     def GET(self, station, year, month, dataset):
         """
         Gets plain text data.
@@ -578,38 +718,91 @@ class data_dat:
         :raise: web.notfound if the file doesn't exist.
         """
 
+        if dataset not in self._versions:
+            raise web.NotFound()
+
+        int_year = int(year)
+        int_month = int(month)
+
+        # Data for closed months shouldn't be changing anymore so it can be
+        # served from (or added to) the archive.
+        archived = month_archive.is_enabled() and \
+            month_archive.is_month_closed(int_year, int_month)
+
+        if archived:
+            metadata = _get_current_archived_file(station, int_year, int_month,
+                                                  dataset)
+            if metadata is not None:
+                return _archived_file_response(metadata)
+
         station_id = get_station_id(station)
 
         if station_id is None:
             raise web.NotFound()
 
-        int_year = int(year)
-        int_month = int(month)
+        if archived:
+            return _archived_file_response(self._get_archived_file(
+                station, station_id, int_year, int_month, dataset))
 
         # Make sure the month actually exists in the database before we go
         # any further.
-        params = dict(date=date(int(year), int(month), 1), station=station_id)
-        recs = db.query("""select 42 from sample
-        where date(date_trunc('month',time_stamp)) = $date
-        and station_id = $station
-        limit 1""", params)
-        if recs is None or len(recs) == 0:
+        if not _month_exists(int_year, int_month, station_id):
             raise web.NotFound()
 
-        if dataset == 'samples':
-            result, age = get_month_samples_tab_delimited(int_year, int_month,
-                                                          station_id, 1)
-            cache_control_headers(station_id, age, int_year, int_month)
-        elif dataset == 'samples_v2':
-            result, age = get_month_samples_tab_delimited(int_year, int_month,
-                                                          station_id, 2)
-            cache_control_headers(station_id, age, int_year, int_month)
-        else:
-            raise web.NotFound()
+        result, age = get_month_samples_tab_delimited(
+            int_year, int_month, station_id, self._versions[dataset])
+        cache_control_headers(station_id, age, int_year, int_month)
 
         web.header("Content-Type", "text/plain")
         return result
 
+    def _get_archived_file(self, station, station_id, year, month, dataset):
+        """
+        Gets a data file from the month archive after checking it against the
+        database, adding it to the archive if it isn't there or is out of
+        date.
+
+        :returns: Archive metadata for the file
+        :rtype: dict
+        :raise: web.notfound if there is no data for the month
+        """
+        with month_archive.get_archive_lock(station, year, month, dataset):
+            samples = get_month_sample_summary(year, month, station_id)
+
+            if samples.sample_count == 0:
+                raise web.NotFound()
+
+            # Someone else may have archived it while we waited
+            metadata = month_archive.get_archived_file(station, year, month,
+                                                       dataset)
+
+            if metadata is not None and \
+                    month_archive.is_current(metadata, samples):
+                month_archive.mark_validated(station, year, month, dataset)
+                return metadata
+
+            return self._archive(station, station_id, year, month, dataset,
+                                 samples)
+
+    def _archive(self, station, station_id, year, month, dataset, samples):
+        """
+        Generates a data file and adds it to the month archive.
+
+        :param samples: The months sample count and latest sample time. These
+            must be fetched before the file is generated so any samples that
+            arrive while its being generated cause it to be replaced.
+        :returns: Archive metadata for the file
+        :rtype: dict
+        """
+        result, age = get_month_samples_tab_delimited(
+            year, month, station_id, self._versions[dataset])
+
+        if not isinstance(result, bytes):
+            result = result.encode("utf-8")
+
+        return month_archive.archive_file(station, year, month, dataset,
+                                          result, rfcformat(age), samples)
+
     def HEAD(self, station, year, month, dataset):
         """
         Gets headers for plain text data. Its primarily for the benefit of the
@@ -629,41 +822,138 @@ class data_dat:
         :raise: web.notfound if the file doesn't exist.
         """
 
-        station_id = get_station_id(station)
-
-        if station_id is None:
+        if dataset not in self._versions:
             raise web.NotFound()
 
         int_year = int(year)
         int_month = int(month)
 
-        if dataset in ('samples', 'samples_v2'):
-            # TODO: this really needs to not involve the database in any way.
-            age = get_month_data_wp_age(int_year, int_month, station_id)
+        if month_archive.is_enabled() and \
+                month_archive.is_month_closed(int_year, int_month):
+            # Archived files can be handled without generating them.
+            metadata = _get_current_archived_file(station, int_year,
+                                                  int_month, dataset)
+            if metadata is not None:
+                return _archived_file_response(metadata, True)
 
-            if age is None:
-                raise web.NotFound()
+        station_id = get_station_id(station)
+
+        if station_id is None:
+            raise web.NotFound()
+
+        age = get_month_data_wp_age(int_year, int_month, station_id)
 
-            now = datetime.now()
+        if age is None:
+            raise web.NotFound()
 
-            web.header('Last-Modified', rfcformat(age))
-            if int_year == now.year and int_month == now.month:
-                # TODO: look up sample interval and use that. Its what
-                # cache_control_headers() does but we can't currently use
-                # that as the sample interval isn't cached and looking it up
-                # on every request is too expensive here.
-                pass
-            else:
-                web.header('Expires', rfcformat(now + timedelta(60, 0)))
+        now = datetime.now()
 
-            # cache_control_headers(station_id, age, int_year, int_month)
+        web.header('Last-Modified', rfcformat(age))
+        if int_year == now.year and int_month == now.month:
+            # TODO: look up sample interval and use that. Its what
+            # cache_control_headers() does but we can't currently use
+            # that as the sample interval isn't cached and looking it up
+            # on every request is too expensive here.
+            pass
         else:
-            raise web.NotFound()
+            web.header('Expires', rfcformat(now + timedelta(60, 0)))
+
+        # cache_control_headers(station_id, age, int_year, int_month)
 
         web.header("Content-Type", "text/plain")
         return
 
 
+class data_dat_delta:
+    """
+    Gets only the samples added to a month data file after a particular time.
+    This saves clients that already have most of the current months data file
+    from downloading the entire thing again just to get the latest sample.
+    """
+
+    def GET(self, station, year, month, dataset):
+        """
+        Gets plain text data for samples after the time specified by the
+        after parameter (a unix timestamp). Rows are in the same format as
+        the full data file for the dataset but there is no column heading row.
+
+        Two headers are included to allow the client to check its copy of the
+        file is still current:
+          X-Sample-Count: Number of samples in the month at or before the
+                          specified time
+          X-Sample-Checksum: Sum of the unix timestamps of those samples
+        If these don't match the clients copy of the file then samples have
+        been added or removed somewhere in the file and the client should
+        download the full data file instead.
+
+        :param station: Station to get data for
+        :type station: str
+        :param year: Year to get data for
+        :type year: str
+        :param month: Month to get data for. Unlike in other areas of the site
+                      this is not the month name but rather its number.
+        :type month: str
+        :param dataset: Dataset (file) to fetch the delta for.
+        :type dataset: str
+        :return: text file.
+        :raise: web.notfound if the file doesn't exist.
+        :raise: web.badrequest if the after parameter is missing or invalid
+        """
+
+        if dataset not in data_dat._versions:
+            raise web.NotFound()
+
+        try:
+            after = int(web.input(after=None).after)
+        except (TypeError, ValueError):
+            raise web.BadRequest()
+
+        station_id = get_station_id(station)
+
+        if station_id is None:
+            raise web.NotFound()
+
+        int_year = int(year)
+        int_month = int(month)
+
+        if not _month_exists(int_year, int_month, station_id):
+            raise web.NotFound()
+
+        result, age, sample_count, checksum = \
+            get_month_samples_tab_delimited_delta(
+                int_year, int_month, station_id, data_dat._versions[dataset],
+                after)
+        cache_control_headers(station_id, age, int_year, int_month)
+
+        if result is None:
+            result = ""
+
+        web.header("Content-Type", "text/plain")
+        web.header("X-Sample-Count", str(sample_count))
+        web.header("X-Sample-Checksum", str(checksum))
+        return result
+
+
+def _get_tsv_options(station_id):
+    """
+    Gets the broadcast ID and extra sensors setting used by the
+    month_samples_tsv functions.
+
+    :param station_id: Station to get options for
+    :type station_id: int
+    :returns: Broadcast ID and if extra sensors are enabled
+    :rtype: (int, bool)
+    """
+    station_config = get_station_config(station_id)
+    broadcast_id = None
+    if station_config is not None and 'broadcast_id' in station_config:
+        broadcast_id = station_config['broadcast_id']
+
+    extra_sensors = get_extra_sensors_enabled(station_id)
+
+    return broadcast_id, extra_sensors
+
+
 def get_month_samples_tab_delimited(int_year, int_month, station_id, version):
     """
     Gets a tab-delimited data file containing all data for the requested month.
@@ -679,12 +969,7 @@ def get_month_samples_tab_delimited(int_year, int_month, station_id, version):
     :param version: File version
     :type version: int
     """
-    station_config = get_station_config(station_id)
-    broadcast_id = None
-    if station_config is not None and 'broadcast_id' in station_config:
-        broadcast_id = station_config['broadcast_id']
-
-    extra_sensors = get_extra_sensors_enabled(station_id)
+    broadcast_id, extra_sensors = _get_tsv_options(station_id)
 
     results = db.query("""
     select max(sample_ts) as max_ts, 
@@ -698,3 +983,56 @@ def get_month_samples_tab_delimited(int_year, int_month, station_id, version):
     file_data = row.file_data
 
     return file_data, max_ts
+
+
+def get_month_samples_tab_delimited_delta(int_year, int_month, station_id,
+                                          version, after):
+    """
+    Gets tab-delimited data for all samples in the requested month after the
+    specified time along with a count and checksum of the samples at or before
+    that time. The checksum is the sum of the unix timestamps of those samples
+    which is enough to spot a sample being inserted into (or removed from) the
+    part of the month the client already has.
+
+    :param int_year: Year
+    :type int_year: int
+    :param int_month: Month
+    :type int_month: int
+    :param station_id: Station to get data for
+    :type station_id: int
+    :param version: File version
+    :type version: int
+    :param after: Only return samples after this time (unix timestamp)
+    :type after: int
+    :returns: File data (or None if there are no new samples), timestamp of
+              the most recent sample, count of samples at or before the
+              specified time and checksum of those samples.
+    :rtype: (str, datetime, int, int)
+    """
+    broadcast_id, extra_sensors = _get_tsv_options(station_id)
+    month = date(year=int_year, month=int_month, day=1)
+
+    results = db.query("""
+    select max(sample_ts) as max_ts,
+           string_agg(sample_data, chr(10)) as file_data
+    from month_samples_tsv_rows($station, $month, to_timestamp($after),
+                                $broadcast_id, $version, $extra_sensors)""",
+                       dict(station=station_id, month=month, after=after,
+                            broadcast_id=broadcast_id, version=version,
+                            extra_sensors=extra_sensors))
+    row = results[0]
+
+    # Both bounds are on the station/timestamp index so this doesn't need to
+    # go near the rest of the sample table.
+    results = db.query("""
+    select count(*) as sample_count,
+           coalesce(sum(floor(extract(epoch from time_stamp))::bigint), 0)
+               as checksum
+    from sample
+    where station_id = $station
+      and time_stamp >= $month
+      and time_stamp <= to_timestamp($after)""",
+                       dict(station=station_id, month=month, after=after))
+    check = results[0]
+
+    return row.file_data, row.max_ts, check.sample_count, check.checksum
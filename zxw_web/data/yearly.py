@@ -13,8 +13,10 @@ import os
 import web
 from web.contrib.template import render_jinja
 from config import db
+from data import downsample
 from data.util import  daily_records_result_to_datatable, daily_records_result_to_json
-from database import get_station_id, get_noaa_year_data
+from database import get_station_id
+from noaa import get_noaa_year_data
 
 __author__ = 'David Goodwin'
 
@@ -22,7 +24,8 @@ __author__ = 'David Goodwin'
 # This file provides URLs to access raw data in json format.
 #
 # /data/{year}/datatable/daily_records.json
-#       daily records for the year.
+#       daily records for the year. Can be downsampled by adding ?points=N
+#       (see data.downsample)
 
 # TODO: round temperatures, etc.
 
@@ -256,9 +259,11 @@ def get_daily_records_dataset(year,output_function, station_id):
     :return: JSON data.
     """
 
-    query_data = get_daily_records_data(year, station_id)
-
-    json_data, data_age = output_function(query_data)
+    json_data, data_age = downsample.output_dataset(
+        ("daily_records", station_id, year),
+        lambda: downsample.is_closed(date(year + 1, 1, 1)),
+        lambda: get_daily_records_data(year, station_id),
+        output_function)
 
     cache_control_headers(station_id,data_age,year)
     web.header('Content-Type', 'application/json')
@@ -0,0 +1,783 @@
+# coding=utf-8
+"""
+NOAA style monthly and yearly climatological summaries.
+
+Reports are built from the daily_climatology table which holds one summary per
+station per day. Days are only stored once they've closed (see
+config.month_archive_after_days) so building a report only ever summarises the
+last few days from samples. Reports for closed months and years are also kept
+in memory along with the number of days they were built from and when those
+were calculated so they're rebuilt when the daily_climatology_update trigger
+throws any of those days away.
+
+Values are formatted as fixed-width strings for the noaamo.txt and noaayr.txt
+templates and the month and year summary pages. Rounding and padding follows
+what PostgreSQL does with round() and lpad() as the reports were originally
+produced by SQL ported from the desktop client.
+"""
+from collections import Counter, OrderedDict
+import copy
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+import math
+import threading
+
+import config
+from database import get_station_report_info, get_daily_climatology, \
+    get_daily_climatology_version
+from months import month_name
+
+__author__ = 'David Goodwin'
+
+# Days are counted in the reports when the temperature (in degrees C) or
+# rainfall (in mm) reaches these thresholds
+MAX_HIGH_TEMP = 32
+MAX_LOW_TEMP = 0
+MIN_HIGH_TEMP = 0
+MIN_LOW_TEMP = -18
+RAIN_02 = Decimal('0.2')
+RAIN_2 = Decimal('2.0')
+RAIN_20 = Decimal('20.0')
+
+COMPASS_POINTS = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
+                  'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW']
+
+# Number of reports to keep in memory
+CACHE_SIZE = 64
+
+_cache_lock = threading.Lock()
+_cache = OrderedDict()
+
+
+def _cache_get(key):
+    with _cache_lock:
+        value = _cache.pop(key, None)
+        if value is not None:
+            # Move to the end so its the last to be evicted
+            _cache[key] = value
+        return value
+
+
+def _cache_put(key, value):
+    with _cache_lock:
+        _cache[key] = value
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _closed_until():
+    """
+    Returns the first day that hasn't closed yet. Days before this are old
+    enough that their data shouldn't change anymore. This is the same test
+    used by the month archive.
+    :rtype: date
+    """
+    return date.today() - timedelta(days=config.month_archive_after_days)
+
+
+def _decimal(value, real=False):
+    """
+    Converts a floating point value to Decimal the same way PostgreSQL casts
+    them to numeric: 6 significant digits for real and 15 for double
+    precision.
+    """
+    if value is None or isinstance(value, Decimal):
+        return value
+    return Decimal('%.*g' % (6 if real else 15, value))
+
+
+def _round(value, places=1):
+    """
+    Rounds half away from zero like round() on a numeric value in PostgreSQL.
+    """
+    if value is None:
+        return None
+    value = _decimal(value).quantize(Decimal(1).scaleb(-places),
+                                     rounding=ROUND_HALF_UP)
+    if value == 0:
+        # numeric doesn't have negative zero
+        value = abs(value)
+    return value
+
+
+def _lpad(value, width):
+    """
+    Pads a value on the left to the specified width. Like lpad() in
+    PostgreSQL longer values are truncated.
+    """
+    if value is None:
+        return None
+    return u"{0}".format(value).rjust(width)[:width]
+
+
+def _rpad(value, width):
+    if value is None:
+        return None
+    return u"{0}".format(value).ljust(width)[:width]
+
+
+def _fm(value):
+    """
+    Formats a value less than one without its leading zero like to_char()
+    with an FM9.9 format.
+    """
+    value = str(value)
+    if value.startswith('0.'):
+        return value[1:]
+    return value
+
+
+def _sum(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return sum(values)
+
+
+def _avg(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return sum(values) / len(values)
+
+
+def _max(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return max(values)
+
+
+def _min(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return min(values)
+
+
+def _temperature(value, fahrenheit, real=False):
+    if value is None:
+        return None
+    if fahrenheit:
+        if isinstance(value, Decimal):
+            return value * Decimal('1.8') + 32
+        return _decimal(value * 1.8 + 32)
+    return _decimal(value, real)
+
+
+def _temperature_difference(value, fahrenheit):
+    """
+    Converts a difference in temperature such as degree days or the departure
+    from normal.
+    """
+    if value is None:
+        return None
+    if fahrenheit:
+        return _decimal(value * 1.8)
+    return _decimal(value)
+
+
+def _rain(value, inches, real=False):
+    if value is None:
+        return None
+    if inches:
+        if isinstance(value, Decimal):
+            return _round(value / Decimal('25.4'), 2)
+        return _round(_decimal(value / 25.4), 2)
+    return _round(_decimal(value, real), 1)
+
+
+def _wind(value, kmh, mph, real=False):
+    if value is None:
+        return None
+    if isinstance(value, Decimal):
+        if kmh:
+            value *= Decimal('3.6')
+        elif mph:
+            value *= Decimal('2.23694')
+        return value
+    if kmh:
+        return _decimal(value * 3.6)
+    if mph:
+        return _decimal(value * 2.23694)
+    return _decimal(value, real)
+
+
+def _compass_point(wind_directions):
+    """
+    Returns the compass point for the most common wind direction. If there is
+    a tie the lowest direction wins.
+
+    :param wind_directions: Number of samples for each wind direction
+    :type wind_directions: Counter
+    :rtype: str
+    """
+    if not wind_directions:
+        return None
+    direction = min(wind_directions.items(),
+                    key=lambda item: (-item[1], item[0]))[0]
+    return COMPASS_POINTS[((direction * 100 + 1125) % 36000) // 2250]
+
+
+def _time(value):
+    if value is None:
+        return None
+    return u"{0}:{1:02d}".format(value.hour, value.minute)
+
+
+def _short_month(month):
+    return month_name[month][:3].upper()
+
+
+def _short_year(year):
+    return u"{0:02d}".format(year % 100)
+
+
+def _day_summary(record):
+    """
+    Rounds a daily_climatology record to the values the monthly and yearly
+    summaries are built from.
+    """
+    max_temp = _round(_decimal(record.max_temperature, True))
+    min_temp = _round(_decimal(record.min_temperature, True))
+    tot_rain = _round(_decimal(record.rainfall, True))
+
+    def _count(value, test):
+        return 1 if value is not None and test(value) else 0
+
+    return {
+        'date': record.date_stamp,
+        'rain_02': _count(tot_rain, lambda v: v >= RAIN_02),
+        'rain_2': _count(tot_rain, lambda v: v >= RAIN_2),
+        'rain_20': _count(tot_rain, lambda v: v >= RAIN_20),
+        'max_high': _count(max_temp, lambda v: v >= MAX_HIGH_TEMP),
+        'max_low': _count(max_temp, lambda v: v <= MAX_LOW_TEMP),
+        'min_high': _count(min_temp, lambda v: v <= MIN_HIGH_TEMP),
+        'min_low': _count(min_temp, lambda v: v <= MIN_LOW_TEMP),
+        'max_avg_temp': max_temp,
+        'min_avg_temp': min_temp,
+        'avg_temp': _round(record.avg_temperature),
+        'max_temp': max_temp,
+        'min_temp': min_temp,
+        'heat_dd': record.heat_degree_days,
+        'cool_dd': record.cool_degree_days,
+        'tot_rain': tot_rain,
+        'avg_wind': _round(record.avg_wind_speed),
+        'max_wind': _round(_decimal(record.max_gust_wind_speed, True)),
+        'wind_directions': Counter(dict(zip(
+            record.wind_directions or [],
+            record.wind_direction_counts or []))),
+    }
+
+
+def _summarise(summaries):
+    """
+    Summarises a list of day summaries into a month or a list of month
+    summaries into a year. The date of each extreme is the last day (or
+    month) it occurred on.
+    """
+    def _last(field, value):
+        if value is None:
+            return None
+        return max(s['date'] for s in summaries if s[field] == value)
+
+    max_temp = _max(s['max_temp'] for s in summaries)
+    min_temp = _min(s['min_temp'] for s in summaries)
+    max_rain = _max(s['tot_rain'] for s in summaries)
+    max_wind = _max(s['max_wind'] for s in summaries)
+
+    wind_directions = Counter()
+    for s in summaries:
+        wind_directions.update(s['wind_directions'])
+
+    result = {
+        'date': summaries[0]['date'],
+        'max_avg_temp': _avg(s['max_avg_temp'] for s in summaries),
+        'min_avg_temp': _avg(s['min_avg_temp'] for s in summaries),
+        'avg_temp': _avg(s['avg_temp'] for s in summaries),
+        'heat_dd': _sum(s['heat_dd'] for s in summaries),
+        'cool_dd': _sum(s['cool_dd'] for s in summaries),
+        'max_temp': max_temp,
+        'max_temp_date': _last('max_temp', max_temp),
+        'min_temp': min_temp,
+        'min_temp_date': _last('min_temp', min_temp),
+        'tot_rain': _sum(s['tot_rain'] for s in summaries),
+        'max_rain': max_rain,
+        'max_rain_date': _last('tot_rain', max_rain),
+        'avg_wind': _avg(s['avg_wind'] for s in summaries),
+        'max_wind': max_wind,
+        'max_wind_date': _last('max_wind', max_wind),
+        'wind_directions': wind_directions,
+    }
+
+    for field in ('rain_02', 'rain_2', 'rain_20', 'max_high', 'max_low',
+                  'min_high', 'min_low'):
+        result[field] = sum(s[field] for s in summaries)
+
+    return result
+
+
+def _get_day_summaries(station_id, start, end, params):
+    """
+    Gets the summary for each day with data between start and end
+    (inclusive).
+    """
+    records = get_daily_climatology(station_id, start, end,
+                                    params["heatBase"], params["coolBase"],
+                                    _closed_until())
+
+    return [_day_summary(r) for r in records if r.sample_count > 0]
+
+
+def _dms(value, positive, negative):
+    """
+    Formats a latitude or longitude as degrees, minutes and seconds.
+    """
+    if value is None:
+        return None
+
+    value = float(value)
+    magnitude = abs(value)
+    degrees = math.floor(magnitude)
+    minutes = math.floor(60 * (magnitude - degrees))
+    seconds = 3600 * (magnitude - degrees) - 60 * minutes
+
+    return u"{0}° {1}' {2}\" {3}".format(
+        int(degrees), int(minutes), _round(seconds, 0),
+        negative if value < 0 else positive)
+
+
+def _threshold(value, fahrenheit):
+    if fahrenheit:
+        return int(_round(value * Decimal('1.8') + 32, 0))
+    return value
+
+
+def _criteria(params, station, at_date, base_width):
+    """
+    Report header values common to the monthly and yearly reports.
+    """
+    altitude = float(station.altitude)
+    if params["altFeet"]:
+        altitude *= 3.28084
+
+    def _base(value):
+        if not params["celsius"]:
+            value = value * 1.8 + 32
+        return _lpad(_round(value), base_width)
+
+    if params["kmh"]:
+        wind_units = "km/h"
+    elif params["mph"]:
+        wind_units = "mph"
+    else:
+        wind_units = "m/s"
+
+    return {
+        "month": _short_month(at_date.month),
+        "year": at_date.year,
+        "title": station.title,
+        "city": params["city"],
+        "state": params["state"],
+        "altitude": _lpad(_round(altitude, 0), 5),
+        "altitude_units": "ft" if params["altFeet"] else "m ",
+        "latitude": _lpad(_dms(station.latitude, 'N', 'S'), 14),
+        "longitude": _lpad(_dms(station.longitude, 'E', 'W'), 14),
+        "temperature_units": u"°C" if params["celsius"] else u"°F",
+        "rain_units": "in" if params["inches"] else "mm",
+        "wind_units": wind_units,
+        "cool_base": _base(params["coolBase"]),
+        "heat_base": _base(params["heatBase"]),
+    }
+
+
+def _year_criteria(params, station, year):
+    criteria = _criteria(params, station, date(year, 1, 1), 4)
+
+    f = params["fahrenheit"]
+    criteria.update({
+        "max_high_temp": u">=" + _rpad(_threshold(MAX_HIGH_TEMP, f), 2),
+        "max_low_temp": u"<=" + _rpad(_threshold(MAX_LOW_TEMP, f), 2),
+        "min_high_temp": u"<=" + _rpad(_threshold(MIN_HIGH_TEMP, f), 2),
+        "min_low_temp": u"<=" + str(_threshold(MIN_LOW_TEMP, f)),
+    })
+
+    if params["inches"]:
+        criteria.update({
+            "rain_02": _lpad(_fm(_rain(RAIN_02, True)), 3),
+            "rain_2": _lpad(_fm(_round(RAIN_2 / Decimal('25.4'), 1)), 2),
+            "rain_20": _lpad(_round(RAIN_20 / Decimal('25.4'), 0), 2),
+        })
+    else:
+        criteria.update({
+            "rain_02": _lpad(_fm(RAIN_02), 3),
+            "rain_2": _lpad(_round(RAIN_2, 0), 2),
+            "rain_20": _lpad(_round(RAIN_20, 0), 2),
+        })
+
+    return criteria
+
+
+def _month_criteria(params, station, year, month):
+    criteria = _criteria(params, station, date(year, month, 1), 5)
+
+    f = params["fahrenheit"]
+    for field, value in (("max_high_temp", MAX_HIGH_TEMP),
+                         ("max_low_temp", MAX_LOW_TEMP),
+                         ("min_high_temp", MIN_HIGH_TEMP),
+                         ("min_low_temp", MIN_LOW_TEMP)):
+        criteria[field] = _lpad(_round(Decimal(_threshold(value, f))), 5)
+
+    if params["inches"]:
+        criteria.update({
+            "rain_02_value": _fm(_rain(RAIN_02, True)) + " in",
+            "rain_2_value": _fm(_round(RAIN_2 / Decimal('25.4'), 1)) + " in",
+            "rain_20_value": str(_round(RAIN_20 / Decimal('25.4'), 0)) + " in",
+        })
+    else:
+        criteria.update({
+            "rain_02_value": _fm(RAIN_02) + " mm",
+            "rain_2_value": str(_round(RAIN_2, 0)) + " mm",
+            "rain_20_value": str(_round(RAIN_20, 0)) + " mm",
+        })
+
+    return criteria
+
+
+def _format_summary(summary, params, widths, dd_places, extreme_date):
+    """
+    Converts units and formats a month or year summary.
+
+    :param summary: Summary as returned by _summarise() or None if there was
+        no data
+    :param params: Report settings
+    :param widths: Widths for the temperature and wind extreme dates, the
+        maximum rainfall date, the day counts, the rain day counts and the
+        total rainfall
+    :type widths: tuple
+    :param dd_places: Number of decimal places for degree days
+    :param extreme_date: Function to format the date of an extreme
+    :rtype: dict
+    """
+    date_width, rain_date_width, count_width, rain_count_width, \
+        tot_rain_width = widths
+
+    fields = ['mean', 'heat_dd', 'cool_dd', 'hi_temp', 'hi_temp_date',
+              'low_temp', 'low_temp_date', 'max_high', 'max_low', 'min_high',
+              'min_low', 'tot_rain', 'max_obs_rain', 'max_obs_rain_day',
+              'rain_02', 'rain_2', 'rain_20', 'avg_wind', 'hi_wind',
+              'high_wind_day', 'dom_dir']
+
+    if summary is None:
+        return dict((field, None) for field in fields)
+
+    f = params["fahrenheit"]
+    inches = params["inches"]
+    kmh = params["kmh"]
+    mph = params["mph"]
+
+    def _date(value, width=date_width):
+        if value is None:
+            return None
+        return _lpad(extreme_date(value), width)
+
+    return {
+        'mean': _lpad(_round(_temperature(summary['avg_temp'], f)), 5),
+        'heat_dd': _lpad(_round(_temperature_difference(
+            summary['heat_dd'], f), dd_places), 5),
+        'cool_dd': _lpad(_round(_temperature_difference(
+            summary['cool_dd'], f), dd_places), 5),
+        'hi_temp': _lpad(_round(_temperature(summary['max_temp'], f)), 5),
+        'hi_temp_date': _date(summary['max_temp_date']),
+        'low_temp': _lpad(_round(_temperature(summary['min_temp'], f)), 5),
+        'low_temp_date': _date(summary['min_temp_date']),
+        'max_high': _lpad(summary['max_high'], count_width),
+        'max_low': _lpad(summary['max_low'], count_width),
+        'min_high': _lpad(summary['min_high'], count_width),
+        'min_low': _lpad(summary['min_low'], count_width),
+        'tot_rain': _lpad(_rain(summary['tot_rain'], inches), tot_rain_width),
+        'max_obs_rain': _lpad(_rain(summary['max_rain'], inches), 5),
+        'max_obs_rain_day': _date(summary['max_rain_date'], rain_date_width),
+        'rain_02': _lpad(summary['rain_02'], rain_count_width),
+        'rain_2': _lpad(summary['rain_2'], rain_count_width),
+        'rain_20': _lpad(summary['rain_20'], rain_count_width),
+        'avg_wind': _lpad(_round(_wind(summary['avg_wind'], kmh, mph)), 4),
+        'hi_wind': _lpad(_round(_wind(summary['max_wind'], kmh, mph)), 4),
+        'high_wind_day': _date(summary['max_wind_date']),
+        'dom_dir': _lpad(_compass_point(summary['wind_directions']), 3),
+    }
+
+
+def _format_year_summary(summary, params, widths, dd_places, extreme_date,
+                         dep_norm_temp, dep_norm_rain):
+    """
+    Formats a month or year summary for the yearly report which adds the
+    mean high and low temperatures and departures from normal.
+    """
+    result = _format_summary(summary, params, widths, dd_places, extreme_date)
+
+    if summary is None:
+        result.update(dict(mean_max=None, mean_min=None, dep_norm_temp=None,
+                           dep_norm_rain=None))
+        return result
+
+    f = params["fahrenheit"]
+    result.update({
+        'mean_max': _lpad(_round(_temperature(summary['max_avg_temp'], f)), 5),
+        'mean_min': _lpad(_round(_temperature(summary['min_avg_temp'], f)), 5),
+        'dep_norm_temp': _lpad(_round(_temperature_difference(
+            dep_norm_temp, f)), 5),
+        'dep_norm_rain': _lpad(_rain(dep_norm_rain, params["inches"]), 6),
+    })
+    return result
+
+
+def _format_day(record, params):
+    """
+    Formats a daily_climatology record for a line in the monthly report.
+    """
+    result = {
+        'day': _lpad(record.date_stamp.day, 2),
+    }
+
+    fields = ['mean_temp', 'high_temp', 'high_temp_time', 'low_temp',
+              'low_temp_time', 'heat_degree_days', 'cool_degree_days', 'rain',
+              'avg_wind_speed', 'high_wind', 'high_wind_time', 'dom_wind_dir']
+
+    if record.max_temperature is None and record.max_gust_wind_speed is None:
+        for field in fields:
+            result[field] = None
+        return result
+
+    f = params["fahrenheit"]
+    kmh = params["kmh"]
+    mph = params["mph"]
+
+    wind_directions = Counter(dict(zip(record.wind_directions or [],
+                                       record.wind_direction_counts or [])))
+
+    result.update({
+        'mean_temp': _lpad(_round(_temperature(record.avg_temperature, f)), 4),
+        'high_temp': _lpad(_round(_temperature(
+            record.max_temperature, f, True)), 4),
+        'high_temp_time': _lpad(_time(record.max_temperature_time), 5),
+        'low_temp': _lpad(_round(_temperature(
+            record.min_temperature, f, True)), 4),
+        'low_temp_time': _lpad(_time(record.min_temperature_time), 5),
+        'heat_degree_days': _lpad(_round(_temperature_difference(
+            record.heat_degree_days, f)), 4),
+        'cool_degree_days': _lpad(_round(_temperature_difference(
+            record.cool_degree_days, f)), 4),
+        'rain': _lpad(_rain(record.rainfall, params["inches"], True), 4),
+        'avg_wind_speed': _lpad(_round(_wind(
+            record.avg_wind_speed, kmh, mph)), 4),
+        'high_wind': _lpad(_round(_wind(
+            record.max_gust_wind_speed, kmh, mph, True)), 4),
+        'high_wind_time': _lpad(_time(record.max_gust_wind_speed_time), 5),
+        'dom_wind_dir': _lpad(_compass_point(wind_directions), 3),
+    })
+    return result
+
+
+def _build_year_report(station, year, params):
+    """
+    Builds the monthly and yearly rows of the yearly report.
+    """
+    days = _get_day_summaries(station.station_id, date(year, 1, 1),
+                              date(year, 12, 31), params)
+
+    widths = (2, 3, 2, 3, 5)
+
+    monthly_rows = []
+    months = []
+    dep_norm_temps = []
+    dep_norm_rains = []
+    for month in range(1, 13):
+        month_days = [d for d in days if d['date'].month == month]
+
+        row = {
+            'year': _short_year(year),
+            'month': _lpad(month, 2),
+        }
+
+        if not month_days:
+            row.update(_format_year_summary(None, params, widths, 0, None,
+                                            None, None))
+            monthly_rows.append(row)
+            continue
+
+        summary = _summarise(month_days)
+        months.append(summary)
+
+        abbreviation = month_name[month][:3].capitalize()
+        dep_norm_temp = None
+        if summary['avg_temp'] is not None:
+            dep_norm_temp = float(summary['avg_temp']) - \
+                params["norm" + abbreviation]
+        dep_norm_rain = None
+        if summary['tot_rain'] is not None:
+            dep_norm_rain = float(summary['tot_rain']) - \
+                params["norm" + abbreviation + "Rain"]
+        dep_norm_temps.append(dep_norm_temp)
+        dep_norm_rains.append(dep_norm_rain)
+
+        row.update(_format_year_summary(summary, params, widths, 0,
+                                        lambda d: d.day,
+                                        dep_norm_temp, dep_norm_rain))
+        monthly_rows.append(row)
+
+    yearly_row = {'year': _short_year(year)}
+    yearly_summary = _summarise(months) if months else None
+    yearly_row.update(_format_year_summary(
+        yearly_summary, params, (3, 3, 3, 3, 7), 0,
+        lambda d: _short_month(d.month),
+        _avg(dep_norm_temps), _sum(dep_norm_rains)))
+
+    return monthly_rows, yearly_row
+
+
+def _build_month_report(station, year, month, params):
+    """
+    Builds the month and daily rows of the monthly report.
+    """
+    start = date(year, month, 1)
+    if month == 12:
+        end = date(year + 1, 1, 1) - timedelta(days=1)
+    else:
+        end = date(year, month + 1, 1) - timedelta(days=1)
+
+    records = get_daily_climatology(station.station_id, start, end,
+                                    params["heatBase"], params["coolBase"],
+                                    _closed_until())
+
+    daily_rows = [_format_day(r, params) for r in records]
+
+    days = [_day_summary(r) for r in records if r.sample_count > 0]
+    summary = _summarise(days) if days else None
+
+    month_row = _format_summary(summary, params, (2, 2, 2, 2, 5), 1,
+                                lambda d: d.day)
+    if summary is not None and summary['max_rain_date'] is not None:
+        month_row['max_obs_rain_day'] = str(summary['max_rain_date'])
+
+    return month_row, daily_rows
+
+
+def _get_report(key, station_id, period_start, period_end, params, build):
+    """
+    Builds a report or gets it from the cache if it covers a period that has
+    closed and none of its days have been recalculated since it was built.
+    Callers get their own copy as some add to the values.
+
+    :param key: Identifies the report
+    :type key: tuple
+    :param station_id: Station the report is for
+    :type station_id: int
+    :param period_start: First day of the report period
+    :type period_start: date
+    :param period_end: Day after the report period ends
+    :type period_end: date
+    :param params: Report settings
+    :type params: dict
+    :param build: Function to build the report
+    """
+    if period_end > _closed_until():
+        return build()
+
+    # Taken before building so that if days are thrown away while the
+    # report is being built it'll be rebuilt next time rather than keeping
+    # what may be the old values.
+    version = get_daily_climatology_version(
+        station_id, period_start, period_end - timedelta(days=1),
+        params["heatBase"], params["coolBase"])
+
+    cached = _cache_get(key)
+    if cached is not None and cached[0] == version:
+        return copy.deepcopy(cached[1])
+
+    report = build()
+
+    _cache_put(key, (version, copy.deepcopy(report)))
+
+    return report
+
+
+def get_noaa_year_data(station_code, year, include_criteria=True):
+    """
+    Gets the data for the NOAA yearly climatological report.
+
+    :param station_code: Station to get data for
+    :type station_code: str
+    :param year: Year to report on
+    :type year: int
+    :param include_criteria: If the report header values should be included
+    :type include_criteria: bool
+    :return: monthly rows, yearly row and report header values (criteria). Or
+        None if the station doesn't exist or hasn't been configured for the
+        yearly report.
+    :rtype: (list[dict], dict, dict)
+    """
+    if station_code not in config.report_settings or \
+            "noaa_year" not in config.report_settings[station_code]:
+        return None
+
+    params = config.report_settings[station_code]["noaa_year"]
+
+    station = get_station_report_info(station_code)
+    if station is None:
+        return None
+
+    monthly, yearly = _get_report(
+        ("year", station.station_id, year), station.station_id,
+        date(year, 1, 1), date(year + 1, 1, 1), params,
+        lambda: _build_year_report(station, year, params))
+
+    criteria = None
+    if include_criteria:
+        criteria = _year_criteria(params, station, year)
+
+    return monthly, yearly, criteria
+
+
+def get_noaa_month_data(station_code, year, month, include_criteria=True):
+    """
+    Gets the data for the NOAA monthly climatological report.
+
+    :param station_code: Station to get data for
+    :type station_code: str
+    :param year: Year to report on
+    :type year: int
+    :param month: Month to report on
+    :type month: int
+    :param include_criteria: If the report header values should be included
+    :type include_criteria: bool
+    :return: month row, daily rows and report header values (criteria). Or
+        None if the station doesn't exist or hasn't been configured for
+        reports.
+    :rtype: (dict, list[dict], dict)
+    """
+    if station_code not in config.report_settings or \
+            "noaa_month" not in config.report_settings[station_code]:
+        return None
+
+    params = config.report_settings[station_code]["noaa_month"]
+
+    station = get_station_report_info(station_code)
+    if station is None:
+        return None
+
+    if month == 12:
+        period_end = date(year + 1, 1, 1)
+    else:
+        period_end = date(year, month + 1, 1)
+
+    month_data, daily_data = _get_report(
+        ("month", station.station_id, year, month), station.station_id,
+        date(year, month, 1), period_end, params,
+        lambda: _build_month_report(station, year, month, params))
+
+    criteria = None
+    if include_criteria:
+        criteria = _month_criteria(params, station, year, month)
+
+    return month_data, daily_data, criteria
@@ -0,0 +1,143 @@
+"""
+Tests the daily_climatology records being thrown away when the samples they
+were calculated from change. These need a weather database with the current
+schema and only run when ZXW_TEST_DSN is set.
+"""
+from datetime import date, datetime
+import os
+import unittest
+
+import web
+
+DSN = os.environ.get("ZXW_TEST_DSN")
+
+
+@unittest.skipUnless(DSN, "ZXW_TEST_DSN not set")
+class ClimatologyInvalidationTests(unittest.TestCase):
+    """
+    Everything happens in a transaction which is rolled back at the end of
+    each test.
+    """
+
+    def setUp(self):
+        self.db = web.database(dbn="postgres", dsn=DSN)
+        self.db.printing = False
+        self.transaction = self.db.transaction()
+        self.db.query("set local time zone 'UTC'")
+
+        self.station_id = self.db.query("""
+        insert into station(code, title, station_type_id, sample_interval)
+        select 'ctst', 'Test', station_type_id, 300
+        from station_type where code = 'GENERIC'
+        returning station_id""")[0].station_id
+
+        # Samples every five minutes over the 1st to the 10th of December
+        self.db.query("""
+        insert into sample(station_id, time_stamp, download_timestamp,
+                           temperature, rainfall)
+        select $station, ts, now(), 20, 0.2
+        from generate_series('2019-12-01 00:00'::timestamp,
+                             '2019-12-10 23:55'::timestamp,
+                             '5 minutes'::interval) as ts""",
+                      dict(station=self.station_id))
+
+        self.db.query("""
+        select update_climatology_days($station, '2019-12-01', '2019-12-07',
+                                       18.3, 18.3)""",
+                      dict(station=self.station_id))
+
+    def tearDown(self):
+        self.transaction.rollback()
+
+    def _days(self):
+        rows = self.db.query("""
+        select date_stamp from daily_climatology
+        where station_id = $station order by date_stamp""",
+                             dict(station=self.station_id))
+        return [r.date_stamp for r in rows]
+
+    def _dates(self, *days):
+        return [date(2019, 12, d) for d in days]
+
+    def _insert(self, ts):
+        self.db.query("""
+        insert into sample(station_id, time_stamp, download_timestamp,
+                           temperature, rainfall)
+        values($station, $ts::timestamp, now(), 25, 1.0)""",
+                      dict(station=self.station_id, ts=ts))
+
+    def _in_climatology(self, day):
+        rows = self.db.query("""
+        select count(*) as quarter_hours from sample_quarter_hour
+        where station_id = $station
+          and time_stamp >= $day::timestamptz
+          and time_stamp < ($day + 1)::timestamptz
+          and in_climatology""", dict(station=self.station_id, day=day))
+        return rows[0].quarter_hours
+
+    def test_calculated(self):
+        self.assertEqual(self._days(), self._dates(*range(1, 8)))
+        self.assertEqual(self._in_climatology(date(2019, 12, 7)), 96)
+        self.assertEqual(self._in_climatology(date(2019, 12, 8)), 0)
+
+    def test_newer_samples_keep_days(self):
+        self._insert(datetime(2019, 12, 10, 12, 2))
+        self._insert(datetime(2019, 12, 11, 0, 0))
+
+        self.assertEqual(self._days(), self._dates(*range(1, 8)))
+
+    def test_late_sample(self):
+        self._insert(datetime(2019, 12, 4, 12, 2))
+
+        self.assertEqual(self._days(), self._dates(1, 2, 6, 7))
+
+        # The rest of the day no longer needs to throw anything away
+        self.assertEqual(self._in_climatology(date(2019, 12, 4)), 0)
+        self.assertEqual(self._in_climatology(date(2019, 12, 5)), 96)
+
+    def test_late_sample_new_quarter_hour(self):
+        self.db.query("""
+        delete from sample where station_id = $station
+        and time_stamp >= '2019-12-08 00:00'""", dict(station=self.station_id))
+        self.db.query("""
+        select update_climatology_days($station, '2019-12-08', '2019-12-09',
+                                       18.3, 18.3)""",
+                      dict(station=self.station_id))
+
+        self._insert(datetime(2019, 12, 9, 12, 0))
+
+        self.assertEqual(self._days(), self._dates(*range(1, 8)))
+
+    def test_sample_updated(self):
+        self.db.query("""
+        update sample set rainfall = 5
+        where station_id = $station and time_stamp = '2019-12-02 06:00'""",
+                      dict(station=self.station_id))
+
+        self.assertEqual(self._days(), self._dates(4, 5, 6, 7))
+
+    def test_sample_deleted(self):
+        self.db.query("""
+        delete from sample
+        where station_id = $station and time_stamp = '2019-12-06 06:00'""",
+                      dict(station=self.station_id))
+
+        self.assertEqual(self._days(), self._dates(1, 2, 3, 4))
+
+    def test_recalculated(self):
+        self._insert(datetime(2019, 12, 4, 12, 2))
+        self.db.query("""
+        select update_climatology_days($station, '2019-12-03', '2019-12-05',
+                                       18.3, 18.3)""",
+                      dict(station=self.station_id))
+
+        row = self.db.query("""
+        select sample_count, max_temperature from daily_climatology
+        where station_id = $station and date_stamp = '2019-12-04'""",
+                            dict(station=self.station_id))[0]
+        self.assertEqual((row.sample_count, row.max_temperature), (289, 25))
+        self.assertEqual(self._in_climatology(date(2019, 12, 4)), 96)
+
+
+if __name__ == '__main__':
+    unittest.main()
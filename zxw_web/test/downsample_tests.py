@@ -0,0 +1,96 @@
+"""
+Tests downsampling of the JSON data sets
+"""
+from datetime import date, datetime, timedelta
+import json
+import unittest
+
+import web
+
+import config
+from data import daily, downsample
+from data.util import rainfall_sample_result_to_json
+from test.util import request
+
+
+def _rainfall(start, count):
+    return [web.Storage(time_stamp=start + timedelta(minutes=5 * i),
+                        rainfall=float(i % 7), gap=False)
+            for i in range(count)]
+
+
+class GetDayDatasetTests(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.cache_control = []
+
+        # Cache control headers need the database
+        self._day_cache_control = daily.day_cache_control
+        daily.day_cache_control = \
+            lambda age, day, station_id: self.cache_control.append(day)
+
+        downsample._cache.clear()
+
+    def tearDown(self):
+        daily.day_cache_control = self._day_cache_control
+        downsample._cache.clear()
+
+    def _data_function(self, time, station_id):
+        self.calls.append((time, station_id))
+        return _rainfall(datetime(2020, 1, 1), 100)
+
+    def _get(self, day):
+        return json.loads(daily.get_day_dataset(
+            day, self._data_function, rainfall_sample_result_to_json, 1))
+
+    def test_current_time(self):
+        # The station live data sets pass datetime.now() rather than a date
+        request()
+        now = datetime.now()
+
+        result = self._get(now)
+
+        self.assertEqual(len(result['data']), 100)
+        self.assertEqual(self.calls, [(now, 1)])
+        self.assertEqual(self.cache_control, [now])
+
+    def test_current_time_downsampled(self):
+        request('points=10')
+        now = datetime.now()
+
+        self.assertEqual(len(self._get(now)['data']), 10)
+        self.assertEqual(len(self._get(now)['data']), 10)
+
+        # Today hasn't closed so nothing is cached
+        self.assertEqual(len(self.calls), 2)
+
+    def test_closed_day_downsampled(self):
+        request('points=10')
+        day = date.today() - timedelta(
+            days=config.month_archive_after_days + 1)
+
+        self.assertEqual(len(self._get(day)['data']), 10)
+        self.assertEqual(len(self._get(day)['data']), 10)
+
+        self.assertEqual(len(self.calls), 1)
+
+    def test_invalid_points(self):
+        request('points=2')
+        self.assertRaises(web.BadRequest, self._get, datetime.now())
+
+
+class IsClosedTests(unittest.TestCase):
+
+    def test_open(self):
+        self.assertFalse(downsample.is_closed(date.today()))
+        self.assertFalse(downsample.is_closed(
+            date.today() - timedelta(days=config.month_archive_after_days - 1)))
+
+    def test_closed(self):
+        self.assertTrue(downsample.is_closed(
+            date.today() - timedelta(days=config.month_archive_after_days)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+"""
+Tests the hourly rainfall and reception data sets built from the
+sample_quarter_hour table. These need a weather database with the current
+schema and only run when ZXW_TEST_DSN is set.
+"""
+from datetime import date, datetime, timedelta
+import os
+import unittest
+
+import web
+
+import config
+from data import daily
+
+DSN = os.environ.get("ZXW_TEST_DSN")
+
+# +09:30 all year round so local hours start half way through UTC hours
+TIME_ZONE = "Australia/Darwin"
+
+START = datetime(2019, 12, 9, 22, 0)
+END = datetime(2019, 12, 11, 2, 0)
+
+
+@unittest.skipUnless(DSN, "ZXW_TEST_DSN not set")
+class HourlyRainfallTests(unittest.TestCase):
+    """
+    Everything happens in a transaction which is rolled back at the end of
+    each test.
+    """
+
+    def setUp(self):
+        self.db = web.database(dbn="postgres", dsn=DSN)
+        self.db.printing = False
+        self.transaction = self.db.transaction()
+        self.db.query("set local time zone '{0}'".format(TIME_ZONE))
+
+        self._config_db = config.db
+        self._max_packets = daily.get_davis_max_wireless_packets
+        config.db = self.db
+        daily.get_davis_max_wireless_packets = lambda station_id: 40.0
+
+        self.station_id = self.db.query("""
+        insert into station(code, title, station_type_id, sample_interval)
+        select 'htst', 'Test', station_type_id, 300
+        from station_type where code = 'DAVIS'
+        returning station_id""")[0].station_id
+
+        # A sample every five minutes with 0.2mm of rain and half of the
+        # wireless packets received.
+        self.db.query("""
+        insert into sample(station_id, time_stamp, download_timestamp,
+                           temperature, relative_humidity, rainfall,
+                           average_wind_speed, absolute_pressure)
+        select $station, ts, now(), 20, 50, 0.2, 1.5, 1000
+        from generate_series($start::timestamp, $end::timestamp,
+                             '5 minutes'::interval) as ts""",
+                      dict(station=self.station_id, start=START, end=END))
+        self.db.query("""
+        insert into davis_sample(sample_id, record_time, record_date,
+                                 high_temperature, low_temperature,
+                                 high_rain_rate, wind_sample_count,
+                                 forecast_rule_id)
+        select sample_id, 0, 0, 20, 20, 0, 20, 0
+        from sample where station_id = $station""",
+                      dict(station=self.station_id))
+
+    def tearDown(self):
+        self.transaction.rollback()
+        config.db = self._config_db
+        daily.get_davis_max_wireless_packets = self._max_packets
+
+    def _delete_after(self, ts):
+        params = dict(station=self.station_id, ts=ts)
+        self.db.query("""
+        delete from davis_sample
+        where sample_id in (select sample_id from sample
+                            where station_id = $station
+                              and time_stamp > $ts::timestamp)""", params)
+        self.db.query("""
+        delete from sample
+        where station_id = $station and time_stamp > $ts::timestamp""",
+                      params)
+
+    def _local(self, ts):
+        return ts.replace(tzinfo=None)
+
+    def _assert_hours(self, result, first, count, rainfall=2.4):
+        rows = list(result)
+        self.assertEqual([self._local(r.time_stamp) for r in rows],
+                         [first + timedelta(hours=h) for h in range(count)])
+        for row in rows:
+            self.assertAlmostEqual(row.rainfall, rainfall, places=4)
+
+    def test_day(self):
+        self._assert_hours(
+            daily.get_days_hourly_rainfall_data(date(2019, 12, 10),
+                                                self.station_id),
+            datetime(2019, 12, 10, 0, 0), 24)
+
+    def test_24hr(self):
+        self._assert_hours(
+            daily.get_24hr_hourly_rainfall_data(datetime(2019, 12, 11, 1, 10),
+                                                self.station_id),
+            datetime(2019, 12, 10, 1, 0), 25)
+
+    def test_168hr(self):
+        # Only the hours that have samples
+        self._assert_hours(
+            daily.get_168hr_hourly_rainfall_data(datetime(2019, 12, 10, 12, 10),
+                                                 self.station_id),
+            START, 15)
+
+    def test_7day(self):
+        # The period ends at the last sample of the day and the first hour
+        # only has the samples from the week before
+        self.db.query("""
+        insert into sample(station_id, time_stamp, download_timestamp, rainfall)
+        values($station, '2019-12-03 00:25'::timestamp, now(), 0.2),
+              ($station, '2019-12-03 00:35'::timestamp, now(), 0.2),
+              ($station, '2019-12-03 00:55'::timestamp, now(), 0.2)""",
+                      dict(station=self.station_id))
+        self._delete_after(datetime(2019, 12, 10, 0, 30))
+
+        rows = list(daily.get_7day_hourly_rainfall_data(date(2019, 12, 10),
+                                                        self.station_id))
+
+        self.assertEqual(self._local(rows[0].time_stamp),
+                         datetime(2019, 12, 3, 0, 0))
+        self.assertAlmostEqual(rows[0].rainfall, 0.4, places=4)
+        self.assertEqual(self._local(rows[-1].time_stamp),
+                         datetime(2019, 12, 10, 0, 0))
+        self.assertAlmostEqual(rows[-1].rainfall, 1.4, places=4)
+
+    def test_reception(self):
+        rows = list(daily.get_24hr_reception(datetime(2019, 12, 10, 1, 10),
+                                             self.station_id))
+
+        self.assertEqual([self._local(r.time_stamp) for r in rows],
+                         [START + timedelta(hours=h) for h in range(4)])
+        self.assertEqual([r.reception for r in rows], [50.0] * 4)
+        self.assertEqual([r.gap for r in rows], [False] * 4)
+
+    def test_changes_match_rebuild(self):
+        self.db.query("""
+        update sample set rainfall = 1.0, time_stamp = time_stamp + '3 minutes'
+        where station_id = $station and time_stamp = '2019-12-10 12:05'""",
+                      dict(station=self.station_id))
+        self.db.query("""
+        update davis_sample set wind_sample_count = 5
+        where sample_id = (select sample_id from sample
+                           where station_id = $station
+                             and time_stamp = '2019-12-10 12:10')""",
+                      dict(station=self.station_id))
+        self._delete_after(datetime(2019, 12, 10, 12, 55))
+
+        query = """
+        select time_stamp, sample_count, round(rainfall::numeric, 3) as rainfall,
+               temperature_samples, total_relative_humidity,
+               wind_sample_count, wind_sample_count_samples
+        from {0}
+        where station_id = $station
+        order by time_stamp"""
+        params = dict(station=self.station_id)
+        maintained = list(self.db.query(query.format("sample_quarter_hour"),
+                                        params))
+        rebuilt = list(self.db.query(query.format(
+            "summarise_sample_quarter_hours($station, '-infinity', "
+            "'infinity')"), params))
+
+        self.assertEqual(maintained, rebuilt)
+        self.assertEqual(self._local(maintained[-1].time_stamp),
+                         datetime(2019, 12, 10, 12, 45))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,299 @@
+"""
+Tests the month data file archive
+"""
+from datetime import date, datetime
+import gzip
+from io import BytesIO
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import web
+
+import config
+from data import month_archive, monthly
+from test.util import request, headers
+
+DATA = b"time_stamp\ttemperature\n2019-12-01 00:00:00\t12.5\n" * 50
+
+
+def _samples(count=100, latest=datetime(2019, 12, 31, 23, 55)):
+    return web.Storage(sample_count=count, latest_sample=latest)
+
+
+def _gunzip(data):
+    return gzip.GzipFile(fileobj=BytesIO(data)).read()
+
+
+def _expire_validation():
+    # Pretend the archived file was last checked two hours ago
+    filename = month_archive._metadata_filename("tst", 2019, 12, "samples")
+    validated = time.time() - 2 * 60 * 60
+    os.utime(filename, (validated, validated))
+
+
+class ArchiveTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self._archive_directory = config.month_archive_directory
+        self._revalidate_minutes = config.month_archive_revalidate_minutes
+        config.month_archive_directory = self.directory
+        config.month_archive_revalidate_minutes = 60
+
+    def tearDown(self):
+        config.month_archive_directory = self._archive_directory
+        config.month_archive_revalidate_minutes = self._revalidate_minutes
+        shutil.rmtree(self.directory)
+
+
+class MonthArchiveTests(ArchiveTestCase):
+
+    def _archive(self, data=DATA, samples=None):
+        return month_archive.archive_file(
+            "TST", 2019, 12, "samples", data,
+            "Wed, 01 Jan 2020 00:00:00 GMT", samples or _samples())
+
+    def _get(self):
+        return month_archive.get_archived_file("tst", 2019, 12, "samples")
+
+    def _recently_validated(self):
+        return month_archive.recently_validated("tst", 2019, 12, "samples")
+
+    def test_round_trip(self):
+        metadata = self._archive()
+
+        self.assertEqual(self._get(), metadata)
+        self.assertEqual(metadata["size"], len(DATA))
+        self.assertEqual(metadata["last_modified"],
+                         "Wed, 01 Jan 2020 00:00:00 GMT")
+
+        data = b"".join(month_archive.stream_file(
+            month_archive.data_filename(metadata, False)))
+        self.assertEqual(data, DATA)
+
+    def test_gzip(self):
+        metadata = self._archive()
+
+        with open(month_archive.data_filename(metadata, True), 'rb') as f:
+            gzipped = f.read()
+
+        self.assertEqual(len(gzipped), metadata["gzip_size"])
+        self.assertEqual(_gunzip(gzipped), DATA)
+
+        # Archiving the same data again gives the same file
+        self._archive()
+        with open(month_archive.data_filename(metadata, True), 'rb') as f:
+            self.assertEqual(f.read(), gzipped)
+
+    def test_not_archived(self):
+        self.assertIsNone(self._get())
+
+    def test_missing_data_file(self):
+        metadata = self._archive()
+        os.remove(month_archive.data_filename(metadata, True))
+
+        self.assertIsNone(self._get())
+
+    def test_samples_added(self):
+        metadata = self._archive()
+
+        self.assertTrue(month_archive.is_current(metadata, _samples()))
+        self.assertFalse(month_archive.is_current(metadata,
+                                                  _samples(count=101)))
+        self.assertFalse(month_archive.is_current(metadata, _samples(
+            latest=datetime(2019, 12, 31, 23, 59))))
+
+    def test_replaced(self):
+        self._archive()
+        metadata = self._archive(DATA + DATA, _samples(count=101))
+
+        self.assertEqual(self._get(), metadata)
+        self.assertTrue(month_archive.is_current(metadata,
+                                                 _samples(count=101)))
+        self.assertEqual(metadata["size"], len(DATA) * 2)
+
+    def test_old_metadata(self):
+        # Metadata written before sample counts were recorded is out of date
+        metadata = self._archive()
+        del metadata["sample_count"]
+        del metadata["latest_sample"]
+        month_archive._write_file(
+            month_archive._metadata_filename("tst", 2019, 12, "samples"),
+            json.dumps(metadata).encode("utf-8"))
+
+        self.assertFalse(month_archive.is_current(self._get(), _samples()))
+
+    def test_recently_validated(self):
+        self.assertFalse(self._recently_validated())
+
+        # Archiving a file counts as validating it
+        self._archive()
+        self.assertTrue(self._recently_validated())
+
+        _expire_validation()
+        self.assertFalse(self._recently_validated())
+
+        month_archive.mark_validated("tst", 2019, 12, "samples")
+        self.assertTrue(self._recently_validated())
+
+    def test_is_month_closed(self):
+        today = date.today()
+        self.assertFalse(month_archive.is_month_closed(today.year,
+                                                       today.month))
+        self.assertTrue(month_archive.is_month_closed(2019, 12))
+
+
+class DataFileTests(ArchiveTestCase):
+    """
+    Tests serving month data files from the archive
+    """
+
+    def setUp(self):
+        super(DataFileTests, self).setUp()
+
+        self.samples = _samples()
+        self.generated = 0
+        self.summarised = 0
+
+        def _get_month_sample_summary(year, month, station_id):
+            self.summarised += 1
+            return self.samples
+
+        def _get_month_samples_tab_delimited(year, month, station_id,
+                                             version):
+            self.generated += 1
+            return DATA, datetime(2020, 1, 1)
+
+        self._functions = dict(
+            get_station_id=monthly.get_station_id,
+            get_month_sample_summary=monthly.get_month_sample_summary,
+            get_month_data_wp_age=monthly.get_month_data_wp_age,
+            get_month_samples_tab_delimited=
+            monthly.get_month_samples_tab_delimited)
+
+        monthly.get_station_id = \
+            lambda code: 1 if code.lower() == "tst" else None
+        monthly.get_month_sample_summary = _get_month_sample_summary
+        monthly.get_month_samples_tab_delimited = \
+            _get_month_samples_tab_delimited
+
+    def tearDown(self):
+        for name, function in self._functions.items():
+            setattr(monthly, name, function)
+        super(DataFileTests, self).tearDown()
+
+    def _assert_not_found(self, function, *args):
+        with self.assertRaises(web.HTTPError) as cm:
+            function(*args)
+        self.assertTrue(web.ctx.status.startswith("404"))
+
+    def _get(self, **env):
+        request(**env)
+        return b"".join(monthly.data_dat().GET("tst", "2019", "12",
+                                               "samples"))
+
+    def _head(self, **env):
+        request(method='HEAD', **env)
+        return monthly.data_dat().HEAD("tst", "2019", "12", "samples")
+
+    def test_get(self):
+        self.assertEqual(self._get(), DATA)
+        self.assertEqual(headers()["Content-Length"], str(len(DATA)))
+        self.assertNotIn("Content-Encoding", headers())
+
+        # Second request comes from the archive
+        self.assertEqual(self._get(), DATA)
+        self.assertEqual(self.generated, 1)
+
+    def test_get_gzip(self):
+        data = self._get(HTTP_ACCEPT_ENCODING="gzip, deflate")
+
+        self.assertEqual(headers()["Content-Encoding"], "gzip")
+        self.assertEqual(headers()["Content-Length"], str(len(data)))
+        self.assertEqual(_gunzip(data), DATA)
+
+    def test_head(self):
+        self._get()
+
+        self.assertIsNone(self._head())
+        self.assertEqual(headers()["Content-Length"], str(len(DATA)))
+        etag = headers()["ETag"]
+
+        self.assertIsNone(self._head(HTTP_ACCEPT_ENCODING="gzip"))
+        self.assertEqual(headers()["Content-Encoding"], "gzip")
+        self.assertNotEqual(headers()["ETag"], etag)
+
+        self.assertEqual(self.generated, 1)
+
+    def test_not_modified(self):
+        self._get()
+        etag = headers()["ETag"]
+
+        self.assertRaises(web.NotModified, self._head, HTTP_IF_NONE_MATCH=etag)
+
+    def test_archived_without_database(self):
+        self._get()
+        summarised = self.summarised
+        monthly.get_station_id = None
+
+        self.assertEqual(self._get(), DATA)
+        self.assertIsNone(self._head())
+        self.assertEqual(self.summarised, summarised)
+
+    def test_samples_added(self):
+        self._get()
+
+        # A sample uploaded late isn't noticed until the archived file is
+        # checked again
+        self.samples = _samples(count=101)
+        self._get()
+        self.assertEqual(self.generated, 1)
+
+        _expire_validation()
+        self._get()
+        self.assertEqual(self.generated, 2)
+
+        self._get()
+        self.assertEqual(self.generated, 2)
+
+    def test_revalidated(self):
+        self._get()
+        _expire_validation()
+
+        self.assertIsNone(self._head())
+        self.assertEqual(self.generated, 1)
+        self.assertEqual(self.summarised, 2)
+
+        # Checked again so the next request doesn't need the database
+        self.assertEqual(self._get(), DATA)
+        self.assertEqual(self.summarised, 2)
+
+    def test_head_samples_added(self):
+        self._get()
+        self.samples = _samples(count=101)
+        _expire_validation()
+
+        # HEAD doesn't generate files so it falls back to the database
+        monthly.get_month_data_wp_age = lambda year, month, station_id: \
+            datetime(2020, 1, 2)
+        self.assertIsNone(self._head())
+        self.assertNotIn("ETag", headers())
+        self.assertEqual(self.generated, 1)
+
+    def test_no_samples(self):
+        self.samples = _samples(count=0, latest=None)
+
+        self._assert_not_found(self._get)
+        self.assertEqual(self.generated, 0)
+
+    def test_unknown_station(self):
+        request()
+        self._assert_not_found(monthly.data_dat().GET,
+                               "xyz", "2019", "12", "samples")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,242 @@
+"""
+Tests fetching the samples added to a month data file since a client last
+downloaded it. The database tests need a weather database with the current
+schema and only run when ZXW_TEST_DSN is set.
+"""
+from datetime import datetime
+import calendar
+import os
+import unittest
+
+import web
+
+import database
+from data import monthly
+from test.util import request, headers
+
+DSN = os.environ.get("ZXW_TEST_DSN")
+
+# 2019-12-10 00:00 UTC
+AFTER = calendar.timegm((2019, 12, 10, 0, 0, 0))
+
+
+class DataDatDeltaTests(unittest.TestCase):
+    """
+    Tests the data_dat_delta handler with the database functions replaced
+    """
+
+    def setUp(self):
+        self.calls = []
+        self.result = ("2019-12-10 00:05:00+00\t12.5", datetime(2019, 12, 10),
+                       2590, 4079449800)
+
+        def _get_delta(year, month, station_id, version, after):
+            self.calls.append((year, month, station_id, version, after))
+            return self.result
+
+        self._functions = dict(
+            get_station_id=monthly.get_station_id,
+            _month_exists=monthly._month_exists,
+            get_month_samples_tab_delimited_delta=
+            monthly.get_month_samples_tab_delimited_delta,
+            cache_control_headers=monthly.cache_control_headers)
+
+        monthly.get_station_id = \
+            lambda code: 1 if code.lower() == "tst" else None
+        monthly._month_exists = \
+            lambda year, month, station_id: (year, month) == (2019, 12)
+        monthly.get_month_samples_tab_delimited_delta = _get_delta
+        monthly.cache_control_headers = \
+            lambda station_id, age, year, month: None
+
+    def tearDown(self):
+        for name, function in self._functions.items():
+            setattr(monthly, name, function)
+
+    def _get(self, query="after={0}".format(AFTER), station="tst",
+             month="12", dataset="samples"):
+        request(query)
+        return monthly.data_dat_delta().GET(station, "2019", month, dataset)
+
+    def _assert_not_found(self, **kwargs):
+        with self.assertRaises(web.HTTPError):
+            self._get(**kwargs)
+        self.assertTrue(web.ctx.status.startswith("404"))
+
+    def test_headers(self):
+        self.assertEqual(self._get(), self.result[0])
+
+        self.assertEqual(headers()["X-Sample-Count"], "2590")
+        self.assertEqual(headers()["X-Sample-Checksum"], "4079449800")
+        self.assertEqual(headers()["Content-Type"], "text/plain")
+        self.assertEqual(self.calls, [(2019, 12, 1, 1, AFTER)])
+
+    def test_dataset_version(self):
+        self._get(dataset="samples_v2")
+        self.assertEqual(self.calls[0][3], 2)
+
+    def test_no_new_samples(self):
+        self.result = (None, None, 8928, 13955227200)
+
+        self.assertEqual(self._get(), "")
+        self.assertEqual(headers()["X-Sample-Count"], "8928")
+        self.assertEqual(headers()["X-Sample-Checksum"], "13955227200")
+
+    def test_after_missing(self):
+        self.assertRaises(web.BadRequest, self._get, query="")
+        self.assertEqual(self.calls, [])
+
+    def test_after_invalid(self):
+        self.assertRaises(web.BadRequest, self._get, query="after=yesterday")
+        self.assertEqual(self.calls, [])
+
+    def test_unknown_dataset(self):
+        self._assert_not_found(dataset="nothing")
+
+    def test_unknown_station(self):
+        self._assert_not_found(station="xyz")
+
+    def test_month_without_data(self):
+        self._assert_not_found(month="11")
+        self.assertEqual(self.calls, [])
+
+
+def _epoch(ts):
+    return calendar.timegm(ts.timetuple())
+
+
+@unittest.skipUnless(DSN, "ZXW_TEST_DSN not set")
+class MonthSamplesDeltaTests(unittest.TestCase):
+    """
+    Tests the delta query against a real database. Everything happens in a
+    transaction which is rolled back at the end of each test.
+    """
+
+    def setUp(self):
+        self.db = web.database(dbn="postgres", dsn=DSN)
+        self.db.printing = False
+        self.transaction = self.db.transaction()
+        self.db.query("set local time zone 'UTC'")
+
+        self._monthly_db = monthly.db
+        self._database_db = database.db
+        monthly.db = self.db
+        database.db = self.db
+
+        self.station_id = self._station("dtst")
+
+    def tearDown(self):
+        self.transaction.rollback()
+        monthly.db = self._monthly_db
+        database.db = self._database_db
+
+    def _station(self, code):
+        return self.db.query("""
+        insert into station(code, title, station_type_id, sample_interval)
+        select $code, 'Test', station_type_id, 300
+        from station_type where code = 'GENERIC'
+        returning station_id""", dict(code=code))[0].station_id
+
+    def _insert(self, timestamps, station_id=None):
+        for ts in timestamps:
+            self.db.query("""
+            insert into sample(station_id, time_stamp, download_timestamp,
+                               temperature, relative_humidity)
+            values($station, $ts at time zone 'UTC', now(), 12.5, 80)""",
+                          dict(station=station_id or self.station_id, ts=ts))
+
+    def _delete(self, ts):
+        self.db.query("""
+        delete from sample
+        where station_id = $station and time_stamp = $ts at time zone 'UTC'
+        """, dict(station=self.station_id, ts=ts))
+
+    def _delta(self, after=AFTER, station_id=None):
+        return monthly.get_month_samples_tab_delimited_delta(
+            2019, 12, station_id or self.station_id, 1, after)
+
+    def _month(self, days=(1, 5, 9, 10, 11, 20)):
+        # A sample at the start of the month, at exactly the after time and
+        # either side of it plus one in the previous month which must not be
+        # counted
+        samples = [datetime(2019, 12, d, 0, 0) for d in days]
+        samples.append(datetime(2019, 11, 30, 23, 55))
+        return samples
+
+    def test_count_and_checksum(self):
+        self._insert(self._month())
+
+        file_data, max_ts, count, checksum = self._delta()
+
+        expected = [datetime(2019, 12, d) for d in (1, 5, 9, 10)]
+        self.assertEqual(count, 4)
+        self.assertEqual(checksum, sum(_epoch(ts) for ts in expected))
+
+        rows = file_data.split("\n")
+        self.assertEqual([r.split("\t")[0] for r in rows],
+                         ["2019-12-11 00:00:00+00", "2019-12-20 00:00:00+00"])
+        self.assertEqual(max_ts.replace(tzinfo=None),
+                         datetime(2019, 12, 20))
+
+    def test_checksum_deterministic(self):
+        samples = self._month()
+        self._insert(samples)
+
+        self.assertEqual(self._delta()[2:], self._delta()[2:])
+
+        # The same samples inserted in a different order give the same
+        # result
+        other_station = self._station("dtst2")
+        self._insert(reversed(samples), other_station)
+
+        self.assertEqual(self._delta(station_id=other_station)[2:],
+                         self._delta()[2:])
+
+    def test_nothing_new(self):
+        self._insert(self._month(days=(1, 5)))
+
+        file_data, max_ts, count, checksum = self._delta()
+
+        self.assertIsNone(file_data)
+        self.assertIsNone(max_ts)
+        self.assertEqual(count, 2)
+
+    def test_empty_month(self):
+        self.assertEqual(self._delta(), (None, None, 0, 0))
+
+    def test_sample_inserted_before_after(self):
+        self._insert(self._month())
+        _, _, count, checksum = self._delta()
+
+        self._insert([datetime(2019, 12, 3, 12, 5)])
+
+        _, _, new_count, new_checksum = self._delta()
+        self.assertEqual(new_count, count + 1)
+        self.assertNotEqual(new_checksum, checksum)
+
+    def test_sample_moved_before_after(self):
+        # Same number of samples so only the checksum notices
+        self._insert(self._month())
+        _, _, count, checksum = self._delta()
+
+        self._delete(datetime(2019, 12, 5))
+        self._insert([datetime(2019, 12, 6)])
+
+        _, _, new_count, new_checksum = self._delta()
+        self.assertEqual(new_count, count)
+        self.assertEqual(new_checksum, checksum + 24 * 60 * 60)
+
+    def test_sample_added_after(self):
+        self._insert(self._month())
+        _, _, count, checksum = self._delta()
+
+        self._insert([datetime(2019, 12, 21, 0, 5)])
+
+        file_data, _, new_count, new_checksum = self._delta()
+        self.assertEqual((new_count, new_checksum), (count, checksum))
+        self.assertTrue(file_data.split("\n")[-1].startswith(
+            "2019-12-21 00:05:00+00\t12.50\t"))
+
+
+if __name__ == '__main__':
+    unittest.main()
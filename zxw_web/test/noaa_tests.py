@@ -0,0 +1,326 @@
+"""
+Tests the NOAA climatological report formatting and summaries
+"""
+from collections import Counter
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import unittest
+
+import web
+
+import config
+import noaa
+
+PARAMS = {
+    "heatBase": 18.3,
+    "coolBase": 18.3,
+    "fahrenheit": False,
+    "inches": False,
+    "kmh": False,
+    "mph": False,
+}
+
+
+def _record(day, sample_count=288, **values):
+    """
+    Builds a daily_climatology record
+    """
+    record = web.Storage(
+        date_stamp=day, sample_count=sample_count, max_temperature=None,
+        max_temperature_time=None, min_temperature=None,
+        min_temperature_time=None, avg_temperature=None, rainfall=None,
+        avg_wind_speed=None, max_gust_wind_speed=None,
+        max_gust_wind_speed_time=None, heat_degree_days=None,
+        cool_degree_days=None, wind_directions=None,
+        wind_direction_counts=None)
+    record.update(values)
+    return record
+
+
+def _day(day, max_temp=20.0, min_temp=10.0, rain=0.0, wind=5.0,
+         directions=None):
+    return noaa._day_summary(_record(
+        day, max_temperature=max_temp, min_temperature=min_temp,
+        avg_temperature=(max_temp + min_temp) / 2, rainfall=rain,
+        avg_wind_speed=wind / 2, max_gust_wind_speed=wind,
+        heat_degree_days=1.0, cool_degree_days=0.5,
+        wind_directions=list((directions or {}).keys()),
+        wind_direction_counts=list((directions or {}).values())))
+
+
+class FormattingTests(unittest.TestCase):
+
+    def test_round_half_away_from_zero(self):
+        self.assertEqual(noaa._round(0.05), Decimal("0.1"))
+        self.assertEqual(noaa._round(-0.05), Decimal("-0.1"))
+        self.assertEqual(noaa._round(2.675, 2), Decimal("2.68"))
+
+    def test_round_no_negative_zero(self):
+        self.assertEqual(str(noaa._round(-0.04)), "0.0")
+
+    def test_round_none(self):
+        self.assertIsNone(noaa._round(None))
+
+    def test_lpad(self):
+        self.assertEqual(noaa._lpad(5, 3), u"  5")
+        self.assertEqual(noaa._lpad(Decimal("-1.5"), 5), u" -1.5")
+        self.assertIsNone(noaa._lpad(None, 3))
+
+    def test_lpad_truncates(self):
+        self.assertEqual(noaa._lpad(12345, 3), u"123")
+
+    def test_rpad(self):
+        self.assertEqual(noaa._rpad("N", 3), u"N  ")
+        self.assertEqual(noaa._rpad("NNEE", 3), u"NNE")
+
+    def test_fm(self):
+        self.assertEqual(noaa._fm(Decimal("0.5")), ".5")
+        self.assertEqual(noaa._fm(Decimal("1.5")), "1.5")
+
+    def test_temperature(self):
+        self.assertEqual(noaa._temperature(10.0, False), Decimal("10.0"))
+        self.assertEqual(noaa._temperature(10.0, True), Decimal("50"))
+        self.assertEqual(noaa._temperature(Decimal("-40"), True),
+                         Decimal("-40"))
+        self.assertIsNone(noaa._temperature(None, True))
+
+    def test_temperature_difference_fahrenheit(self):
+        # A difference only scales. It isn't offset by 32 like a temperature.
+        self.assertEqual(noaa._temperature_difference(10.0, True),
+                         Decimal("18"))
+        self.assertEqual(noaa._temperature_difference(-5.0, True),
+                         Decimal("-9"))
+        self.assertEqual(noaa._temperature_difference(10.0, False),
+                         Decimal("10"))
+
+    def test_rain(self):
+        self.assertEqual(noaa._rain(25.4, True), Decimal("1.00"))
+        self.assertEqual(noaa._rain(12.34, False), Decimal("12.3"))
+
+    def test_wind(self):
+        self.assertEqual(noaa._wind(10.0, True, False), Decimal("36"))
+        self.assertEqual(noaa._wind(Decimal("10"), False, True),
+                         Decimal("22.3694"))
+        self.assertEqual(noaa._wind(10.0, False, False), Decimal("10"))
+
+    def test_compass_point(self):
+        self.assertEqual(noaa._compass_point(Counter({90: 5, 180: 2})), "E")
+        self.assertEqual(noaa._compass_point(Counter({350: 1})), "N")
+        self.assertEqual(noaa._compass_point(Counter({200: 1})), "SSW")
+        self.assertIsNone(noaa._compass_point(Counter()))
+
+    def test_compass_point_tie_lowest_direction(self):
+        self.assertEqual(noaa._compass_point(Counter({270: 3, 90: 3})), "E")
+
+    def test_time(self):
+        self.assertEqual(noaa._time(datetime(2019, 1, 1, 7, 5)), u"7:05")
+        self.assertIsNone(noaa._time(None))
+
+
+class SummaryTests(unittest.TestCase):
+
+    def test_day_summary_counts(self):
+        summary = _day(date(2019, 1, 1), max_temp=32.04, min_temp=-18.0,
+                       rain=20.0)
+        self.assertEqual(summary["max_high"], 1)
+        self.assertEqual(summary["max_low"], 0)
+        self.assertEqual(summary["min_high"], 1)
+        self.assertEqual(summary["min_low"], 1)
+        self.assertEqual(summary["rain_02"], 1)
+        self.assertEqual(summary["rain_2"], 1)
+        self.assertEqual(summary["rain_20"], 1)
+        self.assertEqual(summary["max_temp"], Decimal("32.0"))
+
+    def test_day_summary_below_thresholds(self):
+        summary = _day(date(2019, 1, 1), max_temp=31.94, min_temp=0.1,
+                       rain=0.14)
+        self.assertEqual(summary["max_high"], 0)
+        self.assertEqual(summary["min_high"], 0)
+        self.assertEqual(summary["rain_02"], 0)
+
+    def test_summarise(self):
+        days = [
+            _day(date(2019, 1, 1), max_temp=20.0, min_temp=10.0, rain=1.0,
+                 directions={90: 2}),
+            _day(date(2019, 1, 2), max_temp=30.0, min_temp=12.0, rain=3.0,
+                 directions={90: 1, 180: 4}),
+        ]
+
+        summary = noaa._summarise(days)
+
+        self.assertEqual(summary["date"], date(2019, 1, 1))
+        self.assertEqual(summary["max_temp"], Decimal("30.0"))
+        self.assertEqual(summary["max_temp_date"], date(2019, 1, 2))
+        self.assertEqual(summary["min_temp"], Decimal("10.0"))
+        self.assertEqual(summary["min_temp_date"], date(2019, 1, 1))
+        self.assertEqual(summary["tot_rain"], Decimal("4.0"))
+        self.assertEqual(summary["max_rain_date"], date(2019, 1, 2))
+        self.assertEqual(summary["max_avg_temp"], Decimal("25.0"))
+        self.assertEqual(summary["heat_dd"], 2.0)
+        self.assertEqual(summary["rain_2"], 1)
+        self.assertEqual(summary["wind_directions"],
+                         Counter({90: 3, 180: 4}))
+
+    def test_summarise_extreme_is_last_date(self):
+        days = [_day(date(2019, 1, d), max_temp=25.0, min_temp=5.0)
+                for d in (3, 10, 7)]
+
+        summary = noaa._summarise(days)
+
+        self.assertEqual(summary["max_temp_date"], date(2019, 1, 10))
+        self.assertEqual(summary["min_temp_date"], date(2019, 1, 10))
+        self.assertEqual(summary["max_wind_date"], date(2019, 1, 10))
+
+    def test_summarise_ignores_missing_values(self):
+        days = [_day(date(2019, 1, 1)),
+                noaa._day_summary(_record(date(2019, 1, 2)))]
+
+        summary = noaa._summarise(days)
+
+        self.assertEqual(summary["max_temp"], Decimal("20.0"))
+        self.assertEqual(summary["max_temp_date"], date(2019, 1, 1))
+        self.assertEqual(summary["max_avg_temp"], Decimal("20.0"))
+
+    def test_format_summary_fahrenheit(self):
+        summary = noaa._summarise([_day(date(2019, 1, 1), max_temp=20.0,
+                                        min_temp=10.0)])
+        params = dict(PARAMS, fahrenheit=True)
+
+        result = noaa._format_summary(summary, params, (2, 2, 2, 2, 5), 1,
+                                      lambda d: d.day)
+
+        self.assertEqual(result["hi_temp"], u" 68.0")
+        self.assertEqual(result["low_temp"], u" 50.0")
+        self.assertEqual(result["mean"], u" 59.0")
+        # Degree days are a difference so aren't offset by 32
+        self.assertEqual(result["heat_dd"], u"  1.8")
+        self.assertEqual(result["cool_dd"], u"  0.9")
+        self.assertEqual(result["hi_temp_date"], u" 1")
+
+    def test_format_summary_no_data(self):
+        result = noaa._format_summary(None, PARAMS, (2, 2, 2, 2, 5), 1,
+                                      lambda d: d.day)
+        self.assertTrue(all(value is None for value in result.values()))
+
+    def test_format_day(self):
+        record = _record(date(2019, 1, 5), max_temperature=21.5,
+                         max_temperature_time=datetime(2019, 1, 5, 14, 30),
+                         heat_degree_days=5.0,
+                         wind_directions=[0, 90],
+                         wind_direction_counts=[1, 2])
+
+        result = noaa._format_day(record, dict(PARAMS, fahrenheit=True))
+
+        self.assertEqual(result["day"], u" 5")
+        self.assertEqual(result["high_temp"], u"70.7")
+        self.assertEqual(result["high_temp_time"], u"14:30")
+        self.assertEqual(result["heat_degree_days"], u" 9.0")
+        self.assertEqual(result["dom_wind_dir"], u"  E")
+
+    def test_format_day_no_data(self):
+        result = noaa._format_day(_record(date(2019, 1, 5), 0), PARAMS)
+        self.assertEqual(result["day"], u" 5")
+        self.assertIsNone(result["high_temp"])
+
+
+class ReportTests(unittest.TestCase):
+    """
+    Tests building the reports with the database functions replaced
+    """
+
+    def setUp(self):
+        self._get_daily_climatology = noaa.get_daily_climatology
+        self._get_version = noaa.get_daily_climatology_version
+        self._get_station = noaa.get_station_report_info
+        self._closed_until = noaa._closed_until
+        self._report_settings = config.report_settings
+
+        self.builds = []
+        self.version = (31, datetime(2020, 1, 8))
+        self.closed_until = date(2020, 2, 1)
+
+        def _get_daily_climatology(station_id, start, end, heat_base,
+                                   cool_base, closed_until):
+            self.builds.append((start, end))
+            days = []
+            day = start
+            while day <= end:
+                days.append(_record(day, max_temperature=20.0,
+                                    min_temperature=10.0, rainfall=1.0))
+                day += timedelta(days=1)
+            return days
+
+        noaa.get_daily_climatology = _get_daily_climatology
+        noaa.get_daily_climatology_version = lambda *args: self.version
+        noaa.get_station_report_info = lambda code: web.Storage(
+            station_id=1)
+        noaa._closed_until = lambda: self.closed_until
+        config.report_settings = {"tst": {"noaa_month": PARAMS}}
+
+        noaa._cache.clear()
+
+    def tearDown(self):
+        noaa.get_daily_climatology = self._get_daily_climatology
+        noaa.get_daily_climatology_version = self._get_version
+        noaa.get_station_report_info = self._get_station
+        noaa._closed_until = self._closed_until
+        config.report_settings = self._report_settings
+        noaa._cache.clear()
+
+    def _month(self, year=2019, month=12):
+        return noaa.get_noaa_month_data("tst", year, month, False)
+
+    def test_december(self):
+        month_row, daily_rows, criteria = self._month()
+
+        self.assertEqual(self.builds, [(date(2019, 12, 1),
+                                        date(2019, 12, 31))])
+        self.assertEqual(len(daily_rows), 31)
+        self.assertEqual(daily_rows[-1]["day"], u"31")
+        self.assertEqual(month_row["tot_rain"], u" 31.0")
+        self.assertEqual(month_row["hi_temp_date"], u"31")
+
+    def test_closed_month_cached(self):
+        first = self._month()
+        second = self._month()
+
+        self.assertEqual(len(self.builds), 1)
+        self.assertEqual(first, second)
+
+    def test_callers_get_a_copy(self):
+        month_row = self._month()[0]
+        month_row["tot_rain"] = "changed"
+
+        self.assertEqual(self._month()[0]["tot_rain"], u" 31.0")
+
+    def test_rebuilt_when_days_recalculated(self):
+        self._month()
+        self.version = (31, datetime(2020, 3, 1))
+        self._month()
+
+        self.assertEqual(len(self.builds), 2)
+
+    def test_rebuilt_when_days_thrown_away(self):
+        self._month()
+        self.version = (30, datetime(2020, 1, 8))
+        self._month()
+        self._month()
+
+        self.assertEqual(len(self.builds), 2)
+
+    def test_open_month_not_cached(self):
+        self.closed_until = date(2019, 12, 20)
+
+        self._month()
+        self._month()
+
+        self.assertEqual(len(self.builds), 2)
+        self.assertEqual(noaa._cache, {})
+
+    def test_not_configured(self):
+        self.assertIsNone(noaa.get_noaa_month_data("abc", 2019, 12, False))
+        self.assertIsNone(noaa.get_noaa_year_data("tst", 2019, False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+"""
+Helpers for the zxw_web tests
+"""
+import web
+
+
+def request(query='', method='GET', **env):
+    """
+    Sets up the web.py context for a request. Any additional keyword
+    arguments are added to the WSGI environment (eg, HTTP_ACCEPT_ENCODING).
+    """
+    web.ctx.clear()
+    web.ctx.env = {'REQUEST_METHOD': method, 'QUERY_STRING': query}
+    web.ctx.env.update(env)
+    web.ctx.method = method
+    web.ctx.headers = []
+    web.ctx.status = '200 OK'
+
+
+def headers():
+    """
+    Returns the response headers set so far as a dict
+    """
+    return dict(web.ctx.headers)
@@ -10,7 +10,8 @@ import config
 from months import month_name, month_number
 from cache import month_cache_control
 from database import month_exists, get_station_id, in_archive_mode, get_station_name, get_stations, get_station_message, \
-    get_station_type_code, get_station_config, get_site_name, get_noaa_month_data
+    get_station_type_code, get_station_config, get_site_name
+from noaa import get_noaa_month_data
 from ui import get_nav_urls, make_station_switch_urls, build_alternate_ui_urls
 import os
 from ui import validate_request, html_file
@@ -9,7 +9,8 @@ import config
 from months import month_name
 from cache import year_cache_control
 from database import year_exists, get_station_id, in_archive_mode, get_station_name, get_stations, get_station_message, \
-    get_site_name, get_noaa_year_data
+    get_site_name
+from noaa import get_noaa_year_data
 from ui import get_nav_urls, make_station_switch_urls, build_alternate_ui_urls
 import os
 from ui import validate_request, html_file
@@ -42,6 +42,7 @@ urls = (
     '/data/(\w*)/(\d+)/(\d+)/(\d+)/(\w*).json', 'data.daily.data_json',             # Daily
     '/data/(\w*)/(\d+)/(\d+)/datatable/(\w*).json', 'data.monthly.datatable_json',  # Monthly, DT
     '/data/(\w*)/(\d+)/(\d+)/(\w*).txt', 'data.monthly.data_ascii',                 # Monthly,
+    '/data/(\w*)/(\d+)/(\d+)/(\w*)_delta.dat', 'data.monthly.data_dat_delta',       # Monthly, delta
     '/data/(\w*)/(\d+)/(\d+)/(\w*).dat', 'data.monthly.data_dat',                   # Monthly,
     '/data/(\w*)/(\d+)/(\d+)/(\w*).json', 'data.monthly.data_json',                 # Monthly,
     '/data/(\w*)/(\d+)/datatable/(\w*).json', 'data.yearly.datatable_json',         # Yearly, DT